@@ -4,28 +4,42 @@
 # pylint: disable=C0301,C0103,C0304,C0303,W0611,C0411,W1203
 
 from dataclasses import dataclass
-from typing import Callable
+from typing import Any, Callable, Iterator, Optional
+import json
 import logging
 
 from core.file_indexing import FileIndex, FileIndexParams
 from core.parsers.chunk_splitters.base_splitter import ChunkSplitterMode
-from core.source_storage import SourceStorage
+from core.source_storage import SourceStorage, is_archive_file
+from core.url_ingestion import UrlIngestion, UrlIngestionParams, UrlIngestionStatus, UrlIngestionResult, get_url_ingestion_message
 from core.llm_manager import LlmManager, LlmFactsResult
 from core.document_set_manager import DocumentSetManager
-from core.text_extractor import TextExtractor, TextExtractorParams
+from core.text_extractor import TextExtractor, TextExtractorParams, iter_in_background
+from core.parsers.parser_sandbox import ParserSandboxParams
 from core.parsers.chunk_splitters.base_splitter import ChunkSplitterParams
 from core.kt_manager import KnowledgeTreeItem, KnowledgeTree, KnowledgeTreeManager
 from core.table_extractor import TableExtractor, TableExtractorResult
-from core.embedding_manager import EmbeddingManager, EmbeddingItem
+from core.embedding_manager import EmbeddingManager, EmbeddingItem, SharedEmbeddings
+from core.artefact_store import ArtefactStore, ArtefactKind, get_text_digest
 from core.user_query_manager import UserQueryManager
-from core.parsers.base_parser import DocumentParserParams, DocumentParserHTMLParams
-from core.facts.fact_clustering import FactCluster, fact_k_means
+from core.parsers.base_parser import DocumentParserParams, DocumentParserHTMLParams, HtmlParserBackend, DocumentParserPDFParams, PdfParserBackend
+from core.facts.fact_clustering import FactClusterResult
+from core.facts.fact_embedding_cache import FactEmbeddingCache
+from core.facts.fact_cluster_manager import FactClusterManager, FactClusterParams
+from core.facts.fact_dedup import dedup_facts
+from core.job_manager import JobManager
+from core.shared_resources import SharedResources
+from core.tracing import trace_span, traced, get_current_span
+from core.span_metrics import SpanMetrics
+from backend_jobs import JOB_FUNCTIONS
 
 import streamlit as st
 
 logger : logging.Logger = logging.getLogger()
 
 IN_MEMORY = False
+USE_TEXT_STORE = False # new document sets keep pages in single file store instead of folder
+JOB_MAX_WORKERS = 2 # background jobs (extraction, indexing, knowledge tree) running at the same time
 
 @dataclass
 class BackendTextExtractionParams:
@@ -37,6 +51,8 @@ class BackendTextExtractionParams:
     fact_context            : str  # context to extact facts
     combine_html_headers    : bool # combine html headers
     show_progress_callback  : Callable[[str], None]
+    html_parser_backend     : HtmlParserBackend = HtmlParserBackend.BS4
+    pdf_parser_backend      : PdfParserBackend = PdfParserBackend.PYPDF
 
 @dataclass
 class BackendFileIndexingParams:
@@ -48,6 +64,8 @@ class BackendFileIndexingParams:
     chunk_overlap  : int
     use_formatted  : bool
     chunk_splitter_mode : ChunkSplitterMode
+    fact_dedup_threshold : float = 0 # 0 - keep near-duplicate facts
+    progress_callback : Optional[Callable[[str], None]] = None # job is cancelled from it
 
 @dataclass
 class BackendChunk:
@@ -61,17 +79,32 @@ class BackendChunk:
 class BackEndCore():
     """Main back-end manager"""
 
-    _SESSION_FILE_INDEX = 'file_index'
-    _SESSION_SOURCE_INDEX = 'source_index'
-    _SESSION_LLM = 'llm_instance'
-    _SESSION_TEXT_EXTRACTOR = 'plain_text_extractor'
+    # per-session state
     _SESSION_DOCUMENT_SET = 'document_set_manager'
-    _SESSION_KT_MANAGER = 'knowledge_tree_manager'
-    _SESSION_TABLE_EXTRACTOR = 'table_extractor'
-    _SESSION_EMBEDDING_MANAGER = 'embedding_manager'
-    _SESSION_USER_QUERY_MANAGER = 'user_query_manager'
+
+    # process-wide resources shared by all sessions (models, clients, caches)
+    _SHARED_FILE_INDEX = 'file_index'
+    _SHARED_SOURCE_INDEX = 'source_index'
+    _SHARED_LLM = 'llm_instance'
+    _SHARED_TEXT_EXTRACTOR = 'plain_text_extractor'
+    _SHARED_KT_MANAGER = 'knowledge_tree_manager'
+    _SHARED_TABLE_EXTRACTOR = 'table_extractor'
+    _SHARED_EMBEDDING_MANAGER = 'embedding_manager'
+    _SHARED_USER_QUERY_MANAGER = 'user_query_manager'
+    _SHARED_FACT_EMBEDDING_CACHE = 'fact_embedding_cache'
+    _SHARED_FACT_CLUSTER_MANAGER = 'fact_cluster_manager'
+    _SHARED_ARTEFACT_STORE = 'artefact_store'
+    _SHARED_JOB_MANAGER = 'job_manager'
+    _SHARED_SPAN_METRICS = 'span_metrics'
 
     __MIN_PLAIN_TEXT_SIZE = 50
+    __ARCHIVE_READ_AHEAD = 8 # files unpacked ahead of text extraction
+
+    _headless_session : Optional[dict[str, Any]] = None # used instead of streamlit session in batch mode
+    _headless_secrets : Optional[dict[str, Any]] = None
+    _index_keep_open_seconds : float = 0 # long-running services keep indexes open between searches
+
+    _shared_resources = SharedResources()
 
     def __new__(cls):
         """Singleton"""
@@ -79,100 +112,217 @@ class BackEndCore():
             cls.instance = super(BackEndCore, cls).__new__(cls)
         return cls.instance
 
+    @classmethod
+    def init_headless(cls, all_secrets : dict[str, Any], index_keep_open_seconds : float = 0):
+        """Run without streamlit (batch jobs, query service): managers are kept in process, secrets are provided by caller"""
+        cls._headless_session = {}
+        cls._headless_secrets = all_secrets
+        cls._index_keep_open_seconds = index_keep_open_seconds
+
+    @classmethod
+    def _get_session(cls) -> dict[str, Any]:
+        """Storage of managers: streamlit session or headless storage"""
+        if cls._headless_session is not None:
+            return cls._headless_session
+        return st.session_state
+
+    @classmethod
+    def _get_secrets(cls) -> dict[str, Any]:
+        """Secrets: streamlit secrets or provided in headless mode"""
+        if cls._headless_secrets is not None:
+            return cls._headless_secrets
+        return {s[0]:s[1] for s in st.secrets.items()}
+
+    @classmethod
+    def _get_shared(cls, key : str, create_call : Callable[[], Any]) -> Any:
+        """Resource shared by all sessions of process, created once"""
+        return cls._shared_resources.get(key, create_call)
+
     @classmethod
     def get_document_set_manager(cls) -> DocumentSetManager:
         """Get DocumentSetManager"""
-        if cls._SESSION_DOCUMENT_SET not in st.session_state:
+        if cls._SESSION_DOCUMENT_SET not in cls._get_session():
             document_set_manager= DocumentSetManager(IN_MEMORY)
             document_set_manager.load()
-            st.session_state[cls._SESSION_DOCUMENT_SET] = document_set_manager
+            cls._get_session()[cls._SESSION_DOCUMENT_SET] = document_set_manager
 
-        return st.session_state[cls._SESSION_DOCUMENT_SET]
+        return cls._get_session()[cls._SESSION_DOCUMENT_SET]
 
     @classmethod
     def get_file_index(cls) -> FileIndex:
         """Get FileIndex"""
-        if cls._SESSION_FILE_INDEX not in st.session_state:
-            st.session_state[cls._SESSION_FILE_INDEX] = FileIndex(IN_MEMORY)
-        return st.session_state[cls._SESSION_FILE_INDEX]
+        return cls._get_shared(cls._SHARED_FILE_INDEX, lambda: FileIndex(IN_MEMORY, cls._index_keep_open_seconds))
 
     @classmethod
     def get_source_storage(cls) -> SourceStorage:
         """Get SourceIndex"""
-        if cls._SESSION_SOURCE_INDEX not in st.session_state:
-            st.session_state[cls._SESSION_SOURCE_INDEX] = SourceStorage(IN_MEMORY)
-        return st.session_state[cls._SESSION_SOURCE_INDEX]
+        return cls._get_shared(cls._SHARED_SOURCE_INDEX, lambda: SourceStorage(IN_MEMORY))
 
     @classmethod
     def get_llm_manager(cls) -> LlmManager:
         """Get LLM Manager"""
-        if cls._SESSION_LLM not in st.session_state:
-            all_secrets = {s[0]:s[1] for s in st.secrets.items()}
-            st.session_state[cls._SESSION_LLM] = LlmManager(all_secrets)
-        return st.session_state[cls._SESSION_LLM]
+        return cls._get_shared(cls._SHARED_LLM, lambda: LlmManager(cls._get_secrets()))
 
     @classmethod
     def get_embedding_manager(cls) -> EmbeddingManager:
         """Get embedding Manager"""
-        if cls._SESSION_EMBEDDING_MANAGER not in st.session_state:
-            st.session_state[cls._SESSION_EMBEDDING_MANAGER] = EmbeddingManager()
-        return st.session_state[cls._SESSION_EMBEDDING_MANAGER]
+        return cls._get_shared(cls._SHARED_EMBEDDING_MANAGER, EmbeddingManager)
 
     @classmethod
     def get_text_extractor(cls) -> TextExtractor:
         """Get TextExtractor"""
-        if cls._SESSION_TEXT_EXTRACTOR not in st.session_state:
-            st.session_state[cls._SESSION_TEXT_EXTRACTOR] = TextExtractor()
-        return st.session_state[cls._SESSION_TEXT_EXTRACTOR]
+        return cls._get_shared(cls._SHARED_TEXT_EXTRACTOR, lambda: TextExtractor(USE_TEXT_STORE, cls.get_artefact_store()))
 
     @classmethod
     def get_knowledge_tree_manager(cls) -> KnowledgeTreeManager:
         """Get KnowledgeTreeManager"""
-        if cls._SESSION_KT_MANAGER not in st.session_state:
-            st.session_state[cls._SESSION_KT_MANAGER] = KnowledgeTreeManager(IN_MEMORY)
-        return st.session_state[cls._SESSION_KT_MANAGER]
+        return cls._get_shared(cls._SHARED_KT_MANAGER, lambda: KnowledgeTreeManager(IN_MEMORY))
 
     @classmethod
     def get_table_extractor(cls) -> TableExtractor:
         """Get TableExtractor"""
-        if cls._SESSION_TABLE_EXTRACTOR not in st.session_state:
-            st.session_state[cls._SESSION_TABLE_EXTRACTOR] = TableExtractor()
-        return st.session_state[cls._SESSION_TABLE_EXTRACTOR]
+        return cls._get_shared(cls._SHARED_TABLE_EXTRACTOR, TableExtractor)
 
     @classmethod
     def get_user_query_manager(cls) -> UserQueryManager:
         """Get UserQueryManager"""
-        if cls._SESSION_USER_QUERY_MANAGER not in st.session_state:
-            st.session_state[cls._SESSION_USER_QUERY_MANAGER] = UserQueryManager(IN_MEMORY)
-        return st.session_state[cls._SESSION_USER_QUERY_MANAGER]
+        return cls._get_shared(cls._SHARED_USER_QUERY_MANAGER, lambda: UserQueryManager(IN_MEMORY))
 
-    def run_text_extraction(self, document_set : str, params : BackendTextExtractionParams) -> list[str]:
-        """Extract plain text from source files"""
+    @classmethod
+    def get_fact_embedding_cache(cls) -> FactEmbeddingCache:
+        """Get FactEmbeddingCache"""
+        return cls._get_shared(cls._SHARED_FACT_EMBEDDING_CACHE, FactEmbeddingCache)
 
-        source_storage  = self.get_source_storage()
-        text_extractor  = self.get_text_extractor()
-        llm_manager     = self.get_llm_manager()
-        table_extractor = self.get_table_extractor()
+    @classmethod
+    def get_fact_cluster_manager(cls) -> FactClusterManager:
+        """Get FactClusterManager"""
+        return cls._get_shared(cls._SHARED_FACT_CLUSTER_MANAGER, lambda: FactClusterManager(IN_MEMORY))
+
+    @classmethod
+    def get_artefact_store(cls) -> ArtefactStore:
+        """Get ArtefactStore"""
+        return cls._get_shared(cls._SHARED_ARTEFACT_STORE, lambda: ArtefactStore(IN_MEMORY))
+
+    @classmethod
+    def get_span_metrics(cls) -> SpanMetrics:
+        """Aggregated metrics of recorded spans"""
+        return cls._get_shared(cls._SHARED_SPAN_METRICS, SpanMetrics)
 
-        uploaded_files = source_storage.get_all_files(document_set)
-        textExtractorParams = TextExtractorParams(
+    @classmethod
+    def get_job_manager(cls) -> JobManager:
+        """Background job manager (shared by all sessions)"""
+        job_manager : JobManager = cls._get_shared(cls._SHARED_JOB_MANAGER, lambda: JobManager(JOB_FUNCTIONS, JOB_MAX_WORKERS))
+        job_manager.start()
+        return job_manager
+
+    def submit_job(self, job_type : str, document_set : str, params : dict) -> str:
+        """Run long operation in background, returns job id"""
+        return self.get_job_manager().submit(job_type, document_set, params)
+
+    def get_pdf_parser_backend(self, document_set : str) -> PdfParserBackend:
+        """Pdf parser backend used for document set (default if not known)"""
+        document_set_item = self.get_document_set_manager().find_name(document_set)
+        if document_set_item and document_set_item.pdf_parser_backend in PdfParserBackend.__members__:
+            return PdfParserBackend[document_set_item.pdf_parser_backend]
+        return PdfParserBackend.PYPDF
+
+    def run_url_ingestion(self, document_set : str, url_list : list[str], sitemap_url : str, show_progress_callback : Callable[[str], None]) -> list[str]:
+        """Download urls (and urls from sitemap) into document set"""
+        url_ingestion = UrlIngestion(self.get_source_storage(), UrlIngestionParams())
+        url_list = list(url_list)
+        if sitemap_url:
+            show_progress_callback('Load sitemap...')
+            url_list.extend(url_ingestion.get_sitemap_urls(sitemap_url))
+
+        result_list = url_ingestion.ingest(document_set, url_list, show_progress_callback)
+        output_log = [
+            f'Downloaded {len([r for r in result_list if r.status == UrlIngestionStatus.SAVED])} url(s), '\
+            f'{len([r for r in result_list if r.status == UrlIngestionStatus.NOT_MODIFIED])} not modified'
+        ]
+        output_log.extend(get_url_ingestion_message(r) for r in result_list if r.status == UrlIngestionStatus.ERROR)
+        return output_log
+
+    def run_single_url_ingestion(self, document_set : str, url : str) -> UrlIngestionResult:
+        """Download one url into document set"""
+        return UrlIngestion(self.get_source_storage(), UrlIngestionParams()).ingest(document_set, [url])[0]
+
+    def __get_text_extractor_params(self, params : BackendTextExtractionParams) -> TextExtractorParams:
+        """Parameters of text extractor"""
+        return TextExtractorParams(
             params.override_all,
             params.show_progress_callback,
             DocumentParserParams(
                 DocumentParserHTMLParams(
                     params.combine_html_headers,
                     ['header', 'footer', 'breadcrumb'],
-                    ['head', 'script', 'button']
-                )
-            )
+                    ['head', 'script', 'button'],
+                    params.html_parser_backend
+                ),
+                DocumentParserPDFParams(params.pdf_parser_backend)
+            ),
+            ParserSandboxParams()
+        )
+
+    def is_archive_file(self, file_name : str) -> bool:
+        """True if uploaded file is archive"""
+        return is_archive_file(file_name)
+
+    def run_archive_upload(
+            self,
+            document_set : str,
+            archive_name : str,
+            archive_stream,
+            params : Optional[BackendTextExtractionParams]
+        ) -> list[str]:
+        """
+            Save files from archive. If params are provided, plain text is extracted (without LLM steps)
+            while next files are unpacked.
+        """
+        source_storage = self.get_source_storage()
+        file_digests = dict[str, str]()
+        def iter_saved_files() -> Iterator[str]:
+            for file_name, digest in source_storage.iter_save_archive(document_set, archive_name, archive_stream):
+                file_digests[file_name] = digest
+                yield file_name
+
+        if not params:
+            file_count = len(list(iter_saved_files()))
+            return [f'Unpacked {file_count} file(s) from {archive_name}']
+
+        output_log = self.get_text_extractor().text_extraction_and_save(
+            document_set,
+            iter_in_background(iter_saved_files(), self.__ARCHIVE_READ_AHEAD),
+            self.__get_text_extractor_params(params),
+            file_digests
         )
+        output_log.insert(0, f'Unpacked {len(file_digests)} file(s) from {archive_name}')
+        return output_log
+
+    @traced('text_extraction')
+    def run_text_extraction(self, document_set : str, params : BackendTextExtractionParams) -> list[str]:
+        """Extract plain text from source files"""
+
+        source_storage  = self.get_source_storage()
+        text_extractor  = self.get_text_extractor()
+        llm_manager     = self.get_llm_manager()
+        table_extractor = self.get_table_extractor()
+
+        artefact_store  = self.get_artefact_store()
+
+        # digests of content: the same document from other document set is not extracted again
+        file_digests = source_storage.get_file_digests(document_set)
+        uploaded_files = list(file_digests.keys())
+        textExtractorParams = self.__get_text_extractor_params(params)
+        get_current_span().set_attribute('document_set', document_set)
+        get_current_span().set_attribute('files', len(uploaded_files))
 
         # extract plain text
-        output_log : list[str] = text_extractor.text_extraction_and_save(document_set, uploaded_files, textExtractorParams)
+        output_log : list[str] = text_extractor.text_extraction_and_save(document_set, uploaded_files, textExtractorParams, file_digests)
+        self.get_document_set_manager().set_pdf_parser_backend(document_set, params.pdf_parser_backend.name, True)
 
         # additional formatting and table extraction
         if params.run_html_llm_formatter or params.run_table_extraction:
-            plain_text_files = text_extractor.get_all_source_file_names(document_set, True)
+            plain_text_files = text_extractor.get_all_source_file_names(document_set)
             for plain_text_file_name in plain_text_files:
                 plain_text = text_extractor.get_input_by_file_name(document_set, plain_text_file_name)
                 if len(plain_text) < self.__MIN_PLAIN_TEXT_SIZE:
@@ -185,6 +335,7 @@ class BackEndCore():
                         plain_text,
                         text_extractor, 
                         llm_manager, 
+                        artefact_store,
                         params.show_progress_callback,
                         output_log
                     )
@@ -195,21 +346,28 @@ class BackEndCore():
                         plain_text_file_name,
                         text_extractor,
                         table_extractor,
+                        artefact_store,
                         params.show_progress_callback,
                         output_log
                     )
 
         # fact extractor
         if params.store_as_facts_list:
-            plain_text_files = text_extractor.get_all_source_file_names(document_set, True)
+            plain_text_files = text_extractor.get_all_source_file_names(document_set)
             for index, plain_text_file_name in enumerate(plain_text_files):
                 params.show_progress_callback(f'Extract facts from {plain_text_file_name} ({index+1}/{len(plain_text_files)})...')
                 plain_text = text_extractor.get_input_by_file_name(document_set, plain_text_file_name)
+                facts_key = get_text_digest(plain_text, params.fact_context, llm_manager.get_fact_list_version())
+                shared_facts = artefact_store.get(ArtefactKind.FACTS, facts_key)
+                if shared_facts is not None:
+                    text_extractor.save_fact_text(document_set, plain_text_file_name, json.loads(shared_facts))
+                    continue
                 fact_list_result : LlmFactsResult = llm_manager.get_fact_list(plain_text, params.fact_context)
                 if fact_list_result.error_list:
                     error_str = "\n".join(fact_list_result.error_list)
                     output_log.append(f'ERROR. File={plain_text_file_name}. {error_str}')
                     continue
+                artefact_store.put(ArtefactKind.FACTS, facts_key, json.dumps(fact_list_result.fact_list))
                 text_extractor.save_fact_text(document_set, plain_text_file_name, fact_list_result.fact_list)
 
 
@@ -222,17 +380,25 @@ class BackEndCore():
             plain_text,
             text_extractor, 
             llm_manager, 
+            artefact_store : ArtefactStore,
             show_progress_callback : Callable[[str], None],
             output_log : list[str]
         ):
         """Execute LLM formatter"""
         output_log.append(f'LLM formatting of {plain_text_file_name}')
+        formatted_key = get_text_digest(plain_text, llm_manager.get_format_version())
+        shared_formatted_text = artefact_store.get(ArtefactKind.FORMATTED, formatted_key)
+        if shared_formatted_text is not None:
+            output_log.append('Saved formatted text (reused)')
+            text_extractor.save_formatted_text(document_set, plain_text_file_name, shared_formatted_text)
+            return
         show_progress_callback(f'Run LLM formatting of {plain_text_file_name}...')
         formatted_text_result = llm_manager.run_llm_format(plain_text)
         if formatted_text_result.error:
             output_log.append(f'ERROR {plain_text_file_name}: {formatted_text_result.error}')
         else:
             output_log.append('Saved formatted text')
+            artefact_store.put(ArtefactKind.FORMATTED, formatted_key, formatted_text_result.output_text)
             text_extractor.save_formatted_text(document_set, plain_text_file_name, formatted_text_result.output_text)
 
     def __exec_extract_tables(
@@ -241,6 +407,7 @@ class BackEndCore():
             plain_text_file_name : str,
             text_extractor : TextExtractor, 
             table_extractor : TableExtractor, 
+            artefact_store : ArtefactStore,
             show_progress_callback : Callable[[str], None],
             output_log : list[str] 
         ):
@@ -251,6 +418,13 @@ class BackEndCore():
         formatted_text = text_extractor.get_formatted_text(document_set, plain_text_file_name)
         if len(formatted_text) < self.__MIN_PLAIN_TEXT_SIZE:
             return
+        tables_key = get_text_digest(formatted_text)
+        shared_tables = artefact_store.get(ArtefactKind.TABLES, tables_key)
+        if shared_tables is not None:
+            if shared_tables: # empty - no tables
+                output_log.append('Saved extracted table(s) (reused)')
+                text_extractor.save_tables(document_set, plain_text_file_name, shared_tables)
+            return
         table_list_result = table_extractor.get_table_from_html(formatted_text)
         if not table_list_result:
             return
@@ -258,11 +432,14 @@ class BackEndCore():
             output_log.append(f'ERROR {plain_text_file_name}: {table_list_result.error}')
             return
         if not table_list_result.table_list or len(table_list_result.table_list) == 0:
+            artefact_store.put(ArtefactKind.TABLES, tables_key, '')
             return
         table_extractor_result_json = table_extractor.get_table_extractor_result_json(table_list_result)
+        artefact_store.put(ArtefactKind.TABLES, tables_key, table_extractor_result_json)
         output_log.append('Saved extracted table(s)')
         text_extractor.save_tables(document_set, plain_text_file_name, table_extractor_result_json)
 
+    @traced('file_indexing')
     def run_file_indexing(self, document_set : str, params : BackendFileIndexingParams) -> list[str]:
         """Run file indexing"""
 
@@ -271,6 +448,12 @@ class BackEndCore():
         text_extractor = self.get_text_extractor()
         embedding_manager = self.get_embedding_manager()
 
+        span = get_current_span()
+        span.set_attribute('document_set', document_set)
+        span.set_attribute('index_name', params.index_name)
+        span.set_attribute('embedding', params.embedding_item.embedding_type.name)
+        span.set_attribute('splitter', params.chunk_splitter_mode.name)
+
         fileIndexParams = FileIndexParams(
                 ChunkSplitterParams(
                     params.chunk_min,
@@ -279,10 +462,12 @@ class BackEndCore():
                     llm_manager.get_model_name(),
                     params.chunk_splitter_mode,
                 ),
-                text_extractor.FACT_LINE_SEPARATOR
+                text_extractor.FACT_LINE_SEPARATOR,
+                params.fact_dedup_threshold
         )
 
-        input_with_meta = text_extractor.get_input_with_meta(document_set, params.use_formatted)
+        # pages are read while chunks are created
+        input_with_meta = text_extractor.iter_input_with_meta(document_set, params.use_formatted)
 
         indexing_result = file_index.run_indexing(
                 document_set,
@@ -290,12 +475,19 @@ class BackEndCore():
                 input_with_meta,
                 params.embedding_item.embedding_type.name,
                 params.embedding_item.default_threshold,
-                embedding_manager.get_embeddings(params.embedding_item.embedding_type.name),
-                fileIndexParams
+                # vectors of the same chunks are shared by all indexes
+                SharedEmbeddings(
+                    embedding_manager.get_embeddings(params.embedding_item.embedding_type.name),
+                    params.embedding_item.embedding_type.name,
+                    self.get_artefact_store()
+                ),
+                fileIndexParams,
+                params.progress_callback
         )
 
         return indexing_result
 
+    @traced('similarity_search')
     def similarity_search(
             self, 
             document_set : str,
@@ -312,8 +504,14 @@ class BackEndCore():
         file_index = self.get_file_index()
         embedding_manager = self.get_embedding_manager()
 
+        span = get_current_span()
+        span.set_attribute('document_set', document_set)
+        span.set_attribute('index_name', index_name)
+        span.set_attribute('sample_count', sample_count)
+
         show_status_callback('Load index...')
-        fileIndexMeta = file_index.get_file_index_meta(document_set, index_name)
+        with trace_span('load_index_meta'):
+            fileIndexMeta = file_index.get_file_index_meta(document_set, index_name)
 
         show_status_callback('Similarity search...')
         similarity_result = file_index.similarity_search(
@@ -337,28 +535,44 @@ class BackEndCore():
         ]
 
         if add_llm_score:
-            llm_chunk_list = []
-            for chunk_index, chunk in enumerate(chunk_list):
-                show_status_callback(f'LLM score {chunk_index+1}/{len(chunk_list)}...')
-                relevance_score = llm_manager.get_relevance_score(query, chunk.content)
-                if relevance_score.llm_score >= llm_threshold:
-                    chunk.llm_score = relevance_score.llm_score
-                    chunk.llm_expl = relevance_score.llm_expl
-                    llm_chunk_list.append(chunk)
-            chunk_list = llm_chunk_list
+            with trace_span('llm_score', chunks=len(chunk_list)) as llm_span:
+                llm_chunk_list = []
+                for chunk_index, chunk in enumerate(chunk_list):
+                    show_status_callback(f'LLM score {chunk_index+1}/{len(chunk_list)}...')
+                    relevance_score = llm_manager.get_relevance_score(query, chunk.content)
+                    if relevance_score.llm_score >= llm_threshold:
+                        chunk.llm_score = relevance_score.llm_score
+                        chunk.llm_expl = relevance_score.llm_expl
+                        llm_chunk_list.append(chunk)
+                chunk_list = llm_chunk_list
+                llm_span.set_attribute('relevant_chunks', len(chunk_list))
+
+        span.set_attribute('chunks', len(chunk_list))
 
         show_status_callback('')
         return chunk_list
 
+    @traced('build_answer')
     def build_answer(self, question : str, chunk_list : list[BackendChunk]) -> str:
         """Build LLM answer"""
         logger.info('Build summary by LLM...')
+        get_current_span().set_attribute('chunks', len(chunk_list))
         llm_manager = self.get_llm_manager()
         answer_result = llm_manager.build_answer(question, [c.content for c in chunk_list])
         if answer_result.error:
             return answer_result.error
         return answer_result.answer
 
+    def iter_answer(self, question : str, chunk_list : list[BackendChunk]) -> Iterator[str]:
+        """Build LLM answer, answer is returned each time it's refined (last one is final)"""
+        llm_manager = self.get_llm_manager()
+        for answer_result in llm_manager.iter_answer(question, [c.content for c in chunk_list]):
+            if answer_result.error:
+                yield 'Answer can not be built'
+                return
+            yield answer_result.answer
+
+    @traced('knowledge_tree')
     def build_knowledge_tree(
             self,
             document_set : str,
@@ -368,6 +582,8 @@ class BackEndCore():
             show_progress_callback : Callable[[str], None]
         ) -> KnowledgeTree:
         """Build knowledge tree"""
+        get_current_span().set_attribute('document_set', document_set)
+        get_current_span().set_attribute('files', len(input_file_list))
 
         text_extractor = self.get_text_extractor()
         llm_manager = self.get_llm_manager()
@@ -379,10 +595,11 @@ class BackEndCore():
             if not existed_tree.error and existed_tree.triples and len(existed_tree.triples) > 0:
                 existed_triples = existed_tree.triples
 
-        input_list_text_with_meta = text_extractor.get_input_with_meta_by_files(document_set, input_file_list)
+        # next pages are read while LLM processes current one
+        input_list_text_with_meta = text_extractor.iter_input_with_meta_by_files(document_set, input_file_list)
         triples = list[KnowledgeTreeItem](existed_triples)
         for index, input_item in enumerate(input_list_text_with_meta):
-            show_progress_callback(f'Process {index+1}/{len(input_list_text_with_meta)}...')
+            show_progress_callback(f'Process {index+1}/{len(input_file_list)}...')
             kt_list = llm_manager.build_knowledge_tree(input_item[0])
             if not kt_list.error:
                 for kt_item in kt_list.triples:
@@ -410,17 +627,53 @@ class BackEndCore():
             return None
         return table_extractor.get_table_extractor_result_from_json(table_json)
 
-    def get_fact_clusters(self, selected_document_set : str, cluster_count : int, embedding_item : EmbeddingItem) -> list[FactCluster]:
-        """Get fact clusters"""
+    @traced('fact_clusters')
+    def get_fact_clusters(
+            self,
+            selected_document_set : str,
+            embedding_item : EmbeddingItem,
+            params : FactClusterParams
+        ) -> FactClusterResult:
+        """Get fact clusters. Stored clusters are reused, new facts are assigned to the nearest cluster"""
         text_extractor = self.get_text_extractor()
         embedding_manager = self.get_embedding_manager()
+        fact_embedding_cache = self.get_fact_embedding_cache()
+        fact_cluster_manager = self.get_fact_cluster_manager()
 
         all_fact_files = text_extractor.get_all_facts_file_names(selected_document_set, True)
 
         full_fact_list = []
+        fact_sources = []
         for fact_file in all_fact_files:
             facts = text_extractor.get_facts_from_file(selected_document_set, fact_file)
             full_fact_list.extend(facts)
-        
-        embedding_encode_call = embedding_manager.get_embeddings_encode_call(embedding_item.embedding_type.name)
-        return fact_k_means(full_fact_list, cluster_count, embedding_encode_call)
+            fact_sources.extend([[fact_file]] * len(facts))
+
+        if not full_fact_list:
+            return FactClusterResult([], 0, [])
+
+        embedding_name = embedding_item.embedding_type.name
+        def encode_call(fact_list : list[str]) -> list[list[float]]:
+            # embedding model is loaded only when there are new facts
+            return embedding_manager.get_embeddings_encode_call(embedding_name)(fact_list)
+        normalized_embeddings = fact_embedding_cache.get_normalized_embeddings(embedding_name, full_fact_list, encode_call)
+
+        if params.dedup_threshold > 0:
+            dedup_result = dedup_facts(normalized_embeddings, params.dedup_threshold)
+            fact_sources = [
+                sorted({fact_sources[index][0] for index in duplicate_index_list})
+                for duplicate_index_list in dedup_result.duplicate_index_list
+            ]
+            full_fact_list = [full_fact_list[index] for index in dedup_result.kept_index_list]
+            normalized_embeddings = normalized_embeddings[dedup_result.kept_index_list]
+
+        return fact_cluster_manager.get_fact_clusters(
+            selected_document_set,
+            embedding_name,
+            full_fact_list,
+            [fact_embedding_cache.get_fact_hash(fact) for fact in full_fact_list],
+            normalized_embeddings,
+            params,
+            # sources are kept by fact index, the same fact text can come from different files
+            fact_sources
+        )
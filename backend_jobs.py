@@ -0,0 +1,80 @@
+"""
+    Long operations which are run by job manager in worker processes
+    Each job function: (document_set, params, progress_callback) -> log lines
+"""
+# pylint: disable=C0301,C0103,C0303,C0415
+
+from typing import Callable
+
+from core.pipeline_config import BatchExtractionConfig, BatchIndexingConfig, DEFAULT_SECRETS_FILE, load_secrets
+from core.parsers.base_parser import HtmlParserBackend, PdfParserBackend
+from core.parsers.chunk_splitters.base_splitter import ChunkSplitterMode
+
+JOB_TEXT_EXTRACTION = 'text_extraction'
+JOB_FILE_INDEXING   = 'file_indexing'
+JOB_KNOWLEDGE_TREE  = 'knowledge_tree'
+
+JOB_FUNCTIONS = {
+    JOB_TEXT_EXTRACTION : 'backend_jobs:run_text_extraction_job',
+    JOB_FILE_INDEXING   : 'backend_jobs:run_file_indexing_job',
+    JOB_KNOWLEDGE_TREE  : 'backend_jobs:run_knowledge_tree_job',
+}
+
+def get_headless_backend():
+    """Backend in worker process: streamlit is not running here, secrets are read from file"""
+    from backend_core import BackEndCore
+    BackEndCore.init_headless(load_secrets(DEFAULT_SECRETS_FILE))
+    return BackEndCore()
+
+def run_text_extraction_job(document_set : str, params : dict, progress_callback : Callable[[str], None]) -> list[str]:
+    """Text extraction, params are BatchExtractionConfig"""
+    from backend_core import BackendTextExtractionParams
+    backend = get_headless_backend()
+    extraction = BatchExtractionConfig.from_dict(params) # pylint: disable=E1101
+    return backend.run_text_extraction(
+        document_set,
+        BackendTextExtractionParams(
+            extraction.override_all,
+            extraction.run_html_llm_formatter,
+            extraction.run_table_extraction,
+            extraction.store_as_facts_list,
+            extraction.fact_context,
+            extraction.combine_html_headers,
+            progress_callback,
+            HtmlParserBackend[extraction.html_parser_backend],
+            PdfParserBackend[extraction.pdf_parser_backend]
+        )
+    )
+
+def run_file_indexing_job(document_set : str, params : dict, progress_callback : Callable[[str], None]) -> list[str]:
+    """File indexing, params are BatchIndexingConfig"""
+    from backend_core import BackendFileIndexingParams
+    backend = get_headless_backend()
+    indexing = BatchIndexingConfig.from_dict(params) # pylint: disable=E1101
+    progress_callback(f'Start indexing [{indexing.index_name}] ...')
+    return backend.run_file_indexing(
+        document_set,
+        BackendFileIndexingParams(
+            backend.get_embedding_manager().get_embedding_information(indexing.embedding),
+            indexing.index_name,
+            indexing.chunk_min,
+            indexing.chunk_size,
+            indexing.chunk_overlap,
+            indexing.use_formatted,
+            ChunkSplitterMode[indexing.chunk_splitter_mode],
+            indexing.fact_dedup_threshold,
+            progress_callback
+        )
+    )
+
+def run_knowledge_tree_job(document_set : str, params : dict, progress_callback : Callable[[str], None]) -> list[str]:
+    """Build knowledge tree, params: name, input_file_list, append_mode"""
+    backend = get_headless_backend()
+    knowledge_tree = backend.build_knowledge_tree(
+        document_set,
+        params['name'],
+        params['input_file_list'],
+        params.get('append_mode', False),
+        progress_callback
+    )
+    return [f'Knowledge tree {params["name"]} is saved with {len(knowledge_tree.triples)} triple(s)']
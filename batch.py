@@ -0,0 +1,180 @@
+"""
+    Headless batch run of text extraction (with facts), indexing and bulk queries for document sets
+    To run: python batch.py batch_config.json [--workers 4] [--secrets .streamlit/secrets.toml]
+    Progress is printed as JSON lines: {"time", "document_set", "step", "event", "message"}
+"""
+# pylint: disable=C0301,C0103,C0303,C0411,W0718,R0913
+
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from dataclasses import dataclass, field
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses_json import dataclass_json
+
+from core.parsers.base_parser import HtmlParserBackend, PdfParserBackend
+from core.parsers.chunk_splitters.base_splitter import ChunkSplitterMode
+from core.pipeline_config import BatchExtractionConfig, BatchIndexingConfig, DEFAULT_SECRETS_FILE, load_secrets
+
+@dataclass_json
+@dataclass
+class BatchQueryConfig:
+    """Bulk queries: one question per line in questions_file, answers are saved as JSON lines"""
+    index_name      : str
+    questions_file  : str
+    output_file     : str
+    sample_count    : int = 5
+    score_threshold : float = 0
+    add_llm_score   : bool = False
+    llm_threshold   : float = 0
+    build_answer    : bool = True
+
+@dataclass_json
+@dataclass
+class BatchDocumentSetConfig:
+    """Steps for one document set (step is skipped if it's not provided)"""
+    document_set : str
+    extraction   : Optional[BatchExtractionConfig] = None
+    indexing     : Optional[BatchIndexingConfig] = None
+    queries      : Optional[BatchQueryConfig] = None
+
+@dataclass_json
+@dataclass
+class BatchConfig:
+    """Batch configuration"""
+    document_sets : list[BatchDocumentSetConfig] = field(default_factory=list)
+    workers       : int = 1 # document sets are processed in parallel processes
+    secrets_file  : str = DEFAULT_SECRETS_FILE
+
+def load_batch_config(file_name : str) -> BatchConfig:
+    """Load config from json file"""
+    with open(file_name, encoding="utf-8") as f:
+        return BatchConfig.from_json(f.read()) # pylint: disable=E1101
+
+def print_progress(document_set : str, step : str, event : str, message : str = ''):
+    """Print progress record as one JSON line"""
+    record = {
+        'time'         : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'document_set' : document_set,
+        'step'         : step,
+        'event'        : event,
+        'message'      : message
+    }
+    sys.stdout.write(json.dumps(record) + '\n')
+    sys.stdout.flush()
+
+def run_document_set(document_set_config : BatchDocumentSetConfig, all_secrets : dict) -> bool:
+    """Run all steps for one document set (in worker process), returns False if step failed"""
+
+    document_set = document_set_config.document_set
+    step = 'init'
+    try:
+        # imported in worker process, streamlit is not running here and managers are kept in process
+        from backend_core import BackEndCore, BackendTextExtractionParams, BackendFileIndexingParams # pylint: disable=C0415
+        BackEndCore.init_headless(all_secrets)
+        backend = BackEndCore()
+
+        step = 'extraction'
+        if document_set_config.extraction:
+            print_progress(document_set, step, 'start')
+            extraction = document_set_config.extraction
+            output_log = backend.run_text_extraction(
+                document_set,
+                BackendTextExtractionParams(
+                    extraction.override_all,
+                    extraction.run_html_llm_formatter,
+                    extraction.run_table_extraction,
+                    extraction.store_as_facts_list,
+                    extraction.fact_context,
+                    extraction.combine_html_headers,
+                    lambda message: message and print_progress(document_set, 'extraction', 'progress', message),
+                    HtmlParserBackend[extraction.html_parser_backend],
+                    PdfParserBackend[extraction.pdf_parser_backend]
+                )
+            )
+            print_progress(document_set, step, 'done', '\n'.join(output_log))
+
+        step = 'indexing'
+        if document_set_config.indexing:
+            print_progress(document_set, step, 'start')
+            indexing = document_set_config.indexing
+            output_log = backend.run_file_indexing(
+                document_set,
+                BackendFileIndexingParams(
+                    backend.get_embedding_manager().get_embedding_information(indexing.embedding),
+                    indexing.index_name,
+                    indexing.chunk_min,
+                    indexing.chunk_size,
+                    indexing.chunk_overlap,
+                    indexing.use_formatted,
+                    ChunkSplitterMode[indexing.chunk_splitter_mode],
+                    indexing.fact_dedup_threshold
+                )
+            )
+            print_progress(document_set, step, 'done', '\n'.join(output_log))
+
+        step = 'queries'
+        if document_set_config.queries:
+            print_progress(document_set, step, 'start')
+            queries = document_set_config.queries
+            with open(queries.questions_file, encoding="utf-8") as f:
+                question_list = [line.strip() for line in f if line.strip()]
+            with open(queries.output_file, "wt", encoding="utf-8") as f:
+                for index, question in enumerate(question_list):
+                    print_progress(document_set, step, 'progress', f'Question {index+1}/{len(question_list)}')
+                    chunk_list = backend.similarity_search(
+                        document_set,
+                        queries.index_name,
+                        question,
+                        queries.sample_count,
+                        queries.score_threshold,
+                        queries.add_llm_score,
+                        queries.llm_threshold,
+                        lambda _: None
+                    )
+                    answer = backend.build_answer(question, chunk_list) if queries.build_answer and chunk_list else None
+                    f.write(json.dumps({
+                        'question' : question,
+                        'answer'   : answer,
+                        'chunks'   : [{'content': c.content, 'score': c.score, 'metadata': c.metadata} for c in chunk_list]
+                    }) + '\n')
+            print_progress(document_set, step, 'done', f'{len(question_list)} answer(s) saved into {queries.output_file}')
+    except Exception as error:
+        print_progress(document_set, step, 'error', f'{error} [{type(error)}]')
+        return False
+
+    return True
+
+def main():
+    """Run batch"""
+    parser = argparse.ArgumentParser(description='Run extraction, indexing and queries without UI')
+    parser.add_argument('config', help='JSON file with batch configuration')
+    parser.add_argument('--workers', type=int, help='count of parallel document sets (overrides config)')
+    parser.add_argument('--secrets', help=f'secrets file (streamlit format), default {DEFAULT_SECRETS_FILE}')
+    args = parser.parse_args()
+
+    batch_config = load_batch_config(args.config)
+    all_secrets = load_secrets(args.secrets or batch_config.secrets_file)
+    workers = args.workers or batch_config.workers
+
+    failed_count = 0
+    if workers <= 1:
+        for document_set_config in batch_config.document_sets:
+            if not run_document_set(document_set_config, all_secrets):
+                failed_count += 1
+    else:
+        # spawn: the same start method on all platforms, each worker has its own managers
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(run_document_set, document_set_config, all_secrets) for document_set_config in batch_config.document_sets]
+            for future in as_completed(futures):
+                if not future.result():
+                    failed_count += 1
+
+    print_progress('', 'batch', 'done', f'{len(batch_config.document_sets) - failed_count} document set(s) done, {failed_count} failed')
+    sys.exit(1 if failed_count else 0)
+
+if __name__ == '__main__':
+    main()
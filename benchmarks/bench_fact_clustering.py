@@ -0,0 +1,63 @@
+"""
+    Benchmark of fact clustering
+    To run: python -m benchmarks.bench_fact_clustering [--sizes 1000 10000 100000]
+"""
+
+# pylint: disable=C0301,C0103
+
+import argparse
+
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import pairwise_distances
+
+from core.facts.fact_clustering import fact_k_means
+from benchmarks.bench_utils import measure, print_table
+
+EMBEDDING_SIZE = 384 # all-MiniLM-L6-v2
+CLUSTER_COUNT  = 20
+MAX_PAIRWISE_FACTS = 10000 # old implementation needs N*N matrix
+
+def synthetic_embeddings(fact_count : int, seed : int = 42) -> np.ndarray:
+    """Random embeddings around CLUSTER_COUNT centers"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(CLUSTER_COUNT, EMBEDDING_SIZE))
+    labels = rng.integers(0, CLUSTER_COUNT, size=fact_count)
+    return (centers[labels] + rng.normal(scale=0.5, size=(fact_count, EMBEDDING_SIZE))).astype(np.float32)
+
+def pairwise_k_means(embeddings : np.ndarray) -> np.ndarray:
+    """Previous implementation: k-means over N*N cosine distance matrix"""
+    cosine_distances = pairwise_distances(embeddings, metric="cosine")
+    kmeans = KMeans(n_clusters=CLUSTER_COUNT, n_init="auto")
+    kmeans.fit(cosine_distances)
+    return kmeans.labels_
+
+def main():
+    """Run benchmark"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    rows = []
+    for fact_count in args.sizes:
+        embeddings = synthetic_embeddings(fact_count)
+        fact_list = [f'fact {i}' for i in range(fact_count)]
+
+        def encode_call(_, embeddings=embeddings):
+            return embeddings
+
+        for mode_name, use_mini_batch in [('KMeans', False), ('MiniBatchKMeans', True)]:
+            m = measure(lambda use_mini_batch=use_mini_batch, encode_call=encode_call, fact_list=fact_list:
+                        fact_k_means(fact_list, CLUSTER_COUNT, encode_call, use_mini_batch))
+            rows.append([fact_count, mode_name, f'{m.seconds:.2f}', f'{m.peak_mb:.1f}'])
+
+        if fact_count <= MAX_PAIRWISE_FACTS:
+            m = measure(lambda embeddings=embeddings: pairwise_k_means(embeddings))
+            rows.append([fact_count, 'pairwise (old)', f'{m.seconds:.2f}', f'{m.peak_mb:.1f}'])
+        else:
+            rows.append([fact_count, 'pairwise (old)', 'skipped', f'~{fact_count*fact_count*8/(1024**3):.0f} GB'])
+
+    print_table(['facts', 'mode', 'seconds', 'peak MB'], rows)
+
+if __name__ == '__main__':
+    main()
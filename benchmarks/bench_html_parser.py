@@ -0,0 +1,121 @@
+"""
+    Benchmark of html content extraction (combine_html_headers mode) and of full parsing with each backend
+    To run: python -m benchmarks.bench_html_parser [--sizes-mb 1 4 8]
+"""
+
+# pylint: disable=C0301,C0103
+
+import os
+import re
+import random
+import argparse
+import tempfile
+
+from bs4 import BeautifulSoup, Tag, Comment, Doctype
+
+from core.parsers.html_parser import HtmlParser, HtmlHeaderStack, extract_header_sections
+from core.parsers.base_parser import DocumentParserParams, DocumentParserHTMLParams, HtmlParserBackend
+from benchmarks.bench_utils import measure, print_table
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'service', 'table', 'value', 'invoice', 'customer', 'price']
+
+WRAPPER_DEPTH = 30 # html exports usually have deep wrappers (div/section/article)
+
+def synthetic_html(size_bytes : int, seed : int = 42) -> str:
+    """Html page with headers, paragraphs, nested lists, line breaks and strong text inside of deep wrappers"""
+    rng = random.Random(seed)
+    parts = ['<!DOCTYPE html><html><head><title>t</title></head><body>', '<div>' * WRAPPER_DEPTH]
+    length = 0
+    while length < size_bytes:
+        level = rng.randint(1, 4)
+        block = [f'<h{level}>{" ".join(rng.choices(WORDS, k=3))}</h{level}>']
+        for _ in range(rng.randint(1, 4)):
+            block.append(f'<p>{" ".join(rng.choices(WORDS, k=20))}<br/><strong>{rng.choice(WORDS)}</strong> {" ".join(rng.choices(WORDS, k=10))}</p>')
+        block.append('<ul>')
+        for _ in range(rng.randint(1, 5)):
+            block.append(f'<li>{rng.choice(WORDS)}<ul><li>{rng.choice(WORDS)}</li><li></li></ul></li>')
+        block.append('</ul><!-- comment -->')
+        block_str = ''.join(block)
+        parts.append(block_str)
+        length += len(block_str)
+    parts.append('</div>' * WRAPPER_DEPTH)
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+def legacy_extract_content(tag : Tag, ul_count : int, h_stack : HtmlHeaderStack) -> str:
+    """Previous implementation: recursive walk with string concatenation"""
+    if tag.name in ['h1', 'h2', 'h3', 'h4']:
+        h_stack.append_header(tag.name, str(tag.text))
+        return f'\n\n<HEADER>{h_stack.get_full_header()}</HEADER>\n\n'
+    result = ''
+    for item in tag.contents:
+        if item.name == 'br':
+            result += '\n'
+        elif item.name == 'strong':
+            result += str(item.text) + ' '
+        elif item.name == 'li':
+            content = legacy_extract_content(item, ul_count+1, h_stack)
+            if content.strip():
+                result += '\n' + '-'*(ul_count+1) + ' ' + content
+        elif item.name is None:
+            if isinstance(item, (Doctype, Comment)):
+                continue
+            text = item.strip()
+            if text:
+                result += text + ' '
+        elif item.name:
+            content = legacy_extract_content(item, ul_count, h_stack)
+            if content:
+                result += content
+    return result
+
+def legacy_extract_sections(soup : BeautifulSoup) -> list[str]:
+    """Previous implementation: walk + DOTALL regex post-pass"""
+    content = legacy_extract_content(soup, 0, HtmlHeaderStack())
+    matches = re.findall(r'<HEADER>(.*?)<\/HEADER>\s*(.*?)(?=<HEADER>|$)', content, re.DOTALL)
+    return [f'{m[0]}\n\n{m[1]}' for m in matches]
+
+def new_extract_sections(soup : BeautifulSoup) -> list[str]:
+    """Current implementation"""
+    return [f'{header}\n\n{text}' for header, text in extract_header_sections(soup)]
+
+def parse_html_file(file_name : str, combine_html_headers : bool, backend : HtmlParserBackend) -> list[str]:
+    """Full parsing of html file (as text extractor does)"""
+    html_params = DocumentParserHTMLParams(combine_html_headers, ['header', 'footer', 'breadcrumb'], ['head', 'script', 'button'], backend)
+    result = HtmlParser(file_name).parse(DocumentParserParams(html_params))
+    return [page.page_content.strip() for page in result.content]
+
+def main():
+    """Run benchmark"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    rows = []
+    for size_mb in args.sizes_mb:
+        html = synthetic_html(int(size_mb * 1024 * 1024))
+        soup = BeautifulSoup(html, 'html.parser')
+        legacy = measure(lambda soup=soup: legacy_extract_sections(soup))
+        new = measure(lambda soup=soup: new_extract_sections(soup))
+        same = 'yes' if legacy.result == new.result else 'NO'
+        rows.append([size_mb, len(new.result), f'{legacy.seconds:.2f}', f'{new.seconds:.2f}', f'{legacy.peak_mb:.0f}', f'{new.peak_mb:.0f}', same])
+
+    print_table(['MB', 'sections', 'legacy s', 'new s', 'legacy peak MB', 'new peak MB', 'same output'], rows)
+
+    print()
+    rows = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size_mb in args.sizes_mb:
+            file_name = os.path.join(temp_dir, f'{size_mb}.html')
+            with open(file_name, "wt", encoding="utf-8") as f:
+                f.write(synthetic_html(int(size_mb * 1024 * 1024)))
+            for combine_html_headers in [False, True]:
+                bs4 = measure(lambda f=file_name, c=combine_html_headers: parse_html_file(f, c, HtmlParserBackend.BS4))
+                lxml = measure(lambda f=file_name, c=combine_html_headers: parse_html_file(f, c, HtmlParserBackend.LXML))
+                same = 'yes' if bs4.result == lxml.result else 'NO'
+                rows.append([size_mb, combine_html_headers, f'{bs4.seconds:.2f}', f'{lxml.seconds:.2f}', f'{bs4.peak_mb:.0f}', f'{lxml.peak_mb:.0f}', same])
+
+    print_table(['MB', 'combine', 'bs4 s', 'lxml s', 'bs4 peak MB', 'lxml peak MB', 'same output'], rows)
+
+if __name__ == '__main__':
+    main()
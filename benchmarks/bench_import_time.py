@@ -0,0 +1,68 @@
+"""
+    Benchmark of import time (python -X importtime) with lazy parser registry
+    To run: python -m benchmarks.bench_import_time [--repeat 5]
+    "eager" imports all parser modules as text extractor did before (and as it does when all file types are parsed).
+"""
+
+# pylint: disable=C0301,C0103
+
+import sys
+import argparse
+import statistics
+import subprocess
+
+from benchmarks.bench_utils import print_table
+
+PARSER_MODULES = [
+    'core.parsers.pdf_parser',
+    'core.parsers.msg_parser',
+    'core.parsers.docx_parser',
+    'core.parsers.txt_parser',
+    'core.parsers.html_parser',
+    'core.parsers.unst_parser'
+]
+
+SCENARIOS = {
+    'text_extractor (lazy)'  : ['core.text_extractor'],
+    'text_extractor (eager)' : ['core.text_extractor'] + PARSER_MODULES,
+    'backend_core (lazy)'    : ['backend_core'],
+    'backend_core (eager)'   : ['backend_core'] + PARSER_MODULES,
+}
+
+def measure_import(module_list : list[str]) -> tuple[float, int]:
+    """Run imports in new interpreter, returns total import time (ms) and count of imported modules"""
+    code = '\n'.join(f'import {module}' for module in module_list)
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=False)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    total_us = 0
+    module_count = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        module_count += 1
+        if not name.startswith('  '): # top level import (nested ones are indented)
+            total_us += int(cumulative)
+    return total_us / 1000, module_count
+
+def main():
+    """Run benchmark"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for scenario, module_list in SCENARIOS.items():
+        try:
+            results = [measure_import(module_list) for _ in range(args.repeat)]
+        except RuntimeError as error:
+            rows.append([scenario, '-', '-', f'failed: {error}'])
+            continue
+        rows.append([scenario, f'{statistics.median(r[0] for r in results):.0f}', results[0][1], ''])
+
+    print_table(['scenario', 'import ms (median)', 'modules', 'note'], rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+    Benchmark of pdf parser backends: pages per second and peak RSS on the same corpus
+    To run: python -m benchmarks.bench_pdf_parser [--corpus folder_with_pdf] [--files 4 --pages 250] [--large-pages 2000]
+    Each backend runs in separate process, so peak RSS of one backend does not affect another one.
+    Second table compares serial and page-parallel extraction of one large file.
+"""
+
+# pylint: disable=C0301,C0103
+
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from core.parsers.pdf_parser import PdfParser
+from core.parsers.base_parser import DocumentParserParams, DocumentParserPDFParams, PdfParserBackend
+from benchmarks.synthetic_corpus import synthetic_pdf, synthetic_pdf_pages
+from benchmarks.bench_utils import print_table, get_peak_rss_mb
+
+def parse_corpus(file_list : list[str], pdf_params : DocumentParserPDFParams) -> tuple[int, int, float, float, float]:
+    """Parse all files. Returns pages, chars, seconds, start and peak RSS"""
+    start_rss_mb = get_peak_rss_mb()
+    params = DocumentParserParams(None, pdf_params)
+    page_count = 0
+    char_count = 0
+    start = time.perf_counter()
+    for file_name in file_list:
+        result = PdfParser(file_name).parse(params)
+        if result.error:
+            raise ValueError(result.error)
+        for page in result.content: # pages are consumed one at a time, as text extractor does
+            page_count += 1
+            char_count += len(page.page_content)
+    seconds = time.perf_counter() - start
+    return page_count, char_count, seconds, start_rss_mb, get_peak_rss_mb()
+
+def main():
+    """Run benchmark"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', type=str, default=None, help='folder with pdf files (synthetic corpus if not set)')
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=250)
+    parser.add_argument('--backends', type=str, nargs='+', default=[b.name for b in PdfParserBackend])
+    parser.add_argument('--large-pages', type=int, default=2000, help='pages of large file for parallel extraction, 0 - skip')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.corpus:
+            file_list = [os.path.join(args.corpus, f) for f in sorted(os.listdir(args.corpus)) if f.lower().endswith('.pdf')]
+        else:
+            file_list = []
+            for file_index in range(args.files):
+                file_name = os.path.join(temp_dir, f'synthetic-{file_index}.pdf')
+                with open(file_name, "wb") as f:
+                    f.write(synthetic_pdf(synthetic_pdf_pages(args.pages, seed=file_index)))
+                file_list.append(file_name)
+
+        total_mb = sum(os.path.getsize(f) for f in file_list) / (1024 * 1024)
+        print(f'Corpus: {len(file_list)} file(s), {total_mb:.1f} MB')
+
+        rows = []
+        for backend_name in args.backends:
+            backend = PdfParserBackend[backend_name]
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                serial_params = DocumentParserPDFParams(backend, parallel_min_pages=0)
+                page_count, char_count, seconds, start_rss_mb, peak_rss_mb = executor.submit(parse_corpus, file_list, serial_params).result()
+            rows.append([
+                backend.name,
+                page_count,
+                char_count,
+                f'{seconds:.2f}',
+                f'{page_count / max(seconds, 1e-9):.0f}',
+                f'{start_rss_mb:.0f}',
+                f'{peak_rss_mb:.0f}'
+            ])
+
+        print_table(['backend', 'pages', 'chars', 'seconds', 'pages/s', 'start RSS MB', 'peak RSS MB'], rows)
+
+        if not args.large_pages:
+            return
+
+        large_file_name = os.path.join(temp_dir, 'large.pdf')
+        with open(large_file_name, "wb") as f:
+            f.write(synthetic_pdf(synthetic_pdf_pages(args.large_pages)))
+
+        print()
+        print(f'One file with {args.large_pages} pages, {args.max_workers} worker(s)')
+        rows = []
+        for backend_name in args.backends:
+            backend = PdfParserBackend[backend_name]
+            _, _, serial_seconds, _, _ = parse_corpus([large_file_name], DocumentParserPDFParams(backend, parallel_min_pages=0))
+            _, _, parallel_seconds, _, _ = parse_corpus([large_file_name], DocumentParserPDFParams(backend, parallel_min_pages=1, max_workers=args.max_workers))
+            rows.append([backend.name, f'{serial_seconds:.2f}', f'{parallel_seconds:.2f}', f'{serial_seconds / parallel_seconds:.1f}x'])
+
+    print_table(['backend', 'serial s', 'parallel s', 'speedup'], rows)
+
+if __name__ == '__main__':
+    main()
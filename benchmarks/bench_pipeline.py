@@ -0,0 +1,339 @@
+"""
+    End-to-end benchmark: synthetic corpus -> parsers -> chunk splitters -> embeddings -> index -> search -> LLM (offline)
+    To run: python -m benchmarks.bench_pipeline [--files-per-format 3] [--pages 10] [--output results.json] [--baseline baseline.json]
+    Stages which can not run on this machine (model is not installed, no network for tiktoken) are reported as skipped.
+    LLM stages use offline LLM (synthetic by default, --llm-mode replay --llm-recordings file for recorded responses).
+    With --baseline metrics worse than baseline by more than --tolerance are printed and exit code is 1.
+"""
+
+# pylint: disable=C0301,C0103,R0913,W0718
+
+import os
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+import psutil
+from langchain.embeddings.base import Embeddings
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from core.parsers.parser_registry import get_parser_type
+from core.parsers.base_parser import DocumentParserParams, DocumentParserHTMLParams, DocumentParserPDFParams
+from core.parsers.chunk_splitters.base_splitter import ChunkSplitterParams, ChunkSplitterMode
+from core.parsers.chunk_splitters.chunk_record import ChunkRecord
+from core.file_indexing import FileIndex, FileIndexParams, create_chunk_splitter
+from core.embedding_manager import EmbeddingManager, EmbeddingType
+from core.text_extractor import TextExtractor
+from core.llm_manager import LlmManager
+from benchmarks.synthetic_corpus import CORPUS_FORMATS, write_synthetic_corpus, synthetic_sentence
+from benchmarks.bench_utils import BenchmarkReport, compare_with_baseline, percentile, print_table, get_peak_rss_mb
+
+STAND_IN_EMBEDDING = 'STAND_IN' # deterministic vectors without model, index and search can be measured on any machine
+STAND_IN_EMBEDDING_SIZE = 384
+MODEL_NAME = 'gpt-3.5-turbo' # token counting of splitters
+DOCUMENT_SET = 'bench'
+INDEX_NAME = 'bench-index'
+MB = 1024 * 1024
+
+Page = tuple[str, dict] # text and metadata, as pages are read by text extractor
+
+def get_rss_mb() -> float:
+    """Current RSS of process"""
+    return psutil.Process().memory_info().rss / MB
+
+def create_embeddings(embedding_name : str) -> Embeddings:
+    """Embeddings of the application or stand-in"""
+    if embedding_name == STAND_IN_EMBEDDING:
+        return DeterministicFakeEmbedding(size=STAND_IN_EMBEDDING_SIZE)
+    return EmbeddingManager().get_embeddings(embedding_name)
+
+def get_index_params(args : argparse.Namespace, mode : ChunkSplitterMode) -> FileIndexParams:
+    """Index parameters for splitter mode"""
+    return FileIndexParams(
+        ChunkSplitterParams(args.chunk_min, args.chunk_size, args.chunk_overlap, MODEL_NAME, mode),
+        TextExtractor.FACT_LINE_SEPARATOR
+    )
+
+def run_stage(report : BenchmarkReport, stage : str, name : str, call : Callable[[], Any]) -> Optional[Any]:
+    """Run stage, error is saved in report (stage is skipped)"""
+    try:
+        return call()
+    except Exception as error:
+        report.add_error(stage, name, error)
+        return None
+
+def parse_files(report : BenchmarkReport, file_format : str, file_list : list[str]) -> list[Page]:
+    """Parse files of one format (html is split by headers)"""
+    params = DocumentParserParams(
+        DocumentParserHTMLParams(True, ['header', 'footer', 'breadcrumb'], ['head', 'script', 'button']),
+        DocumentParserPDFParams(parallel_min_pages=0)
+    )
+    pages = list[Page]()
+    start = time.perf_counter()
+    for file_name in file_list:
+        _, file_extension = os.path.splitext(file_name)
+        result = get_parser_type(file_extension)(file_name).parse(params)
+        if result.error:
+            raise ValueError(result.error)
+        base_file_name = os.path.basename(file_name)
+        for item in result.content:
+            pages.append((item.page_content, {'s_source': base_file_name, 'p_source': f'{base_file_name}-{item.page_number:02d}'}))
+    seconds = time.perf_counter() - start
+
+    report.add('parse', file_format, 'files_per_second', len(file_list) / seconds, True)
+    report.add('parse', file_format, 'pages_per_second', len(pages) / seconds, True)
+    report.add('parse', file_format, 'mb_per_second', sum(os.path.getsize(f) for f in file_list) / MB / seconds, True)
+    return pages
+
+def extract_facts(report : BenchmarkReport, llm_manager : LlmManager, pages : list[Page]) -> list[Page]:
+    """Fact list of each page (text is saved with fact separator, as text extractor does)"""
+    fact_pages = list[Page]()
+    start = time.perf_counter()
+    for text, meta in pages:
+        facts_result = llm_manager.get_fact_list(text, 'prices and customers')
+        if facts_result.error_list:
+            raise ValueError('\n'.join(facts_result.error_list))
+        fact_text = ''.join(f'{TextExtractor.FACT_LINE_SEPARATOR}\n{fact}\n\n' for fact in facts_result.fact_list)
+        fact_pages.append((fact_text, meta))
+    report.add('llm', 'facts', 'pages_per_second', len(pages) / (time.perf_counter() - start), True)
+    return fact_pages
+
+def get_faq_pages(pages : list[Page]) -> list[Page]:
+    """Pages in FAQ format (question is the first sentence of each line)"""
+    faq_pages = list[Page]()
+    for text, meta in pages:
+        items = []
+        for line in text.split('\n'):
+            question, _, answer = line.partition('. ')
+            items.append(f'#### FAQ ####\n"question": "{question}?"\n"answer": "{answer}"\n')
+        faq_pages.append((''.join(items), meta))
+    return faq_pages
+
+def split_pages(report : BenchmarkReport, args : argparse.Namespace, mode : ChunkSplitterMode, pages : list[Page]) -> list[ChunkRecord]:
+    """Split pages with splitter of index"""
+    start = time.perf_counter()
+    chunk_splitter = create_chunk_splitter(get_index_params(args, mode))
+    chunks = chunk_splitter.split_into_chunks(pages)
+    seconds = time.perf_counter() - start
+    report.add('split', mode.name, 'pages_per_second', len(pages) / seconds, True)
+    report.add('split', mode.name, 'mb_per_second', sum(len(text) for text, _ in pages) / MB / seconds, True)
+    report.params[f'chunks_{mode.name}'] = len(chunks)
+    return chunks
+
+def embed_chunks(report : BenchmarkReport, embedding_name : str, texts : list[str]) -> Embeddings:
+    """Load model and embed chunks"""
+    start = time.perf_counter()
+    embeddings = create_embeddings(embedding_name)
+    embeddings.embed_documents(texts[:1])
+    report.add('embed', embedding_name, 'load_seconds', time.perf_counter() - start, False)
+
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    report.add('embed', embedding_name, 'chunks_per_second', len(texts) / (time.perf_counter() - start), True)
+    return embeddings
+
+def build_index(report : BenchmarkReport, args : argparse.Namespace, file_index : FileIndex, embedding_name : str, embeddings : Embeddings, pages : list[Page]):
+    """Split, embed and save index"""
+    mode = ChunkSplitterMode[args.index_splitter]
+    start = time.perf_counter()
+    log = file_index.run_indexing(DOCUMENT_SET, INDEX_NAME, iter(pages), embedding_name, 0, embeddings, get_index_params(args, mode))
+    seconds = time.perf_counter() - start
+    errors = [str(item) for item in log if isinstance(item, Exception)]
+    if errors:
+        raise ValueError('\n'.join(errors))
+    chunk_count = report.params.get(f'chunks_{mode.name}', 0)
+    report.add('index', embedding_name, 'seconds', seconds, False)
+    if chunk_count:
+        report.add('index', embedding_name, 'chunks_per_second', chunk_count / seconds, True)
+    report.add('index', embedding_name, 'size_mb', file_index.get_index_size(DOCUMENT_SET, INDEX_NAME) / MB, False)
+
+def search_index(report : BenchmarkReport, args : argparse.Namespace, file_index : FileIndex, embedding_name : str, embeddings : Embeddings) -> list[str]:
+    """Search latency percentiles, returns content of found chunks of the first query"""
+    rng = random.Random(args.seed)
+    queries = [synthetic_sentence(rng, 5) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    first_result = file_index.similarity_search(DOCUMENT_SET, INDEX_NAME, queries[0], embeddings, args.sample_count, 0)
+    report.add('search', embedding_name, 'first_query_ms', (time.perf_counter() - start) * 1000, False)
+
+    latencies = []
+    total_start = time.perf_counter()
+    for query in queries:
+        start = time.perf_counter()
+        file_index.similarity_search(DOCUMENT_SET, INDEX_NAME, query, embeddings, args.sample_count, 0)
+        latencies.append(time.perf_counter() - start)
+    report.add('search', embedding_name, 'queries_per_second', len(queries) / (time.perf_counter() - total_start), True)
+    for p in [50, 95, 99]:
+        report.add('search', embedding_name, f'p{p}_ms', percentile(latencies, p) * 1000, False)
+    return [item.content for item in first_result]
+
+def answer_queries(report : BenchmarkReport, args : argparse.Namespace, llm_manager : LlmManager, chunk_texts : list[str]):
+    """LLM relevance score of chunks and refined answer for each query"""
+    rng = random.Random(args.seed)
+    relevance_latencies = []
+    answer_latencies = []
+    for _ in range(args.llm_queries):
+        query = synthetic_sentence(rng, 5)
+        start = time.perf_counter()
+        for chunk_text in chunk_texts:
+            llm_manager.get_relevance_score(query, chunk_text)
+        relevance_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        answer_result = llm_manager.build_answer(query, chunk_texts)
+        if answer_result.error:
+            raise ValueError('Answer was not built')
+        answer_latencies.append(time.perf_counter() - start)
+
+    for name, latencies in [('relevance', relevance_latencies), ('answer', answer_latencies)]:
+        for p in [50, 95]:
+            report.add('llm', name, f'p{p}_ms', percentile(latencies, p) * 1000, False)
+
+def add_memory(report : BenchmarkReport, stage : str):
+    """RSS after stage"""
+    report.add('memory', stage, 'rss_mb', get_rss_mb(), False)
+
+def run_pipeline(args : argparse.Namespace) -> BenchmarkReport:
+    """Run all stages in temporary folder (storage folders of the application are relative to current folder)"""
+    report = BenchmarkReport(datetime.now().isoformat(timespec='seconds'), {
+        'formats'          : args.formats,
+        'files_per_format' : args.files_per_format,
+        'pages'            : args.pages,
+        'chunk_size'       : args.chunk_size,
+        'index_splitter'   : args.index_splitter,
+        'llm_mode'         : args.llm_mode,
+        'llm_latency_ms'   : args.llm_latency_ms
+    })
+    current_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.llm_recordings:
+            args.llm_recordings = os.path.abspath(args.llm_recordings)
+        os.chdir(temp_dir)
+        try:
+            run_stages(report, args)
+        finally:
+            os.chdir(current_folder)
+    report.add('memory', 'all', 'peak_rss_mb', get_peak_rss_mb(), False)
+    return report
+
+def run_stages(report : BenchmarkReport, args : argparse.Namespace):
+    """Run stages, each stage uses results of previous ones if they are available"""
+    file_list = write_synthetic_corpus('corpus', args.formats, args.files_per_format, args.pages, args.lines, args.seed)
+    add_memory(report, 'start')
+
+    pages = list[Page]()
+    for file_format in args.formats:
+        format_files = [f for f in file_list if f.endswith(f'.{file_format}')]
+        pages.extend(run_stage(report, 'parse', file_format, lambda files=format_files, file_format=file_format: parse_files(report, file_format, files)) or [])
+    add_memory(report, 'parse')
+
+    offline_llm_secrets = {'mode': args.llm_mode, 'latency': args.llm_latency_ms / 1000, 'jitter': args.llm_jitter, 'seed': args.seed}
+    if args.llm_recordings:
+        offline_llm_secrets['recordings_file'] = args.llm_recordings
+    llm_manager = LlmManager({'offline_llm': offline_llm_secrets})
+    fact_pages = run_stage(report, 'llm', 'facts', lambda: extract_facts(report, llm_manager, pages[:args.llm_pages]))
+
+    chunks_by_mode = dict[str, list[ChunkRecord]]()
+    for mode_name in args.splitters:
+        mode = ChunkSplitterMode[mode_name]
+        if mode == ChunkSplitterMode.FACT_LIST:
+            mode_pages = fact_pages
+        elif mode == ChunkSplitterMode.FAQ_LIST:
+            mode_pages = get_faq_pages(pages)
+        else:
+            mode_pages = pages
+        if not mode_pages:
+            report.add_error('split', mode.name, ValueError('no input pages'))
+            continue
+        chunks = run_stage(report, 'split', mode.name, lambda mode=mode, mode_pages=mode_pages: split_pages(report, args, mode, mode_pages))
+        if chunks:
+            chunks_by_mode[mode.name] = chunks
+    add_memory(report, 'split')
+
+    chunk_texts = [c.content for c in chunks_by_mode.get(args.index_splitter, next(iter(chunks_by_mode.values()), []))][:args.embed_chunks]
+    available_embeddings = dict[str, Embeddings]()
+    if chunk_texts:
+        for embedding_name in args.embeddings:
+            embeddings = run_stage(report, 'embed', embedding_name, lambda embedding_name=embedding_name: embed_chunks(report, embedding_name, chunk_texts))
+            if embeddings:
+                available_embeddings[embedding_name] = embeddings
+    add_memory(report, 'embed')
+
+    index_embedding_name = args.index_embedding or next(iter(available_embeddings), None)
+    if index_embedding_name not in available_embeddings:
+        report.add_error('index', str(index_embedding_name), ValueError('embedding is not available'))
+        return
+    index_embeddings = available_embeddings[index_embedding_name]
+    file_index = FileIndex(False, keep_open_seconds=300)
+    if run_stage(report, 'index', index_embedding_name, lambda: build_index(report, args, file_index, index_embedding_name, index_embeddings, pages)) is None and f'index/{index_embedding_name}' in report.errors:
+        return
+    add_memory(report, 'index')
+
+    found_texts = run_stage(report, 'search', index_embedding_name, lambda: search_index(report, args, file_index, index_embedding_name, index_embeddings))
+    file_index.close_idle_indexes(0)
+    add_memory(report, 'search')
+
+    answer_chunks = found_texts or chunk_texts[:args.sample_count]
+    run_stage(report, 'llm', 'answer', lambda: answer_queries(report, args, llm_manager, answer_chunks))
+    add_memory(report, 'llm')
+
+def print_report(report : BenchmarkReport):
+    """Print metrics and skipped stages"""
+    print_table(['stage', 'name', 'metric', 'value'], [[m.stage, m.name, m.metric, f'{m.value:.2f}'] for m in report.metrics])
+    if report.errors:
+        print()
+        print('Skipped:')
+        for key, error in report.errors.items():
+            print(f'  {key}: {error.splitlines()[0][:200] if error else ""}')
+
+def main():
+    """Run benchmark"""
+    parser = argparse.ArgumentParser(description='End-to-end benchmark on synthetic corpus')
+    parser.add_argument('--formats', nargs='+', choices=CORPUS_FORMATS, default=CORPUS_FORMATS)
+    parser.add_argument('--files-per-format', type=int, default=3)
+    parser.add_argument('--pages', type=int, default=10, help='pages (sections) of each file')
+    parser.add_argument('--lines', type=int, default=40, help='lines of each page')
+    parser.add_argument('--splitters', nargs='+', choices=[m.name for m in ChunkSplitterMode], default=[m.name for m in ChunkSplitterMode])
+    parser.add_argument('--chunk-min', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--chunk-overlap', type=int, default=50)
+    parser.add_argument('--embeddings', nargs='+', choices=[e.name for e in EmbeddingType] + [STAND_IN_EMBEDDING], default=[e.name for e in EmbeddingType] + [STAND_IN_EMBEDDING])
+    parser.add_argument('--embed-chunks', type=int, default=500, help='count of chunks for embedding throughput')
+    parser.add_argument('--index-splitter', choices=[m.name for m in ChunkSplitterMode], default=ChunkSplitterMode.CHARACTER_SPLITTER.name)
+    parser.add_argument('--index-embedding', default=None, help='embedding of index (the first available if not set)')
+    parser.add_argument('--queries', type=int, default=100, help='count of search queries')
+    parser.add_argument('--sample-count', type=int, default=5)
+    parser.add_argument('--llm-mode', choices=['synthetic', 'replay'], default='synthetic')
+    parser.add_argument('--llm-recordings', default=None, help='recordings file for replay mode')
+    parser.add_argument('--llm-latency-ms', type=float, default=0, help='latency of each LLM call')
+    parser.add_argument('--llm-jitter', type=float, default=0, help='part of LLM latency')
+    parser.add_argument('--llm-pages', type=int, default=20, help='pages for LLM fact extraction')
+    parser.add_argument('--llm-queries', type=int, default=10, help='queries for LLM relevance and answer')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='JSON file with results')
+    parser.add_argument('--baseline', default=None, help='JSON file with results of previous run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='part of baseline value, worse change is regression')
+    args = parser.parse_args()
+
+    report = run_pipeline(args)
+    print_report(report)
+    if args.output:
+        report.save(args.output)
+        print(f'Results are saved into {args.output}')
+
+    if not args.baseline:
+        return
+    regressions = compare_with_baseline(report, BenchmarkReport.load(args.baseline), args.tolerance)
+    print()
+    if not regressions:
+        print(f'No regressions (tolerance {args.tolerance:.0%})')
+        return
+    print(f'Regressions (tolerance {args.tolerance:.0%}):')
+    print_table(['metric', 'baseline', 'current', 'change'], [[r.key, f'{r.baseline:.2f}', f'{r.current:.2f}', f'{r.change:+.0%}'] for r in regressions])
+    raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
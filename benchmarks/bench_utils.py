@@ -0,0 +1,131 @@
+"""
+    Helpers for benchmarks
+"""
+
+# pylint: disable=C0301,C0103
+
+import os
+import time
+import resource
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+from dataclasses_json import dataclass_json
+
+@dataclass
+class BenchmarkMeasure:
+    """Result of one measurement"""
+    seconds  : float
+    peak_mb  : float
+    result   : Any
+
+def measure(call : Callable[[], Any], trace_memory : bool = True) -> BenchmarkMeasure:
+    """Measure wall time and peak python/numpy memory of call (memory is traced in separate run)"""
+    start = time.perf_counter()
+    result = call()
+    seconds = time.perf_counter() - start
+
+    peak = 0
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return BenchmarkMeasure(seconds, peak / (1024 * 1024), result)
+
+def get_peak_rss_mb() -> float:
+    """Peak RSS of current process (linux: KB, macOS: bytes)"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.uname().sysname == 'Darwin':
+        return max_rss / (1024 * 1024)
+    return max_rss / 1024
+
+def print_table(header : list[str], rows : list[list[Any]]):
+    """Print simple text table"""
+    widths = [max(len(str(v)) for v in [h] + [r[i] for r in rows]) for i, h in enumerate(header)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+def percentile(values : list[float], percent : float) -> float:
+    """Percentile with linear interpolation between closest ranks (0 for empty list)"""
+    if not values:
+        return 0
+    sorted_values = sorted(values)
+    rank = (len(sorted_values) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+@dataclass_json
+@dataclass
+class BenchmarkMetric:
+    """One measured value"""
+    stage            : str # parse, split, embed, index, search, llm, memory
+    name             : str # format, splitter mode, embedding type...
+    metric           : str # pages_per_second, p95_ms...
+    value            : float
+    higher_is_better : bool
+
+    @property
+    def key(self) -> str:
+        """Key to compare with baseline"""
+        return f'{self.stage}/{self.name}/{self.metric}'
+
+@dataclass_json
+@dataclass
+class BenchmarkReport:
+    """Machine-readable results of benchmark run"""
+    created : str
+    params  : dict[str, Any] = field(default_factory=dict)
+    metrics : list[BenchmarkMetric] = field(default_factory=list)
+    errors  : dict[str, str] = field(default_factory=dict) # stage/name -> error (stage was skipped)
+
+    def add(self, stage : str, name : str, metric : str, value : float, higher_is_better : bool):
+        """Add measured value"""
+        self.metrics.append(BenchmarkMetric(stage, name, metric, value, higher_is_better))
+
+    def add_error(self, stage : str, name : str, error : Exception):
+        """Stage could not be measured"""
+        self.errors[f'{stage}/{name}'] = f'{error} [{type(error).__name__}]'
+
+    def save(self, file_name : str):
+        """Save as JSON"""
+        with open(file_name, 'wt', encoding='utf-8') as f:
+            f.write(self.to_json(indent=2)) # pylint: disable=E1101
+
+    @staticmethod
+    def load(file_name : str) -> 'BenchmarkReport':
+        """Load from JSON"""
+        with open(file_name, 'rt', encoding='utf-8') as f:
+            return BenchmarkReport.from_json(f.read()) # pylint: disable=E1101
+
+@dataclass
+class BenchmarkRegression:
+    """Metric which is worse than baseline"""
+    key      : str
+    baseline : float
+    current  : float
+    change   : float # relative change, negative is worse for higher_is_better
+
+def compare_with_baseline(report : BenchmarkReport, baseline : BenchmarkReport, tolerance : float) -> list[BenchmarkRegression]:
+    """Metrics which are worse than baseline by more than tolerance (part of baseline value)"""
+    baseline_metrics = {m.key : m for m in baseline.metrics}
+    regressions = []
+    for metric in report.metrics:
+        baseline_metric : Optional[BenchmarkMetric] = baseline_metrics.get(metric.key)
+        if not baseline_metric or baseline_metric.value <= 0:
+            continue
+        change = (metric.value - baseline_metric.value) / baseline_metric.value
+        worse = change < -tolerance if metric.higher_is_better else change > tolerance
+        if worse:
+            regressions.append(BenchmarkRegression(metric.key, baseline_metric.value, metric.value, change))
+
+    # stage was measured in baseline, but fails now
+    current_keys = {m.key for m in report.metrics}
+    for key, baseline_metric in baseline_metrics.items():
+        if key not in current_keys and f'{baseline_metric.stage}/{baseline_metric.name}' in report.errors:
+            regressions.append(BenchmarkRegression(key, baseline_metric.value, 0, -1))
+    return regressions
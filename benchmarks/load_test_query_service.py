@@ -0,0 +1,163 @@
+"""
+    Load test of query service: latency percentiles and QPS
+    To run against local service (real backend, small local index of synthetic corpus, offline LLM):
+        python -m benchmarks.load_test_query_service [--requests 500] [--concurrency 32] [--endpoint answer] [--embedding SBERT]
+    To run against running service:
+        python -m benchmarks.load_test_query_service --url http://127.0.0.1:8080 --document-set set1 --index-name index1
+"""
+
+# pylint: disable=C0301,C0103,C0415
+
+import os
+import time
+import json
+import asyncio
+import argparse
+import tempfile
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from query_service import QueryService, create_app
+from core.llm_manager import LlmManager
+from core.llm.offline_llm import OfflineLlm, OfflineLlmParams, OfflineLlmMode
+from core.parsers.chunk_splitters.base_splitter import ChunkSplitterMode
+from benchmarks.synthetic_corpus import synthetic_pdf_pages, synthetic_txt, with_paragraphs
+from benchmarks.bench_utils import percentile, print_table
+
+@dataclass
+class RequestResult:
+    """Timing of one request"""
+    seconds       : float
+    first_seconds : float # time to first line (streamed answer)
+    error         : bool
+
+async def send_request(session : aiohttp.ClientSession, url : str, endpoint : str, body : dict) -> RequestResult:
+    """Send request and read full response"""
+    start = time.perf_counter()
+    first_seconds = 0
+    try:
+        async with session.post(f'{url}/{endpoint}', json=body) as response:
+            if response.status != 200:
+                return RequestResult(time.perf_counter() - start, 0, True)
+            async for line in response.content:
+                if not first_seconds:
+                    first_seconds = time.perf_counter() - start
+                if b'"error"' in line and 'error' in json.loads(line):
+                    return RequestResult(time.perf_counter() - start, first_seconds, True)
+    except aiohttp.ClientError:
+        return RequestResult(time.perf_counter() - start, first_seconds, True)
+    return RequestResult(time.perf_counter() - start, first_seconds, False)
+
+async def run_load(url : str, endpoint : str, request_count : int, concurrency : int, body : dict) -> tuple[list[RequestResult], float]:
+    """Send request_count requests with concurrency clients, returns results and total time"""
+    queue = asyncio.Queue()
+    for index in range(request_count):
+        queue.put_nowait(index)
+    results = list[RequestResult]()
+
+    async def client(session : aiohttp.ClientSession):
+        while not queue.empty():
+            index = queue.get_nowait()
+            results.append(await send_request(session, url, endpoint, dict(body, query=f'{body["query"]} {index}')))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*[client(session) for _ in range(concurrency)])
+        total_seconds = time.perf_counter() - start
+    return results, total_seconds
+
+def stub_llm(llm_latency : float, jitter : float):
+    """LLM calls of backend return synthetic responses with latency (LlmManager.create_llm is replaced)"""
+    offline_llm = OfflineLlm(OfflineLlmParams(OfflineLlmMode.SYNTHETIC, latency=llm_latency, jitter=jitter))
+    LlmManager.create_llm = lambda self, max_tokens, model_name='': offline_llm.create_llm(model_name or self.get_model_name(), max_tokens)
+
+def build_local_index(args : argparse.Namespace) -> Any: # BackEndCore
+    """Upload synthetic txt files into document set, extract plain text and build index by real backend"""
+    # streamlit is not running here, managers are kept in process
+    from backend_core import BackEndCore, BackendTextExtractionParams, BackendFileIndexingParams
+    BackEndCore.init_headless({}, args.keep_open_seconds)
+    backend = BackEndCore()
+
+    backend.get_document_set_manager().add(args.document_set, True)
+    source_storage = backend.get_source_storage()
+    for file_index in range(args.files):
+        page_lines = with_paragraphs(synthetic_pdf_pages(args.pages, seed=42 + file_index))
+        source_storage.save_file(args.document_set, f'synthetic-{file_index}.txt', synthetic_txt(page_lines))
+
+    backend.run_text_extraction(args.document_set, BackendTextExtractionParams(True, False, False, False, '', False, lambda _: None))
+    output_log = backend.run_file_indexing(
+        args.document_set,
+        BackendFileIndexingParams(
+            backend.get_embedding_manager().get_embedding_information(args.embedding),
+            args.index_name,
+            0,
+            args.chunk_size,
+            0,
+            False,
+            ChunkSplitterMode.CHARACTER_SPLITTER
+        )
+    )
+    if 'Index has been stored on disk' not in output_log:
+        raise RuntimeError('\n'.join(str(line) for line in output_log))
+    return backend
+
+async def run_with_local_service(args : argparse.Namespace, body : dict) -> tuple[list[RequestResult], float]:
+    """Build local index, start service with real backend on free port and run load"""
+    stub_llm(args.llm_latency_ms / 1000, args.jitter)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='load-test-')
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    backend = build_local_index(args)
+    query_service = QueryService(backend, args.max_concurrency)
+    await query_service.warm_up(args.document_set, args.index_name)
+    runner = web.AppRunner(create_app(query_service))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1] # pylint: disable=W0212
+    try:
+        return await run_load(f'http://127.0.0.1:{port}', args.endpoint, args.requests, args.concurrency, body)
+    finally:
+        await runner.cleanup()
+
+def main():
+    """Run load test"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='url of running service, local service with small index is started if not provided')
+    parser.add_argument('--endpoint', choices=['search', 'answer'], default='search')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=32, help='count of parallel clients')
+    parser.add_argument('--document-set', default='set1')
+    parser.add_argument('--index-name', default='index1')
+    parser.add_argument('--query', default='What is the price?')
+    parser.add_argument('--sample-count', type=int, default=3)
+    parser.add_argument('--max-concurrency', type=int, default=16, help='local service: requests processed at the same time')
+    parser.add_argument('--keep-open-seconds', type=float, default=300, help='local service: idle index is closed after this time')
+    parser.add_argument('--embedding', default='SBERT', help='local service: embedding of index')
+    parser.add_argument('--files', type=int, default=3, help='local service: count of synthetic txt files in index')
+    parser.add_argument('--pages', type=int, default=10, help='local service: pages per file')
+    parser.add_argument('--chunk-size', type=int, default=500, help='local service: chunk size of index')
+    parser.add_argument('--work-dir', help='local service: folder of document set and index (new temp folder if not provided)')
+    parser.add_argument('--llm-latency-ms', type=float, default=200, help='local service: latency of each offline LLM call')
+    parser.add_argument('--jitter', type=float, default=0.2, help='local service: LLM latency jitter (part of latency)')
+    args = parser.parse_args()
+
+    body = {'document_set': args.document_set, 'index_name': args.index_name, 'query': args.query, 'sample_count': args.sample_count}
+    if args.url:
+        results, total_seconds = asyncio.run(run_load(args.url.rstrip('/'), args.endpoint, args.requests, args.concurrency, body))
+    else:
+        results, total_seconds = asyncio.run(run_with_local_service(args, body))
+
+    ok_results = [r for r in results if not r.error]
+    rows = []
+    for name, values in [('latency', [r.seconds for r in ok_results]), ('first line', [r.first_seconds for r in ok_results])]:
+        rows.append([name] + [f'{percentile(values, p) * 1000:.1f}' for p in [50, 95, 99]])
+    print_table(['ms', 'p50', 'p95', 'p99'], rows)
+    print(f'requests: {len(results)}, errors: {len(results) - len(ok_results)}, QPS: {len(ok_results) / total_seconds:.1f}')
+
+if __name__ == '__main__':
+    main()
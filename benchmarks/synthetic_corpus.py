@@ -0,0 +1,112 @@
+"""
+    Synthetic documents for benchmarks and tests
+"""
+
+# pylint: disable=C0301,C0103
+
+import io
+import os
+import random
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'service', 'table', 'value', 'invoice', 'customer', 'price']
+
+def synthetic_sentence(rng : random.Random, word_count : int = 10) -> str:
+    """Random sentence from WORDS"""
+    return ' '.join(rng.choice(WORDS) for _ in range(word_count)).capitalize() + '.'
+
+def synthetic_pdf_pages(page_count : int, lines_per_page : int = 40, seed : int = 42) -> list[list[str]]:
+    """Text lines of each page of synthetic pdf"""
+    rng = random.Random(seed)
+    return [
+        [f'Page {page_index + 1}. {synthetic_sentence(rng)}' for _ in range(lines_per_page)]
+        for page_index in range(page_count)
+    ]
+
+def pdf_escape(text : str) -> str:
+    """Escape pdf string literal"""
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def synthetic_pdf(page_lines : list[list[str]]) -> bytes:
+    """Minimal valid pdf (Helvetica, one text block per page)"""
+    page_count = len(page_lines)
+    objects = list[bytes]()
+    # 1 - catalog, 2 - pages, 3 - font, then page and content for each page
+    kids = ' '.join(f'{4 + 2 * i} 0 R' for i in range(page_count))
+    objects.append(b'<< /Type /Catalog /Pages 2 0 R >>')
+    objects.append(f'<< /Type /Pages /Kids [{kids}] /Count {page_count} >>'.encode('latin-1'))
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    for i, lines in enumerate(page_lines):
+        text = ' T* '.join(f'({pdf_escape(line)}) Tj' for line in lines)
+        stream = f'BT /F1 10 Tf 14 TL 40 800 Td {text} ET'.encode('latin-1')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>'.encode('latin-1'))
+        objects.append(b'<< /Length ' + str(len(stream)).encode('latin-1') + b' >>\nstream\n' + stream + b'\nendstream')
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for index, obj in enumerate(objects):
+        offsets.append(len(output))
+        output += f'{index + 1} 0 obj\n'.encode('latin-1') + obj + b'\nendobj\n'
+    xref_offset = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode('latin-1')
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('latin-1')
+    return bytes(output)
+
+CORPUS_FORMATS = ['pdf', 'docx', 'html', 'txt']
+PARAGRAPH_LINES = 5 # empty line after each paragraph, so paragraphs are found by character splitter
+
+def with_paragraphs(page_lines : list[list[str]]) -> list[list[str]]:
+    """Insert empty line after each PARAGRAPH_LINES lines of page"""
+    return [
+        [item for index, line in enumerate(lines) for item in ([line, ''] if (index + 1) % PARAGRAPH_LINES == 0 else [line])]
+        for lines in page_lines
+    ]
+
+def synthetic_html_page(page_lines : list[list[str]]) -> str:
+    """Html page with header and paragraphs for each page"""
+    parts = ['<!DOCTYPE html><html><head><title>Synthetic document</title><script>var x = 1;</script></head><body><div>']
+    for page_index, lines in enumerate(page_lines):
+        parts.append(f'<h1>Section {page_index + 1}</h1>')
+        parts.extend(f'<p>{line}</p>' if line else '<br><br>' for line in lines)
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+def synthetic_docx(page_lines : list[list[str]]) -> bytes:
+    """Docx with heading and paragraphs for each page"""
+    import docx # pylint: disable=C0415
+    document = docx.Document()
+    for page_index, lines in enumerate(page_lines):
+        document.add_heading(f'Section {page_index + 1}', level=1)
+        for line in lines:
+            document.add_paragraph(line)
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+def synthetic_txt(page_lines : list[list[str]]) -> str:
+    """Plain text, pages are separated by empty line"""
+    return '\n\n'.join('\n'.join(lines) for lines in page_lines)
+
+def write_synthetic_corpus(folder : str, formats : list[str], files_per_format : int, pages_per_file : int, lines_per_page : int = 40, seed : int = 42) -> list[str]:
+    """Write synthetic files of each format, returns file names"""
+    os.makedirs(folder, exist_ok=True)
+    file_list = []
+    for file_format in formats:
+        for file_index in range(files_per_format):
+            page_lines = with_paragraphs(synthetic_pdf_pages(pages_per_file, lines_per_page, seed + file_index))
+            file_name = os.path.join(folder, f'synthetic-{file_index}.{file_format}')
+            if file_format == 'pdf':
+                content = synthetic_pdf(page_lines)
+            elif file_format == 'docx':
+                content = synthetic_docx(page_lines)
+            elif file_format == 'html':
+                content = synthetic_html_page(page_lines).encode('utf-8')
+            elif file_format == 'txt':
+                content = synthetic_txt(page_lines).encode('utf-8')
+            else:
+                raise ValueError(f'Unsupported format of synthetic corpus: {file_format}')
+            with open(file_name, 'wb') as f:
+                f.write(content)
+            file_list.append(file_name)
+    return file_list
@@ -0,0 +1,117 @@
+"""
+    Derived artefacts shared by all document sets (keyed by content digest)
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,C0305,W0611,W0511,C0411
+
+import os
+import hashlib
+import sqlite3
+import threading
+from enum import Enum
+from typing import Iterator, Optional
+
+from core.tracing import count_cache_lookup
+
+class ArtefactKind(Enum):
+    """Kinds of shared artefacts"""
+    PAGE      = "page"      # extracted page of source file (key: source digest + parser params + page number)
+    PAGES     = "pages"     # page numbers of extracted source file, saved after all pages
+    FORMATTED = "formatted" # LLM formatted text (key: digest of plain text)
+    FACTS     = "facts"     # LLM facts (key: digest of plain text and fact context)
+    TABLES    = "tables"    # extracted tables (key: digest of formatted text)
+    EMBEDDING = "embedding" # embedding vector (key: embedding name and digest of text)
+
+def get_text_digest(*text_list : str) -> str:
+    """Sha256 digest of text(s)"""
+    hasher = hashlib.sha256()
+    for text in text_list:
+        hasher.update(text.encode("utf-8"))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+class ArtefactStore:
+    """
+        Artefacts which depend only on content (pages, formatted text, facts, tables, embeddings).
+        The same document uploaded into several document sets is processed only once.
+    """
+
+    in_memory    : bool
+    __connection : sqlite3.Connection
+    __lock       : threading.Lock
+
+    __DISK_FOLDER = '.document-shared'
+    __STORE_FILE = 'artefacts.db'
+    __READ_BATCH_SIZE = 100
+
+    def __init__(self, in_memory : bool):
+        self.in_memory = in_memory
+        if self.in_memory:
+            file_name = ':memory:'
+        else:
+            os.makedirs(self.__DISK_FOLDER, exist_ok=True)
+            file_name = os.path.join(self.__DISK_FOLDER, self.__STORE_FILE)
+        # streamlit runs script in different threads, access is serialized by lock
+        self.__connection = sqlite3.connect(file_name, check_same_thread=False)
+        self.__lock = threading.Lock()
+        with self.__lock, self.__connection:
+            if not self.in_memory:
+                self.__connection.execute('PRAGMA journal_mode=WAL')
+                self.__connection.execute('PRAGMA synchronous=NORMAL')
+            self.__connection.execute('''
+                CREATE TABLE IF NOT EXISTS artefact (
+                    kind  TEXT NOT NULL,
+                    key   TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+            ''')
+
+    def close(self):
+        """Close store"""
+        with self.__lock:
+            self.__connection.close()
+
+    def get(self, kind : ArtefactKind, key : str) -> Optional[str | bytes]:
+        """Artefact value, None if it's not found"""
+        with self.__lock, self.__connection:
+            rows = self.__connection.execute('SELECT value FROM artefact WHERE kind = ? AND key = ?', (kind.value, key)).fetchall()
+        count_cache_lookup(kind.value, len(rows), 1 - len(rows))
+        return rows[0][0] if rows else None
+
+    def get_many(self, kind : ArtefactKind, key_list : list[str]) -> dict[str, str | bytes]:
+        """Found artefacts by keys"""
+        result = dict[str, str | bytes]()
+        for batch_start in range(0, len(key_list), self.__READ_BATCH_SIZE):
+            batch_keys = key_list[batch_start : batch_start + self.__READ_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch_keys))
+            with self.__lock, self.__connection:
+                rows = self.__connection.execute(f'SELECT key, value FROM artefact WHERE kind = ? AND key IN ({placeholders})', (kind.value, *batch_keys)).fetchall()
+            result.update(rows)
+        count_cache_lookup(kind.value, len(result), len(set(key_list)) - len(result))
+        return result
+
+    def iter_values(self, kind : ArtefactKind, key_list : list[str]) -> Iterator[Optional[str | bytes]]:
+        """Values in order of keys (None if not found), read by small batches"""
+        for batch_start in range(0, len(key_list), self.__READ_BATCH_SIZE):
+            batch_keys = key_list[batch_start : batch_start + self.__READ_BATCH_SIZE]
+            found = self.get_many(kind, batch_keys)
+            for key in batch_keys:
+                yield found.get(key)
+
+    def put(self, kind : ArtefactKind, key : str, value : str | bytes):
+        """Save artefact"""
+        self.put_many(kind, [(key, value)])
+
+    def put_many(self, kind : ArtefactKind, item_list : list[tuple[str, str | bytes]]):
+        """Save artefacts in one transaction"""
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO artefact (kind, key, value) VALUES (?, ?, ?)',
+                [(kind.value, key, value) for key, value in item_list]
+            )
+
+    def get_count(self, kind : ArtefactKind) -> int:
+        """Count of artefacts of kind"""
+        with self.__lock, self.__connection:
+            return self.__connection.execute('SELECT COUNT(*) FROM artefact WHERE kind = ?', (kind.value,)).fetchone()[0]
@@ -6,13 +6,17 @@
 
 import os
 from dataclasses import dataclass
+from typing import Callable, Optional
 from dataclasses_json import dataclass_json
 
+from core.file_lock import file_lock, write_file_atomic
+
 @dataclass_json
 @dataclass
 class DocumentSetItem():
     """One document set item"""
     name : str
+    pdf_parser_backend : Optional[str] = None # name of PdfParserBackend used for last extraction
 
 @dataclass_json
 @dataclass
@@ -28,6 +32,7 @@ class DocumentSetManager:
 
     __DISK_FOLDER = '.document-set'
     __FILE_NAME   = 'document-set.json'
+    __LOCK_FILE_NAME = 'document-set.lock' # UI, job workers and batch CLI change document sets in parallel
 
     def __init__(self, in_memory : bool):
         self.in_memory = in_memory
@@ -49,8 +54,8 @@ class DocumentSetManager:
         dir_name = os.path.dirname(file_name)
         os.makedirs(dir_name, exist_ok=True)
 
-        with open(file_name,"wt", encoding="utf-8") as file:
-            file.write(json_str)
+        # file is replaced, so other process never reads partially written file
+        write_file_atomic(file_name, json_str)
 
     def load(self):
         """Load storage"""
@@ -75,12 +80,39 @@ class DocumentSetManager:
                 return document_set
         return None
     
+    def __change(self, change_call : Callable[[], bool], auto_save : bool):
+        """
+            Apply change (it returns True if storage is changed). With auto save storage is re-loaded, changed and saved
+            under inter-process lock, so changes of other processes (batch CLI, job workers) are not lost.
+        """
+        if not auto_save or self.in_memory:
+            change_call()
+            return
+        with file_lock(os.path.join(self.__DISK_FOLDER, self.__LOCK_FILE_NAME)):
+            self.load()
+            if change_call():
+                self.save()
+
     def add(self, name : str, auto_save : bool):
         """Add new document set"""
         name = name.strip()
-        document_set = self.find_name(name)
-        if document_set:
-            return
-        self._storage.document_set.append(DocumentSetItem(name))
-        if auto_save and not self.in_memory:
-            self.save()
\ No newline at end of file
+
+        def add_document_set() -> bool:
+            if self.find_name(name):
+                return False
+            self._storage.document_set.append(DocumentSetItem(name))
+            return True
+
+        self.__change(add_document_set, auto_save)
+
+    def set_pdf_parser_backend(self, name : str, pdf_parser_backend : str, auto_save : bool):
+        """Remember pdf parser backend of document set"""
+
+        def set_backend() -> bool:
+            document_set = self.find_name(name)
+            if not document_set or document_set.pdf_parser_backend == pdf_parser_backend:
+                return False
+            document_set.pdf_parser_backend = pdf_parser_backend
+            return True
+
+        self.__change(set_backend, auto_save)
\ No newline at end of file
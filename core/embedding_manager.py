@@ -5,13 +5,18 @@
 # pylint: disable=C0301,C0103,C0304,C0303,W0611,W0511,R0913,R0402
 
 import os
+from array import array
 from enum import Enum
 from dataclasses import dataclass
 from typing import Callable
 
+from langchain.embeddings.base import Embeddings
 from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 
+from core.artefact_store import ArtefactStore, ArtefactKind, get_text_digest
+from core.shared_resources import SharedResources
+
 class EmbeddingType(Enum):
     """Types of embeddings"""
     SBERT    = "SBERT (https://www.sbert.net/)"
@@ -32,11 +37,64 @@ class EmbeddingItem:
 class LlmEmbeddingError(Exception):
     """Lmm embedding exception"""
 
+class MemoizedEmbeddings(Embeddings):
+    """Embeddings wrapper that keeps calculated document vectors to avoid second encoding of the same text"""
+
+    embeddings : Embeddings
+    __vectors  : dict[str, list[float]]
+
+    def __init__(self, embeddings : Embeddings):
+        self.embeddings = embeddings
+        self.__vectors = dict[str, list[float]]()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, only new texts are encoded"""
+        missed_texts = [text for text in dict.fromkeys(texts) if text not in self.__vectors]
+        if missed_texts:
+            self.__vectors.update(zip(missed_texts, self.embeddings.embed_documents(missed_texts)))
+        return [self.__vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed query"""
+        return self.embeddings.embed_query(text)
+
+class SharedEmbeddings(Embeddings):
+    """Embeddings wrapper that keeps document vectors in artefact store, so the same text is encoded once for all indexes"""
+
+    embeddings     : Embeddings
+    embedding_name : str
+    artefact_store : ArtefactStore
+
+    def __init__(self, embeddings : Embeddings, embedding_name : str, artefact_store : ArtefactStore):
+        self.embeddings = embeddings
+        self.embedding_name = embedding_name
+        self.artefact_store = artefact_store
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, only texts without stored vectors are encoded"""
+        keys = [f'{self.embedding_name}:{get_text_digest(text)}' for text in texts]
+        vectors = {key : array('d', value).tolist() for key, value in self.artefact_store.get_many(ArtefactKind.EMBEDDING, list(set(keys))).items()}
+        missed = {key : text for key, text in zip(keys, texts) if key not in vectors}
+        if missed:
+            encoded = self.embeddings.embed_documents(list(missed.values()))
+            vectors.update(zip(missed.keys(), encoded))
+            self.artefact_store.put_many(ArtefactKind.EMBEDDING, [(key, array('d', vectors[key]).tobytes()) for key in missed])
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed query"""
+        return self.embeddings.embed_query(text)
+
 class EmbeddingManager():
     """Embedding Manager"""
 
     _OPENAI_MODEL_NAME = "gpt-3.5-turbo" # gpt-3.5-turbo-16k
 
+    __models : SharedResources # loaded embedding models, manager is shared by sessions
+
+    def __init__(self):
+        self.__models = SharedResources()
+
     def __get_api_key(self):
         return os.environ["OPENAI_API_KEY"]
 
@@ -69,8 +127,10 @@ class EmbeddingManager():
 
 
     def get_embeddings(self, embedding_name : EmbeddingType)-> (OpenAIEmbeddings | SentenceTransformerEmbeddings):
-        """Embeddings"""
-        
+        """Embeddings (model is loaded once)"""
+        return self.__models.get(embedding_name, lambda: self.__create_embeddings(embedding_name))
+
+    def __create_embeddings(self, embedding_name : EmbeddingType)-> (OpenAIEmbeddings | SentenceTransformerEmbeddings):
         if embedding_name == EmbeddingType.OPENAI35.name:
             # https://api.python.langchain.com/en/latest/embeddings/langchain.embeddings.openai.OpenAIEmbeddings.html
             return OpenAIEmbeddings(openai_api_key= self.__get_api_key())
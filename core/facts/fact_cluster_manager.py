@@ -0,0 +1,225 @@
+"""
+    Fact cluster manager: stored clusters with incremental assignment of new facts
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,W0611,C0411,R0913,W1203
+
+import os
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+from dataclasses_json import dataclass_json
+
+import numpy as np
+
+from core.facts.fact_clustering import FactClusterResult, FactClusterScore, fit_k_means, fact_auto_k_means, group_facts_by_labels, normalize_embeddings
+
+logger : logging.Logger = logging.getLogger()
+
+@dataclass_json
+@dataclass
+class FactClusterState:
+    """Stored result of clustering for document set and embedding"""
+    embedding_name      : str
+    corpus_hash         : str
+    cluster_count       : int # requested count (or max count for auto mode)
+    auto_cluster_range  : Optional[list[int]] # [min, max] for auto mode
+    selected_count      : int # count of clusters in centroids
+    fitted_fact_count   : int # count of facts used for last full clustering
+    centroids           : list[list[float]]
+    assignments         : dict[str, int] # fact hash -> cluster
+    score_list          : list[FactClusterScore] = field(default_factory=list)
+    fitted_hash_list    : list[str] = field(default_factory=list) # fact hashes of last full clustering, drift is measured against them
+
+@dataclass
+class FactClusterParams:
+    """Parameters of fact clustering"""
+    cluster_count      : int
+    auto_cluster_count : bool = False
+    min_cluster_count  : int = 2
+    max_cluster_count  : int = 20
+    force_recluster    : bool = False
+    drift_threshold    : float = 0.2 # share of added/removed facts to run full clustering
+    dedup_threshold    : float = 0 # similarity to collapse near-duplicate facts, 0 - no dedup
+
+class FactClusterManager:
+    """Fact cluster manager class"""
+
+    in_memory : bool
+    __memory  : dict[str, str]
+
+    __DISK_FOLDER = '.document-fact-clusters'
+    __STATE_EXT = '.json'
+
+    def __init__(self, in_memory : bool):
+        self.in_memory = in_memory
+        self.__memory = dict[str, str]()
+        if not in_memory:
+            os.makedirs(self.__DISK_FOLDER, exist_ok=True)
+
+    def __get_state_file_name(self, document_set : str, embedding_name : str) -> str:
+        return os.path.join(self.__DISK_FOLDER, document_set, f'{embedding_name}{self.__STATE_EXT}')
+
+    def save(self, document_set : str, state : FactClusterState):
+        """Save state of clustering"""
+        state_file_name = self.__get_state_file_name(document_set, state.embedding_name)
+        state_json = state.to_json()  # pylint: disable=E1101
+        if self.in_memory:
+            self.__memory[state_file_name] = state_json
+            return
+        os.makedirs(os.path.dirname(state_file_name), exist_ok=True)
+        with open(state_file_name, "wt", encoding="utf-8") as f:
+            f.write(state_json)
+
+    def load(self, document_set : str, embedding_name : str) -> Optional[FactClusterState]:
+        """Load state of clustering"""
+        state_file_name = self.__get_state_file_name(document_set, embedding_name)
+        if self.in_memory:
+            state_json = self.__memory.get(state_file_name)
+        else:
+            if not os.path.isfile(state_file_name):
+                return None
+            with open(state_file_name, "rt", encoding="utf-8") as f:
+                state_json = f.read()
+        if not state_json:
+            return None
+        try:
+            return FactClusterState.from_json(state_json) # pylint: disable=E1101
+        except Exception as error: # pylint: disable=W0718
+            logger.error(error)
+            return None
+
+    def delete(self, document_set : str, embedding_name : str):
+        """Delete state of clustering"""
+        state_file_name = self.__get_state_file_name(document_set, embedding_name)
+        self.__memory.pop(state_file_name, None)
+        if not self.in_memory and os.path.isfile(state_file_name):
+            os.remove(state_file_name)
+
+    @staticmethod
+    def get_corpus_hash(fact_hash_list : list[str]) -> str:
+        """Hash of all facts (order independent)"""
+        return hashlib.sha1('\n'.join(sorted(fact_hash_list)).encode("utf-8")).hexdigest()
+
+    def get_fact_clusters(
+            self,
+            document_set : str,
+            embedding_name : str,
+            fact_list : list[str],
+            fact_hash_list : list[str],
+            normalized_embeddings : np.ndarray,
+            params : FactClusterParams,
+            fact_sources : Optional[list[list[str]]] = None
+        ) -> FactClusterResult:
+        """
+            Get clusters: reuse stored clusters, assign new facts to the nearest centroid or run full clustering.
+            Sources of facts (by index) are kept in clusters.
+        """
+
+        if not fact_list:
+            return FactClusterResult([], 0, [])
+
+        corpus_hash = self.get_corpus_hash(fact_hash_list)
+        auto_cluster_range = [params.min_cluster_count, params.max_cluster_count] if params.auto_cluster_count else None
+
+        state = None
+        if not params.force_recluster:
+            state = self.load(document_set, embedding_name)
+        if state and (state.cluster_count != params.cluster_count or state.auto_cluster_range != auto_cluster_range):
+            state = None
+
+        if state:
+            if state.corpus_hash == corpus_hash:
+                labels = np.array([state.assignments[h] for h in fact_hash_list])
+                return FactClusterResult(group_facts_by_labels(fact_list, labels, fact_sources), state.selected_count, state.score_list, False)
+
+            result = self.__assign_new_facts(document_set, state, fact_list, fact_hash_list, normalized_embeddings, corpus_hash, params.drift_threshold, fact_sources)
+            if result:
+                return result
+
+        return self.__recluster(document_set, embedding_name, fact_list, fact_hash_list, normalized_embeddings, corpus_hash, params, auto_cluster_range, fact_sources)
+
+    def __assign_new_facts(
+            self,
+            document_set : str,
+            state : FactClusterState,
+            fact_list : list[str],
+            fact_hash_list : list[str],
+            normalized_embeddings : np.ndarray,
+            corpus_hash : str,
+            drift_threshold : float,
+            fact_sources : Optional[list[list[str]]]
+        ) -> Optional[FactClusterResult]:
+        """Assign new facts to the nearest centroid. None if drift is too big"""
+
+        new_index_list = [index for index, h in enumerate(fact_hash_list) if h not in state.assignments]
+        # assignments are changed by each incremental call, so small batches are summed up against facts of last full clustering
+        fitted_hash_set = set(state.fitted_hash_list or state.assignments.keys())
+        current_hash_set = set(fact_hash_list)
+        changed_count = len(current_hash_set - fitted_hash_set) + len(fitted_hash_set - current_hash_set)
+        drift = changed_count / max(len(fitted_hash_set), 1)
+        if drift > drift_threshold:
+            logger.info(f'Fact cluster drift {drift:.2f} > {drift_threshold}, full clustering')
+            return None
+
+        assignments = {h : state.assignments[h] for h in fact_hash_list if h in state.assignments}
+        if new_index_list:
+            new_labels = assign_to_centroids(normalized_embeddings[new_index_list], np.asarray(state.centroids, dtype=np.float32))
+            for index, label in zip(new_index_list, new_labels):
+                assignments[fact_hash_list[index]] = int(label)
+
+        state.assignments = assignments
+        state.corpus_hash = corpus_hash
+        self.save(document_set, state)
+
+        labels = np.array([assignments[h] for h in fact_hash_list])
+        return FactClusterResult(group_facts_by_labels(fact_list, labels, fact_sources), state.selected_count, state.score_list, False)
+
+    def __recluster(
+            self,
+            document_set : str,
+            embedding_name : str,
+            fact_list : list[str],
+            fact_hash_list : list[str],
+            normalized_embeddings : np.ndarray,
+            corpus_hash : str,
+            params : FactClusterParams,
+            auto_cluster_range : Optional[list[int]],
+            fact_sources : Optional[list[list[str]]]
+        ) -> FactClusterResult:
+        """Run full clustering and save its state"""
+
+        if params.auto_cluster_count:
+            result = fact_auto_k_means(fact_list, normalized_embeddings, params.min_cluster_count, params.max_cluster_count, fact_sources=fact_sources)
+            labels = result.labels
+        else:
+            labels = fit_k_means(normalized_embeddings, params.cluster_count).labels_
+            result = FactClusterResult(group_facts_by_labels(fact_list, labels, fact_sources), min(params.cluster_count, len(fact_list)), [], True, labels)
+
+        state = FactClusterState(
+            embedding_name,
+            corpus_hash,
+            params.cluster_count,
+            auto_cluster_range,
+            result.cluster_count,
+            len(fact_list),
+            get_centroids(normalized_embeddings, labels).tolist(),
+            {h : int(label) for h, label in zip(fact_hash_list, labels)},
+            result.score_list,
+            list(fact_hash_list)
+        )
+        self.save(document_set, state)
+        return result
+
+def get_centroids(normalized_embeddings : np.ndarray, labels : np.ndarray) -> np.ndarray:
+    """Normalized mean vector of each cluster (index = label)"""
+    labels = np.asarray(labels)
+    cluster_count = int(labels.max()) + 1
+    centroids = np.zeros((cluster_count, normalized_embeddings.shape[1]), dtype=np.float32)
+    np.add.at(centroids, labels, normalized_embeddings)
+    return normalize_embeddings(centroids)
+
+def assign_to_centroids(normalized_embeddings : np.ndarray, centroids : np.ndarray) -> np.ndarray:
+    """Label of the nearest (by cosine) centroid for each embedding"""
+    return np.argmax(normalized_embeddings @ centroids.T, axis=1)
@@ -4,47 +4,150 @@
 
 # pylint: disable=C0301,C0103,C0304,C0303,W0611,C0411
 
-from dataclasses import dataclass
-from typing import Callable
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.metrics import pairwise_distances
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+# starting from this count of facts MiniBatchKMeans is used by default
+MINI_BATCH_MIN_FACTS = 10000
+MINI_BATCH_SIZE = 4096
+# silhouette is O(N^2), so it's calculated on sample
+SILHOUETTE_SAMPLE_SIZE = 5000
 
 @dataclass
 class FactCluster:
     """Cluster of facts"""
-    name      : str
-    fact_list : list[str]
+    name         : str
+    fact_list    : list[str]
+    fact_sources : list[list[str]] = field(default_factory=list) # sources of each fact (if known)
 
+@dataclass
+class FactClusterScore:
+    """Quality of clustering for one count of clusters"""
+    cluster_count : int
+    silhouette    : float
+    inertia       : float
 
-def fact_k_means(fact_list : list[str], cluster_count : int, encode_call : Callable[..., list[list[float]]]) -> list[FactCluster]:
-    """Get fact clusters"""
+@dataclass
+class FactClusterResult:
+    """Fact clusters with scores of evaluated cluster counts"""
+    cluster_list  : list[FactCluster]
+    cluster_count : int
+    score_list    : list[FactClusterScore]
+    reclustered   : bool = True # False if stored clusters were used
+    labels        : Optional[np.ndarray] = None
 
-    embeddings_array = encode_call(fact_list)
-    cosine_distances = pairwise_distances(embeddings_array, metric="cosine")
+def normalize_embeddings(embeddings : list[list[float]] | np.ndarray) -> np.ndarray:
+    """L2-normalize embeddings, so euclidean k-means works as cosine (spherical) k-means"""
+    embeddings_array = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings_array, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return embeddings_array / norms
 
-    kmeans = KMeans(n_clusters=cluster_count, n_init="auto")
-    kmeans.fit(cosine_distances)
-    label = kmeans.labels_
+def create_k_means(cluster_count : int, fact_count : int, use_mini_batch : Optional[bool] = None) -> KMeans | MiniBatchKMeans:
+    """Create KMeans or MiniBatchKMeans (for big count of facts)"""
+    if use_mini_batch is None:
+        use_mini_batch = fact_count >= MINI_BATCH_MIN_FACTS
+    if use_mini_batch:
+        return MiniBatchKMeans(n_clusters=cluster_count, n_init="auto", batch_size=MINI_BATCH_SIZE)
+    return KMeans(n_clusters=cluster_count, n_init="auto")
 
-    data_with_labels = np.column_stack((fact_list, label))
-    data_with_labels = sorted(data_with_labels, key=lambda t: t[-1], reverse=False)
+def fit_k_means(normalized_embeddings : np.ndarray, cluster_count : int, use_mini_batch : Optional[bool] = None) -> KMeans | MiniBatchKMeans:
+    """Fit k-means on (normalized) embeddings"""
+    fact_count = normalized_embeddings.shape[0]
+    cluster_count = min(cluster_count, fact_count)
+    kmeans = create_k_means(cluster_count, fact_count, use_mini_batch)
+    kmeans.fit(normalized_embeddings)
+    return kmeans
 
-    grouped_dict = {}
+def cluster_embeddings(normalized_embeddings : np.ndarray, cluster_count : int, use_mini_batch : Optional[bool] = None) -> np.ndarray:
+    """Get cluster label for each (normalized) embedding"""
+    return fit_k_means(normalized_embeddings, cluster_count, use_mini_batch).labels_
 
-    for item in data_with_labels:
-        key = item[1]
-        if key in grouped_dict:
-            grouped_dict[key].append(item[0])
-        else:
-            grouped_dict[key] = [item[0]]
+def group_facts_by_labels(fact_list : list[str], labels : np.ndarray, fact_sources : Optional[list[list[str]]] = None) -> list[FactCluster]:
+    """Group facts by cluster labels, sources are grouped by fact index (the same fact can come from different files)"""
+    labels = np.asarray(labels)
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    group_starts = np.flatnonzero(np.diff(sorted_labels)) + 1
 
     result = list[FactCluster]()
-    
-    for group in grouped_dict.items():
-        name = f'Cluster {group[0]}'
-        fact_cluster = FactCluster(name, group[1])
-        result.append(fact_cluster)
-
+    for group_indexes in np.split(order, group_starts):
+        name = f'Cluster {labels[group_indexes[0]]}'
+        cluster_sources = [fact_sources[i] for i in group_indexes] if fact_sources is not None else []
+        result.append(FactCluster(name, [fact_list[i] for i in group_indexes], cluster_sources))
     return result
+
+def fact_k_means(
+        fact_list : list[str],
+        cluster_count : int,
+        encode_call : Callable[..., list[list[float]]],
+        use_mini_batch : Optional[bool] = None
+    ) -> list[FactCluster]:
+    """Get fact clusters"""
+
+    if not fact_list:
+        return []
+
+    normalized_embeddings = normalize_embeddings(encode_call(fact_list))
+    labels = cluster_embeddings(normalized_embeddings, cluster_count, use_mini_batch)
+    return group_facts_by_labels(fact_list, labels)
+
+def score_cluster_count(
+        normalized_embeddings : np.ndarray,
+        cluster_count : int,
+        use_mini_batch : Optional[bool] = None,
+        sample_size : int = SILHOUETTE_SAMPLE_SIZE
+    ) -> tuple[FactClusterScore, np.ndarray]:
+    """Run k-means for one count of clusters and score it by (sampled) silhouette"""
+    kmeans = fit_k_means(normalized_embeddings, cluster_count, use_mini_batch)
+    labels = kmeans.labels_
+    silhouette = -1.0
+    if 1 < len(np.unique(labels)) < normalized_embeddings.shape[0]:
+        silhouette = float(silhouette_score(
+            normalized_embeddings,
+            labels,
+            metric="cosine",
+            sample_size=min(sample_size, normalized_embeddings.shape[0]),
+            random_state=0
+        ))
+    return FactClusterScore(cluster_count, silhouette, float(kmeans.inertia_)), labels
+
+def fact_auto_k_means(
+        fact_list : list[str],
+        normalized_embeddings : np.ndarray,
+        min_cluster_count : int,
+        max_cluster_count : int,
+        use_mini_batch : Optional[bool] = None,
+        max_workers : Optional[int] = None,
+        fact_sources : Optional[list[list[str]]] = None
+    ) -> FactClusterResult:
+    """Evaluate range of cluster counts in parallel and return clusters with the best silhouette"""
+
+    if not fact_list:
+        return FactClusterResult([], 0, [])
+
+    max_cluster_count = min(max_cluster_count, len(fact_list) - 1)
+    min_cluster_count = max(2, min(min_cluster_count, max_cluster_count))
+    if max_cluster_count < 2:
+        return FactClusterResult([FactCluster('Cluster 0', list(fact_list), list(fact_sources or []))], 1, [], True, np.zeros(len(fact_list), dtype=int))
+
+    cluster_count_list = list(range(min_cluster_count, max_cluster_count + 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        scored_list = list(executor.map(
+            lambda cluster_count: score_cluster_count(normalized_embeddings, cluster_count, use_mini_batch),
+            cluster_count_list
+        ))
+
+    best_score, best_labels = max(scored_list, key=lambda scored: scored[0].silhouette)
+    return FactClusterResult(
+        group_facts_by_labels(fact_list, best_labels, fact_sources),
+        best_score.cluster_count,
+        [scored[0] for scored in scored_list],
+        True,
+        best_labels
+    )
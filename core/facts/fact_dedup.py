@@ -0,0 +1,68 @@
+"""
+    Removal of near-duplicate facts
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,W0611,C0411
+
+from dataclasses import dataclass
+
+import numpy as np
+
+DEFAULT_DEDUP_THRESHOLD = 0.95
+DEDUP_BLOCK_SIZE = 2048
+
+@dataclass
+class FactDedupResult:
+    """Result of deduplication"""
+    kept_index_list      : list[int] # indexes of kept (representative) facts
+    duplicate_index_list : list[list[int]] # for each kept fact - indexes of all collapsed facts (including itself)
+
+def find_near_duplicates(normalized_embeddings : np.ndarray, threshold : float, block_size : int = DEDUP_BLOCK_SIZE) -> np.ndarray:
+    """
+        Exact blocked cosine search of near-duplicates.
+        Returns index of representative for each fact: the first fact (in input order) that is similar to it.
+    """
+    fact_count = normalized_embeddings.shape[0]
+    representative = np.arange(fact_count)
+
+    for row_start in range(0, fact_count, block_size):
+        row_end = min(row_start + block_size, fact_count)
+        row_block = normalized_embeddings[row_start:row_end]
+
+        pair_rows = []
+        pair_cols = []
+        for col_start in range(row_start, fact_count, block_size):
+            col_end = min(col_start + block_size, fact_count)
+            similarity = row_block @ normalized_embeddings[col_start:col_end].T
+            rows, cols = np.nonzero(similarity >= threshold)
+            rows += row_start
+            cols += col_start
+            upper = cols > rows
+            pair_rows.append(rows[upper])
+            pair_cols.append(cols[upper])
+
+        rows = np.concatenate(pair_rows)
+        cols = np.concatenate(pair_cols)
+        for pair_index in np.lexsort((cols, rows)):
+            row = rows[pair_index]
+            col = cols[pair_index]
+            # only representative fact can collect duplicates, fact can be collected only once
+            if representative[row] == row and representative[col] == col:
+                representative[col] = row
+
+    return representative
+
+def dedup_facts(normalized_embeddings : np.ndarray, threshold : float = DEFAULT_DEDUP_THRESHOLD) -> FactDedupResult:
+    """Collapse facts with cosine similarity above threshold, keep provenance of collapsed facts"""
+    fact_count = normalized_embeddings.shape[0]
+    if fact_count == 0:
+        return FactDedupResult([], [])
+
+    representative = find_near_duplicates(normalized_embeddings, threshold)
+
+    groups = dict[int, list[int]]()
+    for index, representative_index in enumerate(representative.tolist()):
+        groups.setdefault(representative_index, []).append(index)
+
+    kept_index_list = sorted(groups.keys())
+    return FactDedupResult(kept_index_list, [groups[index] for index in kept_index_list])
@@ -0,0 +1,72 @@
+"""
+    Cache of fact embeddings
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,W0611,C0411
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+
+from core.facts.fact_clustering import normalize_embeddings
+from core.tracing import count_cache_lookup
+
+class FactEmbeddingCache:
+    """In-memory LRU cache of normalized fact embeddings (per embedding and fact text)"""
+
+    max_items : int
+    __cache   : OrderedDict[tuple[str, str], np.ndarray]
+    __lock    : threading.Lock
+
+    __DEFAULT_MAX_ITEMS = 200000
+
+    def __init__(self, max_items : int = __DEFAULT_MAX_ITEMS):
+        self.max_items = max_items
+        self.__cache = OrderedDict[tuple[str, str], np.ndarray]()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def get_fact_hash(fact : str) -> str:
+        """Hash of fact text"""
+        return hashlib.sha1(fact.encode("utf-8")).hexdigest()
+
+    def get_normalized_embeddings(
+            self,
+            embedding_name : str,
+            fact_list : list[str],
+            encode_call : Callable[..., list[list[float]]]
+        ) -> np.ndarray:
+        """Get normalized embeddings for facts, only new facts are encoded"""
+
+        keys = [(embedding_name, self.get_fact_hash(fact)) for fact in fact_list]
+        with self.__lock:
+            found = {key : self.__cache[key] for key in keys if key in self.__cache}
+
+        # the same fact can be present several times, encode it once
+        missed = {key : fact for key, fact in zip(keys, fact_list) if key not in found}
+        count_cache_lookup('fact_embedding', len(found), len(missed))
+        if missed:
+            encoded = normalize_embeddings(encode_call(list(missed.values())))
+            found.update(zip(missed.keys(), encoded))
+
+        with self.__lock:
+            for key, embedding in found.items():
+                self.__cache[key] = embedding
+                self.__cache.move_to_end(key)
+            while len(self.__cache) > self.max_items:
+                self.__cache.popitem(last=False)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([found[key] for key in keys])
+
+    def clear(self):
+        """Clear cache"""
+        with self.__lock:
+            self.__cache.clear()
+
+    def __len__(self):
+        return len(self.__cache)
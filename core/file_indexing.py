@@ -4,10 +4,13 @@
 # pylint: disable=C0301,C0103,C0304,C0303,W0611,W0511,R0913,C0412,W1203
 
 import os
+import time
 import shutil
 import logging
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional
 from dataclasses_json import dataclass_json
 
 from qdrant_client import QdrantClient
@@ -16,12 +19,15 @@ from langchain.embeddings.base import Embeddings
 from langchain_community.vectorstores import Qdrant
 from langchain.docstore.document import Document
 
-from core.parsers.chunk_splitters.base_splitter import ChunkSplitterParams, ChunkSplitterMode
+from core.parsers.chunk_splitters.base_splitter import BaseChunkSplitter, ChunkSplitterParams, ChunkSplitterMode
 from core.parsers.chunk_splitters.token_splitter import TokenChunkSplitter
 from core.parsers.chunk_splitters.fact_splitter import FactChunkSplitter
 from core.parsers.chunk_splitters.faq_splitter import FAQChunkSplitter
 from core.parsers.chunk_splitters.semantic_splitter import SemanticSplitter
 from core.parsers.chunk_splitters.character_splitter import CharacterSplitter
+from core.parsers.chunk_splitters.chunk_record import ChunkRecord, chunks_to_documents
+from core.embedding_manager import MemoizedEmbeddings
+from core.tracing import trace_span
 
 logger : logging.Logger = logging.getLogger()
 
@@ -32,8 +38,9 @@ class FileIndexingError(Exception):
 @dataclass
 class FileIndexParams:
     """Parameters for indexing"""
-    splitter_params     : ChunkSplitterParams
-    fact_line_separator : str
+    splitter_params      : ChunkSplitterParams
+    fact_line_separator  : str
+    fact_dedup_threshold : float = 0 # 0 - keep near-duplicate facts
 
 @dataclass_json
 @dataclass
@@ -53,10 +60,45 @@ class FileIndexMeta:
     default_threshold   : Optional[float] = None
     error               : Optional[str] = None
 
+@dataclass
+class OpenedIndex:
+    """Index which is kept open between searches"""
+    client    : QdrantClient
+    lock      : threading.Lock
+    last_used : float
+    in_use    : int = 0 # searches which use or wait for index, index is not closed as idle while it's used
+    closed    : bool = False
+
+def create_chunk_splitter(index_params : FileIndexParams, embeddings : Optional[Embeddings] = None) -> BaseChunkSplitter:
+    """Chunk splitter of index (embeddings are used only for dedup of facts)"""
+    chunk_splitter_value = index_params.splitter_params.chunk_splitter_mode.value
+    if  chunk_splitter_value == ChunkSplitterMode.FACT_LIST.value:
+        return FactChunkSplitter(
+            index_params.splitter_params,
+            index_params.fact_line_separator,
+            index_params.fact_dedup_threshold,
+            embeddings
+        )
+    if  chunk_splitter_value == ChunkSplitterMode.FAQ_LIST.value:
+        return FAQChunkSplitter(index_params.splitter_params)
+    if chunk_splitter_value == ChunkSplitterMode.TOKEN_MODE.value:
+        return TokenChunkSplitter(index_params.splitter_params)
+    if chunk_splitter_value == ChunkSplitterMode.SEMANTIC_SPLITTER_SBERT.value:
+        return SemanticSplitter(index_params.splitter_params)
+    if chunk_splitter_value == ChunkSplitterMode.CHARACTER_SPLITTER.value:
+        return CharacterSplitter(index_params.splitter_params)
+    raise FileIndexingError(f'Unsupported ChunkSplitterMode: {chunk_splitter_value}')
+
+def _no_progress(_ : str):
+    """Progress is not reported"""
+
 class FileIndex:
     """File index class"""
     in_memory : bool
     full_index_folder : str
+    keep_open_seconds : float # 0 - index is opened for each search
+    __opened_indexes  : dict[str, OpenedIndex]
+    __opened_lock     : threading.Lock
 
     # folder structure:
     #   .document-index
@@ -66,15 +108,22 @@ class FileIndex:
     #         \chunks
     #             chunk-nnnnn.txt
     #         index_meta.json
+    #      \.build
+    #         \<document-set>\<index-name> (index which is being built)
 
     __DISK_FOLDER = '.document-index'
     __INDEX_FOLDER = 'index'
     __CHUNKS_FOLDER = 'chunks'
+    __BUILD_FOLDER = '.build' # index is built in .build/<document-set>/<index-name> and moved into place
     __CHUNKS_COLLECTION_NAME = 'chunks'
     __INDEX_META_FILE = 'index_meta.json'
+    __PROGRESS_PAGES = 10 # progress is reported after each 10 pages
 
-    def __init__(self, in_memory : bool):
+    def __init__(self, in_memory : bool, keep_open_seconds : float = 0):
         self.in_memory = in_memory
+        self.keep_open_seconds = keep_open_seconds
+        self.__opened_indexes = {}
+        self.__opened_lock = threading.Lock()
         if not in_memory:
             os.makedirs(self.__DISK_FOLDER, exist_ok=True)
 
@@ -84,109 +133,147 @@ class FileIndex:
 
     def save_chunks(
             self, 
-            document_set : str, 
-            index_name : str, 
-            chunks : list[Document]) -> list[Document]:
-        """Save chunks"""
-        chunks_folder = os.path.join(self.__DISK_FOLDER, document_set, index_name, self.__CHUNKS_FOLDER)
+            index_folder : str, 
+            chunks : list[ChunkRecord]) -> list[ChunkRecord]:
+        """Save chunks into folder of index"""
+        chunks_folder = os.path.join(index_folder, self.__CHUNKS_FOLDER)
         if os.path.isdir(chunks_folder):
             shutil.rmtree(chunks_folder)
         os.makedirs(chunks_folder)
-        for index, document in enumerate(chunks):
+        for index, chunk in enumerate(chunks):
             chunk_file_name = self.get_chunk_name(index)
-            document.metadata['chunk_file_name'] = chunk_file_name
+            chunk.chunk_file_name = chunk_file_name
             with open(os.path.join(chunks_folder, chunk_file_name), "wt", encoding="utf-8") as f:
-                f.write(document.page_content)
+                f.write(chunk.content)
         return chunks
 
     def run_indexing(
             self,
             document_set : str,
             index_name  : str,
-            input_with_meta : list[tuple[str, dict]],
+            input_with_meta : Iterable[tuple[str, dict]],
             embedding_name : str,
             default_threshold : float,
             embeddings : Embeddings, 
-            index_params : FileIndexParams) -> list[str]:
-        """Index files from file_list based on text_splitter and embeddings and save into DB"""
+            index_params : FileIndexParams,
+            progress_callback : Optional[Callable[[str], None]] = None) -> list[str]:
+        """
+            Index files from file_list based on text_splitter and embeddings and save into DB.
+            Progress is reported while pages are read and between stages (job is cancelled from progress callback).
+            Index is built in separate folder and replaces old index only when it's built,
+            so old index is kept if indexing is cancelled or failed.
+        """
         
         log = list[str]()
+        progress_callback = progress_callback or _no_progress
 
-        log.append(f'Loaded {len(input_with_meta)} document(s)')
+        # input can be lazy (pages are read while chunks are created), so documents are counted on the fly
+        loaded_count = 0
+        def iter_counted_input() -> Iterator[tuple[str, dict]]:
+            nonlocal loaded_count
+            for input_item in input_with_meta:
+                loaded_count += 1
+                if loaded_count % self.__PROGRESS_PAGES == 0:
+                    progress_callback(f'Split {loaded_count} document(s) into chunks...')
+                yield input_item
+        counted_input = iter_counted_input()
 
         chunk_splitter_value = index_params.splitter_params.chunk_splitter_mode.value
-        if  chunk_splitter_value == ChunkSplitterMode.FACT_LIST.value:
-            fact_chunk_splitter = FactChunkSplitter(index_params.splitter_params, index_params.fact_line_separator)
-            chunks  = fact_chunk_splitter.split_into_documents(input_with_meta)
-        elif  chunk_splitter_value == ChunkSplitterMode.FAQ_LIST.value:
-            fact_chunk_splitter = FAQChunkSplitter(index_params.splitter_params)
-            chunks  = fact_chunk_splitter.split_into_documents(input_with_meta)
-        elif chunk_splitter_value == ChunkSplitterMode.TOKEN_MODE.value:
-            token_chunk_splitter = TokenChunkSplitter(index_params.splitter_params)
-            chunks  = token_chunk_splitter.split_into_documents(input_with_meta)
-        elif chunk_splitter_value == ChunkSplitterMode.SEMANTIC_SPLITTER_SBERT.value:
-            semantic_splitter = SemanticSplitter(index_params.splitter_params)
-            chunks  = semantic_splitter.split_into_documents(input_with_meta)
-        elif chunk_splitter_value == ChunkSplitterMode.CHARACTER_SPLITTER.value:
-            character_splitter = CharacterSplitter(index_params.splitter_params)
-            chunks  = character_splitter.split_into_documents(input_with_meta)
-        else:
-            raise FileIndexingError(f'Unsupported ChunkSplitterMode: {chunk_splitter_value}')
-        
+        # input is read while it's split, so reading of pages is part of this stage
+        with trace_span('split_chunks', splitter= chunk_splitter_value) as span:
+            if chunk_splitter_value == ChunkSplitterMode.FACT_LIST.value and index_params.fact_dedup_threshold > 0:
+                # vectors calculated for dedup will be reused for index
+                embeddings = MemoizedEmbeddings(embeddings)
+            chunk_splitter = create_chunk_splitter(index_params, embeddings)
+            chunks  = chunk_splitter.split_into_chunks(counted_input)
+            if isinstance(chunk_splitter, FactChunkSplitter) and chunk_splitter.removed_duplicate_count:
+                log.append(f'Removed {chunk_splitter.removed_duplicate_count} near-duplicate fact(s)')
+            span.set_attribute('documents', loaded_count)
+            span.set_attribute('chunks', len(chunks))
+
+        log.insert(0, f'Loaded {loaded_count} document(s)')
         log.append(f'Total count of chunks {len(chunks)}')
 
-        # remove index before creating
-        self.delete_index(document_set, index_name)
+        progress_callback(f'Save {len(chunks)} chunk(s)...')
 
-        # save all chunks
-        chunks = self.save_chunks(document_set, index_name, chunks)
-        log.append(f'Chunks saved on disk ({len(chunks)} chunks)')
+        build_folder = os.path.join(self.__DISK_FOLDER, self.__BUILD_FOLDER, document_set, index_name)
+        if os.path.isdir(build_folder): # left by killed job
+            shutil.rmtree(build_folder)
+        try:
+            # save all chunks
+            with trace_span('save_chunks', chunks= len(chunks)):
+                chunks = self.save_chunks(build_folder, chunks)
+            log.append(f'Chunks saved on disk ({len(chunks)} chunks)')
 
-        # create index folder
-        if not self.in_memory:
-            os.makedirs(os.path.join(self.__DISK_FOLDER, document_set, index_name), exist_ok=True)
+            # save meta data
+            file_index_meta = FileIndexMeta(
+                index_params,
+                document_set,
+                embedding_name,
+                default_threshold
+            )
 
-        # save meta data
-        file_index_meta = FileIndexMeta(
-            index_params,
-            document_set,
-            embedding_name,
-            default_threshold
-        )
+            meta_json_str = file_index_meta.to_json(indent=4)  # pylint: disable=E1101
+            with open(os.path.join(build_folder, self.__INDEX_META_FILE), "wt", encoding="utf-8") as f:
+                f.write(meta_json_str)
 
-        meta_json_str = file_index_meta.to_json(indent=4)  # pylint: disable=E1101
-        with open(os.path.join(self.__DISK_FOLDER, document_set, index_name, self.__INDEX_META_FILE), "wt", encoding="utf-8") as f:
-            f.write(meta_json_str)
+            progress_callback(f'Embed {len(chunks)} chunk(s) and build index...')
 
-        # create db
-        qdrant = None
-        try:
-            if self.in_memory:
-                qdrant = Qdrant.from_documents( # pylint: disable=E1101
-                    chunks,
-                    embeddings,
-                    location=":memory:",
-                    collection_name= self.__CHUNKS_COLLECTION_NAME,
-                    force_recreate=True
-                )
-                log.append('Index has been stored in memory')
-            else:
-                qdrant = Qdrant.from_documents( # pylint: disable=E1101
-                    chunks,
-                    embeddings,
-                    path = os.path.join(self.__DISK_FOLDER, document_set, index_name, self.__INDEX_FOLDER),
-                    collection_name= self.__CHUNKS_COLLECTION_NAME,
-                    force_recreate=True
-                )      
-                log.append('Index has been stored on disk')
-        except Exception as error: # pylint: disable=W0718
-            log.append(error)
-            logger.error(error)
+            # create db, chunks are embedded here (langchain Documents are needed only here)
+            with trace_span('build_index', chunks= len(chunks)) as span:
+                qdrant = None
+                try:
+                    documents = chunks_to_documents(chunks)
+                    if self.in_memory:
+                        qdrant = Qdrant.from_documents( # pylint: disable=E1101
+                            documents,
+                            embeddings,
+                            location=":memory:",
+                            collection_name= self.__CHUNKS_COLLECTION_NAME,
+                            force_recreate=True
+                        )
+                        log.append('Index has been stored in memory')
+                    else:
+                        qdrant = Qdrant.from_documents( # pylint: disable=E1101
+                            documents,
+                            embeddings,
+                            path = os.path.join(build_folder, self.__INDEX_FOLDER),
+                            collection_name= self.__CHUNKS_COLLECTION_NAME,
+                            force_recreate=True
+                        )      
+                        log.append('Index has been stored on disk')
+                except Exception as error: # pylint: disable=W0718
+                    log.append(error)
+                    logger.error(error)
+                    log.append('Index is not built, old index is kept')
+                    return log
+                finally:
+                    if qdrant is not None:
+                        qdrant.client.close()
 
-        if qdrant is not None:
-            qdrant.client.close()
+                # old index is replaced by built one (nothing is cancelled from here)
+                self.__replace_index(build_folder, document_set, index_name)
+                if not self.in_memory:
+                    span.set_attribute('index_bytes', self.get_index_size(document_set, index_name))
+        finally:
+            if os.path.isdir(build_folder):
+                shutil.rmtree(build_folder)
 
         return log
+
+    def __replace_index(self, build_folder : str, document_set : str, index_name : str):
+        """Move built index into place of old index"""
+        self.__close_index(document_set, index_name)
+        index_folder = os.path.join(self.__DISK_FOLDER, document_set, index_name)
+        old_folder = f'{build_folder}.old'
+        if os.path.isdir(old_folder):
+            shutil.rmtree(old_folder)
+        if os.path.isdir(index_folder):
+            os.replace(index_folder, old_folder)
+        os.makedirs(os.path.dirname(index_folder), exist_ok=True)
+        os.replace(build_folder, index_folder)
+        if os.path.isdir(old_folder):
+            shutil.rmtree(old_folder)
     
     def similarity_search(
             self, 
@@ -198,24 +285,78 @@ class FileIndex:
             score_threshold : float) -> list[SearchResult]:
         """Run similarity search"""
 
-        if self.in_memory:
-            client = QdrantClient(location=":memory:")
-        else:
-            index_folder = os.path.join(self.__DISK_FOLDER, document_set, index_name, self.__INDEX_FOLDER)
-            client = QdrantClient(path = index_folder)
-
-        qdrant = Qdrant( # pylint: disable=E1102
-                    client= client,
-                    collection_name= self.__CHUNKS_COLLECTION_NAME,
-                    embeddings= embeddings
-                )
-        
+        # query is embedded before index is locked, only search itself is serialized
+        with trace_span('embed_query', query_chars= len(query)):
+            query_vector = embeddings.embed_query(query)
+
         if score_threshold == 0:
             score_threshold = None
-        
-        search_results : list[tuple[Document, float]] = qdrant.similarity_search_with_score(query, k= sample_count, score_threshold = score_threshold)
+
+        with trace_span('open_index'), self.__open_index(document_set, index_name) as client:
+            qdrant = Qdrant( # pylint: disable=E1102
+                        client= client,
+                        collection_name= self.__CHUNKS_COLLECTION_NAME,
+                        embeddings= embeddings
+                    )
+            with trace_span('index_search', sample_count= sample_count) as span:
+                search_results : list[tuple[Document, float]] = qdrant.similarity_search_with_score_by_vector(query_vector, k= sample_count, score_threshold = score_threshold)
+                span.set_attribute('chunks', len(search_results))
         return [SearchResult(s[0].page_content, s[1], s[0].metadata) for s in search_results]
 
+    def __create_client(self, document_set : str, index_name : str) -> QdrantClient:
+        if self.in_memory:
+            return QdrantClient(location=":memory:")
+        return QdrantClient(path = os.path.join(self.__DISK_FOLDER, document_set, index_name, self.__INDEX_FOLDER))
+
+    @contextmanager
+    def __open_index(self, document_set : str, index_name : str) -> Iterator[QdrantClient]:
+        """Client of index: opened for one search or kept open (loading of local index is slow)"""
+        if self.keep_open_seconds <= 0:
+            client = self.__create_client(document_set, index_name)
+            try:
+                yield client
+            finally:
+                client.close()
+            return
+
+        self.close_idle_indexes()
+        key = os.path.join(document_set, index_name)
+        with self.__opened_lock:
+            opened_index = self.__opened_indexes.get(key)
+            if not opened_index:
+                opened_index = OpenedIndex(self.__create_client(document_set, index_name), threading.Lock(), time.time())
+                self.__opened_indexes[key] = opened_index
+            # marked before the lock is released, so idle check doesn't close it
+            opened_index.in_use += 1
+        try:
+            with opened_index.lock:
+                if opened_index.closed: # index is deleted or re-built
+                    raise FileIndexingError(f'Index {key} was closed')
+                yield opened_index.client
+        finally:
+            with self.__opened_lock:
+                opened_index.in_use -= 1
+                opened_index.last_used = time.time()
+
+    def close_idle_indexes(self, max_idle_seconds : Optional[float] = None):
+        """Close indexes which were not used for keep_open_seconds (local Qdrant locks index folder while it's open)"""
+        if max_idle_seconds is None:
+            max_idle_seconds = self.keep_open_seconds
+        with self.__opened_lock:
+            for key, opened_index in list(self.__opened_indexes.items()):
+                if opened_index.in_use == 0 and time.time() - opened_index.last_used >= max_idle_seconds:
+                    opened_index.closed = True
+                    opened_index.client.close()
+                    del self.__opened_indexes[key]
+
+    def __close_index(self, document_set : str, index_name : str):
+        with self.__opened_lock:
+            opened_index = self.__opened_indexes.pop(os.path.join(document_set, index_name), None)
+        if opened_index:
+            with opened_index.lock:
+                opened_index.closed = True
+                opened_index.client.close()
+
     def get_index_name_list(self, document_set : str) -> list[str]:
         """Get list of available indexes"""
         index_folder = os.path.join(self.__DISK_FOLDER, document_set)
@@ -223,6 +364,13 @@ class FileIndex:
             return []
         return os.listdir(index_folder)
 
+    def get_index_size(self, document_set : str, index_name : str) -> int:
+        """Size of index on disk (chunks, meta and vectors) in bytes"""
+        total_size = 0
+        for folder, _, file_names in os.walk(os.path.join(self.__DISK_FOLDER, document_set, index_name)):
+            total_size += sum(os.path.getsize(os.path.join(folder, file_name)) for file_name in file_names)
+        return total_size
+
     def get_file_index_meta(self, document_set : str, index_name : str) -> FileIndexMeta:
         """Get meta info about index"""
         try:
@@ -236,6 +384,7 @@ class FileIndex:
     
     def delete_index(self, document_set : str, index_name : str):
         """Delete existed index"""
+        self.__close_index(document_set, index_name)
         index_folder = os.path.join(self.__DISK_FOLDER, document_set, index_name)
         if os.path.isdir(index_folder):
             shutil.rmtree(index_folder)
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+    Lock of files shared by processes (UI, job workers and batch CLI change the same files)
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303
+
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError: # Windows
+    import msvcrt
+    fcntl = None
+
+@contextmanager
+def file_lock(lock_file_name : str) -> Iterator[None]:
+    """
+        Exclusive lock by lock file, waits until lock is released by other process or thread.
+        Lock is held by opened file, so it's not reentrant (nested lock of the same file waits forever).
+    """
+    lock_folder = os.path.dirname(lock_file_name)
+    if lock_folder:
+        os.makedirs(lock_folder, exist_ok=True)
+    with open(lock_file_name, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError: # LK_LOCK gives up after 10 seconds
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def write_file_atomic(file_name : str, content : str):
+    """Write text into temp file and replace target, so readers never see partially written file"""
+    temp_file_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(temp_file_name, "wt", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp_file_name, file_name)
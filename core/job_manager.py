@@ -0,0 +1,344 @@
+"""
+    Background jobs: persistent job table, worker processes, progress and cancellation
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,C0305,W0611,W0511,C0411,W0718,W1203,R0902
+
+import os
+import time
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+import importlib
+import multiprocessing
+from enum import Enum
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import psutil
+
+logger : logging.Logger = logging.getLogger()
+
+class JobStatus(Enum):
+    """Status of job"""
+    QUEUED    = "queued"
+    RUNNING   = "running"
+    DONE      = "done"
+    FAILED    = "failed"
+    CANCELLED = "cancelled"
+
+ACTIVE_JOB_STATUSES = [JobStatus.QUEUED.value, JobStatus.RUNNING.value]
+
+@dataclass
+class JobItem:
+    """Job record"""
+    job_id           : str
+    job_type         : str
+    document_set     : str
+    params           : dict
+    status           : str = JobStatus.QUEUED.value
+    progress         : str = ''
+    result           : list[str] = field(default_factory=list)
+    error            : Optional[str] = None
+    created          : float = 0
+    started          : Optional[float] = None
+    finished         : Optional[float] = None
+    cancel_requested : bool = False
+
+    @property
+    def is_active(self) -> bool:
+        """Job is queued or running"""
+        return self.status in ACTIVE_JOB_STATUSES
+
+class JobCancelledError(Exception):
+    """Job was cancelled by user"""
+
+class JobStore:
+    """Job table in sqlite file (shared by server process and job workers)"""
+
+    file_name : str
+
+    __COLUMNS = 'job_id, job_type, document_set, params, status, progress, result, error, created, started, finished, cancel_requested'
+
+    def __init__(self, file_name : str):
+        self.file_name = file_name
+        with self.__connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS job (
+                    job_id           TEXT PRIMARY KEY,
+                    job_type         TEXT NOT NULL,
+                    document_set     TEXT NOT NULL,
+                    params           TEXT NOT NULL,
+                    status           TEXT NOT NULL,
+                    progress         TEXT NOT NULL,
+                    result           TEXT NOT NULL,
+                    error            TEXT,
+                    created          REAL NOT NULL,
+                    started          REAL,
+                    finished         REAL,
+                    cancel_requested INTEGER NOT NULL
+                )
+            ''')
+
+    def __connect(self) -> sqlite3.Connection:
+        # short connections: store is used from several threads and processes
+        return sqlite3.connect(self.file_name, timeout=30)
+
+    def __execute(self, sql : str, parameters : tuple = ()) -> list[tuple]:
+        connection = self.__connect()
+        try:
+            with connection:
+                return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def __execute_update(self, sql : str, parameters : tuple = ()) -> int:
+        """Execute update, returns count of changed rows"""
+        connection = self.__connect()
+        try:
+            with connection:
+                return connection.execute(sql, parameters).rowcount
+        finally:
+            connection.close()
+
+    def __to_job(self, row : tuple) -> JobItem:
+        return JobItem(
+            row[0], row[1], row[2], json.loads(row[3]), row[4], row[5], json.loads(row[6]), row[7], row[8], row[9], row[10], bool(row[11])
+        )
+
+    def add(self, job : JobItem):
+        """Add new job"""
+        self.__execute(
+            f'INSERT INTO job ({self.__COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job.job_id, job.job_type, job.document_set, json.dumps(job.params), job.status, job.progress,
+             json.dumps(job.result), job.error, job.created, job.started, job.finished, int(job.cancel_requested))
+        )
+
+    def get(self, job_id : str) -> Optional[JobItem]:
+        """Job by id"""
+        rows = self.__execute(f'SELECT {self.__COLUMNS} FROM job WHERE job_id = ?', (job_id,))
+        return self.__to_job(rows[0]) if rows else None
+
+    def get_jobs(self, document_set : Optional[str] = None, job_type : Optional[str] = None, limit : int = 20) -> list[JobItem]:
+        """Last jobs (newest first)"""
+        conditions = []
+        parameters = []
+        if document_set is not None:
+            conditions.append('document_set = ?')
+            parameters.append(document_set)
+        if job_type is not None:
+            conditions.append('job_type = ?')
+            parameters.append(job_type)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        rows = self.__execute(f'SELECT {self.__COLUMNS} FROM job {where} ORDER BY created DESC LIMIT ?', (*parameters, limit))
+        return [self.__to_job(row) for row in rows]
+
+    def get_queued(self) -> list[JobItem]:
+        """Queued jobs (oldest first)"""
+        rows = self.__execute(f'SELECT {self.__COLUMNS} FROM job WHERE status = ? ORDER BY created', (JobStatus.QUEUED.value,))
+        return [self.__to_job(row) for row in rows]
+
+    def set_running(self, job_id : str) -> bool:
+        """Job is started. False if job is not queued anymore (it was cancelled)"""
+        return self.__execute_update(
+            'UPDATE job SET status = ?, started = ? WHERE job_id = ? AND status = ?',
+            (JobStatus.RUNNING.value, time.time(), job_id, JobStatus.QUEUED.value)
+        ) > 0
+
+    def set_progress(self, job_id : str, progress : str):
+        """Update progress message"""
+        self.__execute('UPDATE job SET progress = ? WHERE job_id = ?', (progress, job_id))
+
+    def set_finished(self, job_id : str, status : JobStatus, result : list[str], error : Optional[str]):
+        """Job is finished (only active job can be finished)"""
+        self.__execute(
+            f'UPDATE job SET status = ?, result = ?, error = ?, finished = ? WHERE job_id = ? AND status IN ({",".join("?" * len(ACTIVE_JOB_STATUSES))})',
+            (status.value, json.dumps(result), error, time.time(), job_id, *ACTIVE_JOB_STATUSES)
+        )
+
+    def request_cancel(self, job_id : str):
+        """Ask job to stop"""
+        self.__execute('UPDATE job SET cancel_requested = 1 WHERE job_id = ?', (job_id,))
+
+    def is_cancel_requested(self, job_id : str) -> bool:
+        """True if user cancelled job"""
+        rows = self.__execute('SELECT cancel_requested FROM job WHERE job_id = ?', (job_id,))
+        return bool(rows and rows[0][0])
+
+    def fail_running_jobs(self, error : str) -> int:
+        """Mark jobs which were running in previous server process as failed"""
+        rows = self.__execute('SELECT job_id FROM job WHERE status = ?', (JobStatus.RUNNING.value,))
+        for row in rows:
+            self.set_finished(row[0], JobStatus.FAILED, [], error)
+        return len(rows)
+
+def kill_process_tree(process : multiprocessing.Process):
+    """Kill worker with its children (parser sandbox workers), so they are not left orphaned"""
+    try:
+        for child in psutil.Process(process.pid).children(recursive=True):
+            child.kill()
+    except psutil.Error:
+        pass
+    process.kill()
+    process.join()
+
+def job_worker_main(store_file_name : str, job_id : str, function_name : str):
+    """Run job function in worker process: function(document_set, params, progress_callback) -> log lines"""
+    job_store = JobStore(store_file_name)
+    job = job_store.get(job_id)
+
+    def progress_callback(progress : str):
+        if job_store.is_cancel_requested(job_id):
+            raise JobCancelledError(f'Job {job_id} was cancelled')
+        if progress:
+            job_store.set_progress(job_id, progress)
+
+    try:
+        module_name, function = function_name.split(':')
+        job_function : Callable = getattr(importlib.import_module(module_name), function)
+        result = job_function(job.document_set, job.params, progress_callback)
+        job_store.set_finished(job_id, JobStatus.DONE, result or [], None)
+    except JobCancelledError:
+        job_store.set_finished(job_id, JobStatus.CANCELLED, [], None)
+    except Exception as error:
+        logger.exception(error)
+        job_store.set_finished(job_id, JobStatus.FAILED, [], f'{error} [{type(error)}]')
+
+class JobManager:
+    """
+        Queue of long operations. Jobs are kept in job table and run in worker processes,
+        so they don't depend on streamlit session (reruns, browser refresh) and don't block UI.
+    """
+
+    job_store     : JobStore
+    job_functions : dict[str, str] # job type -> "module:function"
+    max_workers   : int
+    __processes   : dict[str, multiprocessing.Process]
+    __lock        : threading.Lock
+    __dispatcher  : Optional[threading.Thread]
+    __stopped     : threading.Event
+
+    __DISK_FOLDER = '.document-jobs'
+    __STORE_FILE = 'jobs.db'
+    __POLL_INTERVAL = 0.5 # seconds
+    __CANCEL_GRACE_SECONDS = 10 # cancelled job is killed if it doesn't stop itself
+
+    def __init__(self, job_functions : dict[str, str], max_workers : int = 2, store_file_name : Optional[str] = None):
+        if not store_file_name:
+            os.makedirs(self.__DISK_FOLDER, exist_ok=True)
+            store_file_name = os.path.join(self.__DISK_FOLDER, self.__STORE_FILE)
+        self.job_store = JobStore(store_file_name)
+        self.job_functions = job_functions
+        self.max_workers = max_workers
+        self.__processes = {}
+        self.__lock = threading.Lock()
+        self.__dispatcher = None
+        self.__stopped = threading.Event()
+        self.__cancel_times = dict[str, float]()
+
+        interrupted_count = self.job_store.fail_running_jobs('Interrupted: server was restarted')
+        if interrupted_count:
+            logger.warning(f'{interrupted_count} running job(s) were interrupted')
+
+    def start(self):
+        """Start dispatcher thread"""
+        with self.__lock:
+            if self.__dispatcher:
+                return
+            self.__stopped.clear()
+            self.__dispatcher = threading.Thread(target=self.__dispatch, name='job-dispatcher', daemon=True)
+            self.__dispatcher.start()
+
+    def close(self, wait : bool = False):
+        """Stop dispatcher, running jobs are killed unless wait is True"""
+        while wait and any(job.is_active for job in self.job_store.get_jobs(limit=1000)):
+            time.sleep(self.__POLL_INTERVAL)
+        self.__stopped.set()
+        if self.__dispatcher:
+            self.__dispatcher.join()
+            self.__dispatcher = None
+        with self.__lock:
+            for job_id, process in self.__processes.items():
+                kill_process_tree(process)
+                self.job_store.set_finished(job_id, JobStatus.FAILED, [], 'Interrupted: job manager was stopped')
+            self.__processes.clear()
+
+    def submit(self, job_type : str, document_set : str, params : dict) -> str:
+        """Add job into queue, returns job id"""
+        if job_type not in self.job_functions:
+            raise ValueError(f'Unknown job type {job_type}')
+        job_id = uuid.uuid4().hex
+        self.job_store.add(JobItem(job_id, job_type, document_set, params, created=time.time()))
+        self.start()
+        return job_id
+
+    def cancel(self, job_id : str):
+        """Cancel job: queued job is cancelled at once, running job stops on next progress (or is killed)"""
+        self.job_store.request_cancel(job_id)
+        job = self.job_store.get(job_id)
+        if job and job.status == JobStatus.QUEUED.value:
+            self.job_store.set_finished(job_id, JobStatus.CANCELLED, [], None)
+
+    def get_job(self, job_id : str) -> Optional[JobItem]:
+        """Job by id"""
+        return self.job_store.get(job_id)
+
+    def get_jobs(self, document_set : Optional[str] = None, job_type : Optional[str] = None, limit : int = 20) -> list[JobItem]:
+        """Last jobs"""
+        return self.job_store.get_jobs(document_set, job_type, limit)
+
+    def get_last_job(self, document_set : str, job_type : str) -> Optional[JobItem]:
+        """Last job of type for document set"""
+        job_list = self.job_store.get_jobs(document_set, job_type, 1)
+        return job_list[0] if job_list else None
+
+    def __dispatch(self):
+        """Start queued jobs, watch running ones"""
+        while not self.__stopped.is_set():
+            try:
+                self.__check_running()
+                self.__start_queued()
+            except Exception as error:
+                logger.exception(error)
+            self.__stopped.wait(self.__POLL_INTERVAL)
+
+    def __check_running(self):
+        with self.__lock:
+            for job_id, process in list(self.__processes.items()):
+                if not process.is_alive():
+                    process.join()
+                    del self.__processes[job_id]
+                    self.__cancel_times.pop(job_id, None)
+                    # worker updates status itself, it's still active only if worker died
+                    self.job_store.set_finished(job_id, JobStatus.FAILED, [], f'Worker process died (exit code {process.exitcode})')
+                    continue
+                if not self.job_store.is_cancel_requested(job_id):
+                    continue
+                cancel_time = self.__cancel_times.setdefault(job_id, time.time())
+                if time.time() - cancel_time > self.__CANCEL_GRACE_SECONDS:
+                    kill_process_tree(process)
+                    del self.__processes[job_id]
+                    self.__cancel_times.pop(job_id, None)
+                    self.job_store.set_finished(job_id, JobStatus.CANCELLED, [], None)
+
+    def __start_queued(self):
+        with self.__lock:
+            free_count = self.max_workers - len(self.__processes)
+            if free_count <= 0:
+                return
+            # spawn: server process has threads, fork is not safe
+            context = multiprocessing.get_context('spawn')
+            for job in self.job_store.get_queued()[:free_count]:
+                if not self.job_store.set_running(job.job_id): # cancelled after it was read
+                    continue
+                process = context.Process(
+                    target=job_worker_main,
+                    args=(self.job_store.file_name, job.job_id, self.job_functions[job.job_type]),
+                    name=f'job-{job.job_type}',
+                    daemon=False # job can run its own processes (parser sandbox)
+                )
+                process.start()
+                self.__processes[job.job_id] = process
@@ -0,0 +1,312 @@
+"""
+    Offline chat model for benchmarks and load tests (no LLM endpoint is needed):
+    - record: real model is called, prompt and response pairs are saved
+    - replay: saved responses are returned with configurable latency
+    - synthetic: schema-valid JSON is built from the prompt (relevance, facts, knowledge tree, format and refine prompts)
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,W0718,W1203,W0613
+
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+from enum import Enum
+from dataclasses import dataclass
+from typing import Any, Optional
+from dataclasses_json import dataclass_json
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import core.llm.prompts as prompts
+from core.llm.refine_answer import NO_ANSWER_STR, refine_initial_prompt_template, refine_combine_prompt_template
+from core.artefact_store import get_text_digest
+
+logger : logging.Logger = logging.getLogger()
+
+class OfflineLlmMode(Enum):
+    """Mode of offline LLM"""
+    RECORD    = "record"
+    REPLAY    = "replay"
+    SYNTHETIC = "synthetic"
+
+class PromptKind(Enum):
+    """Prompts of the application"""
+    RELEVANCE      = "relevance"
+    KNOWLEDGE_TREE = "knowledge_tree"
+    FORMAT         = "format"
+    FACTS          = "facts"
+    REFINE_INITIAL = "refine_initial"
+    REFINE_COMBINE = "refine_combine"
+
+def get_template_prefix(template : str) -> str:
+    """Static beginning of template (before the first variable or brace)"""
+    return template[:template.index('{')]
+
+PROMPT_PREFIXES = [
+    (PromptKind.RELEVANCE,      get_template_prefix(prompts.relevance_prompt_template)),
+    (PromptKind.KNOWLEDGE_TREE, get_template_prefix(prompts.knowledge_tree_prompt_template)),
+    (PromptKind.FORMAT,         get_template_prefix(prompts.format_prompt_template)),
+    (PromptKind.FACTS,          get_template_prefix(prompts.extract_facts_prompt_template)),
+    (PromptKind.REFINE_INITIAL, get_template_prefix(refine_initial_prompt_template)),
+    (PromptKind.REFINE_COMBINE, get_template_prefix(refine_combine_prompt_template)),
+]
+
+MAX_SYNTHETIC_ITEMS = 20 # facts and triples in one response
+CHARS_PER_TOKEN = 4 # token estimation of synthetic responses
+
+@dataclass_json
+@dataclass
+class OfflineLlmParams:
+    """Parameters of offline LLM (secrets section 'offline_llm')"""
+    mode              : OfflineLlmMode
+    recordings_file   : str = os.path.join('.llm-recordings', 'recordings.jsonl')
+    latency           : Optional[float] = None # seconds, recorded latency is used for replay if not set
+    token_latency     : float = 0 # seconds per completion token (added to latency)
+    jitter            : float = 0 # part of latency
+    synthetic_on_miss : bool = True # replay: synthetic response for prompt which was not recorded
+    seed              : int = 42
+
+@dataclass_json
+@dataclass
+class LlmRecording:
+    """Recorded prompt and response"""
+    key               : str
+    model_name        : str
+    prompt            : str
+    response          : str
+    latency           : float
+    prompt_tokens     : int
+    completion_tokens : int
+
+class LlmRecordings:
+    """Recorded responses (JSON lines), file is appended by record mode"""
+
+    file_name    : str
+    __recordings : dict[str, LlmRecording]
+    __lock       : threading.Lock
+
+    def __init__(self, file_name : str):
+        self.file_name = file_name
+        self.__lock = threading.Lock()
+        self.__recordings = {}
+        if os.path.isfile(file_name):
+            with open(file_name, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        recording = LlmRecording.from_json(line) # pylint: disable=E1101
+                        self.__recordings[recording.key] = recording
+
+    @staticmethod
+    def get_key(model_name : str, prompt : str) -> str:
+        """Key of prompt"""
+        return get_text_digest(model_name, prompt)
+
+    def get(self, key : str) -> Optional[LlmRecording]:
+        """Recording by key"""
+        with self.__lock:
+            return self.__recordings.get(key)
+
+    def add(self, recording : LlmRecording):
+        """Save recording"""
+        with self.__lock:
+            self.__recordings[recording.key] = recording
+            folder = os.path.dirname(self.file_name)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(self.file_name, 'at', encoding='utf-8') as f:
+                f.write(recording.to_json() + '\n') # pylint: disable=E1101
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__recordings)
+
+def get_prompt_kind(prompt : str) -> Optional[PromptKind]:
+    """Kind of application prompt"""
+    for kind, prefix in PROMPT_PREFIXES:
+        if prompt.startswith(prefix):
+            return kind
+    return None
+
+def get_tag_value(prompt : str, tag : str) -> str:
+    """Text inside of XML tag (the last one, examples can be before it)"""
+    start_index = prompt.rfind(f'<{tag}>')
+    if start_index == -1:
+        return ''
+    start_index += len(tag) + 2
+    end_index = prompt.find(f'</{tag}>', start_index)
+    return prompt[start_index : end_index if end_index != -1 else len(prompt)].strip()
+
+def get_sentences(text : str) -> list[str]:
+    """Split text into sentences"""
+    return [s.strip() for s in re.split(r'(?<=[.!?])\s+|\n+', text) if len(s.strip()) > 1]
+
+def get_words(text : str) -> set[str]:
+    """Lowercase words"""
+    return set(re.findall(r'\w{3,}', text.lower()))
+
+def get_overlap(query : str, text : str) -> float:
+    """Part of query words found in text"""
+    query_words = get_words(query)
+    if not query_words:
+        return 0
+    return len(query_words & get_words(text)) / len(query_words)
+
+def get_best_sentence(question : str, text : str) -> tuple[str, float]:
+    """Sentence with most words of question"""
+    best = ('', 0.0)
+    for sentence in get_sentences(text):
+        overlap = get_overlap(question, sentence)
+        if overlap > best[1]:
+            best = (sentence, overlap)
+    return best
+
+def get_synthetic_response(prompt : str) -> str:
+    """Deterministic response in the format expected by the prompt"""
+    kind = get_prompt_kind(prompt)
+
+    if kind == PromptKind.RELEVANCE:
+        score = round(get_overlap(get_tag_value(prompt, 'query'), get_tag_value(prompt, 'content')), 2)
+        return json.dumps({'score': score, 'explanation': f'{score:.0%} of query words are found in content'})
+
+    if kind == PromptKind.KNOWLEDGE_TREE:
+        triples = []
+        for sentence in get_sentences(get_tag_value(prompt, 'text'))[:MAX_SYNTHETIC_ITEMS]:
+            words = sentence.split()
+            if len(words) < 3:
+                continue
+            triples.append({'Subject': ' '.join(words[:2]), 'Predicate': words[2], 'Objects': [{'object': ' '.join(words[3:])}]})
+        return json.dumps({'triples': triples})
+
+    if kind == PromptKind.FORMAT:
+        paragraphs = [p.strip() for p in get_tag_value(prompt, 'input_text').split('\n') if p.strip()]
+        html = ''.join(f'<h1>{p}</h1>' if index == 0 else f'<p>{p}</p>' for index, p in enumerate(paragraphs))
+        return f'<output_text>\n{html}\n</output_text>'
+
+    if kind == PromptKind.FACTS:
+        sentences = get_sentences(get_tag_value(prompt, 'input_text'))
+        facts = [{'fact': sentence, 'score': 1} for sentence in sentences[:MAX_SYNTHETIC_ITEMS]]
+        return json.dumps({'relevant_facts': facts, 'count_other_facts': max(0, len(sentences) - len(facts))})
+
+    if kind == PromptKind.REFINE_INITIAL:
+        sentence, overlap = get_best_sentence(get_tag_value(prompt, 'question'), get_tag_value(prompt, 'input_text'))
+        return json.dumps({'score': round(overlap, 2), 'answer': sentence if overlap > 0 else NO_ANSWER_STR})
+
+    if kind == PromptKind.REFINE_COMBINE:
+        sentence, overlap = get_best_sentence(get_tag_value(prompt, 'question'), get_tag_value(prompt, 'more_context'))
+        existed_answer = get_tag_value(prompt, 'existed_answer')
+        if overlap == 0 or sentence in existed_answer:
+            return json.dumps({'not_useful': True, 'refined_answer': ''})
+        return json.dumps({'not_useful': False, 'refined_answer': f'{existed_answer} {sentence}'})
+
+    return json.dumps({'answer': get_sentences(prompt)[-1] if get_sentences(prompt) else ''})
+
+class OfflineChatModel(BaseChatModel):
+    """Chat model which records, replays or synthesizes responses"""
+
+    params      : Any # OfflineLlmParams
+    model_name  : str
+    max_tokens  : int = 1000
+    recordings  : Any = None # LlmRecordings
+    llm         : Any = None # real model (record mode)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'offline-chat'
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {'model_name': self.model_name, 'mode': self.params.mode.value}
+
+    def _generate(self, messages : list[BaseMessage], stop : Optional[list[str]] = None, run_manager : Any = None, **kwargs : Any) -> ChatResult:
+        prompt = '\n'.join(str(message.content) for message in messages)
+        key = LlmRecordings.get_key(self.model_name, prompt)
+
+        if self.params.mode == OfflineLlmMode.RECORD:
+            return self.__record(key, prompt, messages, stop, **kwargs)
+
+        recording = self.recordings.get(key) if self.params.mode == OfflineLlmMode.REPLAY else None
+        if recording:
+            response = recording.response
+            prompt_tokens, completion_tokens = recording.prompt_tokens, recording.completion_tokens
+            latency = recording.latency if self.params.latency is None else self.params.latency
+        else:
+            if self.params.mode == OfflineLlmMode.REPLAY:
+                if not self.params.synthetic_on_miss:
+                    raise KeyError(f'Prompt was not recorded: {prompt[:100]}...')
+                logger.warning(f'Prompt was not recorded, synthetic response is used: {prompt[:100]}...')
+            response = get_synthetic_response(prompt)
+            prompt_tokens, completion_tokens = len(prompt) // CHARS_PER_TOKEN, len(response) // CHARS_PER_TOKEN
+            latency = self.params.latency or 0
+
+        self.__sleep(key, latency + self.params.token_latency * completion_tokens)
+        return self.__get_result(response, prompt_tokens, completion_tokens)
+
+    def __record(self, key : str, prompt : str, messages : list[BaseMessage], stop : Optional[list[str]], **kwargs : Any) -> ChatResult:
+        start = time.perf_counter()
+        # real model is called directly, so token usage is counted once by callbacks of this model
+        result : ChatResult = self.llm._generate(messages, stop=stop, **kwargs) # pylint: disable=W0212
+        latency = time.perf_counter() - start
+        token_usage = (result.llm_output or {}).get('token_usage') or {}
+        self.recordings.add(LlmRecording(
+            key,
+            self.model_name,
+            prompt,
+            result.generations[0].message.content,
+            latency,
+            token_usage.get('prompt_tokens', 0),
+            token_usage.get('completion_tokens', 0)
+        ))
+        return result
+
+    def __sleep(self, key : str, latency : float):
+        if latency <= 0:
+            return
+        # jitter depends on prompt, so replay is repeatable
+        rng = random.Random(f'{self.params.seed}:{key}')
+        time.sleep(max(0.0, latency + rng.uniform(-self.params.jitter, self.params.jitter) * latency))
+
+    def __get_result(self, response : str, prompt_tokens : int, completion_tokens : int) -> ChatResult:
+        # the same llm_output as OpenAI model, so token usage and cost are counted by openai callback
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=response))],
+            llm_output={
+                'token_usage': {
+                    'prompt_tokens'     : prompt_tokens,
+                    'completion_tokens' : completion_tokens,
+                    'total_tokens'      : prompt_tokens + completion_tokens
+                },
+                'model_name': self.model_name
+            }
+        )
+
+class OfflineLlm:
+    """Creates offline chat models, recordings are shared by all models"""
+
+    params     : OfflineLlmParams
+    recordings : Optional[LlmRecordings]
+
+    def __init__(self, params : OfflineLlmParams):
+        self.params = params
+        self.recordings = None
+        if params.mode in [OfflineLlmMode.RECORD, OfflineLlmMode.REPLAY]:
+            self.recordings = LlmRecordings(params.recordings_file)
+            logger.info(f'Offline LLM ({params.mode.value}): {len(self.recordings)} recording(s) in {params.recordings_file}')
+
+    def create_llm(self, model_name : str, max_tokens : int, llm : Optional[BaseChatModel] = None) -> OfflineChatModel:
+        """Create chat model, real model is required for record mode"""
+        if self.params.mode == OfflineLlmMode.RECORD and llm is None:
+            raise ValueError('Real LLM is required to record responses')
+        return OfflineChatModel(
+            params     = self.params,
+            model_name = model_name,
+            max_tokens = max_tokens,
+            recordings = self.recordings,
+            llm        = llm,
+            cache      = False # responses are not taken from LLM cache, so latency is measured
+        )
@@ -6,12 +6,14 @@
 import logging
 import traceback
 from dataclasses import dataclass
+from typing import Iterator
 
 from langchain_community.callbacks import get_openai_callback
 from langchain.prompts.prompt import PromptTemplate
 from langchain.chains import LLMChain
 
 from core.llm.llm_json_parser import get_llm_json
+from core.tracing import trace_span, add_llm_usage
 
 logger : logging.Logger = logging.getLogger()
 
@@ -82,16 +84,33 @@ class RefineAnswerChain():
 
     def run(self, question : str, docs : list[str]) -> RefineAnswerResult:
         """Run refine"""
+        result = RefineAnswerResult("", 0, False)
+        for result in self.__iter_steps(question, docs):
+            pass
+        return result
+
+    def iter_run(self, question : str, docs : list[str]) -> Iterator[RefineAnswerResult]:
+        """Run refine, answer is returned once when it's found or refined, last result is final"""
+        yielded_answer = None
+        for result in self.__iter_steps(question, docs):
+            if result.error or result.answer != yielded_answer:
+                yielded_answer = result.answer
+                yield result
+
+    def __iter_steps(self, question : str, docs : list[str]) -> Iterator[RefineAnswerResult]:
+        """Answer after each accepted step, last result has all used tokens"""
         tokens_used = 0
 
         logger.info(f"Run answer extraction question: [{question}]")
         try:
             # find first userful document with answers
             processed_doc_index = 0
+            answer = ""
             for doc in docs:
                 logger.info(f'Process doc #{processed_doc_index+1} (document size={len(doc)})')
-                with get_openai_callback() as cb:
+                with trace_span('llm.refine_initial', input_chars= len(doc)) as span, get_openai_callback() as cb:
                     answer_result = self.refine_initial_chain.run(question = question, input_text = docs[processed_doc_index], no_answer = NO_ANSWER_STR)
+                    add_llm_usage(span, cb)
                 tokens_used += cb.total_tokens
                 logger.debug(answer_result)
 
@@ -103,11 +122,14 @@ class RefineAnswerChain():
                 if answer and answer != NO_ANSWER_STR:
                     break
 
+            yield RefineAnswerResult(answer, tokens_used, False)
+
             # try to extend answer if possible
             for doc in docs[processed_doc_index:]:
                 logger.info(f'Process doc #{processed_doc_index+1} (document size={len(doc)})')
-                with get_openai_callback() as cb:
+                with trace_span('llm.refine_combine', input_chars= len(doc)) as span, get_openai_callback() as cb:
                     refine_result = self.refine_combine_chain.run(question = question, existed_answer = answer, more_context = doc)
+                    add_llm_usage(span, cb)
                 tokens_used += cb.total_tokens
                 logger.debug(refine_result)
                 refined_json = get_llm_json(refine_result)
@@ -115,11 +137,12 @@ class RefineAnswerChain():
                 if refined_useful:
                     answer = refined_json["refined_answer"]
                     logger.info('Refined answer was accepted')
+                    yield RefineAnswerResult(answer, tokens_used, False)
                 else:
                     logger.info('Refined answer was rejected')
-            
-            return RefineAnswerResult(answer, tokens_used, False)
+
+            yield RefineAnswerResult(answer, tokens_used, False)
         except Exception as error: # pylint: disable=W0718
             logger.exception(error)
             logger.error(traceback.format_exc())
-            return RefineAnswerResult("", tokens_used, True)
+            yield RefineAnswerResult("", tokens_used, True)
@@ -5,7 +5,10 @@
 # pylint: disable=C0301,C0103,C0304,C0303,W0611,W0511,R0913,R0402,W1203
 
 import os
+import hashlib
+import threading
 from dataclasses import dataclass
+from typing import Iterator, Optional
 import logging
 
 from langchain.prompts.prompt import PromptTemplate
@@ -21,9 +24,15 @@ import core.llm.prompts as prompts
 from core.llm.llm_json_parser import get_llm_json
 from core.llm.llm_xml_parser import parse_llm_xml
 from core.llm.refine_answer import RefineAnswerChain, RefineAnswerResult
+from core.llm.offline_llm import OfflineLlm, OfflineLlmParams, OfflineLlmMode
+from core.tracing import trace_span, add_llm_usage
 
 logger : logging.Logger = logging.getLogger()
 
+def get_prompt_version(prompt_template : str) -> str:
+    """Short digest of prompt template, it's changed with any change of prompt"""
+    return hashlib.sha1(prompt_template.encode("utf-8")).hexdigest()[:12]
+
 class LlmError(Exception):
     """Lmm related exception"""
 
@@ -75,6 +84,7 @@ class LlmManager():
 
     openai_api_type : str
     openai_api_deployment : str
+    offline_llm : Optional[OfflineLlm] # benchmarks and load tests without LLM endpoint
 
     llm_answer   : ChatOpenAI
     relevance_llm : ChatOpenAI
@@ -104,6 +114,12 @@ class LlmManager():
 
         self.init_openai_environment(all_secrets)
 
+        self.offline_llm = None
+        offline_llm_secrets = all_secrets.get('offline_llm') if all_secrets else None
+        if offline_llm_secrets:
+            self.offline_llm = OfflineLlm(OfflineLlmParams.from_dict(offline_llm_secrets)) # pylint: disable=E1101
+            logger.info(f'Run with offline LLM ({self.offline_llm.params.mode.value})')
+
         self.llm_answer = None
         self.relevance_llm  = None
         self.relevance_prompt = None
@@ -117,6 +133,8 @@ class LlmManager():
         self.facts_llm    = None
         self.facts_prompt = None
         self.facts_chain  = None
+        # manager is shared by sessions, chains are created once
+        self.__init_lock = threading.Lock()
 
     def init_openai_environment(self, all_secrets : dict[str, any]):
         """Inint OpenAI or Azure environment"""
@@ -128,6 +146,8 @@ class LlmManager():
  
         # read from secrets
         self.openai_api_type = all_secrets.get('OPENAI_API_TYPE')
+        if not self.openai_api_type and all_secrets.get('offline_llm'):
+            return
 
         if self.openai_api_type == 'openai':
             openai_secrets = all_secrets.get('open_api_openai')
@@ -164,12 +184,29 @@ class LlmManager():
     def get_model_name(self):
         """Return model name"""
         return self._BASE_MODEL_NAME
+
+    def get_fact_list_version(self) -> str:
+        """Model and prompt version of fact extraction (part of key of shared facts)"""
+        return f'{self._BASE_MODEL_NAME}:{get_prompt_version(prompts.extract_facts_prompt_template)}'
+
+    def get_format_version(self) -> str:
+        """Model and prompt version of LLM formatting (part of key of shared formatted text)"""
+        return f'{self._BASE_MODEL_NAME}:{get_prompt_version(prompts.format_prompt_template)}'
     
     def create_llm(self, max_tokens : int, model_name : str = "") -> ChatOpenAI:
-        """Create LLM"""
+        """Create LLM (offline model if it's configured)"""
         if not model_name:
             model_name = self._BASE_MODEL_NAME
 
+        if self.offline_llm:
+            real_llm = None
+            if self.offline_llm.params.mode == OfflineLlmMode.RECORD:
+                real_llm = self.__create_openai_llm(max_tokens, model_name)
+            return self.offline_llm.create_llm(model_name, max_tokens, real_llm)
+
+        return self.__create_openai_llm(max_tokens, model_name)
+
+    def __create_openai_llm(self, max_tokens : int, model_name : str) -> ChatOpenAI:
         if self.openai_api_type == 'openai':
             return ChatOpenAI(
                 model_name     = model_name,
@@ -203,16 +240,18 @@ class LlmManager():
     def get_relevance_score(self, query : str, content : str) -> LlmRelevanceScore:
         """Get relevance score betwee query and content"""
 
-        if not self.relevance_llm:
-            self.relevance_llm = self.create_llm(max_tokens= 1000)
-            self.relevance_prompt = PromptTemplate.from_template(prompts.relevance_prompt_template)
-            self.relevance_chain  = self.relevance_prompt | self.relevance_llm | StrOutputParser()
+        with self.__init_lock:
+            if not self.relevance_chain:
+                self.relevance_llm = self.create_llm(max_tokens= 1000)
+                self.relevance_prompt = PromptTemplate.from_template(prompts.relevance_prompt_template)
+                self.relevance_chain  = self.relevance_prompt | self.relevance_llm | StrOutputParser()
 
-        with get_openai_callback() as llm_callback:
+        with trace_span('llm.relevance', content_chars= len(content)) as span, get_openai_callback() as llm_callback:
             relevance_result = self.relevance_chain.invoke({
                     "query" : query, 
                     "content" : content
                 })
+            add_llm_usage(span, llm_callback)
         try:
             relevance_json = get_llm_json(relevance_result)
             return LlmRelevanceScore(
@@ -227,26 +266,34 @@ class LlmManager():
             
     def build_answer(self, question : str, chunk_list : list[str]) -> RefineAnswerResult:
         """Build LLM summary"""
+        return self.__get_refine_chain().run(question, chunk_list)
+
+    def iter_answer(self, question : str, chunk_list : list[str]) -> Iterator[RefineAnswerResult]:
+        """Build LLM summary, answer is returned each time it's refined (last one is final)"""
+        return self.__get_refine_chain().iter_run(question, chunk_list)
 
-        if not self.llm_answer:
-            self.llm_answer = self.create_llm(max_tokens= 1000)
-        refine_chain = RefineAnswerChain(self.llm_answer)
-        return refine_chain.run(question, chunk_list)
+    def __get_refine_chain(self) -> RefineAnswerChain:
+        with self.__init_lock:
+            if not self.llm_answer:
+                self.llm_answer = self.create_llm(max_tokens= 1000)
+        return RefineAnswerChain(self.llm_answer)
 
     def build_knowledge_tree(self, input_str : str) -> LlmKnowledgeTree:
         """Build knowledge tree"""
         
         logger.info("Build KT")
 
-        if not self.kt_llm:
-            self.kt_llm = self.create_llm(max_tokens= 1000, model_name= self._KT_MODEL_NAME)
-            self.kt_prompt = PromptTemplate.from_template(prompts.knowledge_tree_prompt_template)
-            self.kt_chain  = self.kt_prompt | self.kt_llm | StrOutputParser()
+        with self.__init_lock:
+            if not self.kt_chain:
+                self.kt_llm = self.create_llm(max_tokens= 1000, model_name= self._KT_MODEL_NAME)
+                self.kt_prompt = PromptTemplate.from_template(prompts.knowledge_tree_prompt_template)
+                self.kt_chain  = self.kt_prompt | self.kt_llm | StrOutputParser()
 
-        with get_openai_callback() as llm_callback:
+        with trace_span('llm.knowledge_tree', input_chars= len(input_str)) as span, get_openai_callback() as llm_callback:
             kt_result = self.kt_chain.invoke({
                     "text" : input_str
                 })
+            add_llm_usage(span, llm_callback)
         token_used = llm_callback.total_tokens
 
         logger.debug(kt_result)
@@ -277,15 +324,17 @@ class LlmManager():
 
     def run_llm_format(self, input_text : str) -> LlmFormatResult:
         """Run LLM format for text"""
-        if not self.format_llm:
-            self.format_llm    = self.create_llm(max_tokens= 1000)
-            self.format_prompt = PromptTemplate.from_template(prompts.format_prompt_template)
-            self.format_chain  = self.format_prompt | self.format_llm | StrOutputParser()
+        with self.__init_lock:
+            if not self.format_chain:
+                self.format_llm    = self.create_llm(max_tokens= 1000)
+                self.format_prompt = PromptTemplate.from_template(prompts.format_prompt_template)
+                self.format_chain  = self.format_prompt | self.format_llm | StrOutputParser()
 
-        with get_openai_callback() as llm_callback:
+        with trace_span('llm.format', input_chars= len(input_text)) as span, get_openai_callback() as llm_callback:
             format_result = self.format_chain.invoke({
                     "input_text" : input_text
                 })
+            add_llm_usage(span, llm_callback)
 
         logger.debug(f'FORMATTED: {format_result}')
 
@@ -296,10 +345,11 @@ class LlmManager():
         """Run LLM fact extractor"""
         max_tokens = 1500
 
-        if not self.facts_llm:
-            self.facts_llm = self.create_llm(max_tokens= max_tokens)
-            self.facts_prompt = PromptTemplate.from_template(prompts.extract_facts_prompt_template)
-            self.facts_chain  = self.facts_prompt | self.facts_llm | StrOutputParser()
+        with self.__init_lock:
+            if not self.facts_chain:
+                self.facts_llm = self.create_llm(max_tokens= max_tokens)
+                self.facts_prompt = PromptTemplate.from_template(prompts.extract_facts_prompt_template)
+                self.facts_chain  = self.facts_prompt | self.facts_llm | StrOutputParser()
 
         text_splitter = TokenTextSplitter(chunk_size=max_tokens-100, chunk_overlap=20)
         texts = text_splitter.split_text(input_text)
@@ -310,11 +360,12 @@ class LlmManager():
         for chunk_text in texts:
             facts_result = ''
             try:
-                with get_openai_callback() as llm_callback:
+                with trace_span('llm.facts', input_chars= len(chunk_text)) as span, get_openai_callback() as llm_callback:
                     facts_result = self.facts_chain.invoke({
                             "input_text" : chunk_text,
                             "context"    : context
                         })
+                    add_llm_usage(span, llm_callback)
                 total_tokens += llm_callback.total_tokens
             except Exception as error_llm: # pylint: disable=W0718
                 error_list.append(str(error_llm))
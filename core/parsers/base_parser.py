@@ -6,7 +6,14 @@
 
 from abc import abstractmethod
 import os
-from dataclasses import dataclass
+from enum import Enum
+from typing import Iterable, Optional
+from dataclasses import dataclass, field
+
+class HtmlParserBackend(Enum):
+    """Backends of html parser"""
+    BS4  = "BeautifulSoup (html.parser)" # default
+    LXML = "lxml (fast)" # the same text except of implicitly closed elements (see HtmlParser)
 
 @dataclass
 class DocumentParserHTMLParams:
@@ -14,11 +21,32 @@ class DocumentParserHTMLParams:
     combine_html_headers : bool # combine HTML headers
     excluded_names       : list[str] # to exclude html names
     tag_to_remove        : list[str]
+    backend              : HtmlParserBackend = HtmlParserBackend.BS4
+
+class PdfParserBackend(Enum):
+    """Backends of pdf parser"""
+    PYPDF    = "pypdf"
+    PDFIUM   = "pypdfium2 (fast)"
+    PDFMINER = "pdfminer (layout analysis)"
+
+@dataclass
+class DocumentParserPDFParams:
+    """Params how to parse PDF"""
+    backend     : PdfParserBackend = PdfParserBackend.PYPDF
+    # layout analysis (only for pdfminer), see pdfminer.layout.LAParams
+    line_margin : float = 0.5
+    char_margin : float = 2.0
+    word_margin : float = 0.1
+    boxes_flow  : float = 0.5
+    # big documents are split into page ranges and extracted in worker processes
+    parallel_min_pages : int = 200 # 0 - always serial
+    max_workers        : Optional[int] = None # None - count of CPUs
 
 @dataclass
 class DocumentParserParams:
     """Parser parameters"""
     html_params : DocumentParserHTMLParams
+    pdf_params  : DocumentParserPDFParams = field(default_factory=DocumentParserPDFParams)
 
 @dataclass
 class DocumentContentItem:
@@ -31,7 +59,7 @@ class DocumentContentItem:
 @dataclass
 class DocumentParserResult:
     """Result of parsing"""
-    content : list[DocumentContentItem]
+    content : Iterable[DocumentContentItem] # list or generator (pages are extracted one at a time)
     message : str
     error   : str
 
@@ -6,9 +6,12 @@
 from enum import Enum
 from abc import abstractmethod
 from dataclasses import dataclass
+from typing import Callable, Iterable
 
 from langchain.docstore.document import Document
 
+from core.parsers.chunk_splitters.chunk_record import ChunkRecord, PageMetaPool, chunks_to_documents
+
 class ChunkSplitterMode(Enum):
     """Chunk splitter modes"""
     TOKEN_MODE = "TokenChunkSplitter"
@@ -36,6 +39,30 @@ class BaseChunkSplitter():
         self.splitter_params = splitter_params
 
     @abstractmethod
-    def split_into_documents(self, input_with_meta : list[tuple[str, dict]]) -> list[Document]:
-        """Split input into chunks"""
+    def split_into_chunks(self, input_with_meta : Iterable[tuple[str, dict]]) -> list[ChunkRecord]:
+        """Split input into chunk records"""
+
+    def split_into_documents(self, input_with_meta : Iterable[tuple[str, dict]]) -> list[Document]:
+        """Split input into chunks Documents"""
+        return chunks_to_documents(self.split_into_chunks(input_with_meta))
+
+    def _build_chunk_records(
+            self,
+            input_with_meta : Iterable[tuple[str, dict]],
+            split_text_call : Callable[[str], list[str]],
+            with_offset : bool = True
+        ) -> list[ChunkRecord]:
+        """Split each input text and build chunk records with shared page metadata"""
+        meta_pool = PageMetaPool()
+        chunks = list[ChunkRecord]()
+        for input_text, input_meta in input_with_meta:
+            page_meta = meta_pool.intern(input_meta)
+            index = -1
+            for chunk in split_text_call(input_text):
+                offset = None
+                if with_offset:
+                    index = input_text.find(chunk, index + 1)
+                    offset = index
+                chunks.append(ChunkRecord(chunk, page_meta, offset))
+        return chunks
 
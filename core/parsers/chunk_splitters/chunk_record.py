@@ -0,0 +1,76 @@
+"""
+    Compact chunk record
+"""
+
+# pylint: disable=R0903,C0305,C0301
+
+import sys
+import json
+from typing import Optional
+
+from langchain.docstore.document import Document
+
+class PageMetaPool:
+    """Pool of shared (interned) per-page metadata"""
+
+    __pool : dict[str, dict]
+
+    def __init__(self):
+        self.__pool = dict[str, dict]()
+
+    def intern(self, meta : dict) -> dict:
+        """Return shared metadata dict equal to meta. Result must not be changed by caller"""
+        if not meta:
+            meta = {}
+        key = json.dumps(meta, sort_keys=True, default=str)
+        shared_meta = self.__pool.get(key)
+        if shared_meta is None:
+            shared_meta = {
+                sys.intern(k) : sys.intern(v) if isinstance(v, str) else v
+                for k, v in meta.items()
+            }
+            self.__pool[key] = shared_meta
+        return shared_meta
+
+    def __len__(self):
+        return len(self.__pool)
+
+class ChunkRecord:
+    """One chunk: text, shared page metadata and offset inside of page"""
+
+    __slots__ = ('content', 'page_meta', 'offset', 'chunk_file_name', 'extra_meta')
+
+    content         : str
+    page_meta       : dict
+    offset          : Optional[int]
+    chunk_file_name : Optional[str]
+    extra_meta      : Optional[dict] # chunk specific metadata (rare)
+
+    def __init__(self, content : str, page_meta : dict, offset : Optional[int] = None):
+        self.content   = content
+        self.page_meta = page_meta
+        self.offset    = offset
+        self.chunk_file_name = None
+        self.extra_meta = None
+
+    def get_metadata(self) -> dict:
+        """Build metadata of chunk (page metadata + chunk related fields)"""
+        meta = dict(self.page_meta)
+        if self.extra_meta:
+            meta.update(self.extra_meta)
+        if self.offset is not None:
+            meta["p_offset"] = self.offset
+        if self.chunk_file_name:
+            meta["chunk_file_name"] = self.chunk_file_name
+        return meta
+
+    def to_document(self) -> Document:
+        """Convert into langchain Document (only for vector store)"""
+        return Document(page_content= self.content, metadata= self.get_metadata())
+
+    def __repr__(self):
+        return f'ChunkRecord(offset={self.offset}, content={self.content[:30]!r})'
+
+def chunks_to_documents(chunks : list[ChunkRecord]) -> list[Document]:
+    """Convert chunk records into langchain Documents"""
+    return [chunk.to_document() for chunk in chunks]
@@ -4,25 +4,34 @@
 
 # pylint: disable=R0903,C0305,C0301
 
-import copy
+from typing import Iterable, Optional
 
 import tiktoken
 from tiktoken.core import Encoding
 
-from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
 
 from core.parsers.chunk_splitters.base_splitter import BaseChunkSplitter, ChunkSplitterParams
+from core.parsers.chunk_splitters.chunk_record import ChunkRecord
+from core.facts.fact_clustering import normalize_embeddings
+from core.facts.fact_dedup import dedup_facts
 
 class FactChunkSplitter(BaseChunkSplitter):
     """Split text into chunks based on tokens"""
 
     encoding : Encoding
     fact_line_separator : str
+    dedup_threshold : float
+    embeddings : Optional[Embeddings]
+    removed_duplicate_count : int
 
-    def __init__(self, splitter_params : ChunkSplitterParams, fact_line_separator : str):
+    def __init__(self, splitter_params : ChunkSplitterParams, fact_line_separator : str, dedup_threshold : float = 0, embeddings : Optional[Embeddings] = None):
         super().__init__(splitter_params)
         self.encoding = tiktoken.encoding_for_model(splitter_params.model_name)
         self.fact_line_separator = fact_line_separator
+        self.dedup_threshold = dedup_threshold
+        self.embeddings = embeddings
+        self.removed_duplicate_count = 0
 
     def split_text_by_fact_line(self, text: str) -> list[str]:
         """Split incoming text by fact line"""
@@ -30,21 +39,25 @@ class FactChunkSplitter(BaseChunkSplitter):
         splits= [s.strip() for s in splits if s.strip()]
         return splits
 
-    def split_into_documents(self, input_with_meta : list[tuple([str, {}])]) -> list[Document]:
-        """Split input into chunks Documents"""
-        documents = list[Document]()
-        for input_item in input_with_meta:
-            index = -1
-            input_text = input_item[0]
-            input_meta = input_item[1]
-            for chunk in self.split_text_by_fact_line(input_text):
-                if input_meta:
-                    meta = copy.deepcopy(input_meta)
-                else:
-                    meta = {}
-                index = input_text.find(chunk, index + 1)
-                meta["p_offset"] = index
-                new_doc = Document(page_content=chunk, metadata= meta)
-                documents.append(new_doc)
-
-        return documents
+    def split_into_chunks(self, input_with_meta : Iterable[tuple[str, dict]]) -> list[ChunkRecord]:
+        """Split input into chunk records"""
+        chunks = self._build_chunk_records(input_with_meta, self.split_text_by_fact_line)
+        if self.dedup_threshold > 0 and self.embeddings and chunks:
+            chunks = self.__remove_near_duplicates(chunks)
+        return chunks
+
+    def __remove_near_duplicates(self, chunks : list[ChunkRecord]) -> list[ChunkRecord]:
+        """Collapse near-duplicate facts, sources of collapsed facts are kept in metadata"""
+        normalized_embeddings = normalize_embeddings(self.embeddings.embed_documents([c.content for c in chunks]))
+        dedup_result = dedup_facts(normalized_embeddings, self.dedup_threshold)
+
+        result = list[ChunkRecord]()
+        for kept_index, duplicate_index_list in zip(dedup_result.kept_index_list, dedup_result.duplicate_index_list):
+            chunk = chunks[kept_index]
+            if len(duplicate_index_list) > 1:
+                duplicate_sources = {chunks[i].page_meta.get("p_source") for i in duplicate_index_list}
+                chunk.extra_meta = {"duplicate_sources" : sorted(s for s in duplicate_sources if s)}
+            result.append(chunk)
+
+        self.removed_duplicate_count = len(chunks) - len(result)
+        return result
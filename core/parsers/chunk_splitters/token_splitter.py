@@ -4,14 +4,13 @@
 
 # pylint: disable=R0903,C0305,C0301
 
-import copy
+from typing import Iterable
 
 import tiktoken
 from tiktoken.core import Encoding
 
-from langchain.docstore.document import Document
-
 from core.parsers.chunk_splitters.base_splitter import BaseChunkSplitter, ChunkSplitterParams
+from core.parsers.chunk_splitters.chunk_record import ChunkRecord
 
 class TokenChunkSplitter(BaseChunkSplitter):
     """Split text into chunks based on tokens"""
@@ -42,21 +41,6 @@ class TokenChunkSplitter(BaseChunkSplitter):
             chunk_ids = input_ids[start_index:cur_index]
         return splits
 
-    def split_into_documents(self, input_with_meta : list[tuple[str, dict]]) -> list[Document]:
-        """Split input into chunks Documents"""
-        documents = list[Document]()
-        for input_item in input_with_meta:
-            index = -1
-            input_text = input_item[0]
-            input_meta = input_item[1]
-            for chunk in self.split_text_on_tokens(input_text):
-                if input_meta:
-                    meta = copy.deepcopy(input_meta)
-                else:
-                    meta = {}
-                index = input_text.find(chunk, index + 1)
-                meta["p_offset"] = index
-                new_doc = Document(page_content=chunk, metadata= meta)
-                documents.append(new_doc)
-
-        return documents
+    def split_into_chunks(self, input_with_meta : Iterable[tuple[str, dict]]) -> list[ChunkRecord]:
+        """Split input into chunk records"""
+        return self._build_chunk_records(input_with_meta, self.split_text_on_tokens)
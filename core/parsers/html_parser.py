@@ -5,10 +5,15 @@
 # pylint: disable=C0301,C0103,C0304,C0303,C0305,W0611,W0511,R0903,C0411
 
 import re
+from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional
 from bs4 import BeautifulSoup, Tag, Comment, Doctype
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from core.parsers.base_parser import DocumentContentItem, DocumentParserResult, BaseParser, DocumentParserParams
+import lxml.html
+from lxml import etree
+
+from core.parsers.base_parser import DocumentContentItem, DocumentParserResult, BaseParser, DocumentParserParams, HtmlParserBackend
 
 @dataclass
 class HtmlItem:
@@ -55,6 +60,137 @@ def is_excluded_id_or_class(tag : Tag, excluded_names : list[str]):
                     return True
     return False
 
+@lru_cache(maxsize=32)
+def get_excluded_xpath(excluded_name_count : int) -> Optional[etree.XPath]:
+    """Precompiled XPath with the same rule as is_excluded_id_or_class, names are passed as $n0, $n1..."""
+    conditions = []
+    for index in range(excluded_name_count):
+        conditions.append(f'contains(name(), $n{index}) or contains(@id, $n{index}) or contains(@class, $n{index})')
+    if not conditions:
+        return None
+    return etree.XPath(f'//*[{" or ".join(conditions)}]')
+
+def iter_soup_contents(tag : Tag) -> Iterator[tuple[Optional[str], Any]]:
+    """Contents of BeautifulSoup tag as (name, item), name is None for text"""
+    for item in tag.contents:
+        if item.name is None:
+            if isinstance(item, (Doctype, Comment)):
+                continue
+            yield None, item
+        elif item.name:
+            yield item.name, item
+
+def get_soup_text(tag : Tag) -> str:
+    """Text of BeautifulSoup tag"""
+    return str(tag.text)
+
+def iter_lxml_contents(element : etree.ElementBase) -> Iterator[tuple[Optional[str], Any]]:
+    """Contents of lxml element as (name, item), name is None for text"""
+    if element.text:
+        yield None, element.text
+    for child in element:
+        # comments and processing instructions have no string tag, but their tail is content
+        if isinstance(child.tag, str):
+            yield child.tag, child
+        if child.tail:
+            yield None, child.tail
+
+def get_lxml_text(element : etree.ElementBase) -> str:
+    """Text of lxml element (without own tail)"""
+    return ''.join(element.itertext())
+
+# BeautifulSoup keeps whitespace only in these tags
+PRESERVE_WHITESPACE_TAGS = ('pre', 'textarea')
+ASCII_SPACES = ' \n\t\f\r'
+# lxml drops content after </html>, end tags are replaced by comments (they split text as end tags do)
+DOCUMENT_END_TAG_RE = re.compile(r'</(?:body|html)\s*>', re.IGNORECASE)
+
+def collapse_whitespace(text : Optional[str]) -> Optional[str]:
+    """Whitespace-only text is collapsed into newline (or space if there is no newline) as BeautifulSoup does"""
+    if not text or text.strip(ASCII_SPACES):
+        return text
+    return '\n' if '\n' in text else ' '
+
+def collapse_lxml_whitespace(root : etree.ElementBase):
+    """Collapse whitespace-only text and tails of lxml tree (except of pre and textarea)"""
+    preserved = {descendant for element in root.iter(*PRESERVE_WHITESPACE_TAGS) for descendant in element.iter()}
+    for element in root.iter():
+        if element not in preserved:
+            element.text = collapse_whitespace(element.text)
+        if element is not root and element.getparent() not in preserved:
+            element.tail = collapse_whitespace(element.tail)
+
+HEADER_TAGS = ('h1', 'h2', 'h3', 'h4')
+
+@dataclass
+class HtmlSection:
+    """Header delimited section of html content"""
+    header : str
+    buffer : list[str] = field(default_factory=lambda: ['\n\n'])
+
+def extract_header_sections(
+        root : Any,
+        iter_contents : Callable[[Any], Iterator[tuple[Optional[str], Any]]] = iter_soup_contents,
+        get_text : Callable[[Any], str] = get_soup_text
+    ) -> list[tuple[str, str]]:
+    """
+        Extract (full header, text) sections. Iterative walk with list buffers (linear time, no recursion).
+        Text before the first header is ignored. Works with BeautifulSoup (default) or lxml tree.
+    """
+
+    h_stack  = HtmlHeaderStack()
+    sections = list[HtmlSection]()
+    buffer   = list[str]() # text before the first header
+    nonblank_count = 0 # count of appended non-whitespace pieces, to know if <li> has content
+
+    # frame: (children iterator, ul_count, li slot: (buffer, index, nonblank_count on enter, prefix) or None)
+    stack = [(iter_contents(root), 0, None)]
+    while stack:
+        children, ul_count, li_slot = stack[-1]
+        for name, item in children:
+            if name == 'br':
+                buffer.append('\n')
+            elif name == 'strong':
+                strong_text = get_text(item) + ' '
+                buffer.append(strong_text)
+                if strong_text.strip():
+                    nonblank_count += 1
+            elif name == 'li':
+                buffer.append('') # place for prefix, it's set only if <li> has content
+                li_prefix = '\n' + '-'*(ul_count+1) + ' '
+                stack.append((iter_contents(item), ul_count+1, (buffer, len(buffer)-1, nonblank_count, li_prefix)))
+                break
+            elif name is None:
+                text = item.strip()
+                if text:
+                    buffer.append(text + ' ')
+                    nonblank_count += 1
+            elif name in HEADER_TAGS:
+                h_stack.append_header(name, get_text(item))
+                buffer.append('\n\n')
+                section = HtmlSection(h_stack.get_full_header())
+                sections.append(section)
+                buffer = section.buffer
+                nonblank_count += 1
+            else:
+                stack.append((iter_contents(item), ul_count, None))
+                break
+        else:
+            # all children are processed
+            stack.pop()
+            if li_slot:
+                slot_buffer, slot_index, enter_nonblank_count, li_prefix = li_slot
+                if nonblank_count > enter_nonblank_count:
+                    slot_buffer[slot_index] = li_prefix
+
+    result = list[tuple[str, str]]()
+    for index, section in enumerate(sections):
+        text = ''.join(section.buffer).lstrip()
+        if index == len(sections) - 1 and text.endswith('\n'):
+            text = text[:-1]
+        result.append((section.header, text))
+    return result
+
 class HtmlParser(BaseParser):
     """Html parser class"""
 
@@ -68,27 +204,37 @@ class HtmlParser(BaseParser):
             with open(self.file_name, encoding="cp1251") as f:
                 page_content = f.read()
 
-        content_soup = self.__get_content_soup(
-                            page_content, 
-                            params.html_params.excluded_names,
-                            params.html_params.tag_to_remove
-                        )
+        if params.html_params.backend == HtmlParserBackend.LXML:
+            content_root = self.__get_content_lxml(
+                                page_content,
+                                params.html_params.excluded_names,
+                                params.html_params.tag_to_remove
+                            )
+            get_text = get_lxml_text
+            iter_contents = iter_lxml_contents
+        else:
+            content_root = self.__get_content_soup(
+                                page_content, 
+                                params.html_params.excluded_names,
+                                params.html_params.tag_to_remove
+                            )
+            get_text = get_soup_text
+            iter_contents = iter_soup_contents
             
         if not params.html_params.combine_html_headers:
-            content = content_soup.get_text()
+            content = get_text(content_root) if content_root is not None else ''
             message = f'Extract plain text from {self.base_file_name}'
             return DocumentParserResult([DocumentContentItem(self.base_file_name, content, 1, {})], message, None)
 
-        content = self.__extract_content(content_soup, 0, HtmlHeaderStack())
-        pattern = r'<HEADER>(.*?)<\/HEADER>\s*(.*?)(?=<HEADER>|$)'
-        matches = re.findall(pattern, content, re.DOTALL)
+        sections = []
+        if content_root is not None:
+            sections = extract_header_sections(content_root, iter_contents, get_text)
 
         result_content = list[DocumentContentItem]()
-        for index, header_match in enumerate(matches):
-            text = f'{header_match[0]}\n\n{header_match[1]}'
+        for index, (header, text) in enumerate(sections):
             result_content.append(DocumentContentItem(
                             self.base_file_name,
-                            text,
+                            f'{header}\n\n{text}',
                             index+1,
                             {}
                         )
@@ -117,35 +263,30 @@ class HtmlParser(BaseParser):
 
         return soup
 
-    def __extract_content(self, tag : Tag, ul_count : int, h_stack : HtmlHeaderStack) -> str:
-        """Extract content recurs."""
-
-        if tag.name in ['h1', 'h2', 'h3', 'h4']:
-            h_stack.append_header(tag.name, str(tag.text))
-            return f'\n\n<HEADER>{h_stack.get_full_header()}</HEADER>\n\n'
-
-        result = ''
-        for item in tag.contents:
-            if item.name == 'br':
-                result += '\n'
-            elif item.name == 'strong':
-                result += str(item.text) + ' '
-            elif item.name == 'li':
-                content = self.__extract_content(item, ul_count+1, h_stack)
-                if content.strip():
-                    li_prefix = '\n' + '-'*(ul_count+1) + ' '
-                    result += li_prefix + content
-            elif item.name is None:
-                if isinstance(item, (Doctype, Comment)):
-                    continue
-                text = item.strip()
-                if text:
-                    result += text + ' '
-            elif item.name:
-                content = self.__extract_content(item, ul_count, h_stack)
-                if content:
-                    result += content
-        return result
-
-    
-    
\ No newline at end of file
+    def __get_content_lxml(self, html_text : str, excluded_names : list[str], tag_to_remove : list[str]) -> Optional[etree.ElementBase]:
+        """
+            Get content with lxml: exclusion by precompiled XPath, removal of tags in C.
+            Text is the same as with BeautifulSoup (whitespace-only text is collapsed, content after </html> is kept), known differences:
+            - elements without end tag (<li>, <p>) are closed by lxml as browser does, html.parser nests next elements into them
+              (list level of <li> and separators of misnested headers differ);
+            - <head> after body content is ignored by lxml, so its text is not removed;
+            - whitespace before <body> is partly dropped by lxml (page is stripped by text extractor).
+        """
+        if not html_text.strip():
+            return None
+        html_text = DOCUMENT_END_TAG_RE.sub('<!---->', html_text)
+        root = lxml.html.document_fromstring(html_text.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+        collapse_lxml_whitespace(root)
+
+        excluded_xpath = get_excluded_xpath(len(excluded_names))
+        if excluded_xpath is not None:
+            variables = {f'n{index}' : name for index, name in enumerate(excluded_names)}
+            # drop_tree keeps tail text (it's not a part of removed tag)
+            for element in excluded_xpath(root, **variables):
+                if element.getparent() is not None:
+                    element.drop_tree()
+
+        if tag_to_remove:
+            etree.strip_elements(root, *tag_to_remove, with_tail=False)
+
+        return root
@@ -0,0 +1,37 @@
+"""
+    Lazy registry of parsers: parser module is imported only when file of its type is parsed
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,C0305
+
+import importlib
+from functools import lru_cache
+
+from core.parsers.base_parser import BaseParser
+
+# file extension -> "module:class"
+PARSER_REGISTRY : dict[str, str] = {
+    '.pdf'  : 'core.parsers.pdf_parser:PdfParser',
+    '.msg'  : 'core.parsers.msg_parser:MsgParser',
+    '.docx' : 'core.parsers.docx_parser:DocxParser',
+    '.txt'  : 'core.parsers.txt_parser:TxtParser',
+    '.html' : 'core.parsers.html_parser:HtmlParser',
+    '.htm'  : 'core.parsers.html_parser:HtmlParser'
+}
+
+# for all other files
+DEFAULT_PARSER = 'core.parsers.unst_parser:UnstructuredParser'
+
+def get_parser_name(file_extension : str) -> str:
+    """Name ("module:class") of parser for file extension"""
+    return PARSER_REGISTRY.get(file_extension.lower(), DEFAULT_PARSER)
+
+@lru_cache(maxsize=None)
+def load_parser_type(parser_name : str) -> type[BaseParser]:
+    """Import parser module and return parser class"""
+    module_name, class_name = parser_name.split(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+def get_parser_type(file_extension : str) -> type[BaseParser]:
+    """Parser class for file extension"""
+    return load_parser_type(get_parser_name(file_extension))
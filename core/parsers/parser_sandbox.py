@@ -0,0 +1,221 @@
+"""
+    Run parsers in isolated worker process with timeout and memory limit
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,C0305,W0611,W0511,R0903,C0411,W1203
+
+import time
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import psutil
+
+from core.parsers.base_parser import BaseParser, DocumentContentItem, DocumentParserParams, DocumentParserResult
+from core.parsers.parser_registry import load_parser_type
+
+try:
+    import resource # address space limit of worker (not available on Windows)
+except ImportError:
+    resource = None
+
+logger : logging.Logger = logging.getLogger()
+
+# messages from worker
+WORKER_RESULT = 'result' # (WORKER_RESULT, message, error) - always the first message for file
+WORKER_PAGE   = 'page'   # (WORKER_PAGE, DocumentContentItem)
+WORKER_ERROR  = 'error'  # (WORKER_ERROR, error) - error while pages were extracted
+WORKER_END    = 'end'    # (WORKER_END,)
+
+RSS_CHECK_INTERVAL = 0.5 # seconds
+
+@dataclass
+class ParserSandboxParams:
+    """Limits of parser worker"""
+    timeout_seconds      : float = 300 # wall-clock time for one file
+    max_rss_mb           : float = 4096 # worker (with its children) is killed above this RSS
+    max_address_space_mb : float = 16384 # hard limit of virtual memory of worker process (allocation fails above it), 0 - no limit
+    max_files_per_worker : int = 50 # worker is restarted after this count of files
+
+class ParserSandboxError(Exception):
+    """File was not parsed because worker was killed (timeout, memory) or died"""
+
+def set_address_space_limit(max_address_space_mb : float):
+    """Hard limit of process memory, backstop for RSS check of parent (virtual memory is larger than RSS, so limit is higher)"""
+    if resource is None or max_address_space_mb <= 0:
+        return
+    limit = int(max_address_space_mb * 1024 * 1024)
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    if hard_limit != resource.RLIM_INFINITY:
+        limit = min(limit, hard_limit)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def parser_worker_main(connection : Connection, max_address_space_mb : float = 0):
+    """Worker loop: parse files, send pages one by one"""
+    set_address_space_limit(max_address_space_mb)
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        parser_type, file_name, params = task
+        try:
+            if isinstance(parser_type, str):
+                parser_type = load_parser_type(parser_type)
+        except ImportError as error:
+            connection.send((WORKER_RESULT, None, f'ERROR: file {file_name}. Parser is not available: {error}'))
+            connection.send((WORKER_END,))
+            continue
+        result : DocumentParserResult = parser_type(file_name).parse(params)
+        connection.send((WORKER_RESULT, result.message, result.error))
+        if not result.error:
+            try:
+                for content_item in result.content:
+                    connection.send((WORKER_PAGE, content_item))
+            except Exception as error: # pylint: disable=W0718
+                connection.send((WORKER_ERROR, f'ERROR: file {file_name}. Exception: {error} [{type(error)}]'))
+                continue
+        connection.send((WORKER_END,))
+
+class ParserSandbox:
+    """Parses files in separate worker process, one file at a time"""
+
+    params : ParserSandboxParams
+    __process     : Optional[multiprocessing.Process]
+    __connection  : Optional[Connection]
+    __file_count  : int
+    __in_progress : bool
+
+    def __init__(self, params : ParserSandboxParams):
+        self.params = params
+        self.__process = None
+        self.__connection = None
+        self.__file_count = 0
+        self.__in_progress = False
+
+    @property
+    def worker_pid(self) -> Optional[int]:
+        """Pid of current worker"""
+        return self.__process.pid if self.__process else None
+
+    def __start_worker(self):
+        # spawn: parent process (streamlit) has threads, fork is not safe
+        context = multiprocessing.get_context('spawn')
+        self.__connection, worker_connection = context.Pipe()
+        # not daemon, so worker can run its own process pool (page-parallel pdf extraction)
+        self.__process = context.Process(target=parser_worker_main, args=(worker_connection, self.params.max_address_space_mb), daemon=False)
+        self.__process.start()
+        worker_connection.close()
+        self.__file_count = 0
+
+    def __kill_worker(self):
+        """Kill worker with all its children"""
+        if not self.__process:
+            return
+        try:
+            worker = psutil.Process(self.__process.pid)
+            for child in worker.children(recursive=True):
+                child.kill()
+        except psutil.Error:
+            pass
+        self.__process.kill()
+        self.__process.join()
+        self.__connection.close()
+        self.__process = None
+        self.__connection = None
+        self.__in_progress = False
+
+    def close(self):
+        """Stop worker"""
+        if not self.__process:
+            return
+        if self.__in_progress:
+            self.__kill_worker()
+            return
+        try:
+            self.__connection.send(None)
+            self.__process.join(timeout=10)
+        except (OSError, EOFError):
+            pass
+        self.__kill_worker()
+
+    def __get_worker_rss_mb(self) -> float:
+        """RSS of worker and its children"""
+        try:
+            worker = psutil.Process(self.__process.pid)
+            rss = worker.memory_info().rss
+            for child in worker.children(recursive=True):
+                rss += child.memory_info().rss
+        except psutil.Error:
+            return 0
+        return rss / (1024 * 1024)
+
+    def __receive(self, file_name : str, deadline : float) -> tuple:
+        """Wait for message from worker, kill worker if limits are exceeded (memory is checked for each message too)"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.__kill_worker()
+                error = f'ERROR: file {file_name}. Timeout: parsing took more than {self.params.timeout_seconds} s'
+                logger.warning(error)
+                raise ParserSandboxError(error)
+            worker_message = None
+            try:
+                if self.__connection.poll(min(remaining, RSS_CHECK_INTERVAL)):
+                    worker_message = self.__connection.recv()
+            except (OSError, EOFError) as error:
+                self.__kill_worker()
+                raise ParserSandboxError(f'ERROR: file {file_name}. Parser worker died [{error}]') from error
+            # worker which streams pages never waits for poll timeout, so RSS is checked on each message
+            rss_mb = self.__get_worker_rss_mb()
+            if rss_mb > self.params.max_rss_mb:
+                self.__kill_worker()
+                error = f'ERROR: file {file_name}. Memory limit: parser used {rss_mb:.0f} MB (limit {self.params.max_rss_mb} MB)'
+                logger.warning(error)
+                raise ParserSandboxError(error)
+            if worker_message is not None:
+                return worker_message
+
+    def parse(self, parser_type : type[BaseParser] | str, file_name : str, params : DocumentParserParams) -> DocumentParserResult:
+        """
+            Parse file in worker. Content is streamed, limits are checked while content is read.
+            Parser can be class or registry name ("module:class") - then it's imported only in worker.
+        """
+        if self.__in_progress: # content of previous file was not read till the end
+            self.__kill_worker()
+        if self.__process and self.__file_count >= self.params.max_files_per_worker:
+            self.close()
+        if not self.__process:
+            self.__start_worker()
+
+        deadline = time.monotonic() + self.params.timeout_seconds
+        self.__file_count += 1
+        self.__in_progress = True
+        try:
+            self.__connection.send((parser_type, file_name, params))
+            _, message, error = self.__receive(file_name, deadline)
+        except ParserSandboxError as sandbox_error:
+            return DocumentParserResult(None, None, str(sandbox_error))
+
+        if error:
+            try:
+                self.__receive(file_name, deadline) # WORKER_END
+            except ParserSandboxError as sandbox_error:
+                logger.warning(sandbox_error)
+            self.__in_progress = False
+            return DocumentParserResult(None, None, error)
+
+        return DocumentParserResult(self.__iter_content(file_name, deadline), message, None)
+
+    def __iter_content(self, file_name : str, deadline : float) -> Iterator[DocumentContentItem]:
+        """Pages from worker"""
+        while True:
+            worker_message = self.__receive(file_name, deadline)
+            if worker_message[0] == WORKER_PAGE:
+                yield worker_message[1]
+                continue
+            self.__in_progress = False
+            if worker_message[0] == WORKER_ERROR:
+                raise ParserSandboxError(worker_message[1])
+            return
@@ -2,11 +2,163 @@
     Pdf parser
 """
 
-# pylint: disable=C0301,C0103,C0304,C0303,C0305,W0611,W0511,R0903
+# pylint: disable=C0301,C0103,C0304,C0303,C0305,W0611,W0511,R0903,C0415
+
+import os
+import math
+import multiprocessing
+from abc import abstractmethod
+from typing import Iterator
+from concurrent.futures import ProcessPoolExecutor
 
 import pypdf
 
-from core.parsers.base_parser import DocumentContentItem, DocumentParserResult, BaseParser, DocumentParserParams
+from core.parsers.base_parser import DocumentContentItem, DocumentParserResult, BaseParser, DocumentParserParams, DocumentParserPDFParams, PdfParserBackend
+
+class BasePdfBackend():
+    """Opened pdf document, text is extracted page by page"""
+
+    file_name  : str
+    pdf_params : DocumentParserPDFParams
+
+    def __init__(self, file_name : str, pdf_params : DocumentParserPDFParams):
+        self.file_name = file_name
+        self.pdf_params = pdf_params
+
+    @abstractmethod
+    def get_page_count(self) -> int:
+        """Count of pages"""
+
+    @abstractmethod
+    def extract_page_text(self, page_index : int) -> str:
+        """Get plain text of one page"""
+
+    @abstractmethod
+    def close(self):
+        """Release document"""
+
+class PypdfBackend(BasePdfBackend):
+    """pypdf backend (pure python)"""
+
+    def __init__(self, file_name : str, pdf_params : DocumentParserPDFParams):
+        super().__init__(file_name, pdf_params)
+        # reader with file stream does not copy the whole file into memory
+        self.__file = open(file_name, "rb") # pylint: disable=R1732
+        try:
+            self.__reader = pypdf.PdfReader(self.__file)
+        except Exception:
+            self.__file.close()
+            raise
+
+    def get_page_count(self) -> int:
+        return len(self.__reader.pages)
+
+    def extract_page_text(self, page_index : int) -> str:
+        return self.__reader.pages[page_index].extract_text()
+
+    def close(self):
+        self.__file.close()
+
+class PdfiumBackend(BasePdfBackend):
+    """pypdfium2 backend (PDFium, native code)"""
+
+    def __init__(self, file_name : str, pdf_params : DocumentParserPDFParams):
+        super().__init__(file_name, pdf_params)
+        import pypdfium2
+        self.__pdf = pypdfium2.PdfDocument(file_name)
+
+    def get_page_count(self) -> int:
+        return len(self.__pdf)
+
+    def extract_page_text(self, page_index : int) -> str:
+        page = self.__pdf[page_index]
+        text_page = page.get_textpage()
+        try:
+            text = text_page.get_text_range()
+        finally:
+            text_page.close()
+            page.close()
+        return text.replace('\r\n', '\n')
+
+    def close(self):
+        self.__pdf.close()
+
+class PdfminerBackend(BasePdfBackend):
+    """pdfminer.six backend with layout analysis"""
+
+    def __init__(self, file_name : str, pdf_params : DocumentParserPDFParams):
+        super().__init__(file_name, pdf_params)
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+        from pdfminer.converter import PDFPageAggregator
+        from pdfminer.layout import LAParams
+
+        self.__file = open(file_name, "rb") # pylint: disable=R1732
+        try:
+            document = PDFDocument(PDFParser(self.__file))
+            # page objects are only references, content is parsed in extract_page_text
+            self.__pages = list(PDFPage.create_pages(document))
+        except Exception:
+            self.__file.close()
+            raise
+        resource_manager = PDFResourceManager(caching=True)
+        la_params = LAParams(
+            line_margin= pdf_params.line_margin,
+            char_margin= pdf_params.char_margin,
+            word_margin= pdf_params.word_margin,
+            boxes_flow=  pdf_params.boxes_flow
+        )
+        self.__device = PDFPageAggregator(resource_manager, laparams=la_params)
+        self.__interpreter = PDFPageInterpreter(resource_manager, self.__device)
+
+    def get_page_count(self) -> int:
+        return len(self.__pages)
+
+    def extract_page_text(self, page_index : int) -> str:
+        from pdfminer.layout import LTTextContainer
+
+        self.__interpreter.process_page(self.__pages[page_index])
+        layout = self.__device.get_result()
+        return ''.join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+
+    def close(self):
+        self.__file.close()
+
+PDF_BACKEND_MAP : dict[PdfParserBackend, type[BasePdfBackend]] = {
+    PdfParserBackend.PYPDF    : PypdfBackend,
+    PdfParserBackend.PDFIUM   : PdfiumBackend,
+    PdfParserBackend.PDFMINER : PdfminerBackend
+}
+
+def open_pdf(file_name : str, pdf_params : DocumentParserPDFParams) -> BasePdfBackend:
+    """Open pdf document with selected backend"""
+    return PDF_BACKEND_MAP[pdf_params.backend](file_name, pdf_params)
+
+# several small ranges per worker: to balance workers and to return first pages early
+PARALLEL_RANGES_PER_WORKER = 4
+PARALLEL_MIN_RANGE_PAGES = 10
+
+def extract_page_range(file_name : str, pdf_params : DocumentParserPDFParams, first_page : int, last_page : int) -> list[str]:
+    """Extract text of pages [first_page, last_page) - runs in worker process, document is opened independently"""
+    pdf = open_pdf(file_name, pdf_params)
+    try:
+        return [pdf.extract_page_text(page_index) for page_index in range(first_page, last_page)]
+    finally:
+        pdf.close()
+
+def get_page_ranges(page_count : int, worker_count : int) -> list[tuple[int, int]]:
+    """Split pages into ranges for workers"""
+    range_size = max(PARALLEL_MIN_RANGE_PAGES, math.ceil(page_count / (worker_count * PARALLEL_RANGES_PER_WORKER)))
+    return [(first_page, min(first_page + range_size, page_count)) for first_page in range(0, page_count, range_size)]
+
+def get_parallel_worker_count(page_count : int, pdf_params : DocumentParserPDFParams) -> int:
+    """Count of worker processes for document, 1 - serial extraction"""
+    if not pdf_params.parallel_min_pages or page_count < pdf_params.parallel_min_pages:
+        return 1
+    max_workers = pdf_params.max_workers or os.cpu_count() or 1
+    return max(1, min(max_workers, math.ceil(page_count / PARALLEL_MIN_RANGE_PAGES)))
 
 class PdfParser(BaseParser):
     """Pdf parser class"""
@@ -14,17 +166,52 @@ class PdfParser(BaseParser):
     def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
         """Get plain text from pdf"""
 
-        content = list[DocumentContentItem]()
+        pdf = open_pdf(self.file_name, params.pdf_params)
+        try:
+            page_count = pdf.get_page_count()
+        except Exception:
+            pdf.close()
+            raise
 
-        pdf = pypdf.PdfReader(self.file_name)
-        for page in pdf.pages:
-            text = page.extract_text()
-            content.append(DocumentContentItem(
+        message = f'Converted {page_count} pages(s) from {self.base_file_name}'
+
+        worker_count = get_parallel_worker_count(page_count, params.pdf_params)
+        if worker_count > 1:
+            pdf.close()
+            return DocumentParserResult(self.__iter_parallel_content(params.pdf_params, page_count, worker_count), message, None)
+
+        return DocumentParserResult(self.__iter_content(pdf, page_count), message, None)
+
+    def __iter_content(self, pdf : BasePdfBackend, page_count : int) -> Iterator[DocumentContentItem]:
+        """Extract pages one at a time, document is closed at the end"""
+        try:
+            for page_index in range(page_count):
+                yield DocumentContentItem(
                             self.base_file_name,
-                            text,
-                            page.page_number,
+                            pdf.extract_page_text(page_index),
+                            page_index, # pypdf page_number is zero-based
                             {}
                         )
+        finally:
+            pdf.close()
+
+    def __iter_parallel_content(self, pdf_params : DocumentParserPDFParams, page_count : int, worker_count : int) -> Iterator[DocumentContentItem]:
+        """Extract page ranges in worker processes, pages are returned in page order"""
+        page_ranges = get_page_ranges(page_count, worker_count)
+        # spawn: parent process (streamlit) has threads, fork is not safe
+        with ProcessPoolExecutor(max_workers=worker_count, mp_context=multiprocessing.get_context('spawn')) as executor:
+            range_results = executor.map(
+                extract_page_range,
+                [self.file_name] * len(page_ranges),
+                [pdf_params] * len(page_ranges),
+                [first_page for first_page, _ in page_ranges],
+                [last_page for _, last_page in page_ranges]
             )
-        message = f'Converted {len(pdf.pages)} pages(s) from {self.base_file_name}'
-        return DocumentParserResult(content, message, None)
+            for (first_page, _), page_text_list in zip(page_ranges, range_results):
+                for page_index, page_text in enumerate(page_text_list, start=first_page):
+                    yield DocumentContentItem(
+                                self.base_file_name,
+                                page_text,
+                                page_index,
+                                {}
+                            )
@@ -0,0 +1,47 @@
+"""
+    Configuration of extraction and indexing steps, shared by UI, background jobs and batch CLI
+"""
+# pylint: disable=C0301,C0103
+
+import os
+import tomllib
+from dataclasses import dataclass
+from dataclasses_json import dataclass_json
+
+from core.parsers.base_parser import HtmlParserBackend, PdfParserBackend
+from core.parsers.chunk_splitters.base_splitter import ChunkSplitterMode
+
+DEFAULT_SECRETS_FILE = os.path.join('.streamlit', 'secrets.toml')
+
+@dataclass_json
+@dataclass
+class BatchExtractionConfig:
+    """Text extraction step (names of enums are used for backends)"""
+    override_all           : bool = True
+    run_html_llm_formatter : bool = False
+    run_table_extraction   : bool = False
+    store_as_facts_list    : bool = False
+    fact_context           : str = ''
+    combine_html_headers   : bool = False
+    html_parser_backend    : str = HtmlParserBackend.BS4.name
+    pdf_parser_backend     : str = PdfParserBackend.PYPDF.name
+
+@dataclass_json
+@dataclass
+class BatchIndexingConfig:
+    """Indexing step (names of enums are used for embedding and splitter)"""
+    index_name           : str
+    embedding            : str = 'SBERT'
+    chunk_min            : int = 0
+    chunk_size           : int = 500
+    chunk_overlap        : int = 50
+    use_formatted        : bool = False
+    chunk_splitter_mode  : str = ChunkSplitterMode.TOKEN_MODE.name
+    fact_dedup_threshold : float = 0
+
+def load_secrets(secrets_file : str) -> dict:
+    """Secrets in the same format as streamlit secrets (empty if file is not found)"""
+    if not secrets_file or not os.path.isfile(secrets_file):
+        return {}
+    with open(secrets_file, "rb") as f:
+        return tomllib.load(f)
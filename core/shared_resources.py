@@ -0,0 +1,44 @@
+"""
+    Process-wide resources shared by all sessions (models, clients, caches)
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303
+
+import threading
+from typing import Any, Callable
+
+class SharedResources:
+    """Registry of resources which are created once per process (thread-safe lazy initialization)"""
+
+    __resources     : dict[str, Any]
+    __lock          : threading.Lock
+    __create_locks  : dict[str, threading.Lock]
+
+    def __init__(self):
+        self.__resources = {}
+        self.__lock = threading.Lock()
+        self.__create_locks = {}
+
+    def get(self, key : str, create_call : Callable[[], Any]) -> Any:
+        """Resource by key, it's created by create_call on first use"""
+        resource = self.__resources.get(key)
+        if resource is not None:
+            return resource
+        with self.__lock:
+            create_lock = self.__create_locks.setdefault(key, threading.Lock())
+        # resources are created under own lock, slow model loading doesn't block other resources
+        with create_lock:
+            resource = self.__resources.get(key)
+            if resource is None:
+                resource = create_call()
+                self.__resources[key] = resource
+        return resource
+
+    def contains(self, key : str) -> bool:
+        """True if resource is created"""
+        return key in self.__resources
+
+    def clear(self):
+        """Forget all resources (they are created again on next use)"""
+        with self.__lock:
+            self.__resources.clear()
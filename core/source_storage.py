@@ -3,13 +3,48 @@
 """
 
 import os
-from typing import Any
+import json
+import shutil
+import tarfile
+import zipfile
+import hashlib
+import tempfile
+from typing import Any, BinaryIO, Callable, Iterator, Optional
+
+from core.file_lock import file_lock, write_file_atomic
+
+ARCHIVE_EXTENSIONS = ['.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz']
+
+def is_archive_file(file_name : str) -> bool:
+    """True if file is archive (zip or tar)"""
+    return any(file_name.lower().endswith(extension) for extension in ARCHIVE_EXTENSIONS)
 
 class SourceStorage:
-    """Source storage class"""
+    """
+        Source storage class.
+        Content is stored once in blob folder (by sha256 digest), files of document sets are hard links to blobs
+        and name->digest references are kept per document set.
+    """
+
+    # folder structure:
+    #   .document-source
+    #      \.blobs
+    #          <digest>
+    #      \<document-set>
+    #          <file-name> (hard link to blob)
+    #      <document-set>.digests.json
+    #      .digests.lock (digests and blobs are changed under this lock by all processes)
+    #      <document-set>.urls.json (url -> file name, ETag, Last-Modified of downloaded files)
 
     in_memory : bool
     __DISK_FOLDER = '.document-source'
+    __BLOBS_FOLDER = '.blobs'
+    __DIGESTS_EXT = '.digests.json'
+    __DIGESTS_LOCK = '.digests.lock'
+    __URLS_EXT = '.urls.json'
+    __TEMP_PREFIX = '.upload-'
+    __TEMP_SUFFIX = '.part'
+    __CHUNK_SIZE  = 1024 * 1024
 
     def __init__(self, in_memory : bool):
         self.in_memory = in_memory
@@ -21,30 +56,272 @@ class SourceStorage:
         if not self.in_memory:
             os.makedirs(storage_folder, exist_ok=True)
         return storage_folder
-    
+
     def __get_file_name(self, document_set : str, file_name : str):
         return os.path.join(self.__get_storage_folder(document_set), file_name)
 
-    def save_file(self, document_set: str, file_name : str, buffer : Any):
-        """Save file from buffer into file_name on disk"""
-        full_file_name = self.__get_file_name(document_set, file_name)
+    def __get_blobs_folder(self) -> str:
+        blobs_folder = os.path.join(self.__DISK_FOLDER, self.__BLOBS_FOLDER)
+        os.makedirs(blobs_folder, exist_ok=True)
+        return blobs_folder
+
+    def get_blob_file_name(self, digest : str) -> str:
+        """File name of content with given digest"""
+        return os.path.join(self.__get_blobs_folder(), digest)
+
+    def __get_digests_file_name(self, document_set : str) -> str:
+        return os.path.join(self.__DISK_FOLDER, f'{document_set}{self.__DIGESTS_EXT}')
+
+    def __load_digests(self, document_set : str) -> dict[str, str]:
+        digests_file_name = self.__get_digests_file_name(document_set)
+        if not os.path.isfile(digests_file_name):
+            return {}
+        with open(digests_file_name, "rt", encoding="utf-8") as f:
+            return json.loads(f.read())
+
+    def __lock_digests(self):
+        """Inter-process lock of digests and blobs (UI, job workers and batch CLI share them), it's not reentrant"""
+        return file_lock(os.path.join(self.__DISK_FOLDER, self.__DIGESTS_LOCK))
+
+    def __update_digests(self, document_set : str, file_name : str, digest : Optional[str]):
+        """Set (or remove if digest is None) digest of file, called under digests lock"""
+        digests = self.__load_digests(document_set)
+        if digest:
+            digests[file_name] = digest
+        else:
+            digests.pop(file_name, None)
+        write_file_atomic(self.__get_digests_file_name(document_set), json.dumps(digests, indent=4))
+
+    def get_url_info(self, document_set : str) -> dict[str, dict[str, str]]:
+        """Info about downloaded urls (url -> file name and http validators)"""
+        url_info_file_name = os.path.join(self.__DISK_FOLDER, f'{document_set}{self.__URLS_EXT}')
+        if not os.path.isfile(url_info_file_name):
+            return {}
+        with open(url_info_file_name, "rt", encoding="utf-8") as f:
+            return json.loads(f.read())
+
+    def save_url_info(self, document_set : str, url_info : dict[str, dict[str, str]]):
+        """Save info about downloaded urls"""
+        url_info_file_name = os.path.join(self.__DISK_FOLDER, f'{document_set}{self.__URLS_EXT}')
+        with open(f'{url_info_file_name}{self.__TEMP_SUFFIX}', "wt", encoding="utf-8") as f:
+            f.write(json.dumps(url_info, indent=4))
+        os.replace(f'{url_info_file_name}{self.__TEMP_SUFFIX}', url_info_file_name)
+
+    def create_file_writer(self, document_set: str, file_name : str) -> 'SourceFileWriter':
+        """Writer to save file chunk by chunk (for content which is not available as file-like stream)"""
+        temp_handle, temp_file_name = tempfile.mkstemp(dir=self.__get_blobs_folder(), prefix=self.__TEMP_PREFIX, suffix=self.__TEMP_SUFFIX)
+        return SourceFileWriter(
+            os.fdopen(temp_handle, "wb"),
+            temp_file_name,
+            lambda digest: self.__commit_file(document_set, file_name, temp_file_name, digest)
+        )
+
+    def save_stream(self, document_set: str, file_name : str, stream : BinaryIO) -> str:
+        """
+            Save file from stream by chunks (memory is bounded by chunk size).
+            Content is written into temp file and renamed, so file is never partially written.
+            The same content is stored only once. Returns sha256 digest of content.
+        """
+        file_writer = self.create_file_writer(document_set, file_name)
+        try:
+            while True:
+                chunk = stream.read(self.__CHUNK_SIZE)
+                if not chunk:
+                    break
+                file_writer.write(chunk)
+        except BaseException:
+            file_writer.abort()
+            raise
+        return file_writer.commit()
+
+    def __commit_file(self, document_set: str, file_name : str, temp_file_name : str, digest : str):
+        """Move written content into blob and link it into document set"""
+        # blob is not removed by other process between it's found and linked
+        with self.__lock_digests():
+            blob_file_name = self.get_blob_file_name(digest)
+            if os.path.isfile(blob_file_name):
+                os.remove(temp_file_name) # content is already stored
+            else:
+                os.replace(temp_file_name, blob_file_name)
+
+            previous_digest = self.__load_digests(document_set).get(file_name)
+            self.__link_blob(document_set, file_name, digest)
+            self.__update_digests(document_set, file_name, digest)
+            if previous_digest and previous_digest != digest:
+                self.__delete_blob_if_unused(previous_digest)
+
+    def __link_blob(self, document_set : str, file_name : str, digest : str):
+        """Replace file of document set by link to blob (copy if links are not supported)"""
+        storage_folder = self.__get_storage_folder(document_set)
+        temp_file_name = os.path.join(storage_folder, f'{self.__TEMP_PREFIX}{digest}{self.__TEMP_SUFFIX}')
+        if os.path.isfile(temp_file_name):
+            os.remove(temp_file_name)
+        try:
+            os.link(self.get_blob_file_name(digest), temp_file_name)
+        except OSError:
+            shutil.copyfile(self.get_blob_file_name(digest), temp_file_name)
+        os.replace(temp_file_name, os.path.join(storage_folder, file_name))
+
+    def __delete_blob_if_unused(self, digest : str):
+        """Remove blob if no document set refers to it, called under digests lock"""
+        for digests_file_name in os.listdir(self.__DISK_FOLDER):
+            if not digests_file_name.endswith(self.__DIGESTS_EXT):
+                continue
+            if digest in self.__load_digests(digests_file_name.removesuffix(self.__DIGESTS_EXT)).values():
+                return
+        blob_file_name = self.get_blob_file_name(digest)
+        if not os.path.isfile(blob_file_name):
+            return
+        # file of document set is still linked to blob (for example, it's saved but its digest is not written yet)
+        if os.stat(blob_file_name).st_nlink > 1:
+            return
+        os.remove(blob_file_name)
 
+    def save_file(self, document_set: str, file_name : str, buffer : Any) -> str:
+        """Save file from buffer (str or bytes-like) into file_name on disk. Returns sha256 digest of content"""
         if isinstance(buffer, str):
-            with open(full_file_name,"wt", encoding="utf-8") as file_txt:
-                file_txt.write(buffer)
+            buffer = buffer.encode("utf-8")
+        return self.save_stream(document_set, file_name, MemoryViewReader(buffer))
+
+    def iter_save_archive(self, document_set: str, archive_name : str, stream : BinaryIO) -> Iterator[tuple[str, str]]:
+        """
+            Save files from zip or tar archive one by one, yields (full file name, digest) when file is saved.
+            Members are streamed, archive is never unpacked in memory. Folders are kept in file name (folder-file.pdf).
+        """
+        if archive_name.lower().endswith('.zip'):
+            with zipfile.ZipFile(stream) as archive: # zip needs seekable stream (central directory is at the end)
+                for member in archive.infolist():
+                    file_name = self.__get_archive_member_name(member.filename)
+                    if member.is_dir() or not file_name:
+                        continue
+                    with archive.open(member) as member_stream:
+                        digest = self.save_stream(document_set, file_name, member_stream)
+                    yield self.__get_file_name(document_set, file_name), digest
             return
 
-        with open(full_file_name,"wb") as file:
-            file.write(buffer)
+        with tarfile.open(fileobj=stream, mode='r|*') as archive: # stream mode, members are read in order
+            for member in archive:
+                file_name = self.__get_archive_member_name(member.name)
+                if not member.isfile() or not file_name:
+                    continue
+                member_stream = archive.extractfile(member)
+                digest = self.save_stream(document_set, file_name, member_stream)
+                yield self.__get_file_name(document_set, file_name), digest
+
+    def __get_archive_member_name(self, member_name : str) -> Optional[str]:
+        """File name for archive member, None for hidden and service files"""
+        parts = [part for part in member_name.replace('\\', '/').split('/') if part and part not in ['.', '..']]
+        if not parts or any(part.startswith('.') or part == '__MACOSX' for part in parts):
+            return None
+        return '-'.join(parts)
+
+    def get_file_digest(self, document_set : str, file_name : str) -> Optional[str]:
+        """
+            Sha256 digest of file content. None if file is not found.
+            File saved before blobs were used is moved into blob (so its content is shared too).
+        """
+        full_file_name = self.__get_file_name(document_set, file_name)
+        if not os.path.isfile(full_file_name):
+            return None
+        digest = self.__load_digests(document_set).get(file_name)
+        if digest:
+            return digest
+        return self.__move_into_blob(document_set, file_name)
+
+    def __move_into_blob(self, document_set : str, file_name : str) -> str:
+        """Calculate digest of file saved before blobs were used, content is moved into blob"""
+        full_file_name = self.__get_file_name(document_set, file_name)
+        hasher = hashlib.sha256()
+        with open(full_file_name, "rb") as file:
+            for chunk in iter(lambda: file.read(self.__CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with self.__lock_digests():
+            if not os.path.isfile(self.get_blob_file_name(digest)):
+                try:
+                    os.link(full_file_name, self.get_blob_file_name(digest))
+                except OSError:
+                    shutil.copyfile(full_file_name, self.get_blob_file_name(digest))
+            self.__link_blob(document_set, file_name, digest)
+            self.__update_digests(document_set, file_name, digest)
+        return digest
+
+    def get_file_digests(self, document_set : str) -> dict[str, str]:
+        """Digests of all files of document set (full file name -> digest), digests are loaded once"""
+        digests = self.__load_digests(document_set)
+        return {
+            file_name : digests.get(os.path.basename(file_name)) or self.__move_into_blob(document_set, os.path.basename(file_name))
+            for file_name in self.get_all_files(document_set)
+        }
 
     def get_all_files(self, document_set: str, only_names : bool = False) -> list[str]:
         """Get all available files"""
         storage_folder = self.__get_storage_folder(document_set)
-        file_list = os.listdir(storage_folder)
+        file_list = [
+            file_name for file_name in os.listdir(storage_folder)
+            if not (file_name.startswith(self.__TEMP_PREFIX) and file_name.endswith(self.__TEMP_SUFFIX))
+        ]
         if only_names:
             return [os.path.basename(file_name) for file_name in file_list]
         return [os.path.join(storage_folder, file_name) for file_name in file_list]
-        
+
     def delete_file(self, document_set : str, file_name : str):
         """Remove file from source folder"""
-        os.remove(self.__get_file_name(document_set, file_name))
\ No newline at end of file
+        with self.__lock_digests():
+            digest = self.__load_digests(document_set).get(file_name)
+            os.remove(self.__get_file_name(document_set, file_name))
+            self.__update_digests(document_set, file_name, None)
+            if digest:
+                self.__delete_blob_if_unused(digest)
+
+class SourceFileWriter:
+    """Writes content into temp file and calculates its digest, content is saved only by commit"""
+
+    __file           : BinaryIO
+    __temp_file_name : str
+    __hasher         : Any
+    __commit_call    : Callable[[str], None]
+
+    def __init__(self, file : BinaryIO, temp_file_name : str, commit_call : Callable[[str], None]):
+        self.__file = file
+        self.__temp_file_name = temp_file_name
+        self.__hasher = hashlib.sha256()
+        self.__commit_call = commit_call
+
+    def write(self, chunk : bytes):
+        """Write next chunk"""
+        self.__hasher.update(chunk)
+        self.__file.write(chunk)
+
+    def commit(self) -> str:
+        """Save written content, returns sha256 digest"""
+        self.__file.close()
+        digest = self.__hasher.hexdigest()
+        try:
+            self.__commit_call(digest)
+        except BaseException:
+            self.abort()
+            raise
+        return digest
+
+    def abort(self):
+        """Discard written content"""
+        self.__file.close()
+        if os.path.isfile(self.__temp_file_name):
+            os.remove(self.__temp_file_name)
+
+class MemoryViewReader:
+    """Read bytes-like buffer by chunks without copying of whole buffer"""
+
+    __view     : memoryview
+    __position : int
+
+    def __init__(self, buffer : Any):
+        self.__view = memoryview(buffer).cast('B')
+        self.__position = 0
+
+    def read(self, size : int) -> memoryview:
+        """Next chunk (empty at the end)"""
+        chunk = self.__view[self.__position : self.__position + size]
+        self.__position += len(chunk)
+        return chunk
@@ -0,0 +1,240 @@
+"""
+    Aggregated metrics of recorded spans: latency percentiles, throughput, LLM cost, cache hit rates.
+    Span files are append-only, so only new lines are read on update; aggregates of each daily file
+    are kept in cache file, so the history is not read again after restart.
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,W0718,W1203
+
+import os
+import json
+import math
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+from dataclasses_json import dataclass_json
+
+from core.tracing import TRACE_FOLDER, TRACE_FILE_PREFIX, TRACE_FILE_EXT
+
+logger : logging.Logger = logging.getLogger()
+
+LATENCY_BUCKET_BASE = 1.1 # bucket bounds grow by 10%, so percentiles are approximate (within 5%)
+MIN_LATENCY_SECONDS = 1e-6
+
+CACHE_ATTRIBUTE_PREFIX = 'cache.'
+CACHE_HITS_SUFFIX = '.hits'
+CACHE_MISSES_SUFFIX = '.misses'
+
+@dataclass_json
+@dataclass
+class StageMetrics:
+    """Aggregate of spans with the same name"""
+    count           : int = 0
+    errors          : int = 0
+    seconds         : float = 0
+    latency_buckets : dict[str, int] = field(default_factory=dict) # bucket index -> count of spans
+    totals          : dict[str, float] = field(default_factory=dict) # sum of numeric attributes (files, bytes, chunks, tokens, cost, cache hits)
+
+    def add(self, duration : float, error : Optional[str], attributes : dict[str, Any]):
+        """Add one span"""
+        self.count += 1
+        self.seconds += duration
+        if error:
+            self.errors += 1
+        bucket = str(math.floor(math.log(max(duration, MIN_LATENCY_SECONDS), LATENCY_BUCKET_BASE)))
+        self.latency_buckets[bucket] = self.latency_buckets.get(bucket, 0) + 1
+        for key, value in attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.totals[key] = self.totals.get(key, 0) + value
+
+    def merge(self, other : 'StageMetrics'):
+        """Add all spans of other aggregate"""
+        self.count += other.count
+        self.errors += other.errors
+        self.seconds += other.seconds
+        for bucket, count in other.latency_buckets.items():
+            self.latency_buckets[bucket] = self.latency_buckets.get(bucket, 0) + count
+        for key, value in other.totals.items():
+            self.totals[key] = self.totals.get(key, 0) + value
+
+    def get_percentile(self, p : float) -> float:
+        """Approximate latency percentile (seconds)"""
+        if not self.count:
+            return 0
+        rank = p / 100 * self.count
+        cumulative = 0
+        for bucket in sorted(self.latency_buckets, key=int):
+            cumulative += self.latency_buckets[bucket]
+            if cumulative >= rank:
+                # geometric middle of the bucket
+                return LATENCY_BUCKET_BASE ** (int(bucket) + 0.5)
+        return LATENCY_BUCKET_BASE ** (int(max(self.latency_buckets, key=int)) + 0.5)
+
+@dataclass_json
+@dataclass
+class DocumentSetMetrics:
+    """LLM usage of traces of document set"""
+    traces : int = 0
+    tokens : int = 0
+    cost   : float = 0
+
+@dataclass_json
+@dataclass
+class SpanFileMetrics:
+    """Aggregates of one daily span file"""
+    day           : str
+    offset        : int = 0 # bytes already read
+    stages        : dict[str, StageMetrics] = field(default_factory=dict)
+    document_sets : dict[str, DocumentSetMetrics] = field(default_factory=dict)
+
+    def add_records(self, record_list : list[dict[str, Any]]):
+        """Add span records (all spans of trace are written together, root span first)"""
+        trace_document_sets = dict[str, str]()
+        for record in record_list:
+            attributes = record.get('attributes') or {}
+            if not record.get('parent_id'):
+                trace_document_sets[record['trace_id']] = attributes.get('document_set', '')
+                self.__get_document_set(trace_document_sets[record['trace_id']]).traces += 1
+
+            stage = self.stages.setdefault(record['name'], StageMetrics())
+            stage.add(record.get('duration', 0), record.get('error'), attributes)
+
+            if 'tokens' in attributes or 'cost' in attributes:
+                document_set_metrics = self.__get_document_set(trace_document_sets.get(record['trace_id'], ''))
+                document_set_metrics.tokens += attributes.get('tokens', 0)
+                document_set_metrics.cost += attributes.get('cost', 0)
+
+    def __get_document_set(self, document_set : str) -> DocumentSetMetrics:
+        return self.document_sets.setdefault(document_set, DocumentSetMetrics())
+
+@dataclass_json
+@dataclass
+class SpanMetricsCache:
+    """Saved aggregates of all span files"""
+    files : dict[str, SpanFileMetrics] = field(default_factory=dict)
+
+class SpanMetrics:
+    """Incremental aggregation of span files"""
+
+    folder       : str
+    __cache      : SpanMetricsCache
+    __lock       : threading.Lock
+
+    __CACHE_FILE = 'span-metrics-cache.json'
+
+    def __init__(self, folder : str = TRACE_FOLDER):
+        self.folder = folder
+        self.__lock = threading.Lock()
+        self.__cache = self.__load_cache()
+
+    def __get_cache_file_name(self) -> str:
+        return os.path.join(self.folder, self.__CACHE_FILE)
+
+    def __load_cache(self) -> SpanMetricsCache:
+        try:
+            with open(self.__get_cache_file_name(), 'rt', encoding='utf-8') as f:
+                return SpanMetricsCache.from_json(f.read()) # pylint: disable=E1101
+        except FileNotFoundError:
+            return SpanMetricsCache()
+        except Exception as error:
+            logger.warning(f'Span metrics cache is rebuilt: {error}')
+            return SpanMetricsCache()
+
+    def __save_cache(self):
+        os.makedirs(self.folder, exist_ok=True)
+        temp_file_name = f'{self.__get_cache_file_name()}.tmp'
+        with open(temp_file_name, 'wt', encoding='utf-8') as f:
+            f.write(self.__cache.to_json()) # pylint: disable=E1101
+        os.replace(temp_file_name, self.__get_cache_file_name())
+
+    def update(self) -> int:
+        """Read new lines of span files, returns count of new spans"""
+        if not os.path.isdir(self.folder):
+            return 0
+        file_names = sorted(f for f in os.listdir(self.folder) if f.startswith(TRACE_FILE_PREFIX) and f.endswith(TRACE_FILE_EXT))
+        new_span_count = 0
+        with self.__lock:
+            for file_name in file_names:
+                new_span_count += self.__update_file(file_name)
+            if new_span_count:
+                self.__save_cache()
+        return new_span_count
+
+    def __update_file(self, file_name : str) -> int:
+        file_path = os.path.join(self.folder, file_name)
+        file_metrics = self.__cache.files.get(file_name)
+        size = os.path.getsize(file_path)
+        if file_metrics is None or size < file_metrics.offset:
+            # new file or file was re-created
+            file_metrics = SpanFileMetrics(file_name[len(TRACE_FILE_PREFIX):-len(TRACE_FILE_EXT)])
+            self.__cache.files[file_name] = file_metrics
+        if size == file_metrics.offset:
+            return 0
+
+        with open(file_path, 'rb') as f:
+            f.seek(file_metrics.offset)
+            data = f.read(size - file_metrics.offset)
+        # only complete lines, the last one can be written right now
+        data = data[:data.rfind(b'\n') + 1]
+        record_list = []
+        for line in data.splitlines():
+            try:
+                record_list.append(json.loads(line))
+            except ValueError:
+                logger.warning(f'Bad span line in {file_name}')
+        file_metrics.add_records(record_list)
+        file_metrics.offset += len(data)
+        return len(record_list)
+
+    def get_days(self) -> list[str]:
+        """Days with recorded spans"""
+        with self.__lock:
+            return sorted({f.day for f in self.__cache.files.values()})
+
+    def get_stage_metrics(self, day_from : Optional[str] = None) -> dict[str, StageMetrics]:
+        """Metrics of stages since day (all days if not set)"""
+        result = dict[str, StageMetrics]()
+        with self.__lock:
+            for file_metrics in self.__iter_files(day_from):
+                for name, stage in file_metrics.stages.items():
+                    result.setdefault(name, StageMetrics()).merge(stage)
+        return result
+
+    def get_daily_stage_metrics(self, day_from : Optional[str] = None) -> dict[str, dict[str, StageMetrics]]:
+        """Metrics of stages by day"""
+        result = dict[str, dict[str, StageMetrics]]()
+        with self.__lock:
+            for file_metrics in self.__iter_files(day_from):
+                day_stages = result.setdefault(file_metrics.day, {})
+                for name, stage in file_metrics.stages.items():
+                    day_stages.setdefault(name, StageMetrics()).merge(stage)
+        return result
+
+    def get_daily_document_set_metrics(self, day_from : Optional[str] = None) -> dict[str, dict[str, DocumentSetMetrics]]:
+        """LLM usage of document sets by day"""
+        result = dict[str, dict[str, DocumentSetMetrics]]()
+        with self.__lock:
+            for file_metrics in self.__iter_files(day_from):
+                day_document_sets = result.setdefault(file_metrics.day, {})
+                for name, document_set_metrics in file_metrics.document_sets.items():
+                    total = day_document_sets.setdefault(name, DocumentSetMetrics())
+                    total.traces += document_set_metrics.traces
+                    total.tokens += document_set_metrics.tokens
+                    total.cost += document_set_metrics.cost
+        return result
+
+    def __iter_files(self, day_from : Optional[str]) -> Iterator[SpanFileMetrics]:
+        for file_metrics in self.__cache.files.values():
+            if not day_from or file_metrics.day >= day_from:
+                yield file_metrics
+
+def get_cache_hit_rates(stage : StageMetrics) -> dict[str, tuple[int, int]]:
+    """(hits, misses) of each cache from totals of span attributes"""
+    result = dict[str, tuple[int, int]]()
+    for key, value in stage.totals.items():
+        if key.startswith(CACHE_ATTRIBUTE_PREFIX) and key.endswith(CACHE_HITS_SUFFIX):
+            cache_name = key[len(CACHE_ATTRIBUTE_PREFIX):-len(CACHE_HITS_SUFFIX)]
+            misses = stage.totals.get(f'{CACHE_ATTRIBUTE_PREFIX}{cache_name}{CACHE_MISSES_SUFFIX}', 0)
+            result[cache_name] = (int(value), int(misses))
+    return result
@@ -6,16 +6,20 @@
 
 import os
 import json
-from dataclasses import dataclass
-from typing import Callable
-
-from core.parsers.base_parser import BaseParser, DocumentParserResult, DocumentParserParams
-from core.parsers.pdf_parser  import PdfParser
-from core.parsers.msg_parser  import MsgParser
-from core.parsers.docx_parser import DocxParser
-from core.parsers.txt_parser  import TxtParser
-from core.parsers.html_parser import HtmlParser
-from core.parsers.unst_parser import UnstructuredParser
+import queue
+import shutil
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Iterable, Iterator, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from core.parsers.base_parser import BaseParser, DocumentParserResult, DocumentParserParams, DocumentContentItem
+from core.parsers.parser_registry import get_parser_name, load_parser_type
+from core.parsers.parser_sandbox import ParserSandbox, ParserSandboxParams, ParserSandboxError
+from core.text_store import TextStore
+from core.artefact_store import ArtefactStore, ArtefactKind, get_text_digest
+from core.tracing import trace_span
 
 @dataclass
 class TextExtractorParams:
@@ -23,6 +27,64 @@ class TextExtractorParams:
     override_all  : bool # clean up storage before new run
     show_progress_callback : Callable[[str], None]
     document_parser_params : DocumentParserParams
+    sandbox_params : Optional[ParserSandboxParams] = None # None - parse in current process
+
+DEFAULT_READ_WORKERS = 4
+
+def iter_in_order(call : Callable[[Any], Any], items : list[Any], max_workers : int) -> Iterator[Any]:
+    """Run call for items in thread pool, yield results in order of items. Only few results are read ahead"""
+    if max_workers <= 1:
+        for item in items:
+            yield call(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(call, item))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def iter_in_background(items : Iterable[Any], max_ahead : int) -> Iterator[Any]:
+    """Read items in background thread (at most max_ahead items ahead), so producing overlaps with processing"""
+    item_queue = queue.Queue(maxsize=max_ahead)
+    stopped = threading.Event()
+    end_marker = object()
+
+    def put(queue_item : tuple) -> bool:
+        """Wait for free place in queue, False if reading is stopped"""
+        while not stopped.is_set():
+            try:
+                item_queue.put(queue_item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((end_marker, None))
+        except BaseException as error: # pylint: disable=W0718
+            put((end_marker, error))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = item_queue.get()
+            if error:
+                raise error
+            if item is end_marker:
+                break
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
 
 class TextExtractor:
     """Converted from source files into plain text"""
@@ -33,105 +95,224 @@ class TextExtractor:
     __FACTS_EXT = '.facts.txt'
     __META_EXT = '.json'
     __TABLES_EXT = '.tables.json'
+    __TEXT_STORE_EXT = '.db'
 
     FACT_LINE_SEPARATOR = '#### FACT ####'
 
-    __parser_map = {
-        '.pdf'  : PdfParser,
-        '.msg'  : MsgParser,
-        '.docx' : DocxParser,
-        '.txt'  : TxtParser,
-        '.html' : HtmlParser,
-        '.htm'  : HtmlParser
-    }
+    use_text_store : bool # new document sets are saved into single file store
+    artefact_store : Optional[ArtefactStore] # pages of the same source content are extracted once
+    __text_stores  : dict[str, TextStore]
+    __text_stores_lock : threading.Lock
 
-    def __init__(self):
+    def __init__(self, use_text_store : bool = False, artefact_store : Optional[ArtefactStore] = None):
+        self.use_text_store = use_text_store
+        self.artefact_store = artefact_store
+        self.__text_stores = dict[str, TextStore]()
+        self.__text_stores_lock = threading.Lock()
         os.makedirs(self.__DISK_FOLDER, exist_ok=True)
 
     def __get_document_set_folder_for_plain_text(self, document_set : str):
         return os.path.join(self.__DISK_FOLDER, document_set)
 
+    def __get_text_store_file_name(self, document_set : str) -> str:
+        return os.path.join(self.__DISK_FOLDER, f'{document_set}{self.__TEXT_STORE_EXT}')
+
+    def __get_page_name(self, plain_text_file_name : str) -> str:
+        """Name of page in text store"""
+        return os.path.basename(plain_text_file_name).removesuffix(self.__PLAIN_TEXT_EXT)
+
+    def uses_text_store(self, document_set : str) -> bool:
+        """True if document set is saved in single file store (not in folder with files)"""
+        return document_set in self.__text_stores or os.path.isfile(self.__get_text_store_file_name(document_set))
+
+    def __get_text_store(self, document_set : str, for_write : bool = False) -> Optional[TextStore]:
+        """Text store of document set. None if document set uses folder"""
+        text_store = self.__text_stores.get(document_set)
+        if text_store:
+            return text_store
+        with self.__text_stores_lock: # extractor is shared by sessions
+            text_store = self.__text_stores.get(document_set)
+            if text_store:
+                return text_store
+            if not os.path.isfile(self.__get_text_store_file_name(document_set)):
+                # new store is created only for new (or empty) document sets, existed folders must be migrated
+                document_set_folder = self.__get_document_set_folder_for_plain_text(document_set)
+                if not for_write or not self.use_text_store or (os.path.isdir(document_set_folder) and os.listdir(document_set_folder)):
+                    return None
+            text_store = TextStore(self.__get_text_store_file_name(document_set))
+            self.__text_stores[document_set] = text_store
+        return text_store
+
     def __get_meta_file_name(self, source_file_name : str) -> str:
         """Create file name for meta info"""
         return f'{source_file_name}{self.__META_EXT}'
 
-    def text_extraction_and_save(self, document_set : str, file_list : list[str], params : TextExtractorParams) -> list[str]:
-        """Convert into plain text"""
+    def text_extraction_and_save(
+            self,
+            document_set : str,
+            file_list : Iterable[str],
+            params : TextExtractorParams,
+            file_digests : Optional[dict[str, str]] = None
+        ) -> list[str]:
+        """
+            Convert into plain text. If digests of files are known, pages extracted before (in any document set) are reused.
+            File list can be lazy (files are extracted while next files are saved), digests must be known when file is yielded.
+        """
         
         document_set_folder = self.__get_document_set_folder_for_plain_text(document_set)
-        os.makedirs(document_set_folder, exist_ok=True)
+        text_store = self.__get_text_store(document_set, True)
+        if not text_store:
+            os.makedirs(document_set_folder, exist_ok=True)
 
         output_log = list[str]()
 
         if params.override_all:
             output_log.append('Clean up storage')
             params.show_progress_callback('Clean up storage')
-            for f in os.listdir(document_set_folder):
-                os.remove(os.path.join(document_set_folder, f))
+            if text_store:
+                text_store.clear()
+            else:
+                for f in os.listdir(document_set_folder):
+                    os.remove(os.path.join(document_set_folder, f))
             params.show_progress_callback('')
 
-        for file in file_list:
-            base_file_name = os.path.basename(file)
-            base_file_name_lower = base_file_name.lower()
-            _, base_file_extension = os.path.splitext(base_file_name_lower)
-
-            parser_type : BaseParser = UnstructuredParser
-            if base_file_extension in self.__parser_map:
-                parser_type = self.__parser_map[base_file_extension]
-
-            params.show_progress_callback(f'Parse {base_file_name}...')
-            parser_instance = parser_type(file)
-            parserResult : DocumentParserResult = parser_instance.parse(params.document_parser_params)
-            
-            if parserResult.error:
-                output_log.append(parserResult.error)
+        # parsers run in worker process, so bad file can not stall or kill extraction
+        sandbox = ParserSandbox(params.sandbox_params) if params.sandbox_params else None
+        try:
+            for file in file_list:
+                digest = file_digests.get(file) if file_digests else None
+                with trace_span('extract_file', file= os.path.basename(file), bytes= os.path.getsize(file) if os.path.isfile(file) else 0) as span:
+                    message = self.__extract_file(document_set_folder, text_store, file, digest, params, sandbox)
+                    span.set_attribute('message', message)
+                output_log.append(message)
+        finally:
+            if sandbox:
+                sandbox.close()
+
+        params.show_progress_callback('')
+        return output_log
+    
+    def __get_extraction_key(self, digest : str, file_extension : str, params : TextExtractorParams) -> str:
+        """Key of extracted pages: the same content parsed by the same parser with the same parameters gives the same pages"""
+        parser_params_json = json.dumps(asdict(params.document_parser_params), default=str, sort_keys=True)
+        return f'{digest}:{file_extension}:{get_text_digest(parser_params_json)}'
+
+    def __extract_file(
+            self,
+            document_set_folder : str,
+            text_store : Optional[TextStore],
+            file : str,
+            digest : Optional[str],
+            params : TextExtractorParams,
+            sandbox : Optional[ParserSandbox]
+        ) -> str:
+        """Parse one file and save its pages, returns log message"""
+        base_file_name = os.path.basename(file)
+        base_file_name_lower = base_file_name.lower()
+        _, base_file_extension = os.path.splitext(base_file_name_lower)
+
+        extraction_key = self.__get_extraction_key(digest, base_file_extension, params) if digest and self.artefact_store else None
+        if extraction_key:
+            page_count = self.artefact_store.get(ArtefactKind.PAGES, extraction_key)
+            if page_count is not None:
+                self.__save_content(document_set_folder, text_store, base_file_name, self.__iter_shared_content(extraction_key, int(page_count)))
+                return f'Reused {page_count} extracted page(s) of {base_file_name}'
+
+        # parser module is imported only when it's needed (in worker if sandbox is used)
+        parser_name = get_parser_name(base_file_extension)
+
+        params.show_progress_callback(f'Parse {base_file_name}...')
+        if sandbox:
+            parserResult : DocumentParserResult = sandbox.parse(parser_name, file, params.document_parser_params)
+        else:
+            try:
+                parser_type : type[BaseParser] = load_parser_type(parser_name)
+            except ImportError as error:
+                return f'ERROR: file {file}. Parser is not available: {error}'
+            parserResult : DocumentParserResult = parser_type(file).parse(params.document_parser_params)
+
+        if parserResult.error:
+            return parserResult.error
+
+        content = parserResult.content
+        if extraction_key:
+            content = self.__iter_and_share_content(extraction_key, content)
+
+        try:
+            self.__save_content(document_set_folder, text_store, base_file_name, content)
+        except ParserSandboxError as error:
+            # timeout or memory limit while pages were extracted
+            return str(error)
+        except Exception as error: # pylint: disable=W0718
+            # pages can be extracted lazily, so error can be raised here
+            return f'ERROR: file {file}. Exception: {error} [{type(error)}]'
+
+        return parserResult.message
+
+    def __iter_and_share_content(self, extraction_key : str, content : Iterable[DocumentContentItem]) -> Iterator[DocumentContentItem]:
+        """Save pages into artefact store while they are extracted, page count is saved only when all pages are done"""
+        page_count = 0
+        for content_item in content:
+            page_json = json.dumps({
+                'page_content' : content_item.page_content,
+                'page_number'  : content_item.page_number,
+                'metadata'     : content_item.metadata
+            })
+            self.artefact_store.put(ArtefactKind.PAGE, f'{extraction_key}:{page_count}', page_json)
+            page_count += 1
+            yield content_item
+        self.artefact_store.put(ArtefactKind.PAGES, extraction_key, str(page_count))
+
+    def __iter_shared_content(self, extraction_key : str, page_count : int) -> Iterator[DocumentContentItem]:
+        """Pages extracted before"""
+        key_list = [f'{extraction_key}:{index}' for index in range(page_count)]
+        for page_json in self.artefact_store.iter_values(ArtefactKind.PAGE, key_list):
+            page = json.loads(page_json)
+            yield DocumentContentItem(None, page['page_content'], page['page_number'], page['metadata'])
+
+    def __save_content(self, document_set_folder : str, text_store : Optional[TextStore], base_file_name : str, content : Iterable[DocumentContentItem]):
+        """Save pages (and meta) of one source file"""
+        for content_item in content:
+            page_file_name = f'{base_file_name}-{content_item.page_number:02d}{self.__PLAIN_TEXT_EXT}'
+            page_content = content_item.page_content
+            page_content = page_content.strip()
+
+            if not page_content:
                 continue
 
-            for content_item in parserResult.content:
-                page_file_name = f'{base_file_name}-{content_item.page_number:02d}{self.__PLAIN_TEXT_EXT}'
-                page_content = content_item.page_content
-                page_content = page_content.strip()
+            metadata = content_item.metadata
+            if not metadata:
+                metadata = {}
+            metadata["s_source"] = base_file_name
+            metadata["page_number"] = content_item.page_number
+            metadata["p_source"] = os.path.basename(page_file_name)
 
-                if not page_content:
-                    continue
+            if text_store:
+                text_store.save_page(self.__get_page_name(page_file_name), page_content, metadata)
+                continue
 
-                # save content
-                with open(os.path.join(document_set_folder, page_file_name), "wt", encoding="utf-8") as f:
-                    f.write(page_content)
-                
-                # save metadata
-                metadata = content_item.metadata
-                if not metadata:
-                    metadata = {}
-                metadata["s_source"] = base_file_name
-                metadata["page_number"] = content_item.page_number
-                metadata["p_source"] = os.path.basename(page_file_name)
+            # save content
+            with open(os.path.join(document_set_folder, page_file_name), "wt", encoding="utf-8") as f:
+                f.write(page_content)
 
-                meta_file_name = self.__get_meta_file_name(page_file_name)
-                with open(os.path.join(document_set_folder, meta_file_name), "wt", encoding="utf-8") as f:
-                    f.write(json.dumps(metadata))
+            # save metadata
+            meta_file_name = self.__get_meta_file_name(page_file_name)
+            with open(os.path.join(document_set_folder, meta_file_name), "wt", encoding="utf-8") as f:
+                f.write(json.dumps(metadata))
 
-            output_log.append(parserResult.message)
+    def get_all_source_file_names(self, document_set : str) -> list[str]:
+        """Get names (without extension) of all available plain text pages, the same for folder and text store"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            return text_store.get_page_names()
 
-        params.show_progress_callback('')
-        return output_log
-    
-    def get_all_source_file_names(self, document_set : str, only_names : bool = False) -> list[str]:
-        """Get all available files from plain text folder"""
         document_set_folder = self.__get_document_set_folder_for_plain_text(document_set)
         if not os.path.isdir(document_set_folder):
             return []
-        file_list = os.listdir(document_set_folder)
-
-        file_list = [file_name for file_name in file_list 
-                     if file_name.endswith(self.__PLAIN_TEXT_EXT) and \
-                        not file_name.endswith(self.__FACTS_EXT)
-                    ]
-
-        if only_names:
-            return [os.path.basename(file_name).removesuffix(self.__PLAIN_TEXT_EXT) for file_name in file_list]
-        
-        return [os.path.join(document_set_folder, file_name) for file_name in file_list]
+        return [
+            file_name.removesuffix(self.__PLAIN_TEXT_EXT) for file_name in os.listdir(document_set_folder)
+            if file_name.endswith(self.__PLAIN_TEXT_EXT) and not file_name.endswith(self.__FACTS_EXT)
+        ]
 
     def __convert_source_file_names(self, document_set : str, input_file_list : list[str], only_names : bool = False) -> list[str]:
         """Convert file names into full names or only names"""
@@ -146,31 +327,64 @@ class TextExtractor:
                 file_list.append(os.path.join(document_set_folder, input_file))
         return file_list
 
-    def get_input_with_meta(self, document_set : str, use_formatted : bool) -> list[tuple[str, ]]:
+    def get_input_with_meta(self, document_set : str, use_formatted : bool) -> list[tuple[str, dict]]:
         """Get all available data with meta"""
-        source_files = self.get_all_source_file_names(document_set, False)
-
-        result = list[tuple([str, dict])]()
-        for source_file in source_files:
-
-            metadata_file = self.__get_meta_file_name(source_file)
-            with open(metadata_file, encoding="utf-8") as f:
-                metadata = json.loads(f.read())
-            
-            formatted_file_name = f'{source_file}{self.__FORMATTER_EXT}'
-            if use_formatted and os.path.isfile(formatted_file_name):
-                with open(formatted_file_name, encoding="utf-8") as f:
-                    source = f.read()
-            else:
-                with open(source_file, encoding="utf-8") as f:
-                    source = f.read()
-
-            result.append(tuple([source, metadata]))
+        return list(self.iter_input_with_meta(document_set, use_formatted))
+
+    def iter_input_with_meta(
+            self,
+            document_set : str,
+            use_formatted : bool,
+            source_file_list : Optional[list[str]] = None,
+            max_workers : int = DEFAULT_READ_WORKERS
+        ) -> Iterator[tuple[str, dict]]:
+        """
+            Yield (text, meta) page by page. Pages can be filtered by source file names (s_source).
+            Pages from folder are read by small thread pool, order of pages is kept.
+        """
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            page_names = text_store.get_page_names()
+        else:
+            page_names = self.get_all_source_file_names(document_set)
+
+        if source_file_list is not None:
+            source_file_set = set(source_file_list)
+            page_names = [name for name in page_names if self.__get_source_file_name(name) in source_file_set]
+
+        if text_store:
+            yield from text_store.iter_pages_with_meta(use_formatted, page_names)
+            return
+
+        source_files = self.__convert_source_file_names(document_set, page_names, False)
+        yield from iter_in_order(lambda source_file: self.__read_page_with_meta(source_file, use_formatted), source_files, max_workers)
+
+    def __get_source_file_name(self, page_name : str) -> str:
+        """Source file name from page name ({source}-{page:02d})"""
+        return page_name.rsplit('-', 1)[0]
+
+    def __read_page_with_meta(self, source_file : str, use_formatted : bool) -> tuple[str, dict]:
+        """Read page (or its formatted version) with meta from folder"""
+        metadata_file = self.__get_meta_file_name(source_file)
+        with open(metadata_file, encoding="utf-8") as f:
+            metadata = json.loads(f.read())
+
+        formatted_file_name = f'{source_file}{self.__FORMATTER_EXT}'
+        if use_formatted and os.path.isfile(formatted_file_name):
+            with open(formatted_file_name, encoding="utf-8") as f:
+                source = f.read()
+        else:
+            with open(source_file, encoding="utf-8") as f:
+                source = f.read()
 
-        return result
+        return source, metadata
 
     def get_input_by_file_name(self, document_set : str, input_file : str) -> str:
         """Get all available data"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            return text_store.get_page(self.__get_page_name(input_file)) or ''
+
         source_files = self.__convert_source_file_names(document_set, [input_file], False)
         with open(source_files[0], encoding="utf-8") as f:
             source = f.read()
@@ -178,19 +392,23 @@ class TextExtractor:
 
     def get_input_with_meta_by_files(self,  document_set : str, input_file_list : list[str]) -> list[tuple[str, dict]]:
         """Get all available data with meta by file names"""
-        source_files = self.__convert_source_file_names(document_set, input_file_list, False)
+        return list(self.iter_input_with_meta_by_files(document_set, input_file_list))
+
+    def iter_input_with_meta_by_files(
+            self,
+            document_set : str,
+            input_file_list : list[str],
+            max_workers : int = DEFAULT_READ_WORKERS
+        ) -> Iterator[tuple[str, dict]]:
+        """Yield (text, meta) for given pages one by one, in order of input list"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            page_names = [self.__get_page_name(input_file) for input_file in input_file_list]
+            yield from text_store.iter_pages_with_meta(False, page_names)
+            return
 
-        result = list[tuple([str, dict])]()
-        for source_file in source_files:
-            print(source_file)
-            metadata_file = self.__get_meta_file_name(source_file)
-            with open(metadata_file, encoding="utf-8") as f:
-                metadata = json.loads(f.read())
-            with open(source_file, encoding="utf-8") as f:
-                source = f.read()
-            result.append(tuple([source, metadata]))
-
-        return result
+        source_files = self.__convert_source_file_names(document_set, input_file_list, False)
+        yield from iter_in_order(lambda source_file: self.__read_page_with_meta(source_file, False), source_files, max_workers)
 
     def __get_formatted_file_name(self, document_set : str, plain_text_file_name : str) -> str:
         source_file = self.__convert_source_file_names(document_set, [plain_text_file_name], False)[0]
@@ -202,12 +420,20 @@ class TextExtractor:
 
     def save_formatted_text(self, document_set : str, plain_text_file_name : str, formatted_text : str):
         """Save formatted text"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            text_store.save_formatted(self.__get_page_name(plain_text_file_name), formatted_text)
+            return
         formatted_file_name = self.__get_formatted_file_name(document_set, plain_text_file_name)
         with open(formatted_file_name, "wt", encoding="utf-8") as f:
             f.write(formatted_text)
 
     def save_fact_text(self, document_set : str, plain_text_file_name : str, fact_list : list[str]):
         """Save fact list text"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            text_store.save_facts(self.__get_page_name(plain_text_file_name), fact_list)
+            return
         fact_file_name = self.__get_facts_file_name(document_set, plain_text_file_name)
         with open(fact_file_name, "wt", encoding="utf-8") as f:
             for fact in fact_list:
@@ -218,6 +444,9 @@ class TextExtractor:
 
     def get_facts_from_file(self, document_set : str, plain_text_file_name : str) -> list[str]:
         """Save fact list text"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            return text_store.get_facts(self.__get_page_name(plain_text_file_name))
         fact_file_name = self.__get_facts_file_name(document_set, plain_text_file_name)
         with open(fact_file_name, "rt", encoding="utf-8") as f:
             fact_str = f.read()
@@ -226,6 +455,9 @@ class TextExtractor:
     
     def get_formatted_text(self, document_set : str, plain_text_file : str) -> str:
         """Get formatted text"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            return text_store.get_formatted(self.__get_page_name(plain_text_file)) or ''
         formatted_file_name = self.__get_formatted_file_name(document_set, plain_text_file)
         if not os.path.isfile(formatted_file_name):
             return ''
@@ -241,18 +473,29 @@ class TextExtractor:
 
     def save_tables(self, document_set : str, plain_text_file : str, tables_text : str):
         """Save tables text"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            text_store.save_tables(self.__get_page_name(plain_text_file), tables_text)
+            return
         tables_file_name = self.__get_table_file_name(document_set, plain_text_file)
         with open(tables_file_name, "wt", encoding="utf-8") as f:
             f.write(tables_text)
 
     def delete_table(self, document_set : str, plain_text_file : str):
         """Delete table"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            text_store.delete_tables(self.__get_page_name(plain_text_file))
+            return
         tables_file_name = self.__get_table_file_name(document_set, plain_text_file)
         if os.path.isfile(tables_file_name):
             os.remove(tables_file_name)
 
     def get_table_file_list(self, document_set : str, only_names : bool) -> list[str]:
         """List of files with tables"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            return [f'{name}{self.__PLAIN_TEXT_EXT}{self.__TABLES_EXT}' for name in text_store.get_table_page_names()]
         document_set_folder = self.__get_document_set_folder_for_plain_text(document_set)
         if not os.path.isdir(document_set_folder):
             return []
@@ -263,6 +506,9 @@ class TextExtractor:
 
     def load_table_json(self, document_set : str, file_name : str) -> str:
         """Return table json"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            return text_store.get_tables(self.__get_page_name(file_name.removesuffix(self.__TABLES_EXT))) or ''
         document_set_folder = self.__get_document_set_folder_for_plain_text(document_set)
         if not os.path.isdir(document_set_folder):
             return ''
@@ -278,6 +524,9 @@ class TextExtractor:
         
     def get_all_facts_file_names(self, document_set : str, only_names : bool = False) -> list[str]:
         """Get all available files with facts"""
+        text_store = self.__get_text_store(document_set)
+        if text_store:
+            return text_store.get_fact_page_names()
         document_set_folder = self.__get_document_set_folder_for_plain_text(document_set)
         if not os.path.isdir(document_set_folder):
             return []
@@ -287,3 +536,39 @@ class TextExtractor:
             return [os.path.basename(file_name).removesuffix(self.__FACTS_EXT).removesuffix(self.__PLAIN_TEXT_EXT) for file_name in file_list]
         return [os.path.join(document_set_folder, file_name) for file_name in file_list]
 
+    def migrate_to_text_store(self, document_set : str) -> int:
+        """Move pages and all artefacts of document set from folder into single file store. Returns count of pages"""
+        if self.uses_text_store(document_set):
+            return 0
+        document_set_folder = self.__get_document_set_folder_for_plain_text(document_set)
+        if not os.path.isdir(document_set_folder):
+            return 0
+
+        page_list = []
+        for page_name in self.get_all_source_file_names(document_set):
+            plain_text_file = f'{page_name}{self.__PLAIN_TEXT_EXT}'
+            source_file = os.path.join(document_set_folder, plain_text_file)
+            with open(source_file, encoding="utf-8") as f:
+                content = f.read()
+            with open(self.__get_meta_file_name(source_file), encoding="utf-8") as f:
+                metadata = json.loads(f.read())
+            formatted = self.get_formatted_text(document_set, plain_text_file) or None
+            facts = None
+            if os.path.isfile(self.__get_facts_file_name(document_set, plain_text_file)):
+                facts = self.get_facts_from_file(document_set, plain_text_file)
+            tables = self.load_table_json(document_set, plain_text_file) or None
+            page_list.append((self.__get_page_name(plain_text_file), content, metadata, formatted, facts, tables))
+
+        # store is created next to folder and renamed, so half-migrated store is never used
+        text_store_file_name = self.__get_text_store_file_name(document_set)
+        temp_file_name = f'{text_store_file_name}.tmp'
+        for file_name in [temp_file_name, f'{temp_file_name}-wal', f'{temp_file_name}-shm']:
+            if os.path.isfile(file_name):
+                os.remove(file_name)
+        text_store = TextStore(temp_file_name)
+        text_store.save_pages(page_list)
+        text_store.close()
+        os.replace(temp_file_name, text_store_file_name)
+
+        shutil.rmtree(document_set_folder)
+        return len(page_list)
@@ -0,0 +1,153 @@
+"""
+    Single file (sqlite) store of extracted pages of document set
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,C0305,W0611,W0511,C0411
+
+import json
+import sqlite3
+import threading
+from typing import Iterator, Optional
+
+class TextStore:
+    """Pages, metadata and derived artefacts (formatted text, facts, tables) of one document set in one file"""
+
+    file_name    : str
+    __connection : sqlite3.Connection
+    __lock       : threading.Lock
+
+    __READ_BATCH_SIZE = 100
+
+    def __init__(self, file_name : str):
+        self.file_name = file_name
+        # streamlit runs script in different threads, access is serialized by lock
+        self.__connection = sqlite3.connect(file_name, check_same_thread=False)
+        self.__lock = threading.Lock()
+        with self.__lock, self.__connection:
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.execute('PRAGMA synchronous=NORMAL')
+            self.__connection.execute('''
+                CREATE TABLE IF NOT EXISTS page (
+                    name      TEXT PRIMARY KEY,
+                    content   TEXT NOT NULL,
+                    metadata  TEXT NOT NULL,
+                    formatted TEXT,
+                    facts     TEXT,
+                    tables    TEXT
+                )
+            ''')
+
+    def close(self):
+        """Close store"""
+        with self.__lock:
+            self.__connection.close()
+
+    def __execute(self, sql : str, parameters : tuple = ()) -> list[tuple]:
+        with self.__lock, self.__connection:
+            return self.__connection.execute(sql, parameters).fetchall()
+
+    def __get_value(self, column : str, name : str) -> Optional[str]:
+        rows = self.__execute(f'SELECT {column} FROM page WHERE name = ?', (name,))
+        return rows[0][0] if rows else None
+
+    def __get_names(self, column : Optional[str] = None) -> list[str]:
+        if column:
+            rows = self.__execute(f'SELECT name FROM page WHERE {column} IS NOT NULL ORDER BY name')
+        else:
+            rows = self.__execute('SELECT name FROM page ORDER BY name')
+        return [row[0] for row in rows]
+
+    def clear(self):
+        """Remove all pages"""
+        self.__execute('DELETE FROM page')
+
+    def save_page(self, name : str, content : str, metadata : dict):
+        """Save page (derived artefacts of existed page are kept)"""
+        self.__execute('''
+            INSERT INTO page (name, content, metadata) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET content = excluded.content, metadata = excluded.metadata
+        ''', (name, content, json.dumps(metadata)))
+
+    def save_pages(self, page_list : list[tuple[str, str, dict, Optional[str], Optional[list[str]], Optional[str]]]):
+        """Save pages with all artefacts in one transaction: (name, content, metadata, formatted, facts, tables)"""
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO page (name, content, metadata, formatted, facts, tables) VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (name, content, json.dumps(metadata), formatted, json.dumps(facts) if facts is not None else None, tables)
+                    for name, content, metadata, formatted, facts, tables in page_list
+                ]
+            )
+
+    def get_page_names(self) -> list[str]:
+        """Names of all pages"""
+        return self.__get_names()
+
+    def get_page(self, name : str) -> Optional[str]:
+        """Page content"""
+        return self.__get_value('content', name)
+
+    def get_page_with_meta(self, name : str) -> Optional[tuple[str, dict]]:
+        """Page content with metadata"""
+        rows = self.__execute('SELECT content, metadata FROM page WHERE name = ?', (name,))
+        if not rows:
+            return None
+        return rows[0][0], json.loads(rows[0][1])
+
+    def iter_pages_with_meta(self, use_formatted : bool, name_list : Optional[list[str]] = None) -> Iterator[tuple[str, dict]]:
+        """Pages (formatted text if it's available and requested) with metadata, read by small batches"""
+        if name_list is None:
+            name_list = self.get_page_names()
+        for batch_start in range(0, len(name_list), self.__READ_BATCH_SIZE):
+            batch_names = name_list[batch_start : batch_start + self.__READ_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch_names))
+            rows = self.__execute(f'SELECT name, content, formatted, metadata FROM page WHERE name IN ({placeholders})', tuple(batch_names))
+            row_map = {row[0] : row[1:] for row in rows}
+            for name in batch_names:
+                if name not in row_map:
+                    continue
+                content, formatted, metadata = row_map[name]
+                if use_formatted and formatted is not None:
+                    content = formatted
+                yield content, json.loads(metadata)
+
+    def save_formatted(self, name : str, formatted_text : str):
+        """Save formatted text of page"""
+        self.__execute('UPDATE page SET formatted = ? WHERE name = ?', (formatted_text, name))
+
+    def get_formatted(self, name : str) -> Optional[str]:
+        """Formatted text of page"""
+        return self.__get_value('formatted', name)
+
+    def save_facts(self, name : str, fact_list : list[str]):
+        """Save facts of page"""
+        self.__execute('UPDATE page SET facts = ? WHERE name = ?', (json.dumps(fact_list), name))
+
+    def get_facts(self, name : str) -> list[str]:
+        """Facts of page"""
+        facts = self.__get_value('facts', name)
+        return json.loads(facts) if facts else []
+
+    def get_fact_page_names(self) -> list[str]:
+        """Names of pages with facts"""
+        return self.__get_names('facts')
+
+    def save_tables(self, name : str, tables_text : str):
+        """Save tables (json) of page"""
+        self.__execute('UPDATE page SET tables = ? WHERE name = ?', (tables_text, name))
+
+    def delete_tables(self, name : str):
+        """Delete tables of page"""
+        self.__execute('UPDATE page SET tables = NULL WHERE name = ?', (name,))
+
+    def get_tables(self, name : str) -> Optional[str]:
+        """Tables (json) of page"""
+        return self.__get_value('tables', name)
+
+    def get_table_page_names(self) -> list[str]:
+        """Names of pages with tables"""
+        return self.__get_names('tables')
+
+    def get_page_count(self) -> int:
+        """Count of pages"""
+        return self.__execute('SELECT COUNT(*) FROM page')[0][0]
@@ -0,0 +1,256 @@
+"""
+    Tracing of stages: nested spans with timing and attributes (tokens, chunk counts, bytes).
+    Finished traces are saved as JSON lines into .logs/spans-YYYY-MM-DD.jsonl,
+    and sent to OTLP/HTTP collector if OTEL_EXPORTER_OTLP_ENDPOINT is set.
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,W0718,W1203
+
+import os
+import time
+import json
+import queue
+import logging
+import functools
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Iterator, Optional
+
+logger : logging.Logger = logging.getLogger()
+
+TRACE_FOLDER = '.logs'
+TRACE_FILE_PREFIX = 'spans-'
+TRACE_FILE_EXT = '.jsonl'
+SERVICE_NAME = 'gpt-search-and-summary'
+
+OTLP_ENDPOINT_ENV = 'OTEL_EXPORTER_OTLP_ENDPOINT' # for example http://localhost:4318
+TRACING_DISABLED_ENV = 'TRACING_DISABLED'
+
+@dataclass
+class Span:
+    """One stage"""
+    name        : str
+    trace_id    : str
+    span_id     : str
+    parent_id   : Optional[str]
+    start_time  : float # epoch seconds
+    duration    : float = 0 # seconds
+    attributes  : dict[str, Any] = field(default_factory=dict)
+    error       : Optional[str] = None
+    children    : list['Span'] = field(default_factory=list, repr=False)
+
+    def set_attribute(self, key : str, value : Any):
+        """Set attribute"""
+        self.attributes[key] = value
+
+    def add_attribute(self, key : str, value : float):
+        """Add value to numeric attribute (for example tokens of several LLM calls)"""
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_record(self) -> dict[str, Any]:
+        """JSON record (without children)"""
+        return {
+            'name'       : self.name,
+            'trace_id'   : self.trace_id,
+            'span_id'    : self.span_id,
+            'parent_id'  : self.parent_id,
+            'start_time' : self.start_time,
+            'duration'   : self.duration,
+            'attributes' : self.attributes,
+            'error'      : self.error
+        }
+
+def iter_span_tree(root : Span, depth : int = 0) -> Iterator[tuple[int, Span]]:
+    """(depth, span) for span and all nested spans, depth first"""
+    yield depth, root
+    for child in root.children:
+        yield from iter_span_tree(child, depth + 1)
+
+def add_llm_usage(span : Span, llm_callback : Any):
+    """Add token usage and cost from openai callback to span"""
+    span.add_attribute('tokens', llm_callback.total_tokens)
+    span.add_attribute('prompt_tokens', llm_callback.prompt_tokens)
+    span.add_attribute('completion_tokens', llm_callback.completion_tokens)
+    span.add_attribute('cost', llm_callback.total_cost)
+
+def get_otlp_value(value : Any) -> dict[str, Any]:
+    """OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def to_otlp_json(span_list : list[Span]) -> dict[str, Any]:
+    """Spans in OTLP/HTTP JSON form (ExportTraceServiceRequest)"""
+    otlp_spans = []
+    for span in span_list:
+        otlp_span = {
+            'traceId'           : span.trace_id,
+            'spanId'            : span.span_id,
+            'name'              : span.name,
+            'kind'              : 1, # internal
+            'startTimeUnixNano' : str(int(span.start_time * 1e9)),
+            'endTimeUnixNano'   : str(int((span.start_time + span.duration) * 1e9)),
+            'attributes'        : [{'key': key, 'value': get_otlp_value(value)} for key, value in span.attributes.items()],
+            'status'            : {'code': 2, 'message': span.error} if span.error else {'code': 1}
+        }
+        if span.parent_id:
+            otlp_span['parentSpanId'] = span.parent_id
+        otlp_spans.append(otlp_span)
+    return {
+        'resourceSpans': [{
+            'resource'   : {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans' : [{'scope': {'name': SERVICE_NAME}, 'spans': otlp_spans}]
+        }]
+    }
+
+class JsonLinesSpanExporter:
+    """Spans are appended into daily JSON lines file"""
+
+    folder : str
+    __lock : threading.Lock
+
+    def __init__(self, folder : str = TRACE_FOLDER):
+        self.folder = folder
+        self.__lock = threading.Lock()
+
+    def get_file_name(self, start_time : float) -> str:
+        """Daily file name"""
+        return os.path.join(self.folder, f'{TRACE_FILE_PREFIX}{datetime.fromtimestamp(start_time).strftime("%Y-%m-%d")}{TRACE_FILE_EXT}')
+
+    def export(self, span_list : list[Span]):
+        """Save spans of one trace"""
+        os.makedirs(self.folder, exist_ok=True)
+        lines = ''.join(json.dumps(span.to_record(), default=str) + '\n' for span in span_list)
+        # one write per trace, so traces of several processes are not mixed
+        with self.__lock, open(self.get_file_name(span_list[0].start_time), 'at', encoding='utf-8') as f:
+            f.write(lines)
+
+class OtlpHttpSpanExporter:
+    """Spans are sent to OTLP/HTTP collector (JSON encoding) by background thread"""
+
+    url     : str
+    __queue : queue.Queue
+
+    __MAX_QUEUE_SIZE = 1000 # traces are dropped if collector is not available
+    __TIMEOUT = 5
+
+    def __init__(self, endpoint : str):
+        self.url = f'{endpoint.rstrip("/")}/v1/traces'
+        self.__queue = queue.Queue(self.__MAX_QUEUE_SIZE)
+        threading.Thread(target=self.__send_loop, name='otlp-exporter', daemon=True).start()
+
+    def export(self, span_list : list[Span]):
+        """Queue spans of one trace"""
+        try:
+            self.__queue.put_nowait(span_list)
+        except queue.Full:
+            pass
+
+    def __send_loop(self):
+        while True:
+            span_list = self.__queue.get()
+            try:
+                request = urllib.request.Request(
+                    self.url,
+                    json.dumps(to_otlp_json(span_list), default=str).encode('utf-8'),
+                    {'Content-Type': 'application/json'}
+                )
+                with urllib.request.urlopen(request, timeout=self.__TIMEOUT):
+                    pass
+            except Exception as error:
+                logger.warning(f'Spans were not sent to {self.url}: {error}')
+
+class Tracer:
+    """Creates nested spans, trace is exported when its root span is finished"""
+
+    exporters : Optional[list[Any]]
+    __current : contextvars.ContextVar
+
+    def __init__(self, exporters : Optional[list[Any]] = None):
+        self.exporters = exporters
+        self.__current = contextvars.ContextVar('current_span', default=None)
+
+    def __get_exporters(self) -> list[Any]:
+        # default exporters are created on first trace (environment is read at runtime)
+        if self.exporters is None:
+            exporters = []
+            if not os.environ.get(TRACING_DISABLED_ENV):
+                exporters.append(JsonLinesSpanExporter())
+            if os.environ.get(OTLP_ENDPOINT_ENV):
+                exporters.append(OtlpHttpSpanExporter(os.environ[OTLP_ENDPOINT_ENV]))
+            self.exporters = exporters
+        return self.exporters
+
+    def get_current_span(self) -> Optional[Span]:
+        """Current span (None outside of spans)"""
+        return self.__current.get()
+
+    @contextmanager
+    def span(self, name : str, **attributes) -> Iterator[Span]:
+        """Run stage in span, nested spans of the same thread (or copied context) are children"""
+        parent : Optional[Span] = self.__current.get()
+        span = Span(
+            name,
+            parent.trace_id if parent else os.urandom(16).hex(),
+            os.urandom(8).hex(),
+            parent.span_id if parent else None,
+            time.time(),
+            attributes= attributes
+        )
+        token = self.__current.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as error:
+            span.error = f'{error} [{type(error)}]'
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            self.__current.reset(token)
+            if parent:
+                parent.children.append(span)
+            else:
+                self.__export(span)
+
+    def __export(self, root : Span):
+        span_list = [span for _, span in iter_span_tree(root)]
+        for exporter in self.__get_exporters():
+            try:
+                exporter.export(span_list)
+            except Exception as error:
+                logger.warning(f'Spans were not exported: {error}')
+
+tracer = Tracer()
+
+def trace_span(name : str, **attributes):
+    """Span of default tracer"""
+    return tracer.span(name, **attributes)
+
+def get_current_span() -> Optional[Span]:
+    """Current span of default tracer"""
+    return tracer.get_current_span()
+
+def count_cache_lookup(cache_name : str, hits : int, misses : int):
+    """Add cache hits and misses to current span (ignored outside of spans)"""
+    span = tracer.get_current_span()
+    if span:
+        span.add_attribute(f'cache.{cache_name}.hits', hits)
+        span.add_attribute(f'cache.{cache_name}.misses', misses)
+
+def traced(name : str) -> Callable[[Callable], Callable]:
+    """Decorator: function call is span of default tracer (not for generators)"""
+    def decorator(function : Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,215 @@
+"""
+    Bulk download of urls (list or sitemap) into source storage
+"""
+
+# pylint: disable=C0301,C0103,C0304,C0303,C0305,W0611,W0511,C0411,R0913,W1203
+
+import asyncio
+import logging
+import xml.etree.ElementTree as ET
+from enum import Enum
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import aiohttp
+
+from core.source_storage import SourceStorage
+
+logger : logging.Logger = logging.getLogger()
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+# content of these files is saved as is, all other urls are saved as html
+SOURCE_FILE_EXTENSIONS = ['.pdf', '.docx', '.txt', '.msg', '.html', '.htm']
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+def get_file_name_from_url(url : str) -> str:
+    """Build file name from url"""
+    file_name = url \
+                    .replace('https://', '')\
+                    .replace('http://', '') \
+                    .replace('/', '-')\
+                    .replace('\\', '-')\
+                    .replace('&', '-')\
+                    .replace('?', '-')\
+                    .replace(':', '-')\
+                    .strip('-')
+    if any(file_name.lower().endswith(extension) for extension in SOURCE_FILE_EXTENSIONS):
+        return file_name
+    return f'{file_name}.html'
+
+@dataclass
+class UrlIngestionParams:
+    """Parameters of url download"""
+    max_connections  : int = 20 # total count of open connections
+    max_per_host     : int = 4  # count of parallel requests to the same host
+    retry_count      : int = 3  # retries for network errors and 429/5xx
+    retry_delay      : float = 1 # seconds, doubled for each next retry
+    timeout_seconds  : float = 100
+    chunk_size       : int = 64 * 1024
+    headers          : dict[str, str] = field(default_factory=lambda: dict(DEFAULT_HEADERS))
+
+class UrlIngestionStatus(Enum):
+    """Result of url download"""
+    SAVED        = "saved"
+    NOT_MODIFIED = "not modified"
+    ERROR        = "error"
+
+@dataclass
+class UrlIngestionResult:
+    """Result of one url"""
+    url       : str
+    status    : UrlIngestionStatus
+    file_name : Optional[str] = None
+    digest    : Optional[str] = None
+    error     : Optional[str] = None
+
+def get_url_ingestion_message(result : UrlIngestionResult) -> str:
+    """Status message of one url for UI and log"""
+    if result.status == UrlIngestionStatus.ERROR:
+        return f'ERROR: {result.url}. {result.error}'
+    if result.status == UrlIngestionStatus.NOT_MODIFIED:
+        return f'Content of {result.file_name} file is not modified.'
+    return f'Content loaded into {result.file_name} file.'
+
+class UrlIngestion:
+    """Download urls with pooled async http client, content is streamed into source storage"""
+
+    source_storage : SourceStorage
+    params         : UrlIngestionParams
+
+    def __init__(self, source_storage : SourceStorage, params : UrlIngestionParams):
+        self.source_storage = source_storage
+        self.params = params
+
+    def ingest(self, document_set : str, url_list : list[str], progress_callback : Optional[Callable[[str], None]] = None) -> list[UrlIngestionResult]:
+        """Download urls into document set. Urls downloaded before are requested with ETag/Last-Modified"""
+        return asyncio.run(self.ingest_async(document_set, url_list, progress_callback))
+
+    def get_sitemap_urls(self, sitemap_url : str) -> list[str]:
+        """Urls from sitemap (nested sitemaps are loaded too)"""
+        return asyncio.run(self.get_sitemap_urls_async(sitemap_url))
+
+    def __create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=self.params.max_connections, limit_per_host=self.params.max_per_host)
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers=self.params.headers,
+            timeout=aiohttp.ClientTimeout(total=self.params.timeout_seconds)
+        )
+
+    async def ingest_async(self, document_set : str, url_list : list[str], progress_callback : Optional[Callable[[str], None]] = None) -> list[UrlIngestionResult]:
+        """Download urls into document set"""
+        url_list = list(dict.fromkeys(url.strip() for url in url_list if url.strip()))
+        url_info = self.source_storage.get_url_info(document_set)
+        current_files = set(self.source_storage.get_all_files(document_set, True))
+        done_count = 0
+
+        async def ingest_url(session : aiohttp.ClientSession, url : str) -> UrlIngestionResult:
+            nonlocal done_count
+            result = await self.__ingest_url(session, document_set, url, url_info, current_files)
+            done_count += 1
+            if progress_callback:
+                progress_callback(f'Downloaded {done_count}/{len(url_list)} url(s)...')
+            return result
+
+        async with self.__create_session() as session:
+            result_list = await asyncio.gather(*[ingest_url(session, url) for url in url_list])
+
+        self.source_storage.save_url_info(document_set, url_info)
+        return result_list
+
+    async def __ingest_url(
+            self,
+            session : aiohttp.ClientSession,
+            document_set : str,
+            url : str,
+            url_info : dict[str, dict[str, str]],
+            current_files : set[str]
+        ) -> UrlIngestionResult:
+        """Download one url with retries"""
+        file_name = get_file_name_from_url(url)
+
+        # conditional request only if file is still available
+        headers = {}
+        info = url_info.get(url)
+        if info and info.get('file_name') == file_name and file_name in current_files:
+            if info.get('etag'):
+                headers['If-None-Match'] = info['etag']
+            if info.get('last_modified'):
+                headers['If-Modified-Since'] = info['last_modified']
+
+        retry_delay = self.params.retry_delay
+        for attempt in range(self.params.retry_count + 1):
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        return UrlIngestionResult(url, UrlIngestionStatus.NOT_MODIFIED, file_name, info.get('digest') if info else None)
+                    if response.status in RETRY_STATUS_CODES and attempt < self.params.retry_count:
+                        error = f'HTTP {response.status}'
+                    elif response.status != 200:
+                        return UrlIngestionResult(url, UrlIngestionStatus.ERROR, file_name, error=f'HTTP {response.status}')
+                    else:
+                        digest = await self.__save_response(document_set, file_name, response)
+                        url_info[url] = {
+                            'file_name'     : file_name,
+                            'digest'        : digest,
+                            'etag'          : response.headers.get('ETag', ''),
+                            'last_modified' : response.headers.get('Last-Modified', '')
+                        }
+                        return UrlIngestionResult(url, UrlIngestionStatus.SAVED, file_name, digest)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+                error = f'{type(exception).__name__} {exception}'
+                if attempt >= self.params.retry_count:
+                    break
+            logger.warning(f'Retry {url} in {retry_delay} s: {error}')
+            await asyncio.sleep(retry_delay)
+            retry_delay *= 2
+
+        return UrlIngestionResult(url, UrlIngestionStatus.ERROR, file_name, error=error)
+
+    async def __save_response(self, document_set : str, file_name : str, response : aiohttp.ClientResponse) -> str:
+        """Stream response body into source storage"""
+        file_writer = self.source_storage.create_file_writer(document_set, file_name)
+        try:
+            async for chunk in response.content.iter_chunked(self.params.chunk_size):
+                file_writer.write(chunk)
+        except BaseException:
+            file_writer.abort()
+            raise
+        return file_writer.commit()
+
+    async def get_sitemap_urls_async(self, sitemap_url : str) -> list[str]:
+        """Urls from sitemap (nested sitemaps are loaded too)"""
+        url_list = list[str]()
+        async with self.__create_session() as session:
+            sitemap_list = [sitemap_url]
+            loaded_sitemaps = set[str]()
+            while sitemap_list:
+                sitemap_list = [sitemap for sitemap in sitemap_list if sitemap not in loaded_sitemaps]
+                loaded_sitemaps.update(sitemap_list)
+                sitemap_content_list = await asyncio.gather(*[self.__fetch_text(session, sitemap) for sitemap in sitemap_list])
+                sitemap_list = []
+                for sitemap_content in sitemap_content_list:
+                    page_urls, nested_sitemaps = parse_sitemap(sitemap_content)
+                    url_list.extend(page_urls)
+                    sitemap_list.extend(nested_sitemaps)
+        return list(dict.fromkeys(url_list))
+
+    async def __fetch_text(self, session : aiohttp.ClientSession, url : str) -> str:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return await response.text()
+
+def parse_sitemap(sitemap_content : str) -> tuple[list[str], list[str]]:
+    """Page urls and nested sitemap urls from sitemap xml"""
+    root = ET.fromstring(sitemap_content)
+    locations = [element.text.strip() for element in root.iter() if element.tag.endswith('loc') and element.text]
+    if root.tag.endswith('sitemapindex'):
+        return [], locations
+    return locations, []
@@ -3,12 +3,12 @@
 """
 # pylint: disable=C0301,C0103,C0304,C0303,W0611
 
-import requests
 import streamlit as st
 import urllib.parse
 
 from utils_streamlit import streamlit_hack_remove_top_space, hide_footer
-from backend_core import BackEndCore
+from backend_core import BackEndCore, BackendTextExtractionParams
+from core.url_ingestion import get_file_name_from_url, get_url_ingestion_message
 from ui.shared_session import set_selected_document_set, get_selected_document_set_index
 from utils.app_logger import init_streamlit_logger
 
@@ -16,6 +16,7 @@ from utils.app_logger import init_streamlit_logger
 
 CONTENT_FROM_FILE = 'From file'
 CONTENT_FROM_URL_HTML  = 'From URL (html)'
+CONTENT_FROM_URL_LIST  = 'From URL list or sitemap'
 
 # ------------------------------- Session
 
@@ -67,21 +68,28 @@ if currently_uploaded_files:
 else:
     current_file_list.markdown("No files available")
 
-content_type = st.radio("Content type:", [CONTENT_FROM_FILE, CONTENT_FROM_URL_HTML], horizontal=True)
+content_type = st.radio("Content type:", [CONTENT_FROM_FILE, CONTENT_FROM_URL_HTML, CONTENT_FROM_URL_LIST], horizontal=True)
 
 new_uploaded_files = None
 new_uploaded_url   = None
+new_url_list       = None
+new_sitemap_url    = None
+extract_archives   = False
 
 with st.form(key="uploadContent", clear_on_submit=True):
     if content_type == CONTENT_FROM_FILE:
         new_uploaded_files = st.file_uploader(
-            'Choose files for indexing (PDF, Word, Txt)',
-            type=["pdf", "docx", "txt", "msg"],
+            'Choose files for indexing (PDF, Word, Txt) or archives (zip, tar)',
+            type=["pdf", "docx", "txt", "msg", "zip", "tar", "gz", "tgz"],
             accept_multiple_files= True,
             key="new_uploaded_files"
         )
+        extract_archives = st.checkbox(label="Extract plain text from archive files while unpacking", value=True)
     if content_type == CONTENT_FROM_URL_HTML:
         new_uploaded_url = st.text_input("URL (html):")
+    if content_type == CONTENT_FROM_URL_LIST:
+        new_url_list = st.text_area("URLs (one per line):")
+        new_sitemap_url = st.text_input("Sitemap URL:")
     load_button = st.form_submit_button(label="Upload")
     
 progress = st.empty()
@@ -103,24 +111,34 @@ if content_type == CONTENT_FROM_URL_HTML and not new_uploaded_url:
     progress.markdown('Please provide URL for downloading')
     st.stop()
 
+if content_type == CONTENT_FROM_URL_LIST and not new_url_list and not new_sitemap_url:
+    progress.markdown('Please provide URLs or sitemap for downloading')
+    st.stop()
+
 if content_type == CONTENT_FROM_FILE:
     progress.markdown('Saving files...')
+    unchanged_count = 0
+    archive_log = []
     for file in new_uploaded_files:
-        source_index.save_file(selected_document_set, file.name, file.getbuffer())
-    st.session_state[SESSION_UPLOADED_STATUS] = f'Uploaded {len(new_uploaded_files)} file(s)'
+        if BackEndCore().is_archive_file(file.name):
+            progress.markdown(f'Unpacking {file.name}...')
+            extraction_params = None
+            if extract_archives:
+                extraction_params = BackendTextExtractionParams(
+                    False, False, False, False, '', False, progress.markdown,
+                    pdf_parser_backend= BackEndCore().get_pdf_parser_backend(selected_document_set)
+                )
+            archive_log.extend(BackEndCore().run_archive_upload(selected_document_set, file.name, file, extraction_params))
+            continue
+        previous_digest = source_index.get_file_digest(selected_document_set, file.name)
+        digest = source_index.save_stream(selected_document_set, file.name, file)
+        if digest == previous_digest:
+            unchanged_count += 1
+    st.session_state[SESSION_UPLOADED_STATUS] = '\n\n'.join([f'Uploaded {len(new_uploaded_files)} file(s), {unchanged_count} unchanged'] + archive_log)
     st.rerun()
 
 if content_type == CONTENT_FROM_URL_HTML:
-    file_name_from_url = new_uploaded_url \
-                                .replace('https://', '')\
-                                .replace('http://', '') \
-                                .replace('/', '-')\
-                                .replace('\\', '-')\
-                                .replace('&', '-')\
-                                .replace('?', '-')\
-                                .replace(':', '-')\
-                                .strip('-') \
-                                + '.html'
+    file_name_from_url = get_file_name_from_url(new_uploaded_url)
 
     if new_uploaded_url.lower().startswith('file://'):
         progress.markdown('Load from FILE...')
@@ -136,21 +154,13 @@ if content_type == CONTENT_FROM_URL_HTML:
         st.session_state[SESSION_UPLOADED_STATUS] = f'Content loaded into {file_name_from_url} file. {len(html_content)}  bytes.'
     else:
         progress.markdown('Fetch URL...')
-    
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36",
-            "Accept-Language": "en-US,en;q=0.5",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Connection": "keep-alive",
-            "Upgrade-Insecure-Requests": "1",
-        }    
-
-        response = requests.get(new_uploaded_url, headers=headers, timeout=100)
-        if response.status_code == 200:
-            html = response.text
-            source_index.save_file(selected_document_set, file_name_from_url, html)
-            st.session_state[SESSION_UPLOADED_STATUS] = f'Content loaded into {file_name_from_url} file. {len(html)}  bytes.'
-        else:
-            st.session_state[SESSION_UPLOADED_STATUS] = f'Error loading content. Code: {response.status_code}.'
+        url_result = BackEndCore().run_single_url_ingestion(selected_document_set, new_uploaded_url)
+        st.session_state[SESSION_UPLOADED_STATUS] = get_url_ingestion_message(url_result)
+
+    st.rerun()
 
+if content_type == CONTENT_FROM_URL_LIST:
+    progress.markdown('Fetch URLs...')
+    output_log = BackEndCore().run_url_ingestion(selected_document_set, new_url_list.splitlines() if new_url_list else [], new_sitemap_url, progress.markdown)
+    st.session_state[SESSION_UPLOADED_STATUS] = '\n\n'.join(output_log)
     st.rerun()
@@ -0,0 +1,160 @@
+"""
+    Performance page: latency, throughput, LLM cost and cache hit rates from recorded spans
+"""
+# pylint: disable=C0301,C0103,C0304,C0303,W0611
+
+import datetime
+from typing import Optional
+
+import pandas as pd
+import streamlit as st
+
+from utils_streamlit import streamlit_hack_remove_top_space, hide_footer
+from backend_core import BackEndCore
+from core.span_metrics import StageMetrics, get_cache_hit_rates
+from ui.shared_session import set_selected_document_set, get_selected_document_set_index
+from utils.app_logger import init_streamlit_logger
+
+# ------------------------------- Const
+PERIOD_DAYS = {
+    "Today"        : 0,
+    "Last 7 days"  : 6,
+    "Last 30 days" : 29,
+    "All"          : None
+}
+PERCENTILES = [50, 95, 99]
+
+# ------------------------------- Core
+
+document_set_manager = BackEndCore.get_document_set_manager()
+file_index = BackEndCore.get_file_index()
+span_metrics = BackEndCore.get_span_metrics()
+
+init_streamlit_logger()
+# ------------------------------- UI Setup
+PAGE_NAME = "Performance"
+st.set_page_config(page_title= PAGE_NAME, layout="wide")
+st.title(PAGE_NAME)
+streamlit_hack_remove_top_space()
+hide_footer()
+
+def get_throughput(day_stages : dict[str, StageMetrics], stage_name : str, attribute : str, time_stage_name : str, scale : float = 1) -> Optional[float]:
+    """Sum of attribute per second of time stage"""
+    stage = day_stages.get(stage_name)
+    time_stage = day_stages.get(time_stage_name)
+    if not stage or not time_stage or not time_stage.seconds:
+        return None
+    return stage.totals.get(attribute, 0) / time_stage.seconds * scale
+
+# only new lines of span files are read
+span_metrics.update()
+
+period = st.radio(label="Period", options= list(PERIOD_DAYS.keys()), index=1, horizontal=True, label_visibility="collapsed")
+day_from = None
+if PERIOD_DAYS[period] is not None:
+    day_from = (datetime.date.today() - datetime.timedelta(days=PERIOD_DAYS[period])).isoformat()
+
+stage_metrics = span_metrics.get_stage_metrics(day_from)
+if not stage_metrics:
+    st.info('There are no recorded stages for selected period')
+    st.stop()
+daily_stage_metrics = span_metrics.get_daily_stage_metrics(day_from)
+days = sorted(daily_stage_metrics.keys())
+
+# ------------------------------- Latency
+st.subheader("Latency")
+latency_dataframe = pd.DataFrame(
+    [
+        [name, stage.count, stage.errors] + [round(stage.get_percentile(p)*1000) for p in PERCENTILES] + [round(stage.seconds, 1)]
+        for name, stage in sorted(stage_metrics.items())
+    ],
+    columns=['Stage', 'Count', 'Errors'] + [f'p{p}, ms' for p in PERCENTILES] + ['Total, s']
+)
+st.dataframe(latency_dataframe, use_container_width=True, hide_index=True)
+
+selected_stage = st.selectbox(label="Stage:", options= sorted(stage_metrics.keys()))
+stage_latency_dataframe = pd.DataFrame(
+    [
+        [day] + [daily_stage_metrics[day][selected_stage].get_percentile(p)*1000 for p in PERCENTILES]
+        for day in days if selected_stage in daily_stage_metrics[day]
+    ],
+    columns=['Day'] + [f'p{p}, ms' for p in PERCENTILES]
+).set_index('Day')
+st.line_chart(stage_latency_dataframe)
+
+# ------------------------------- Throughput
+st.subheader("Throughput")
+throughput_dataframe = pd.DataFrame(
+    [
+        [
+            day,
+            get_throughput(daily_stage_metrics[day], 'text_extraction', 'files', 'text_extraction', 60),
+            get_throughput(daily_stage_metrics[day], 'extract_file', 'bytes', 'extract_file', 1/1024/1024),
+            get_throughput(daily_stage_metrics[day], 'split_chunks', 'chunks', 'file_indexing'),
+            get_throughput(daily_stage_metrics[day], 'build_index', 'chunks', 'build_index')
+        ]
+        for day in days
+    ],
+    columns=['Day', 'Extraction, files/min', 'Parsing, MB/s', 'Indexing, chunks/s', 'Embedding, chunks/s']
+).set_index('Day')
+st.line_chart(throughput_dataframe)
+
+# ------------------------------- LLM cost
+st.subheader("LLM cost")
+daily_document_set_metrics = span_metrics.get_daily_document_set_metrics(day_from)
+cost_rows = [
+    [day, document_set or '(no document set)', metrics.traces, metrics.tokens, metrics.cost]
+    for day, document_sets in daily_document_set_metrics.items()
+    for document_set, metrics in document_sets.items()
+]
+cost_dataframe = pd.DataFrame(cost_rows, columns=['Day', 'Document set', 'Operations', 'Tokens', 'Cost, $'])
+if cost_dataframe['Tokens'].sum() > 0:
+    st.bar_chart(cost_dataframe.pivot_table(index='Day', columns='Document set', values='Cost, $', aggfunc='sum', fill_value=0))
+    total_cost_dataframe = cost_dataframe.groupby('Document set', as_index=False)[['Operations', 'Tokens', 'Cost, $']].sum()
+    st.dataframe(total_cost_dataframe, use_container_width=True, hide_index=True)
+else:
+    st.info('There were no LLM calls for selected period')
+
+# ------------------------------- Caches
+st.subheader("Cache hit rate")
+all_stages = StageMetrics()
+for stage in stage_metrics.values():
+    all_stages.merge(stage)
+cache_rows = [
+    [cache_name, hits, misses, f'{hits / (hits + misses):.1%}' if hits + misses else '']
+    for cache_name, (hits, misses) in sorted(get_cache_hit_rates(all_stages).items())
+]
+if cache_rows:
+    st.dataframe(pd.DataFrame(cache_rows, columns=['Cache', 'Hits', 'Misses', 'Hit rate']), use_container_width=True, hide_index=True)
+else:
+    st.info('There were no cache lookups for selected period')
+
+# ------------------------------- Index sizes
+st.subheader("Index size")
+document_set_manager.load()
+
+selected_document_set_data  = [''] + document_set_manager.get_all_names()
+selected_document_set_index = get_selected_document_set_index(selected_document_set_data)
+selected_document_set = st.selectbox(
+    label="Document set:",
+    options= selected_document_set_data,
+    key="selected_document_set_performance",
+    index= selected_document_set_index
+)
+set_selected_document_set(selected_document_set)
+
+if not selected_document_set:
+    st.stop()
+
+index_rows = []
+for index_name in file_index.get_index_name_list(selected_document_set):
+    index_meta = file_index.get_file_index_meta(selected_document_set, index_name)
+    index_rows.append([
+        index_name,
+        index_meta.embedding_name if not index_meta.error else '',
+        round(file_index.get_index_size(selected_document_set, index_name)/1024/1024, 2)
+    ])
+if index_rows:
+    st.dataframe(pd.DataFrame(index_rows, columns=['Index', 'Embedding', 'Size, MB']), use_container_width=True, hide_index=True)
+else:
+    st.info('There are no indexes for selected document set')
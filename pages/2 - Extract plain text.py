@@ -6,8 +6,12 @@
 import streamlit as st
 
 from utils_streamlit import streamlit_hack_remove_top_space, hide_footer
-from backend_core import BackEndCore, BackendTextExtractionParams
+from backend_core import BackEndCore
+from core.parsers.base_parser import HtmlParserBackend, PdfParserBackend
 from ui.shared_session import set_selected_document_set, get_selected_document_set_index
+from ui.job_status import show_job_status
+from backend_jobs import JOB_TEXT_EXTRACTION
+from core.pipeline_config import BatchExtractionConfig
 from utils.app_logger import init_streamlit_logger
 
 # ------------------------------- Core
@@ -46,7 +50,7 @@ file_list = st.expander(label=f"Available {len(uploaded_files)} source file(s)")
 uploaded_files_str = "".join([f'{file_name}<br/>' for file_name in uploaded_files])
 file_list.markdown(uploaded_files_str, unsafe_allow_html=True)
 
-text_files = text_extractor.get_all_source_file_names(selected_document_set, True)
+text_files = text_extractor.get_all_source_file_names(selected_document_set)
 
 override_all = st.checkbox(label="Override all")
 text_files_count = len(text_files)
@@ -58,6 +62,11 @@ if override_all:
     pages_message+= ' They will be re-created.'
 st.info(pages_message)
 
+if text_files_count > 0 and not text_extractor.uses_text_store(selected_document_set):
+    if st.button(label="Move pages into single file store"):
+        migrated_count = text_extractor.migrate_to_text_store(selected_document_set)
+        st.info(f'{migrated_count} page(s) moved into single file store')
+
 run_html_llm_formatter = st.checkbox(label="Format text into HTML with LLM")
 run_table_extraction   = st.checkbox(label="Extract tables")
 
@@ -67,45 +76,43 @@ store_as_facts_list = col_f1.checkbox(label="Store as fact list")
 fact_context        = col_f2.text_input(label="Context of facts:", disabled= not store_as_facts_list)
 
 combine_html_headers = st.checkbox(label="Combine HTML headers")
+html_parser_backend  = st.selectbox(label="HTML parser:", options= list(HtmlParserBackend), format_func= lambda b: b.value)
+pdf_parser_backend_list = list(PdfParserBackend)
+pdf_parser_backend   = st.selectbox(
+    label="PDF parser:",
+    options= pdf_parser_backend_list,
+    format_func= lambda b: b.value,
+    index= pdf_parser_backend_list.index(BackEndCore().get_pdf_parser_backend(selected_document_set))
+)
 
 if run_table_extraction:
     st.info('Tables will be extracted from formatted documents if they were created.')
 
-extraction_log = st.expander(label="Log").empty()
-
 progress = st.empty()
 
-def show_progress_callback(progress_str : str):
-    """Show progress/status"""
-    progress.markdown(progress_str)
-
-
 if not uploaded_files:
     progress.markdown('Please load at least one file')
     st.stop()
 
 run_button = st.button(label="Run extraction")
-if not run_button:
-    st.stop()
-
-if store_as_facts_list and not fact_context:
-    progress.markdown('Context is requred for fact extractor')
-    st.stop()
-
-progress.markdown('Start converting...')
-extraction_result = BackEndCore().run_text_extraction(
-    selected_document_set,
-    BackendTextExtractionParams(
-        override_all,
-        run_html_llm_formatter,
-        run_table_extraction,
-        store_as_facts_list,
-        fact_context,
-        combine_html_headers,
-        show_progress_callback
+if run_button:
+    if store_as_facts_list and not fact_context:
+        progress.markdown('Context is requred for fact extractor')
+        st.stop()
+    # runs in background, page can be refreshed or closed
+    BackEndCore().submit_job(
+        JOB_TEXT_EXTRACTION,
+        selected_document_set,
+        BatchExtractionConfig(
+            override_all,
+            run_html_llm_formatter,
+            run_table_extraction,
+            store_as_facts_list,
+            fact_context,
+            combine_html_headers,
+            html_parser_backend.name,
+            pdf_parser_backend.name
+        ).to_dict() # pylint: disable=E1101
     )
-)
-progress.markdown('Done')
 
-extraction_result_str = '<br/>'.join(extraction_result)
-extraction_log.markdown(extraction_result_str, unsafe_allow_html= True)
+show_job_status(BackEndCore.get_job_manager(), selected_document_set, JOB_TEXT_EXTRACTION)
@@ -6,8 +6,11 @@
 import streamlit as st
 
 from utils_streamlit import streamlit_hack_remove_top_space, hide_footer
-from backend_core import BackEndCore, BackendFileIndexingParams
+from backend_core import BackEndCore
 from ui.shared_session import set_selected_document_set, get_selected_document_set_index
+from ui.job_status import show_job_status
+from backend_jobs import JOB_FILE_INDEXING
+from core.pipeline_config import BatchIndexingConfig
 from utils.app_logger import init_streamlit_logger
 from core.parsers.chunk_splitters.base_splitter import ChunkSplitterMode
 
@@ -43,7 +46,7 @@ set_selected_document_set(selected_document_set)
 if not selected_document_set:
     st.stop()
 
-text_files = text_extractor.get_all_source_file_names(selected_document_set, True)
+text_files = text_extractor.get_all_source_file_names(selected_document_set)
 
 file_list = st.expander(label=f'Available {len(text_files)} page(s)').empty()
 text_files_str = "".join([f'{file_name}<br/>' for file_name in text_files])
@@ -71,6 +74,10 @@ chunk_min_chars      = col1.number_input(label="Chunk min (tokens)", min_value=1
 chunk_size_tokens    = col2.number_input(label="Chunk size (tokens)", min_value=1, max_value=10000, value= 100)
 chunk_overlap_tokens = col3.number_input(label="Сhunk overlap (tokens)", min_value=0, max_value=1000, value= 0)
 
+fact_dedup_threshold = 0.0
+if selected_chunk_splitter_mode == ChunkSplitterMode.FACT_LIST:
+    fact_dedup_threshold = st.number_input(label="Remove near-duplicate facts with similarity above (0 - keep all):", min_value=0.00, max_value=1.00, value=0.00, step=0.01, format="%.2f")
+
 st.info("Index will be created from scratch!")
 
 create_mode = st.radio(
@@ -111,33 +118,34 @@ if not text_files:
     progress.markdown('There are no files for indexing.')
     st.stop()
 
-if not run_button:
-    st.stop()
-
-if create_mode == CREATE_MODE_NEW:
-    if not new_index_name: 
-        progress.markdown('Enter index name.')
-        st.stop()
-    index_name = new_index_name
-
-if create_mode == CREATE_MODE_EXISTED:
-    if not existed_index_name: 
-        progress.markdown('There is no selected index.')
-        st.stop()
-    index_name = existed_index_name
-
-progress.markdown(f'Start indexing [{index_name}] ...')
-indexing_result = BackEndCore().run_file_indexing(
-    selected_document_set,
-    BackendFileIndexingParams(
-        embedding_item,
-        index_name,
-        chunk_min_chars,
-        chunk_size_tokens,
-        chunk_overlap_tokens,
-        use_formatted,
-        selected_chunk_splitter_mode
+if run_button:
+    index_name = None
+    if create_mode == CREATE_MODE_NEW:
+        if not new_index_name: 
+            progress.markdown('Enter index name.')
+            st.stop()
+        index_name = new_index_name
+
+    if create_mode == CREATE_MODE_EXISTED:
+        if not existed_index_name: 
+            progress.markdown('There is no selected index.')
+            st.stop()
+        index_name = existed_index_name
+
+    # runs in background, page can be refreshed or closed
+    BackEndCore().submit_job(
+        JOB_FILE_INDEXING,
+        selected_document_set,
+        BatchIndexingConfig(
+            index_name,
+            embedding_item.embedding_type.name,
+            chunk_min_chars,
+            chunk_size_tokens,
+            chunk_overlap_tokens,
+            use_formatted,
+            selected_chunk_splitter_mode.name,
+            fact_dedup_threshold
+        ).to_dict() # pylint: disable=E1101
     )
-)
-indexing_result_str = '<br/>'.join(indexing_result)
-progress.markdown(f'Result:<br/>{indexing_result_str}', unsafe_allow_html= True)
+
+show_job_status(BackEndCore.get_job_manager(), selected_document_set, JOB_FILE_INDEXING)
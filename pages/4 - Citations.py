@@ -8,6 +8,7 @@ import streamlit as st
 
 from utils_streamlit import streamlit_hack_remove_top_space, hide_footer
 from backend_core import BackEndCore
+from core.tracing import trace_span, iter_span_tree
 from ui.shared_session import set_selected_document_set, get_selected_document_set_index
 from utils.app_logger import init_streamlit_logger
 
@@ -142,60 +143,69 @@ else:
 
 result_set = []
 for index, query in enumerate(query_list):
-
-    chunk_list = BackEndCore().similarity_search(
-                            selected_document_set,
-                            index_name,
-                            query, 
-                            sample_count, 
-                            score_threshold,
-                            add_llm_score,
-                            llm_threshold,
-                            show_status_callback
-                        )
-    
-    if query_mode == QUERY_MODE_BULK:
-        query_bar.progress((index+1)/len(query_list))
-
-    if add_llm_score:
-        chunk_list.sort(key=lambda x: x.llm_score, reverse=True)
-
-    if query_mode != QUERY_MODE_BULK:
-        for index, chunk_item in enumerate(chunk_list):
-            
-            s_source = ''
-            if chunk_item.metadata:
-                if 's_source' in chunk_item.metadata:
-                    s_source = chunk_item.metadata['s_source']
-                    s_source = s_source.replace('.txt', '')
-                    s_source = f"   [{s_source}]"
-
-            chunk_label = f'Result {index+1} s-score {chunk_item.score:0.3f} {s_source}'
-            if add_llm_score:
-                chunk_label = f'{chunk_label} llm-score {chunk_item.llm_score:0.3f}'
-            e = search_result_container.expander(label=chunk_label)
-            col31 , col32 = e.columns([80, 20])
-            col31.markdown(chunk_item.content)
-            col32.markdown(f'Metadata:<br/>{chunk_item.metadata}', unsafe_allow_html=True)
-            if add_llm_score:
-                col32.divider()
-                col32.markdown(f'LLM explanation:<br/>{chunk_item.llm_expl}', unsafe_allow_html=True)
-
-    if not chunk_list:
-        result_set.append([query, 'There are no relevant information'])
-        continue
-        
-    if not build_summary:
-        continue
-
-    summary = BackEndCore().build_answer(query, chunk_list)
-    result_set.append([query, summary])
-
-    setup_str = f'sample_count={sample_count}, score_threshold={score_threshold}, add_llm_score={add_llm_score}, llm_threshold={llm_threshold}'
-    user_query_manager.log_query(selected_document_set, query, summary, setup_str)
+    with trace_span('query', document_set=selected_document_set, index_name=index_name) as query_span:
+        chunk_list = BackEndCore().similarity_search(
+                                selected_document_set,
+                                index_name,
+                                query, 
+                                sample_count, 
+                                score_threshold,
+                                add_llm_score,
+                                llm_threshold,
+                                show_status_callback
+                            )
+
+        if query_mode == QUERY_MODE_BULK:
+            query_bar.progress((index+1)/len(query_list))
+
+        if add_llm_score:
+            chunk_list.sort(key=lambda x: x.llm_score, reverse=True)
+
+        if query_mode != QUERY_MODE_BULK:
+            for index, chunk_item in enumerate(chunk_list):
+
+                s_source = ''
+                if chunk_item.metadata:
+                    if 's_source' in chunk_item.metadata:
+                        s_source = chunk_item.metadata['s_source']
+                        s_source = s_source.replace('.txt', '')
+                        s_source = f"   [{s_source}]"
+
+                chunk_label = f'Result {index+1} s-score {chunk_item.score:0.3f} {s_source}'
+                if add_llm_score:
+                    chunk_label = f'{chunk_label} llm-score {chunk_item.llm_score:0.3f}'
+                e = search_result_container.expander(label=chunk_label)
+                col31 , col32 = e.columns([80, 20])
+                col31.markdown(chunk_item.content)
+                col32.markdown(f'Metadata:<br/>{chunk_item.metadata}', unsafe_allow_html=True)
+                if add_llm_score:
+                    col32.divider()
+                    col32.markdown(f'LLM explanation:<br/>{chunk_item.llm_expl}', unsafe_allow_html=True)
+
+        if not chunk_list:
+            result_set.append([query, 'There are no relevant information'])
+            continue
+
+        if not build_summary:
+            continue
+
+        summary = BackEndCore().build_answer(query, chunk_list)
+        result_set.append([query, summary])
+
+        setup_str = f'sample_count={sample_count}, score_threshold={score_threshold}, add_llm_score={add_llm_score}, llm_threshold={llm_threshold}'
+        user_query_manager.log_query(selected_document_set, query, summary, setup_str)
 
 if query_mode != QUERY_MODE_BULK:
     summary_result_container.markdown(result_set[0][1])
+    timing_expander = summary_result_container.expander(label=f'Timing: {query_span.duration*1000:.0f} ms')
+    timing_dataframe = pd.DataFrame(
+        [
+            ['\u00a0\u00a0' * depth + span.name, round(span.duration*1000), str(span.attributes) if span.attributes else '']
+            for depth, span in iter_span_tree(query_span)
+        ],
+        columns=['Stage', 'ms', 'Attributes']
+    )
+    timing_expander.dataframe(timing_dataframe, use_container_width=True, hide_index=True)
 else:
     result_dataframe = pd.DataFrame(result_set, columns=['Query', 'Summary'])
     summary_result_container.dataframe(result_dataframe, use_container_width=True, hide_index=True)
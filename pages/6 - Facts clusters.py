@@ -8,6 +8,7 @@ import streamlit as st
 from utils_streamlit import streamlit_hack_remove_top_space, hide_footer
 
 from backend_core import BackEndCore
+from core.facts.fact_cluster_manager import FactClusterParams
 from ui.shared_session import set_selected_document_set, get_selected_document_set_index
 from utils.app_logger import init_streamlit_logger
 
@@ -46,16 +47,54 @@ embedding_item = st.selectbox(
 
 st.info(f'{embedding_item.description}.')
 
-cluster_count = st.number_input(label="Combine into clusters", min_value=2, max_value=100, value= 4)
+auto_cluster_count = st.checkbox(label="Select count of clusters automatically")
+min_cluster_count = 2
+max_cluster_count = 20
+cluster_count = 4
+if auto_cluster_count:
+    col1, col2 = st.columns(2)
+    min_cluster_count = col1.number_input(label="Min count of clusters", min_value=2, max_value=100, value= 2)
+    max_cluster_count = col2.number_input(label="Max count of clusters", min_value=2, max_value=100, value= 20)
+else:
+    cluster_count = st.number_input(label="Combine into clusters", min_value=2, max_value=100, value= 4)
+
+dedup_threshold = st.number_input(label="Remove near-duplicate facts with similarity above (0 - keep all):", min_value=0.00, max_value=1.00, value=0.00, step=0.01, format="%.2f")
+
+force_recluster = st.checkbox(label="Re-cluster all facts", help="By default saved clusters are used and new facts are added into the nearest cluster")
 
 run_button = st.button(label="Show")
 
 if not selected_document_set or not run_button:
     st.stop()
 
-cluster_list = BackEndCore().get_fact_clusters(selected_document_set, cluster_count, embedding_item)
-for cluster in cluster_list:
+cluster_result = BackEndCore().get_fact_clusters(
+    selected_document_set,
+    embedding_item,
+    FactClusterParams(
+        cluster_count,
+        auto_cluster_count,
+        min_cluster_count,
+        max_cluster_count,
+        force_recluster,
+        dedup_threshold = dedup_threshold
+    )
+)
+
+if not cluster_result.reclustered:
+    st.info('Saved clusters are used')
+
+if cluster_result.score_list:
+    st.info(f'Selected count of clusters: {cluster_result.cluster_count}')
+    score_df = pd.DataFrame(
+        [[s.cluster_count, s.silhouette] for s in cluster_result.score_list],
+        columns=['Clusters', 'Silhouette']
+    ).set_index('Clusters')
+    st.line_chart(score_df)
+
+for cluster in cluster_result.cluster_list:
     data = {'Fact': cluster.fact_list}
+    if cluster.fact_sources:
+        data['Source'] = ['<br>'.join(sources) for sources in cluster.fact_sources]
     df = pd.DataFrame(data)
     df = df.applymap(lambda x: x.replace('\n', '<br>'))
     fact_expander = st.expander(label= cluster.name, expanded=False)
@@ -11,6 +11,9 @@ from utils_streamlit import streamlit_hack_remove_top_space, hide_footer
 from backend_core import BackEndCore
 from core.kt_manager import KnowledgeTree
 from ui.shared_session import set_selected_document_set, get_selected_document_set_index
+from ui.job_status import show_job_status
+from backend_jobs import JOB_KNOWLEDGE_TREE
+from core.job_manager import JobStatus
 from utils.app_logger import init_streamlit_logger
 
 # ------------------------------- Core
@@ -25,6 +28,9 @@ init_streamlit_logger()
 SESSION_KT = 'ktree'
 if SESSION_KT not in st.session_state:
     st.session_state[SESSION_KT] = None
+SESSION_KT_JOB = 'ktree_job' # tree is drawn when this job is done
+if SESSION_KT_JOB not in st.session_state:
+    st.session_state[SESSION_KT_JOB] = None
 # ------------------------------- Consts
 
 MODE_DRAW_EXISTED = 'Draw existed'
@@ -57,7 +63,7 @@ set_selected_document_set(selected_document_set)
 if not selected_document_set:
     st.stop()
 
-input_text_files = text_extractor.get_all_source_file_names(selected_document_set, True)
+input_text_files = text_extractor.get_all_source_file_names(selected_document_set)
 
 file_list = st.expander(label=f'Available {len(input_text_files)} chunk(s)').empty()
 text_files_str = "".join([f'{file_name}<br/>' for file_name in input_text_files])
@@ -105,10 +111,6 @@ if create_tree_mode == MODE_APPEND:
 
 status_container = st.empty()
 
-def show_progress_callback(progress_str : str):
-    """Show progress/status"""
-    run_status.markdown(progress_str)
-
 def build_agraph(knowledge_tree : KnowledgeTree):
     """Build agraph and save into session"""
     nodes = []
@@ -179,14 +181,22 @@ if build_mode:
         status_container.markdown('Select files for processing')
         st.stop()
 
-    new_knowledge_tree = BackEndCore().build_knowledge_tree(
-                            selected_document_set,
-                            kt_name_to_build,
-                            kt_input_files,
-                            append_mode,
-                            show_progress_callback
-                    )
-    st.session_state[SESSION_KT] = build_agraph(new_knowledge_tree)
+    # runs in background, page can be refreshed or closed
+    st.session_state[SESSION_KT_JOB] = BackEndCore().submit_job(
+        JOB_KNOWLEDGE_TREE,
+        selected_document_set,
+        {
+            'name'            : kt_name_to_build,
+            'input_file_list' : kt_input_files,
+            'append_mode'     : append_mode
+        }
+    )
+
+last_job = show_job_status(BackEndCore.get_job_manager(), selected_document_set, JOB_KNOWLEDGE_TREE)
+if last_job and last_job.job_id == st.session_state[SESSION_KT_JOB] and not last_job.is_active:
+    st.session_state[SESSION_KT_JOB] = None
+    if last_job.status == JobStatus.DONE.value:
+        st.session_state[SESSION_KT] = build_agraph(kt_manager.load(last_job.params['name']))
 
 tree_from_session = st.session_state[SESSION_KT]
 if tree_from_session:
@@ -0,0 +1,252 @@
+"""
+    Async HTTP service for similarity search, answers and bulk queries (without UI)
+    To run: python query_service.py [--port 8080] [--max-concurrency 8] [--warm-up document_set:index_name]
+
+    POST /search  {"document_set", "index_name", "query", "sample_count", "score_threshold", "add_llm_score", "llm_threshold"} -> {"chunks": [...]}
+    POST /answer  the same request -> JSON lines: {"chunks": [...]}, then {"answer", "final"} each time answer is refined
+    POST /bulk    {"document_set", "index_name", "queries": [...], "build_answer", ...} -> JSON lines {"index", "query", "chunks", "answer"} in order of completion
+    GET  /health
+"""
+# pylint: disable=C0301,C0103,C0303,W0718,R0913
+
+import json
+import asyncio
+import logging
+import argparse
+from dataclasses import dataclass, field, asdict
+from typing import Any, AsyncIterator, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses_json import dataclass_json
+
+from aiohttp import web
+
+from core.pipeline_config import DEFAULT_SECRETS_FILE, load_secrets
+
+logger : logging.Logger = logging.getLogger()
+
+DEFAULT_PORT = 8080
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_KEEP_OPEN_SECONDS = 300
+
+@dataclass_json
+@dataclass
+class SearchRequest:
+    """Similarity search (and answer) request"""
+    document_set    : str
+    index_name      : str
+    query           : str
+    sample_count    : int = 5
+    score_threshold : float = 0
+    add_llm_score   : bool = False
+    llm_threshold   : float = 0
+
+@dataclass_json
+@dataclass
+class BulkRequest:
+    """Several queries for the same index"""
+    document_set    : str
+    index_name      : str
+    queries         : list[str] = field(default_factory=list)
+    sample_count    : int = 5
+    score_threshold : float = 0
+    add_llm_score   : bool = False
+    llm_threshold   : float = 0
+    build_answer    : bool = False
+
+class QueryService:
+    """
+        Runs blocking backend calls (embedding, index search, LLM) in thread pool,
+        models and opened indexes are shared by all requests
+    """
+
+    backend         : Any # BackEndCore (or stand-in with similarity_search and iter_answer)
+    max_concurrency : int
+    __executor      : ThreadPoolExecutor
+    __semaphore     : asyncio.Semaphore
+
+    def __init__(self, backend : Any, max_concurrency : int = DEFAULT_MAX_CONCURRENCY):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.__executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='query')
+        self.__semaphore = None
+
+    def __get_semaphore(self) -> asyncio.Semaphore:
+        # created in event loop of service
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.__semaphore
+
+    async def __run(self, call, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, call, *args)
+
+    async def search(self, request : SearchRequest) -> list[dict]:
+        """Similarity search, returns chunks"""
+        async with self.__get_semaphore():
+            chunk_list = await self.__run(
+                self.backend.similarity_search,
+                request.document_set,
+                request.index_name,
+                request.query,
+                request.sample_count,
+                request.score_threshold,
+                request.add_llm_score,
+                request.llm_threshold,
+                lambda _: None
+            )
+        return [asdict(chunk) for chunk in chunk_list]
+
+    async def iter_answer(self, request : SearchRequest) -> AsyncIterator[dict]:
+        """Chunks, then answer each time it's refined"""
+        async with self.__get_semaphore():
+            chunk_list = await self.__run(
+                self.backend.similarity_search,
+                request.document_set,
+                request.index_name,
+                request.query,
+                request.sample_count,
+                request.score_threshold,
+                request.add_llm_score,
+                request.llm_threshold,
+                lambda _: None
+            )
+            yield {'chunks': [asdict(chunk) for chunk in chunk_list]}
+            if not chunk_list:
+                yield {'answer': None, 'final': True}
+                return
+
+            answer_iterator : Iterator[str] = iter(self.backend.iter_answer(request.query, chunk_list))
+            answer = await self.__run(next, answer_iterator, None)
+            while answer is not None:
+                next_answer = await self.__run(next, answer_iterator, None)
+                yield {'answer': answer, 'final': next_answer is None}
+                answer = next_answer
+
+    async def iter_bulk(self, request : BulkRequest) -> AsyncIterator[dict]:
+        """Run queries concurrently, results are returned in order of completion"""
+
+        async def run_query(index : int, query : str) -> dict:
+            search_request = SearchRequest(
+                request.document_set, request.index_name, query, request.sample_count,
+                request.score_threshold, request.add_llm_score, request.llm_threshold
+            )
+            result = {'index': index, 'query': query, 'chunks': [], 'answer': None}
+            try:
+                if request.build_answer:
+                    async for item in self.iter_answer(search_request):
+                        result.update(item)
+                    result.pop('final', None)
+                else:
+                    result['chunks'] = await self.search(search_request)
+            except Exception as error:
+                logger.exception(error)
+                result['error'] = f'{error} [{type(error)}]'
+            return result
+
+        tasks = [asyncio.ensure_future(run_query(index, query)) for index, query in enumerate(request.queries)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def warm_up(self, document_set : str, index_name : str):
+        """Load embedding model and open index before first request"""
+        await self.search(SearchRequest(document_set, index_name, 'warm up', 1))
+
+    def close(self):
+        """Stop thread pool"""
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+async def read_request(request : web.Request, request_type : type) -> Any:
+    """Parse JSON body into request dataclass"""
+    try:
+        return request_type.from_dict(await request.json()) # pylint: disable=E1101
+    except Exception as error:
+        raise web.HTTPBadRequest(text=json.dumps({'error': str(error)}), content_type='application/json') from error
+
+async def stream_json_lines(request : web.Request, items : AsyncIterator[dict]) -> web.StreamResponse:
+    """Send items as JSON lines while they are produced"""
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    try:
+        async for item in items:
+            await response.write((json.dumps(item) + '\n').encode('utf-8'))
+    except Exception as error:
+        logger.exception(error)
+        await response.write((json.dumps({'error': f'{error} [{type(error)}]'}) + '\n').encode('utf-8'))
+    await response.write_eof()
+    return response
+
+def create_app(query_service : QueryService) -> web.Application:
+    """Web application with service routes"""
+
+    async def health(_ : web.Request) -> web.Response:
+        return web.json_response({'status': 'ok'})
+
+    async def search(request : web.Request) -> web.Response:
+        search_request = await read_request(request, SearchRequest)
+        return web.json_response({'chunks': await query_service.search(search_request)})
+
+    async def answer(request : web.Request) -> web.StreamResponse:
+        search_request = await read_request(request, SearchRequest)
+        return await stream_json_lines(request, query_service.iter_answer(search_request))
+
+    async def bulk(request : web.Request) -> web.StreamResponse:
+        bulk_request = await read_request(request, BulkRequest)
+        return await stream_json_lines(request, query_service.iter_bulk(bulk_request))
+
+    async def on_cleanup(_ : web.Application):
+        query_service.close()
+
+    app = web.Application()
+    app.router.add_get('/health', health)
+    app.router.add_post('/search', search)
+    app.router.add_post('/answer', answer)
+    app.router.add_post('/bulk', bulk)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+def main(argv : Optional[list[str]] = None):
+    """Run service"""
+    parser = argparse.ArgumentParser(description='HTTP service for similarity search and answers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY, help='count of requests processed at the same time')
+    parser.add_argument('--keep-open-seconds', type=float, default=DEFAULT_KEEP_OPEN_SECONDS, help='idle index is closed after this time (index can not be re-built while it is open)')
+    parser.add_argument('--warm-up', nargs='*', default=[], help='document_set:index_name loaded on start')
+    parser.add_argument('--secrets', default=DEFAULT_SECRETS_FILE, help='secrets file (streamlit format)')
+    args = parser.parse_args(argv)
+
+    # streamlit is not running here, managers are kept in process
+    from backend_core import BackEndCore # pylint: disable=C0415
+    BackEndCore.init_headless(load_secrets(args.secrets), args.keep_open_seconds)
+    query_service = QueryService(BackEndCore(), args.max_concurrency)
+
+    async def close_idle_indexes():
+        # indexes which are not used are released, so they can be re-built by jobs
+        file_index = BackEndCore.get_file_index()
+        while True:
+            await asyncio.sleep(max(args.keep_open_seconds / 2, 1))
+            await asyncio.get_running_loop().run_in_executor(None, file_index.close_idle_indexes)
+
+    background_tasks = []
+
+    async def on_startup(_ : web.Application):
+        for warm_up_index in args.warm_up:
+            document_set, index_name = warm_up_index.split(':', 1)
+            await query_service.warm_up(document_set, index_name)
+        if args.keep_open_seconds > 0:
+            background_tasks.append(asyncio.create_task(close_idle_indexes()))
+
+    async def on_shutdown(_ : web.Application):
+        for task in background_tasks:
+            task.cancel()
+
+    app = create_app(query_service)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    web.run_app(app, host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
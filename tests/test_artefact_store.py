@@ -0,0 +1,66 @@
+"""
+    Tests of artefacts shared by document sets
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+from langchain.embeddings.base import Embeddings
+
+from core.artefact_store import ArtefactStore, ArtefactKind
+from core.embedding_manager import SharedEmbeddings
+from core.source_storage import SourceStorage
+from core.text_extractor import TextExtractor, TextExtractorParams
+from core.parsers.base_parser import DocumentParserParams
+from core.llm_manager import LlmManager
+import core.llm.prompts as prompts
+
+class CountingEmbeddings(Embeddings):
+    """Fake embeddings, keeps encoded texts"""
+    def __init__(self):
+        self.encoded = []
+    def embed_documents(self, texts):
+        self.encoded.extend(texts)
+        return [[float(len(text)), 0.5] for text in texts]
+    def embed_query(self, text):
+        return [float(len(text)), 0.5]
+
+def test_pages_are_extracted_once(tmp_path, monkeypatch):
+    """The same source content in other document set reuses extracted pages"""
+    monkeypatch.chdir(tmp_path)
+    source_storage = SourceStorage(False)
+    text_extractor = TextExtractor(artefact_store=ArtefactStore(False))
+    params = TextExtractorParams(False, lambda _: None, DocumentParserParams(None))
+    source_storage.save_file('set1', 'a.txt', 'same text')
+    source_storage.save_file('set2', 'b.txt', 'same text')
+
+    file_digests = source_storage.get_file_digests('set1')
+    assert text_extractor.text_extraction_and_save('set1', list(file_digests), params, file_digests) == ['Copied plain text document from a.txt']
+    file_digests = source_storage.get_file_digests('set2')
+    assert text_extractor.text_extraction_and_save('set2', list(file_digests), params, file_digests) == ['Reused 1 extracted page(s) of b.txt']
+    assert text_extractor.get_input_with_meta('set2', False) == [('same text', {'s_source': 'b.txt', 'page_number': 1, 'p_source': 'b.txt-01.txt'})]
+
+def test_shared_embeddings(tmp_path, monkeypatch):
+    """Vectors are stored by embedding name and text"""
+    monkeypatch.chdir(tmp_path)
+    artefact_store = ArtefactStore(False)
+    embeddings = CountingEmbeddings()
+    assert SharedEmbeddings(embeddings, 'E1', artefact_store).embed_documents(['a', 'bb', 'a']) == [[1.0, 0.5], [2.0, 0.5], [1.0, 0.5]]
+    assert SharedEmbeddings(embeddings, 'E1', ArtefactStore(False)).embed_documents(['bb', 'ccc']) == [[2.0, 0.5], [3.0, 0.5]]
+    assert embeddings.encoded == ['a', 'bb', 'ccc']
+    SharedEmbeddings(embeddings, 'E2', artefact_store).embed_documents(['a'])
+    assert artefact_store.get_count(ArtefactKind.EMBEDDING) == 4
+
+def test_llm_artefact_versions(tmp_path, monkeypatch):
+    """Keys of shared LLM results are changed with model or prompt"""
+    monkeypatch.chdir(tmp_path)
+    llm_manager = LlmManager({'offline_llm': {'mode': 'synthetic'}})
+    facts_version = llm_manager.get_fact_list_version()
+    format_version = llm_manager.get_format_version()
+    assert facts_version.startswith('gpt-3.5-turbo:') and facts_version != format_version
+
+    monkeypatch.setattr(prompts, 'extract_facts_prompt_template', prompts.extract_facts_prompt_template + ' ')
+    assert llm_manager.get_fact_list_version() != facts_version
+    assert llm_manager.get_format_version() == format_version
+
+    monkeypatch.setattr(llm_manager, '_BASE_MODEL_NAME', 'gpt-4')
+    assert llm_manager.get_format_version() == format_version.replace('gpt-3.5-turbo', 'gpt-4')
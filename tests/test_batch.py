@@ -0,0 +1,38 @@
+"""
+    Tests of batch configuration
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import json
+
+from batch import load_batch_config, print_progress
+from core.pipeline_config import load_secrets
+
+def test_load_batch_config(tmp_path):
+    """Steps which are not provided are skipped, defaults are used for missed values"""
+    config_file = tmp_path / 'batch.json'
+    config_file.write_text(json.dumps({
+        'workers' : 2,
+        'document_sets' : [
+            {'document_set': 'set1', 'extraction': {'store_as_facts_list': True, 'pdf_parser_backend': 'PDFIUM'}, 'indexing': {'index_name': 'idx'}},
+            {'document_set': 'set2', 'queries': {'index_name': 'idx', 'questions_file': 'q.txt', 'output_file': 'a.jsonl'}}
+        ]
+    }), encoding="utf-8")
+    batch_config = load_batch_config(str(config_file))
+    assert batch_config.workers == 2
+    assert batch_config.document_sets[0].extraction.store_as_facts_list
+    assert batch_config.document_sets[0].indexing.chunk_splitter_mode == 'TOKEN_MODE'
+    assert batch_config.document_sets[0].queries is None
+    assert batch_config.document_sets[1].queries.sample_count == 5
+
+def test_secrets_and_progress(tmp_path, capsys):
+    """Secrets are read from streamlit toml file, progress is one JSON record per line"""
+    secrets_file = tmp_path / 'secrets.toml'
+    secrets_file.write_text('OPENAI_API_TYPE = "openai"\n[open_api_openai]\nOPENAI_API_KEY = "key"\n', encoding="utf-8")
+    assert load_secrets(str(secrets_file)) == {'OPENAI_API_TYPE': 'openai', 'open_api_openai': {'OPENAI_API_KEY': 'key'}}
+    assert not load_secrets(str(tmp_path / 'missing.toml'))
+
+    print_progress('set1', 'indexing', 'done', 'line 1\nline 2')
+    record = json.loads(capsys.readouterr().out)
+    assert (record['document_set'], record['step'], record['event'], record['message']) == ('set1', 'indexing', 'done', 'line 1\nline 2')
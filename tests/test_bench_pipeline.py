@@ -0,0 +1,53 @@
+"""
+    Tests of end-to-end benchmark: synthetic corpus, stage errors and baseline comparison
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import argparse
+
+import pytest
+
+from benchmarks.synthetic_corpus import CORPUS_FORMATS, write_synthetic_corpus
+from benchmarks.bench_utils import BenchmarkReport, compare_with_baseline
+from benchmarks.bench_pipeline import parse_files, run_stage, split_pages
+from core.parsers.chunk_splitters.base_splitter import ChunkSplitterMode
+
+def test_corpus_is_parsed(tmp_path):
+    """Each format of synthetic corpus is parsed and split"""
+    file_list = write_synthetic_corpus(str(tmp_path), CORPUS_FORMATS, 2, 3, 10)
+    assert len(file_list) == 2 * len(CORPUS_FORMATS)
+
+    report = BenchmarkReport('now')
+    args = argparse.Namespace(chunk_min=0, chunk_size=500, chunk_overlap=0)
+    for file_format in CORPUS_FORMATS:
+        pages = parse_files(report, file_format, [f for f in file_list if f.endswith(f'.{file_format}')])
+        text = '\n'.join(text for text, _ in pages)
+        assert text.count('Page 3.') == 2 * 10, file_format
+        chunks = split_pages(report, args, ChunkSplitterMode.CHARACTER_SPLITTER, pages)
+        if file_format != 'pdf': # empty lines are not extracted from pdf
+            assert max(len(c.content) for c in chunks) <= 500, file_format
+    assert {m.name for m in report.metrics if m.stage == 'parse'} == set(CORPUS_FORMATS)
+    assert not report.errors
+
+def test_baseline_regressions(tmp_path):
+    """Worse metrics and failed stages are regressions, better metrics are not"""
+    baseline = BenchmarkReport('before')
+    baseline.add('parse', 'pdf', 'pages_per_second', 100, True)
+    baseline.add('search', 'SBERT', 'p95_ms', 10, False)
+    baseline.add('embed', 'SBERT', 'chunks_per_second', 50, True)
+    baseline.add('index', 'SBERT', 'size_mb', 5, False)
+    baseline.save(str(tmp_path / 'baseline.json'))
+    baseline = BenchmarkReport.load(str(tmp_path / 'baseline.json'))
+
+    report = BenchmarkReport('after')
+    report.add('parse', 'pdf', 'pages_per_second', 70, True)
+    report.add('search', 'SBERT', 'p95_ms', 11, False)
+    report.add('index', 'SBERT', 'size_mb', 3, False)
+    assert run_stage(report, 'embed', 'SBERT', lambda: 1 / 0) is None
+
+    regressions = {r.key : r for r in compare_with_baseline(report, baseline, 0.2)}
+    assert sorted(regressions.keys()) == ['embed/SBERT/chunks_per_second', 'parse/pdf/pages_per_second']
+    assert regressions['parse/pdf/pages_per_second'].change == pytest.approx(-0.3)
+    assert regressions['embed/SBERT/chunks_per_second'].current == 0
+    assert 'ZeroDivisionError' in report.errors['embed/SBERT']
@@ -0,0 +1,41 @@
+"""
+    Tests for chunk records
+    To run: pytest
+"""
+
+# pylint: disable=C0103,C0301,C0411,C0413
+
+from core.parsers.chunk_splitters.chunk_record import ChunkRecord, PageMetaPool
+from core.parsers.chunk_splitters.base_splitter import ChunkSplitterParams, ChunkSplitterMode
+from core.parsers.chunk_splitters.character_splitter import CharacterSplitter
+
+def test_page_meta_is_shared():
+    """Equal page metadata is stored only once"""
+    pool = PageMetaPool()
+    meta1 = pool.intern({"s_source": "a.pdf", "page_number": 1})
+    meta2 = pool.intern({"page_number": 1, "s_source": "a.pdf"})
+    meta3 = pool.intern({"s_source": "a.pdf", "page_number": 2})
+    assert meta1 is meta2
+    assert meta1 is not meta3
+    assert len(pool) == 2
+
+def test_chunk_to_document():
+    """Document is created with own copy of metadata"""
+    page_meta = {"s_source": "a.pdf"}
+    chunk = ChunkRecord("text", page_meta, 10)
+    chunk.chunk_file_name = 'chunk-00001.txt'
+    document = chunk.to_document()
+    assert document.page_content == "text"
+    assert document.metadata == {"s_source": "a.pdf", "p_offset": 10, "chunk_file_name": 'chunk-00001.txt'}
+    assert page_meta == {"s_source": "a.pdf"}
+
+def test_splitter_shares_page_meta():
+    """All chunks from one page refer to the same metadata"""
+    params = ChunkSplitterParams(0, 10, 0, 'gpt-3.5-turbo', ChunkSplitterMode.CHARACTER_SPLITTER)
+    splitter = CharacterSplitter(params)
+    input_with_meta = [("first part\n\nsecond part\n\nthird part", {"p_source": "a-01.txt"})]
+    chunks = splitter.split_into_chunks(input_with_meta)
+    assert len(chunks) == 3
+    assert all(c.page_meta is chunks[0].page_meta for c in chunks)
+    documents = splitter.split_into_documents(input_with_meta)
+    assert [d.page_content for d in documents] == [c.content for c in chunks]
@@ -0,0 +1,43 @@
+"""
+    Tests of document set manager
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import os
+import multiprocessing
+
+from core.document_set_manager import DocumentSetManager
+
+def change_document_sets_in_process(folder : str, process_index : int, count : int):
+    """Add document sets and set their pdf parser from other process"""
+    os.chdir(folder)
+    document_set_manager = DocumentSetManager(False)
+    for index in range(count):
+        name = f'set-{process_index}-{index}'
+        document_set_manager.add(name, True)
+        document_set_manager.set_pdf_parser_backend(name, 'PDFIUM', True)
+
+def test_changes_of_processes_are_kept(tmp_path, monkeypatch):
+    """Document sets changed by parallel processes are not lost"""
+    monkeypatch.chdir(tmp_path)
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        pool.starmap(change_document_sets_in_process, [(str(tmp_path), index, 20) for index in range(4)])
+
+    document_set_manager = DocumentSetManager(False)
+    document_set_manager.load()
+    assert sorted(document_set_manager.get_all_names()) == sorted(f'set-{p}-{i}' for p in range(4) for i in range(20))
+    assert all(document_set_manager.find_name(name).pdf_parser_backend == 'PDFIUM' for name in document_set_manager.get_all_names())
+    # no temp files are left
+    assert sorted(os.listdir('.document-set')) == ['document-set.json', 'document-set.lock']
+
+def test_add_without_save(tmp_path, monkeypatch):
+    """Document set added without auto save is kept in memory only"""
+    monkeypatch.chdir(tmp_path)
+    document_set_manager = DocumentSetManager(False)
+    document_set_manager.add('set1', False)
+    document_set_manager.set_pdf_parser_backend('set1', 'PDFIUM', False)
+    assert document_set_manager.find_name('SET1').pdf_parser_backend == 'PDFIUM'
+    other_manager = DocumentSetManager(False)
+    other_manager.load()
+    assert not other_manager.get_all_names()
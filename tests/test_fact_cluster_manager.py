@@ -0,0 +1,71 @@
+"""
+    Tests for stored fact clusters
+    To run: pytest
+"""
+
+# pylint: disable=C0103,C0301,C0411,C0413
+
+import numpy as np
+
+from core.facts.fact_clustering import normalize_embeddings
+from core.facts.fact_cluster_manager import FactClusterManager, FactClusterParams
+
+FACT_VECTORS = {
+    'x1': [1, 0.0], 'x2': [1, 0.1], 'x3': [1, 0.2], 'x4': [1, 0.3], 'x5': [1, 0.4],
+    'y1': [0.0, 1], 'y2': [0.1, 1], 'y3': [0.2, 1], 'y4': [0.3, 1], 'y5': [0.4, 1],
+}
+
+def get_clusters(manager : FactClusterManager, fact_list : list[str], params : FactClusterParams):
+    """Run clustering for facts"""
+    embeddings = normalize_embeddings([FACT_VECTORS[f] for f in fact_list])
+    return manager.get_fact_clusters('set', 'E', fact_list, fact_list, embeddings, params)
+
+def test_stored_clusters_are_reused():
+    """Second run uses stored clusters, new fact goes to the nearest centroid"""
+    manager = FactClusterManager(True)
+    facts = ['x1', 'x2', 'x3', 'x4', 'y1', 'y2', 'y3', 'y4', 'y5']
+    first = get_clusters(manager, facts, FactClusterParams(2))
+    assert first.reclustered
+
+    second = get_clusters(manager, facts, FactClusterParams(2))
+    assert not second.reclustered
+    assert sorted(sorted(c.fact_list) for c in second.cluster_list) == sorted(sorted(c.fact_list) for c in first.cluster_list)
+
+    third = get_clusters(manager, facts + ['x5'], FactClusterParams(2))
+    assert not third.reclustered
+    assert sorted(sorted(c.fact_list) for c in third.cluster_list) == [['x1', 'x2', 'x3', 'x4', 'x5'], ['y1', 'y2', 'y3', 'y4', 'y5']]
+
+def test_recluster_on_drift_or_request():
+    """Full clustering when too many facts are new or when it's requested"""
+    manager = FactClusterManager(True)
+    get_clusters(manager, ['x1', 'x2', 'y1', 'y2'], FactClusterParams(2))
+    assert get_clusters(manager, ['x1', 'x2', 'y1', 'y2', 'x3', 'y3'], FactClusterParams(2)).reclustered
+    assert get_clusters(manager, ['x1', 'x2', 'y1', 'y2', 'x3', 'y3'], FactClusterParams(2, force_recluster=True)).reclustered
+    assert get_clusters(manager, ['x1', 'x2', 'y1', 'y2', 'x3', 'y3'], FactClusterParams(3)).reclustered
+    assert not get_clusters(manager, ['x1', 'x2', 'y1', 'y2', 'x3', 'y3'], FactClusterParams(3)).reclustered
+    assert np.asarray(manager.load('set', 'E').centroids).shape == (3, 2)
+
+def test_recluster_on_drift_of_small_batches():
+    """Drift of several small batches is summed up against facts of last full clustering"""
+    manager = FactClusterManager(True)
+    facts = ['x1', 'x2', 'x3', 'x4', 'y1', 'y2', 'y3', 'y4']
+    assert get_clusters(manager, facts, FactClusterParams(2)).reclustered
+    # each batch is below drift threshold (1/8), both batches are above it (2/8)
+    assert not get_clusters(manager, facts + ['x5'], FactClusterParams(2)).reclustered
+    assert get_clusters(manager, facts + ['x5', 'y5'], FactClusterParams(2)).reclustered
+    assert sorted(manager.load('set', 'E').fitted_hash_list) == sorted(facts + ['x5', 'y5'])
+    assert not get_clusters(manager, facts + ['x5', 'y5'], FactClusterParams(2)).reclustered
+
+def test_sources_of_the_same_fact():
+    """The same fact from different files keeps its own source (full clustering, reuse, new facts and auto count)"""
+    facts = ['x1', 'x2', 'x1', 'y1', 'y2']
+    sources = [['a.txt'], ['a.txt'], ['b.txt'], ['a.txt'], ['b.txt']]
+    for params in [FactClusterParams(2, drift_threshold=0.5), FactClusterParams(2, auto_cluster_count=True, max_cluster_count=3, drift_threshold=0.5)]:
+        manager = FactClusterManager(True)
+        for fact_list, source_list in [(facts, sources), (facts, sources), (facts + ['x3'], sources + [['c.txt']])]:
+            embeddings = normalize_embeddings([FACT_VECTORS[f] for f in fact_list])
+            result = manager.get_fact_clusters('set', 'E', fact_list, fact_list, embeddings, params, source_list)
+            x_cluster = [c for c in result.cluster_list if 'x2' in c.fact_list][0]
+            assert list(zip(x_cluster.fact_list, x_cluster.fact_sources))[:3] == [('x1', ['a.txt']), ('x2', ['a.txt']), ('x1', ['b.txt'])]
+        assert not result.reclustered
+        assert x_cluster.fact_sources[-1] == ['c.txt']
@@ -0,0 +1,58 @@
+"""
+    Tests for fact clustering
+    To run: pytest
+"""
+
+# pylint: disable=C0103,C0301,C0411,C0413
+
+import numpy as np
+
+from core.facts.fact_clustering import fact_k_means, fact_auto_k_means, group_facts_by_labels, normalize_embeddings
+from core.facts.fact_embedding_cache import FactEmbeddingCache
+
+def test_group_facts_by_labels():
+    """Facts are grouped by label, order inside of group is kept"""
+    clusters = group_facts_by_labels(['a', 'b', 'c', 'd', 'e'], np.array([2, 0, 2, 1, 0]))
+    assert [c.name for c in clusters] == ['Cluster 0', 'Cluster 1', 'Cluster 2']
+    assert [c.fact_list for c in clusters] == [['b', 'e'], ['d'], ['a', 'c']]
+    clusters = group_facts_by_labels(['a', 'b', 'a'], np.array([1, 0, 1]), [['f1'], ['f2'], ['f3']])
+    assert [c.fact_sources for c in clusters] == [[['f2']], [['f1'], ['f3']]]
+
+def test_normalize_embeddings():
+    """Rows have unit length, zero rows stay zero"""
+    normalized = normalize_embeddings([[3, 4], [0, 0]])
+    assert np.allclose(normalized, [[0.6, 0.8], [0, 0]])
+
+def test_fact_k_means():
+    """Facts with the same direction are in one cluster"""
+    embeddings = {'x1': [1, 0], 'x2': [10, 0.5], 'y1': [0, 1], 'y2': [0.5, 7]}
+    def encode_call(fact_list):
+        return [embeddings[f] for f in fact_list]
+    for use_mini_batch in [False, True]:
+        clusters = fact_k_means(list(embeddings.keys()), 2, encode_call, use_mini_batch)
+        assert sorted(sorted(c.fact_list) for c in clusters) == [['x1', 'x2'], ['y1', 'y2']]
+    assert fact_k_means([], 2, encode_call) == []
+
+def test_fact_auto_k_means():
+    """The best count of clusters is selected by silhouette"""
+    fact_list = [f'x{i}' for i in range(5)] + [f'y{i}' for i in range(5)] + [f'z{i}' for i in range(5)]
+    embeddings = normalize_embeddings(
+        [[1, 0.01 * i, 0] for i in range(5)] + [[0, 1, 0.01 * i] for i in range(5)] + [[0.01 * i, 0, 1] for i in range(5)]
+    )
+    result = fact_auto_k_means(fact_list, embeddings, 2, 6)
+    assert result.cluster_count == 3
+    assert [s.cluster_count for s in result.score_list] == [2, 3, 4, 5, 6]
+    assert sorted(c.fact_list[0][0] for c in result.cluster_list) == ['x', 'y', 'z']
+
+def test_fact_embedding_cache():
+    """Only new facts are encoded"""
+    encoded_facts = []
+    def encode_call(fact_list):
+        encoded_facts.extend(fact_list)
+        return [[len(f), 1] for f in fact_list]
+    cache = FactEmbeddingCache()
+    first = cache.get_normalized_embeddings('E', ['a', 'bb', 'a'], encode_call)
+    second = cache.get_normalized_embeddings('E', ['bb', 'ccc'], encode_call)
+    assert encoded_facts == ['a', 'bb', 'ccc']
+    assert first.shape == (3, 2)
+    assert np.allclose(first[1], second[0])
@@ -0,0 +1,35 @@
+"""
+    Tests for near-duplicate facts
+    To run: pytest
+"""
+
+# pylint: disable=C0103,C0301,C0411,C0413
+
+import numpy as np
+
+from core.facts.fact_clustering import normalize_embeddings
+from core.facts.fact_dedup import dedup_facts, find_near_duplicates
+
+def test_dedup_facts():
+    """Similar facts are collapsed into the first one"""
+    embeddings = normalize_embeddings([[1, 0], [0, 1], [1, 0.01], [0.01, 1], [1, 1]])
+    result = dedup_facts(embeddings, 0.99)
+    assert result.kept_index_list == [0, 1, 4]
+    assert result.duplicate_index_list == [[0, 2], [1, 3], [4]]
+
+def test_blocks_give_the_same_result():
+    """Result does not depend on block size"""
+    rng = np.random.default_rng(1)
+    base = rng.normal(size=(50, 8))
+    embeddings = normalize_embeddings(np.vstack([base, base + rng.normal(scale=0.01, size=base.shape)]))
+    full = find_near_duplicates(embeddings, 0.98, block_size=1000)
+    blocked = find_near_duplicates(embeddings, 0.98, block_size=7)
+    assert (full == blocked).all()
+    assert (full[50:] == np.arange(50)).all()
+
+def test_no_chain_collapse():
+    """Fact is collapsed only into representative fact"""
+    # 0~1 and 1~2, but 0 is not similar to 2
+    embeddings = normalize_embeddings([[1, 0], [1, 0.3], [1, 0.62]])
+    result = dedup_facts(embeddings, 0.95)
+    assert result.kept_index_list == [0, 2]
@@ -0,0 +1,139 @@
+"""
+    Tests of file index
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import os
+import types
+import threading
+from typing import Iterator
+
+import pytest
+
+from core import file_indexing
+from core.job_manager import JobCancelledError
+from core.file_indexing import FileIndex, FileIndexParams
+from core.parsers.chunk_splitters.base_splitter import ChunkSplitterParams, ChunkSplitterMode
+
+INDEX_PARAMS = FileIndexParams(ChunkSplitterParams(0, 100, 0, 'gpt-3.5-turbo', ChunkSplitterMode.CHARACTER_SPLITTER), '')
+
+def iter_pages(text : str, count : int) -> Iterator[tuple[str, dict]]:
+    """Pages of one file"""
+    return ((f'{text} {index}', {'s_source': 'f.txt', 'p_source': f'f.txt-{index}'}) for index in range(count))
+
+def read_index_files(document_set : str, index_name : str) -> dict[str, str]:
+    """Content of all files of index by relative name"""
+    index_folder = os.path.join('.document-index', document_set, index_name)
+    index_files = {}
+    for folder, _, file_names in os.walk(index_folder):
+        for file_name in file_names:
+            with open(os.path.join(folder, file_name), encoding='utf-8') as f:
+                index_files[os.path.relpath(os.path.join(folder, file_name), index_folder)] = f.read()
+    return index_files
+
+class StandInQdrant:
+    """Index build: content of documents is written into index folder"""
+    fail = False
+
+    def __init__(self):
+        self.client = StandInClient()
+
+    @classmethod
+    def from_documents(cls, documents, embeddings, path=None, **kwargs):
+        """Write documents or fail"""
+        if cls.fail:
+            raise ValueError('embedding failed')
+        os.makedirs(path)
+        with open(os.path.join(path, 'vectors.txt'), 'wt', encoding='utf-8') as f:
+            f.write('\n'.join(document.page_content for document in documents))
+        return cls()
+
+@pytest.mark.parametrize('cancel_progress', ['Split 10', 'Split 20', 'Save', 'Embed'])
+def test_cancelled_indexing_keeps_old_index(tmp_path, monkeypatch, cancel_progress):
+    """Indexing cancelled from any progress callback keeps old index as it was"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_indexing, 'Qdrant', StandInQdrant)
+    file_index = FileIndex(False)
+    file_index.run_indexing('set1', 'index1', iter_pages('old page', 5), 'E', 0, None, INDEX_PARAMS)
+    old_index_files = read_index_files('set1', 'index1')
+    assert 'old page 4' in old_index_files[os.path.join('index', 'vectors.txt')]
+
+    progress_list = []
+    def progress_callback(progress : str):
+        progress_list.append(progress)
+        if progress.startswith(cancel_progress):
+            raise JobCancelledError('cancelled')
+
+    with pytest.raises(JobCancelledError):
+        file_index.run_indexing('set1', 'index1', iter_pages('new page', 25), 'E', 0, None, INDEX_PARAMS, progress_callback)
+    assert progress_list[-1].startswith(cancel_progress)
+    assert read_index_files('set1', 'index1') == old_index_files
+    assert not read_index_files('.build', 'set1')
+
+def test_indexing_replaces_old_index(tmp_path, monkeypatch):
+    """Built index replaces old one, old index is kept if build failed"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_indexing, 'Qdrant', StandInQdrant)
+    file_index = FileIndex(False)
+    file_index.run_indexing('set1', 'index1', iter_pages('old page', 5), 'E', 0, None, INDEX_PARAMS)
+
+    progress_list = []
+    log = file_index.run_indexing('set1', 'index1', iter_pages('new page', 25), 'E', 0, None, INDEX_PARAMS, progress_list.append)
+    assert progress_list == ['Split 10 document(s) into chunks...', 'Split 20 document(s) into chunks...', 'Save 25 chunk(s)...', 'Embed 25 chunk(s) and build index...']
+    assert log[-1] == 'Index has been stored on disk'
+    new_index_files = read_index_files('set1', 'index1')
+    assert 'new page 24' in new_index_files[os.path.join('index', 'vectors.txt')]
+    assert len([name for name in new_index_files if name.startswith('chunks')]) == 25
+
+    monkeypatch.setattr(StandInQdrant, 'fail', True)
+    log = file_index.run_indexing('set1', 'index1', iter_pages('failed page', 3), 'E', 0, None, INDEX_PARAMS)
+    assert log[-1] == 'Index is not built, old index is kept'
+    assert read_index_files('set1', 'index1') == new_index_files
+    assert not read_index_files('.build', 'set1')
+
+class StandInClient:
+    """Client of index, keeps closed state"""
+    def __init__(self):
+        self.closed = False
+    def close(self):
+        self.closed = True
+
+class GapLock:
+    """Lock of opened index, runs callback before it's acquired (other thread in the gap)"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.on_wait = None
+    def acquire(self, blocking=True):
+        on_wait, self.on_wait = self.on_wait, None
+        if blocking and on_wait:
+            on_wait()
+        return self.lock.acquire(blocking)
+    def release(self):
+        self.lock.release()
+    def __enter__(self):
+        self.acquire()
+    def __exit__(self, *args):
+        self.release()
+
+def test_index_in_use_is_not_closed_as_idle(monkeypatch):
+    """Index is not closed by idle check after it's taken for search (before its lock is acquired)"""
+    file_index = FileIndex(True, keep_open_seconds=300)
+    client_list = []
+    def create_client(document_set, index_name):
+        client_list.append(StandInClient())
+        return client_list[-1]
+    monkeypatch.setattr(file_index, '_FileIndex__create_client', create_client)
+    gap_lock_list = []
+    def create_gap_lock():
+        gap_lock_list.append(GapLock())
+        gap_lock_list[-1].on_wait = lambda: file_index.close_idle_indexes(0)
+        return gap_lock_list[-1]
+    monkeypatch.setattr(file_indexing, 'threading', types.SimpleNamespace(Lock=create_gap_lock))
+
+    with file_index._FileIndex__open_index('set1', 'index1') as client: # pylint: disable=W0212
+        assert not client.closed
+    file_index.close_idle_indexes(0)
+    assert client.closed
+    with file_index._FileIndex__open_index('set1', 'index1') as new_client: # pylint: disable=W0212
+        assert new_client is not client and not new_client.closed and len(client_list) == 2
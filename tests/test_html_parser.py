@@ -0,0 +1,94 @@
+"""
+    Tests for html parser
+    To run: pytest
+"""
+
+# pylint: disable=C0103,C0301,C0411,C0413
+
+import pytest
+from bs4 import BeautifulSoup
+
+from core.parsers.html_parser import HtmlParser, extract_header_sections
+from core.parsers.base_parser import DocumentParserParams, DocumentParserHTMLParams, HtmlParserBackend
+
+def get_sections(html : str) -> list[str]:
+    """Sections as they are stored by parser"""
+    soup = BeautifulSoup(html, 'html.parser')
+    return [f'{header}\n\n{text}' for header, text in extract_header_sections(soup)]
+
+def test_header_sections():
+    """Sections are split by headers, lists and breaks are formatted"""
+    html = '<p>intro</p><h1>Title</h1><p>Text <strong>bold</strong><br/>line</p><ul><li>one<ul><li>sub</li><li> </li></ul></li></ul><h2>Sub</h2><p>end</p><!-- c --><h1>Next</h1>'
+    assert get_sections(html) == ['Title.\n\nText bold \nline \n- one \n-- sub \n\n', 'Title. Sub.\n\nend \n\n', 'Next.\n\n']
+
+def test_deep_html():
+    """Deep html does not hit recursion limit"""
+    depth = 5000
+    html = '<h1>Deep</h1>' + '<div>' * depth + 'text' + '</div>' * depth
+    assert get_sections(html) == ['Deep.\n\ntext ']
+
+HTML_PAGE = '''<!DOCTYPE html>
+<html>
+<head><title>T</title><script>x=1</script></head>
+<body>
+<div class="page-header">HEAD</div><p>intro &amp; more</p><h1>Title</h1><p>Text <strong>bold<!--c--></strong><br/>line</p>
+<ul><li>one<ul><li>sub</li><li> </li></ul></li></ul><button>b</button>tail<h2 id="x-footer">Sub</h2><p>end</p><!-- c --><h1>Next</h1><footer>f</footer>after
+</body>
+</html>
+'''
+
+def parse_with_backend(tmp_path, html : str, combine_html_headers : bool, backend : HtmlParserBackend) -> list[str]:
+    """Pages of html file"""
+    file_name = tmp_path / 'page.html'
+    file_name.write_text(html, encoding="utf-8")
+    html_params = DocumentParserHTMLParams(combine_html_headers, ['header', 'footer', 'breadcrumb'], ['head', 'script', 'button'], backend)
+    result = HtmlParser(str(file_name)).parse(DocumentParserParams(html_params))
+    assert not result.error
+    return [c.page_content for c in result.content]
+
+def test_lxml_backend_gives_the_same_text(tmp_path):
+    """lxml backend returns the same text as BeautifulSoup backend"""
+    for combine_html_headers in [False, True]:
+        # text extractor stores stripped pages (whitespace before <body> is partly dropped by lxml)
+        result_list = [[page.strip() for page in parse_with_backend(tmp_path, HTML_PAGE, combine_html_headers, backend)] for backend in HtmlParserBackend]
+        assert result_list[0] == result_list[1]
+    assert result_list[0] == ['Title.\n\nText bold \nline \n- one \n-- sub tail end', 'Next.\n\nafter']
+
+MALFORMED_HTML = [
+    '<p>a</p>\n\n<p>b</p>',
+    '<h1>A</h1><p>a</p>\t \t<p>b</p>\r\n\r\n<p>c</p>',
+    '<html><body><p>a</p></body></html>after',
+    '<h1>A</h1><p>a</p>\n</body>\n</html>\n<p>after</p>',
+    '<body><h1>A</h1>x</body><h2>B</h2>y',
+    '<h1>A</h1><pre>a\n\n  b</pre>  \n <p>c</p><textarea>  \n  </textarea>z',
+    '<h1>A</h1><div>x<span>y</div>z</span>',
+    '<h1>A</h1><p>x<b>y</p>z</b>',
+    '<h1>A</h1><table><tr><td>a<td>b<tr><td>c</table>',
+    '<h1>A</h1>text &amp; &nbsp; &lt;tag&gt; &#10; end',
+    '<h1>A</h1><!-- c --> \n <p>b</p>',
+    '<h1>A</h1><div class="footer">f</div>after <br> br',
+    '<h1>A</h1><script>var s="</body>";</script>x',
+    '<h1>A</h1>\n\n<strong>bold</strong>\n\n<strong> </strong>text',
+    '<h1>A</h1><p>x<p>y<div>z</div>',
+    '<h1>A</h1><p>a<ul><li>b</ul>',
+    '<h1>A</h1><img src=x>text<input>more',
+    '<h1>A</h1><p>unclosed <i>italic',
+    'no tags at all\n\nsecond',
+]
+
+@pytest.mark.parametrize('combine_html_headers', [False, True])
+@pytest.mark.parametrize('html', MALFORMED_HTML)
+def test_lxml_backend_on_malformed_html(tmp_path, html, combine_html_headers):
+    """lxml backend returns exactly the same pages as BeautifulSoup backend for malformed html"""
+    bs4_pages = parse_with_backend(tmp_path, html, combine_html_headers, HtmlParserBackend.BS4)
+    assert parse_with_backend(tmp_path, html, combine_html_headers, HtmlParserBackend.LXML) == bs4_pages
+
+@pytest.mark.parametrize('html, bs4_pages, lxml_pages', [
+    ('<h1>A</h1><ul><li>one<li>two</ul>', ['A.\n\n- one \n-- two '], ['A.\n\n- one \n- two ']),
+    ('<h1>A<h2>B</h1>c</h2>d', ['AB.\n\nc d '], ['AB.\n\ncd ']),
+    ('<h1>A</h1><head><title>late</title></head>x', ['A.\n\nx '], ['A.\n\nlate x ']),
+])
+def test_lxml_backend_known_differences(tmp_path, html, bs4_pages, lxml_pages):
+    """Implicitly closed elements are documented differences of lxml backend"""
+    assert parse_with_backend(tmp_path, html, True, HtmlParserBackend.BS4) == bs4_pages
+    assert parse_with_backend(tmp_path, html, True, HtmlParserBackend.LXML) == lxml_pages
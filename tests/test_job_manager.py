@@ -0,0 +1,108 @@
+"""
+    Tests of background job manager (worker processes, persistent job table)
+"""
+
+# pylint: disable=C0301,C0103,C0304,W0613
+
+import time
+
+from core.job_manager import JobManager, JobStatus, JobStore, JobItem
+
+JOB_FUNCTIONS = {
+    'sum'    : 'tests.test_job_manager:sum_job',
+    'sleep'  : 'tests.test_job_manager:sleep_job',
+    'failed' : 'tests.test_job_manager:failed_job',
+}
+
+def sum_job(document_set : str, params : dict, progress_callback) -> list[str]:
+    """Job with result"""
+    progress_callback('Summing...')
+    return [f'{document_set}: {sum(params["values"])}']
+
+def sleep_job(document_set : str, params : dict, progress_callback) -> list[str]:
+    """Long job which reports progress"""
+    for index in range(params['steps']):
+        progress_callback(f'Step {index+1}')
+        time.sleep(0.1)
+    return ['slept']
+
+def failed_job(document_set : str, params : dict, progress_callback) -> list[str]:
+    """Job with error"""
+    raise ValueError('bad input')
+
+def wait_finished(job_manager : JobManager, job_id : str, timeout : float = 60) -> JobItem:
+    """Wait until job is not active"""
+    end_time = time.time() + timeout
+    while time.time() < end_time:
+        job = job_manager.get_job(job_id)
+        if not job.is_active:
+            return job
+        time.sleep(0.1)
+    raise TimeoutError(job_id)
+
+def test_jobs_done_and_failed(tmp_path):
+    """Jobs run concurrently in workers, result and error are saved"""
+    job_manager = JobManager(JOB_FUNCTIONS, 2, str(tmp_path / 'jobs.db'))
+    try:
+        sum_ids = [job_manager.submit('sum', f'set{index}', {'values': [1, 2, index]}) for index in range(3)]
+        failed_id = job_manager.submit('failed', 'set1', {})
+
+        for index, job_id in enumerate(sum_ids):
+            job = wait_finished(job_manager, job_id)
+            assert job.status == JobStatus.DONE.value
+            assert job.result == [f'set{index}: {3 + index}']
+            assert job.progress == 'Summing...'
+
+        job = wait_finished(job_manager, failed_id)
+        assert job.status == JobStatus.FAILED.value
+        assert 'bad input' in job.error
+
+        assert job_manager.get_last_job('set1', 'failed').job_id == failed_id
+        assert len(job_manager.get_jobs()) == 4
+    finally:
+        job_manager.close()
+
+def test_cancel(tmp_path):
+    """Running job stops on next progress, queued job is cancelled at once"""
+    job_manager = JobManager(JOB_FUNCTIONS, 1, str(tmp_path / 'jobs.db'))
+    try:
+        running_id = job_manager.submit('sleep', 'set1', {'steps': 1000})
+        queued_id = job_manager.submit('sleep', 'set1', {'steps': 1000})
+        while not job_manager.get_job(running_id).progress:
+            time.sleep(0.1)
+
+        job_manager.cancel(queued_id)
+        assert job_manager.get_job(queued_id).status == JobStatus.CANCELLED.value
+
+        job_manager.cancel(running_id)
+        job = wait_finished(job_manager, running_id)
+        assert job.status == JobStatus.CANCELLED.value
+        assert job.started
+    finally:
+        job_manager.close()
+
+def test_interrupted_jobs(tmp_path):
+    """Jobs which were running when server stopped are failed, queued jobs are kept"""
+    store_file_name = str(tmp_path / 'jobs.db')
+    job_store = JobStore(store_file_name)
+    job_store.add(JobItem('running', 'sum', 'set1', {'values': [1]}, created=1))
+    job_store.set_running('running')
+    job_store.add(JobItem('queued', 'sum', 'set1', {'values': [2]}, created=2))
+
+    job_manager = JobManager(JOB_FUNCTIONS, 1, store_file_name)
+    try:
+        assert job_manager.get_job('running').status == JobStatus.FAILED.value
+        job_manager.start()
+        job = wait_finished(job_manager, 'queued')
+        assert job.result == ['set1: 2']
+    finally:
+        job_manager.close()
+
+def test_cancelled_job_is_not_started(tmp_path):
+    """Job which was cancelled after it was read from queue is not set running"""
+    job_store = JobStore(str(tmp_path / 'jobs.db'))
+    job_store.add(JobItem('job1', 'sum', 'set1', {'values': [1]}, created=1))
+    queued = job_store.get_queued()
+    job_store.set_finished('job1', JobStatus.CANCELLED, [], None)
+    assert not job_store.set_running(queued[0].job_id)
+    assert job_store.get('job1').status == JobStatus.CANCELLED.value
@@ -0,0 +1,74 @@
+"""
+    Tests of offline LLM (record, replay, synthetic)
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import time
+
+import pytest
+from langchain.prompts.prompt import PromptTemplate
+from langchain_community.callbacks import get_openai_callback
+
+import core.llm.prompts as prompts
+from core.llm.llm_json_parser import get_llm_json
+from core.llm.offline_llm import OfflineLlm, OfflineLlmParams, OfflineLlmMode, LlmRecordings, get_synthetic_response
+from core.llm_manager import LlmManager
+
+TEXT = 'The price of the basic plan is 10 dollars. Support is available on weekdays.\nRefunds are possible within 30 days.'
+
+@pytest.fixture(name='llm_manager')
+def fixture_llm_manager(tmp_path, monkeypatch) -> LlmManager:
+    """Manager with synthetic LLM (LLM cache is created in temporary folder)"""
+    monkeypatch.chdir(tmp_path)
+    return LlmManager({'offline_llm': {'mode': 'synthetic'}})
+
+def test_synthetic_pipeline(llm_manager : LlmManager):
+    """Responses of synthetic LLM are parsed by the application"""
+    relevance = llm_manager.get_relevance_score('price of basic plan', TEXT)
+    assert relevance.llm_score == 1 and not relevance.error
+    assert llm_manager.get_relevance_score('weather tomorrow', TEXT).llm_score == 0
+
+    knowledge_tree = llm_manager.build_knowledge_tree(TEXT)
+    assert not knowledge_tree.error
+    assert knowledge_tree.triples[0].subject == 'The price'
+    assert knowledge_tree.triples[0].objects == ['the basic plan is 10 dollars.']
+    assert knowledge_tree.token_used > 0
+
+    formatted = llm_manager.run_llm_format(TEXT)
+    assert formatted.output_text.startswith('<h1>The price')
+
+    answers = [result.answer for result in llm_manager.iter_answer('What is the price of the plan?', ['Nothing here.', TEXT, 'The plan price includes taxes.'])]
+    assert answers[0] == 'The price of the basic plan is 10 dollars.'
+    assert answers[-1] == 'The price of the basic plan is 10 dollars. The plan price includes taxes.'
+
+def test_synthetic_facts():
+    """Facts prompt returns facts of input text"""
+    prompt = PromptTemplate.from_template(prompts.extract_facts_prompt_template).format(input_text=TEXT, context='pricing')
+    facts = get_llm_json(get_synthetic_response(prompt))
+    assert [f['fact'] for f in facts['relevant_facts']] == [
+        'The price of the basic plan is 10 dollars.', 'Support is available on weekdays.', 'Refunds are possible within 30 days.'
+    ]
+
+def test_record_and_replay(tmp_path):
+    """Recorded responses are replayed with latency, token usage is counted by openai callback"""
+    recordings_file = str(tmp_path / 'recordings.jsonl')
+    prompt = PromptTemplate.from_template(prompts.relevance_prompt_template).format(query='price', content=TEXT)
+
+    # synthetic model is used as 'real' model here
+    real_llm = OfflineLlm(OfflineLlmParams(OfflineLlmMode.SYNTHETIC)).create_llm('gpt-3.5-turbo', 100)
+    recorder = OfflineLlm(OfflineLlmParams(OfflineLlmMode.RECORD, recordings_file)).create_llm('gpt-3.5-turbo', 100, real_llm)
+    recorded_response = recorder.invoke(prompt).content
+    assert len(LlmRecordings(recordings_file)) == 1
+
+    player = OfflineLlm(OfflineLlmParams(OfflineLlmMode.REPLAY, recordings_file, latency=0.2, jitter=0.1)).create_llm('gpt-3.5-turbo', 100)
+    with get_openai_callback() as llm_callback:
+        start = time.perf_counter()
+        assert player.invoke(prompt).content == recorded_response
+        assert 0.17 < time.perf_counter() - start < 0.5
+    assert llm_callback.total_tokens > 0
+    assert llm_callback.total_cost > 0
+
+    strict_player = OfflineLlm(OfflineLlmParams(OfflineLlmMode.REPLAY, recordings_file, synthetic_on_miss=False)).create_llm('gpt-3.5-turbo', 100)
+    with pytest.raises(KeyError):
+        strict_player.invoke('prompt which was not recorded')
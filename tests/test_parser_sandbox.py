@@ -0,0 +1,168 @@
+"""
+    Tests of parser sandbox
+"""
+
+# pylint: disable=C0301,C0103,C0304,R0903
+
+import os
+import time
+
+import pytest
+
+from core.parsers.base_parser import BaseParser, DocumentParserParams, DocumentParserResult, DocumentContentItem
+from core.parsers import parser_sandbox
+from core.parsers.parser_sandbox import ParserSandbox, ParserSandboxParams, ParserSandboxError
+from core.parsers.parser_registry import get_parser_name
+
+class PidParser(BaseParser):
+    """Returns pid of worker as page"""
+    def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
+        return DocumentParserResult([DocumentContentItem(self.base_file_name, str(os.getpid()), 1, {})], 'ok', None)
+
+class HangingParser(BaseParser):
+    """Never ends"""
+    def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
+        time.sleep(600)
+
+class MemoryParser(BaseParser):
+    """Allocates a lot of memory"""
+    def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
+        buffers = []
+        for _ in range(100):
+            buffers.append(bytearray(50 * 1024 * 1024))
+            time.sleep(0.05)
+        return DocumentParserResult([], 'ok', None)
+
+class StreamingMemoryParser(BaseParser):
+    """Streams pages without pause, memory of each page is kept"""
+    def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
+        def iter_pages():
+            buffers = []
+            for index in range(60):
+                buffers.append(bytearray(20 * 1024 * 1024))
+                yield DocumentContentItem(self.base_file_name, f'page {index}', index, {})
+        return DocumentParserResult(iter_pages(), 'ok', None)
+
+class HugeAllocationParser(BaseParser):
+    """Allocates more than address space limit at once"""
+    def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
+        buffer = bytearray(2048 * 1024 * 1024)
+        return DocumentParserResult([DocumentContentItem(self.base_file_name, str(len(buffer)), 1, {})], 'ok', None)
+
+class ErrorParser(BaseParser):
+    """Raises error"""
+    def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
+        raise ValueError('bad file')
+
+class DyingResult(DocumentParserResult):
+    """Error is sent by worker, then worker dies before the end of file"""
+    @property
+    def error(self):
+        if self.__dict__.get('error_sent'):
+            os._exit(1)
+        self.__dict__['error_sent'] = True
+        return 'ERROR: file dying.txt. Bad file'
+
+    @error.setter
+    def error(self, value):
+        pass
+
+class DyingParser(BaseParser):
+    """Returns error, worker dies while error is reported"""
+    def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
+        return DyingResult(None, None, None)
+
+class SlowPagesParser(BaseParser):
+    """First page is fast, second one never ends"""
+    def _do_parse(self, params : DocumentParserParams) -> DocumentParserResult:
+        def iter_pages():
+            yield DocumentContentItem(self.base_file_name, 'page 0', 0, {})
+            time.sleep(600)
+        return DocumentParserResult(iter_pages(), 'ok', None)
+
+def test_parser_sandbox_limits():
+    """Timeout, memory limit and parser errors are reported, worker is recycled"""
+    sandbox = ParserSandbox(ParserSandboxParams(timeout_seconds=3, max_rss_mb=500, max_files_per_worker=2))
+    try:
+        pid_list = [list(sandbox.parse(PidParser, f'{i}.txt', None).content)[0].page_content for i in range(3)]
+        assert pid_list[0] == pid_list[1] != pid_list[2]
+        assert pid_list[0] != str(os.getpid())
+
+        result = sandbox.parse(HangingParser, 'hang.txt', None)
+        assert result.error == 'ERROR: file hang.txt. Timeout: parsing took more than 3 s'
+
+        result = sandbox.parse(MemoryParser, 'big.txt', None)
+        assert result.error.startswith('ERROR: file big.txt. Memory limit')
+
+        result = sandbox.parse(ErrorParser, 'error.txt', None)
+        assert result.error.startswith('ERROR: file error.txt. Exception: bad file')
+
+        # worker is restarted after killed one
+        assert list(sandbox.parse(PidParser, 'ok.txt', None).content)[0].page_content != pid_list[2]
+    finally:
+        sandbox.close()
+    assert sandbox.worker_pid is None
+
+def test_parser_sandbox_timeout_while_streaming():
+    """Timeout while pages are streamed is raised from content"""
+    sandbox = ParserSandbox(ParserSandboxParams(timeout_seconds=2))
+    try:
+        result = sandbox.parse(SlowPagesParser, 'slow.pdf', None)
+        assert not result.error
+        pages = []
+        with pytest.raises(ParserSandboxError, match='Timeout'):
+            for page in result.content:
+                pages.append(page)
+        assert [p.page_content for p in pages] == ['page 0']
+    finally:
+        sandbox.close()
+
+def test_parser_sandbox_memory_limit_while_streaming():
+    """Memory limit is checked while pages are streamed faster than RSS check interval"""
+    sandbox = ParserSandbox(ParserSandboxParams(timeout_seconds=60, max_rss_mb=400))
+    try:
+        result = sandbox.parse(StreamingMemoryParser, 'big.pdf', None)
+        assert not result.error
+        pages = []
+        with pytest.raises(ParserSandboxError, match='Memory limit'):
+            for page in result.content:
+                pages.append(page)
+        assert 0 < len(pages) < 60
+        assert list(sandbox.parse(PidParser, 'ok.txt', None).content)[0].page_content
+    finally:
+        sandbox.close()
+
+@pytest.mark.skipif(parser_sandbox.resource is None, reason='address space limit is not supported')
+def test_parser_sandbox_address_space_limit():
+    """Allocation above address space limit fails in worker (before RSS is checked)"""
+    sandbox = ParserSandbox(ParserSandboxParams(max_rss_mb=100000, max_address_space_mb=1024))
+    try:
+        result = sandbox.parse(HugeAllocationParser, 'huge.txt', None)
+        assert result.error.startswith('ERROR: file huge.txt. Exception:')
+        assert 'MemoryError' in result.error
+    finally:
+        sandbox.close()
+
+def test_parser_sandbox_registry_name(tmp_path):
+    """Parser from registry is imported in worker, missing parser is reported"""
+    file_name = tmp_path / 'test.txt'
+    file_name.write_text('hello', encoding="utf-8")
+    sandbox = ParserSandbox(ParserSandboxParams())
+    try:
+        result = sandbox.parse(get_parser_name('.txt'), str(file_name), None)
+        assert [p.page_content for p in result.content] == ['hello']
+        result = sandbox.parse('core.parsers.no_such_parser:NoParser', str(file_name), None)
+        assert result.error.startswith(f'ERROR: file {file_name}. Parser is not available')
+    finally:
+        sandbox.close()
+
+def test_parser_sandbox_worker_dies_after_error():
+    """Parser error is returned if worker dies before the end of file, next file is parsed by new worker"""
+    sandbox = ParserSandbox(ParserSandboxParams(timeout_seconds=5))
+    try:
+        result = sandbox.parse(DyingParser, 'dying.txt', None)
+        assert result.content is None
+        assert result.error == 'ERROR: file dying.txt. Bad file'
+        assert list(sandbox.parse(PidParser, 'ok.txt', None).content)[0].page_content
+    finally:
+        sandbox.close()
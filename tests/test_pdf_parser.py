@@ -0,0 +1,64 @@
+"""
+    Tests of pdf parser backends
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import types
+
+import pytest
+
+from core.parsers.pdf_parser import PdfParser, get_page_ranges
+from core.parsers.base_parser import DocumentParserParams, DocumentParserPDFParams, PdfParserBackend
+from benchmarks.synthetic_corpus import synthetic_pdf, synthetic_pdf_pages
+
+@pytest.fixture(name="pdf_file")
+def fixture_pdf_file(tmp_path):
+    """Synthetic pdf with 3 pages"""
+    page_lines = synthetic_pdf_pages(3, 5)
+    file_name = tmp_path / 'test.pdf'
+    file_name.write_bytes(synthetic_pdf(page_lines))
+    return str(file_name), page_lines
+
+@pytest.mark.parametrize("backend", list(PdfParserBackend))
+def test_pdf_backends_extract_pages(pdf_file, backend):
+    """All backends extract the same lines, page numbers are zero-based (as pypdf)"""
+    file_name, page_lines = pdf_file
+    result = PdfParser(file_name).parse(DocumentParserParams(None, DocumentParserPDFParams(backend)))
+    assert not result.error
+    assert result.message == 'Converted 3 pages(s) from test.pdf'
+    # pages are streamed
+    assert isinstance(result.content, types.GeneratorType)
+    pages = list(result.content)
+    assert [p.page_number for p in pages] == [0, 1, 2]
+    for page, lines in zip(pages, page_lines):
+        assert [line.strip() for line in page.page_content.strip().splitlines()] == lines
+
+def test_pdf_parser_error(tmp_path):
+    """Broken file is reported as error"""
+    file_name = tmp_path / 'broken.pdf'
+    file_name.write_bytes(b'not a pdf')
+    for backend in PdfParserBackend:
+        result = PdfParser(str(file_name)).parse(DocumentParserParams(None, DocumentParserPDFParams(backend)))
+        assert result.error.startswith('ERROR: file')
+
+def test_pdf_parallel_extraction(tmp_path):
+    """Page ranges extracted in worker processes are merged in page order"""
+    page_lines = synthetic_pdf_pages(45, 2)
+    file_name = tmp_path / 'big.pdf'
+    file_name.write_bytes(synthetic_pdf(page_lines))
+
+    serial_params = DocumentParserPDFParams(PdfParserBackend.PDFIUM, parallel_min_pages=0)
+    parallel_params = DocumentParserPDFParams(PdfParserBackend.PDFIUM, parallel_min_pages=10, max_workers=2)
+    serial = list(PdfParser(str(file_name)).parse(DocumentParserParams(None, serial_params)).content)
+    parallel = list(PdfParser(str(file_name)).parse(DocumentParserParams(None, parallel_params)).content)
+    assert parallel == serial
+    assert [p.page_number for p in parallel] == list(range(45))
+
+def test_get_page_ranges():
+    """Ranges cover all pages without gaps"""
+    page_ranges = get_page_ranges(2003, 4)
+    assert page_ranges[0][0] == 0 and page_ranges[-1][1] == 2003
+    assert all(a[1] == b[0] for a, b in zip(page_ranges, page_ranges[1:]))
+    assert len(page_ranges) == 16
+    assert get_page_ranges(15, 8) == [(0, 10), (10, 15)]
@@ -0,0 +1,158 @@
+"""
+    Tests of async query service (stand-in backend)
+"""
+
+# pylint: disable=C0301,C0103,C0304,W0613,R0913
+
+import time
+import json
+import random
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+import aiohttp
+from aiohttp import web
+from langchain_community.llms.fake import FakeListLLM
+
+from query_service import QueryService, create_app
+from core.llm_manager import LlmManager
+from benchmarks.bench_utils import percentile
+
+BODY = {'document_set': 'set1', 'index_name': 'index1', 'query': 'price', 'sample_count': 3}
+
+@dataclass
+class StandInChunk:
+    """Chunk with the same fields as BackendChunk"""
+    content   : str
+    score     : float
+    metadata  : dict[str, str]
+    llm_score : float
+    llm_expl  : str
+
+class StandInQueryBackend:
+    """Backend with fixed latency of search and of each LLM call (with jitter)"""
+
+    def __init__(self, search_latency : float, llm_latency : float, jitter : float, seed : int = 42):
+        self.search_latency = search_latency
+        self.llm_latency = llm_latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+
+    def __sleep(self, latency : float):
+        time.sleep(max(0.0, latency + self.rng.uniform(-self.jitter, self.jitter) * latency))
+
+    def similarity_search(
+            self, document_set : str, index_name : str, query : str, sample_count : int,
+            score_threshold : float, add_llm_score : bool, llm_threshold : float,
+            show_status_callback : Callable[[str], None]) -> list[StandInChunk]:
+        """Search with search latency (plus LLM latency for each chunk when LLM score is used)"""
+        self.__sleep(self.search_latency)
+        chunk_list = [StandInChunk(f'{query} chunk {index}', 1 - index / 10, {'source': f'file-{index}.txt'}, 0, '') for index in range(sample_count)]
+        if add_llm_score:
+            for chunk in chunk_list:
+                self.__sleep(self.llm_latency)
+                chunk.llm_score = 1
+        return chunk_list
+
+    def iter_answer(self, question : str, chunk_list : list[StandInChunk]) -> Iterator[str]:
+        """Refine answer: one LLM call for each chunk"""
+        answer = ''
+        for chunk in chunk_list:
+            self.__sleep(self.llm_latency)
+            answer = f'{answer} {chunk.content}'.strip()
+            yield answer
+
+async def run_with_service(query_service : QueryService, call):
+    """Start service on free port and run call(session, url)"""
+    runner = web.AppRunner(create_app(query_service))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1] # pylint: disable=W0212
+    try:
+        async with aiohttp.ClientSession() as session:
+            return await call(session, f'http://127.0.0.1:{port}')
+    finally:
+        await runner.cleanup()
+
+async def read_lines(response : aiohttp.ClientResponse) -> list[dict]:
+    """Read JSON lines response"""
+    return [json.loads(line) async for line in response.content if line.strip()]
+
+def test_search_answer_bulk():
+    """Search returns chunks, answer is streamed after each refine, bulk returns all queries"""
+
+    async def call(session : aiohttp.ClientSession, url : str):
+        async with session.get(f'{url}/health') as response:
+            assert (await response.json()) == {'status': 'ok'}
+
+        async with session.post(f'{url}/search', json=BODY) as response:
+            chunks = (await response.json())['chunks']
+        assert [c['content'] for c in chunks] == ['price chunk 0', 'price chunk 1', 'price chunk 2']
+
+        async with session.post(f'{url}/answer', json=BODY) as response:
+            lines = await read_lines(response)
+        assert len(lines[0]['chunks']) == 3
+        assert [line['final'] for line in lines[1:]] == [False, False, True]
+        assert lines[-1]['answer'] == 'price chunk 0 price chunk 1 price chunk 2'
+
+        async with session.post(f'{url}/bulk', json=dict(BODY, queries=[f'q{i}' for i in range(10)], build_answer=True)) as response:
+            lines = await read_lines(response)
+        assert sorted(line['index'] for line in lines) == list(range(10))
+        assert all(line['answer'].startswith(line['query']) for line in lines)
+
+        async with session.post(f'{url}/search', json={'query': 'no document set'}) as response:
+            assert response.status == 400
+
+    asyncio.run(run_with_service(QueryService(StandInQueryBackend(0.01, 0.01, 0), 4), call))
+
+class RefineQueryBackend(StandInQueryBackend):
+    """Search of stand-in backend, answer is built by refine chain of LLM manager"""
+
+    def __init__(self, llm_manager : LlmManager):
+        super().__init__(0, 0, 0)
+        self.llm_manager = llm_manager
+
+    def iter_answer(self, question : str, chunk_list : list) -> Iterator[str]:
+        """Answer as it's streamed by backend"""
+        for answer_result in self.llm_manager.iter_answer(question, [chunk.content for chunk in chunk_list]):
+            yield answer_result.answer
+
+def test_answer_stream_with_refine_chain(tmp_path, monkeypatch):
+    """Each answer of refine chain is streamed once, the last one is final"""
+    monkeypatch.chdir(tmp_path)
+    responses = [
+        '{"answer": "10 dollars"}',
+        '{"not_useful": false, "refined_answer": "10 dollars with taxes"}',
+        '{"not_useful": true, "refined_answer": ""}'
+    ]
+    monkeypatch.setattr(LlmManager, 'create_llm', lambda self, max_tokens, model_name='': FakeListLLM(responses=responses))
+    llm_manager = LlmManager({})
+
+    async def call(session : aiohttp.ClientSession, url : str):
+        async with session.post(f'{url}/answer', json=BODY) as response:
+            return await read_lines(response)
+
+    lines = asyncio.run(run_with_service(QueryService(RefineQueryBackend(llm_manager), 4), call))
+    assert [(line['answer'], line['final']) for line in lines[1:]] == [('10 dollars', False), ('10 dollars with taxes', True)]
+
+def test_concurrent_requests():
+    """Requests are processed concurrently up to max concurrency"""
+    request_count = 16
+
+    async def call(session : aiohttp.ClientSession, url : str):
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(*[session.post(f'{url}/search', json=BODY) for _ in range(request_count)])
+        return asyncio.get_running_loop().time() - start
+
+    seconds = asyncio.run(run_with_service(QueryService(StandInQueryBackend(0.2, 0, 0), 8), call))
+    # 2 rounds of 8 parallel searches (sequential run would take 3.2 seconds)
+    assert 0.4 <= seconds < 1.5
+
+def test_percentile():
+    """Linear interpolation between ranks"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50.5
+    assert percentile(values, 99) == 99.01
+    assert percentile([], 95) == 0
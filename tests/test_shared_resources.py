@@ -0,0 +1,38 @@
+"""
+    Tests of process-wide shared resources
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import time
+import threading
+
+from core.shared_resources import SharedResources
+
+def test_resource_created_once():
+    """Concurrent sessions get the same resource, slow creation of one resource doesn't block others"""
+    shared_resources = SharedResources()
+    created = []
+
+    def create_model():
+        created.append('model')
+        time.sleep(0.2)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(shared_resources.get('model', create_model))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    start_time = time.time()
+    assert shared_resources.get('cache', dict) == {}
+    assert time.time() - start_time < 0.1
+
+    for thread in threads:
+        thread.join()
+    assert created == ['model']
+    assert len({id(r) for r in results}) == 1
+    assert shared_resources.contains('model')
+
+    shared_resources.clear()
+    assert not shared_resources.contains('model')
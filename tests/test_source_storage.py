@@ -0,0 +1,182 @@
+"""
+    Tests of source storage
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import io
+import os
+import tarfile
+import zipfile
+import hashlib
+import multiprocessing
+
+import pytest
+
+from core.source_storage import SourceStorage, is_archive_file
+from core.text_extractor import TextExtractor, TextExtractorParams, iter_in_background
+from core.parsers.base_parser import DocumentParserParams
+
+class FailingStream(io.BytesIO):
+    """Stream which fails after first chunk"""
+    def read(self, size = -1):
+        if self.tell() > 0:
+            raise OSError('connection lost')
+        return super().read(size)
+
+def test_save_stream(tmp_path, monkeypatch):
+    """Content is saved by chunks, digest is returned and kept"""
+    monkeypatch.chdir(tmp_path)
+    content = os.urandom(3 * 1024 * 1024 + 17)
+    source_storage = SourceStorage(False)
+    digest = source_storage.save_stream('set1', 'file.pdf', io.BytesIO(content))
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert source_storage.get_all_files('set1', True) == ['file.pdf']
+    with open(source_storage.get_all_files('set1')[0], 'rb') as f:
+        assert f.read() == content
+    assert SourceStorage(False).get_file_digest('set1', 'file.pdf') == digest
+
+    assert source_storage.save_file('set1', 'file.txt', 'text') == hashlib.sha256(b'text').hexdigest()
+    assert source_storage.save_file('set1', 'file.bin', memoryview(b'bin')) == hashlib.sha256(b'bin').hexdigest()
+
+    source_storage.delete_file('set1', 'file.pdf')
+    assert source_storage.get_file_digest('set1', 'file.pdf') is None
+
+def test_save_stream_failed(tmp_path, monkeypatch):
+    """Failed upload keeps previous file and leaves no temp files"""
+    monkeypatch.chdir(tmp_path)
+    source_storage = SourceStorage(False)
+    digest = source_storage.save_file('set1', 'file.pdf', b'old')
+    with pytest.raises(OSError):
+        source_storage.save_stream('set1', 'file.pdf', FailingStream(os.urandom(3 * 1024 * 1024)))
+    assert os.listdir(os.path.join('.document-source', 'set1')) == ['file.pdf']
+    assert source_storage.get_file_digest('set1', 'file.pdf') == digest
+
+def test_digest_of_existed_file(tmp_path, monkeypatch):
+    """Digest is calculated for files saved before digests were kept"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join('.document-source', 'set1'))
+    with open(os.path.join('.document-source', 'set1', 'old.txt'), 'wb') as f:
+        f.write(b'old content')
+    assert SourceStorage(False).get_file_digest('set1', 'old.txt') == hashlib.sha256(b'old content').hexdigest()
+
+def test_same_content_is_stored_once(tmp_path, monkeypatch):
+    """Document sets refer to one blob, blob is removed with the last reference"""
+    monkeypatch.chdir(tmp_path)
+    source_storage = SourceStorage(False)
+    digest = source_storage.save_file('set1', 'a.pdf', b'content')
+    assert source_storage.save_file('set2', 'b.pdf', b'content') == digest
+    assert os.listdir(os.path.join('.document-source', '.blobs')) == [digest]
+    file_a = os.path.join('.document-source', 'set1', 'a.pdf')
+    file_b = os.path.join('.document-source', 'set2', 'b.pdf')
+    assert os.path.samefile(file_a, file_b)
+    assert source_storage.get_file_digests('set2') == {file_b : digest}
+
+    source_storage.delete_file('set1', 'a.pdf')
+    assert os.path.isfile(source_storage.get_blob_file_name(digest))
+    source_storage.save_file('set2', 'b.pdf', b'new content')
+    assert not os.path.isfile(source_storage.get_blob_file_name(digest))
+
+def test_digests_are_loaded_once(tmp_path, monkeypatch):
+    """Digests of document set are read once for all files"""
+    monkeypatch.chdir(tmp_path)
+    source_storage = SourceStorage(False)
+    for index in range(20):
+        source_storage.save_file('set1', f'{index}.txt', f'text {index}')
+    load_digests = source_storage._SourceStorage__load_digests # pylint: disable=W0212
+    load_count = []
+    def counted_load_digests(document_set : str):
+        load_count.append(document_set)
+        return load_digests(document_set)
+    monkeypatch.setattr(source_storage, '_SourceStorage__load_digests', counted_load_digests)
+    file_digests = source_storage.get_file_digests('set1')
+    assert len(file_digests) == 20 and all(file_digests.values())
+    assert load_count == ['set1']
+
+def save_files_in_process(folder : str, prefix : str, count : int):
+    """Save files into shared document set from other process"""
+    os.chdir(folder)
+    source_storage = SourceStorage(False)
+    for index in range(count):
+        source_storage.save_file('set1', f'{prefix}-{index}.txt', f'{prefix} {index % 3}')
+
+def test_digests_are_updated_by_processes(tmp_path, monkeypatch):
+    """Digests saved by parallel processes are not lost, shared blobs are kept"""
+    monkeypatch.chdir(tmp_path)
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        pool.starmap(save_files_in_process, [(str(tmp_path), f'p{index}', 25) for index in range(4)])
+    file_digests = SourceStorage(False).get_file_digests('set1')
+    assert len(file_digests) == 100
+    for file_name, digest in file_digests.items():
+        with open(file_name, 'rb') as f:
+            assert hashlib.sha256(f.read()).hexdigest() == digest
+    assert len(os.listdir(os.path.join('.document-source', '.blobs'))) == 12
+
+def test_linked_blob_is_not_deleted(tmp_path, monkeypatch):
+    """Blob which is linked into document set is kept, even if digest of the file is not written yet"""
+    monkeypatch.chdir(tmp_path)
+    source_storage = SourceStorage(False)
+    digest = source_storage.save_file('set1', 'a.txt', b'content')
+    os.makedirs(os.path.join('.document-source', 'set2'))
+    os.link(source_storage.get_blob_file_name(digest), os.path.join('.document-source', 'set2', 'b.txt'))
+    source_storage.delete_file('set1', 'a.txt')
+    assert os.path.isfile(source_storage.get_blob_file_name(digest))
+
+class NonSeekableStream(io.RawIOBase):
+    """Stream which can be read only once"""
+    def __init__(self, content : bytes):
+        self.content = io.BytesIO(content)
+    def readable(self):
+        return True
+    def readinto(self, buffer):
+        chunk = self.content.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+def test_save_archive(tmp_path, monkeypatch):
+    """Files from zip and tar are saved one by one, folders are kept in file names"""
+    monkeypatch.chdir(tmp_path)
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as archive:
+        archive.writestr('docs/a.txt', 'text a')
+        archive.writestr('docs/sub/b.txt', 'text b')
+        archive.writestr('__MACOSX/docs/._a.txt', 'service')
+        archive.writestr('../c.txt', 'text c')
+    zip_buffer.seek(0)
+    source_storage = SourceStorage(False)
+    saved_list = list(source_storage.iter_save_archive('set1', 'docs.zip', zip_buffer))
+    assert [(os.path.basename(file_name), digest) for file_name, digest in saved_list] == [
+        ('docs-a.txt', hashlib.sha256(b'text a').hexdigest()),
+        ('docs-sub-b.txt', hashlib.sha256(b'text b').hexdigest()),
+        ('c.txt', hashlib.sha256(b'text c').hexdigest())
+    ]
+
+    tar_buffer = io.BytesIO()
+    with tarfile.open(fileobj=tar_buffer, mode='w:gz') as archive:
+        for name, content in [('d.txt', b'text d'), ('e/f.txt', b'text f')]:
+            member = tarfile.TarInfo(name)
+            member.size = len(content)
+            archive.addfile(member, io.BytesIO(content))
+    saved_list = list(source_storage.iter_save_archive('set2', 'docs.tar.gz', NonSeekableStream(tar_buffer.getvalue())))
+    assert sorted(source_storage.get_all_files('set2', True)) == ['d.txt', 'e-f.txt']
+    assert saved_list[1][1] == hashlib.sha256(b'text f').hexdigest()
+    assert is_archive_file('A.TGZ') and not is_archive_file('a.pdf')
+
+def test_archive_feeds_extraction(tmp_path, monkeypatch):
+    """Files are extracted while archive is unpacked"""
+    monkeypatch.chdir(tmp_path)
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as archive:
+        for index in range(5):
+            archive.writestr(f'doc-{index}.txt', f'text {index}')
+    zip_buffer.seek(0)
+    file_digests = {}
+    def iter_saved_files():
+        for file_name, digest in SourceStorage(False).iter_save_archive('set1', 'docs.zip', zip_buffer):
+            file_digests[file_name] = digest
+            yield file_name
+    text_extractor = TextExtractor()
+    params = TextExtractorParams(False, lambda _: None, DocumentParserParams(None))
+    output_log = text_extractor.text_extraction_and_save('set1', iter_in_background(iter_saved_files(), 2), params, file_digests)
+    assert output_log == [f'Copied plain text document from doc-{index}.txt' for index in range(5)]
+    assert len(text_extractor.get_all_source_file_names('set1')) == 5
@@ -0,0 +1,93 @@
+"""
+    Tests of incremental aggregation of span files
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import os
+import json
+from dataclasses import dataclass
+
+import pytest
+
+from core import tracing
+from core.tracing import Tracer, JsonLinesSpanExporter, add_llm_usage, count_cache_lookup
+from core.span_metrics import SpanMetrics, StageMetrics, get_cache_hit_rates
+
+@dataclass
+class StandInCallback:
+    """Token usage fields of openai callback"""
+    total_tokens      : int
+    prompt_tokens     : int
+    completion_tokens : int
+    total_cost        : float
+
+def record_query(tracer : Tracer, document_set : str, cost : float):
+    """Trace of query with search and LLM answer"""
+    with tracer.span('query', document_set=document_set):
+        with tracer.span('similarity_search', chunks=3):
+            count_cache_lookup('embedding', 2, 1)
+        with tracer.span('llm.refine_initial') as llm_span:
+            add_llm_usage(llm_span, StandInCallback(100, 90, 10, cost))
+
+def test_incremental_aggregation(tmp_path, monkeypatch):
+    """Only new lines are read, aggregates are restored from cache file"""
+    # cache lookups are counted in spans of default tracer
+    tracer = tracing.tracer
+    monkeypatch.setattr(tracer, 'exporters', [JsonLinesSpanExporter(str(tmp_path))])
+    record_query(tracer, 'set1', 0.01)
+    record_query(tracer, 'set2', 0.02)
+
+    span_metrics = SpanMetrics(str(tmp_path))
+    assert span_metrics.update() == 6
+    assert span_metrics.update() == 0
+
+    record_query(tracer, 'set1', 0.03)
+    span_file = next(f for f in tmp_path.iterdir() if f.name.startswith('spans-'))
+    line = json.dumps({'name': 'incomplete', 'trace_id': 't', 'span_id': 's', 'parent_id': None, 'duration': 1.0, 'attributes': {}, 'error': 'failed'}) + '\n'
+    with open(span_file, 'at', encoding='utf-8') as f:
+        f.write(line[:20]) # line which is being written
+    assert span_metrics.update() == 3
+
+    stages = span_metrics.get_stage_metrics()
+    assert stages['query'].count == 3
+    assert stages['similarity_search'].totals['chunks'] == 9
+    assert get_cache_hit_rates(stages['similarity_search']) == {'embedding': (6, 3)}
+
+    day = span_metrics.get_days()[0]
+    document_sets = span_metrics.get_daily_document_set_metrics()[day]
+    assert document_sets['set1'].traces == 2
+    assert document_sets['set1'].tokens == 200
+    assert document_sets['set1'].cost == pytest.approx(0.04)
+    assert document_sets['set2'].cost == pytest.approx(0.02)
+
+    # the rest of the incomplete line is written later
+    with open(span_file, 'at', encoding='utf-8') as f:
+        f.write(line[20:])
+    assert span_metrics.update() == 1
+
+    restored_metrics = SpanMetrics(str(tmp_path))
+    assert restored_metrics.update() == 0
+    assert restored_metrics.get_stage_metrics()['query'].count == 3
+    assert restored_metrics.get_stage_metrics()['incomplete'].errors == 1
+    assert not restored_metrics.get_stage_metrics('9999-01-01')
+
+    # span file removed and re-created
+    os.remove(span_file)
+    record_query(tracer, 'set3', 0.05)
+    assert restored_metrics.update() == 3
+    assert list(restored_metrics.get_daily_document_set_metrics()[day].keys()) == ['set3']
+
+def test_latency_percentiles():
+    """Percentiles from latency histogram are within bucket precision"""
+    stage = StageMetrics()
+    for index in range(1, 1001):
+        stage.add(index / 1000, None, {})
+    assert stage.get_percentile(50) == pytest.approx(0.5, rel=0.1)
+    assert stage.get_percentile(99) == pytest.approx(0.99, rel=0.1)
+
+    merged = StageMetrics()
+    merged.merge(stage)
+    merged.merge(stage)
+    assert merged.count == 2000
+    assert merged.get_percentile(95) == stage.get_percentile(95)
@@ -0,0 +1,102 @@
+"""
+    Tests of single file text store
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import os
+
+import pytest
+
+from core.text_extractor import TextExtractor, TextExtractorParams, iter_in_order, iter_in_background
+from core.parsers.base_parser import DocumentParserParams
+
+def extract_and_enrich(text_extractor : TextExtractor, document_set : str, tmp_path) -> list[str]:
+    """Extract two txt files and add formatted text, facts and tables"""
+    file_list = []
+    for index in range(2):
+        file_name = tmp_path / f'source-{index}.txt'
+        file_name.write_text(f'text {index}', encoding="utf-8")
+        file_list.append(str(file_name))
+    output_log = text_extractor.text_extraction_and_save(document_set, file_list, TextExtractorParams(False, lambda _: None, DocumentParserParams(None)))
+    text_extractor.save_formatted_text(document_set, 'source-0.txt-01', '<p>text 0</p>')
+    text_extractor.save_fact_text(document_set, 'source-1.txt-01', ['fact 1', 'fact 2'])
+    text_extractor.save_tables(document_set, 'source-1.txt-01', '{"tables": []}')
+    return output_log
+
+def get_snapshot(text_extractor : TextExtractor, document_set : str) -> dict:
+    """Everything that can be read from text extractor"""
+    page_names = sorted(text_extractor.get_all_source_file_names(document_set))
+    return {
+        'pages'     : page_names,
+        'input'     : sorted(text_extractor.get_input_with_meta(document_set, False), key=lambda p: p[0]),
+        'formatted' : sorted(text_extractor.get_input_with_meta(document_set, True), key=lambda p: p[0]),
+        'by_files'  : text_extractor.get_input_with_meta_by_files(document_set, page_names),
+        'text'      : [text_extractor.get_input_by_file_name(document_set, name) for name in page_names],
+        'html'      : [text_extractor.get_formatted_text(document_set, name) for name in page_names],
+        'facts'     : sorted(text_extractor.get_all_facts_file_names(document_set, True)),
+        'fact_list' : text_extractor.get_facts_from_file(document_set, 'source-1.txt-01'),
+        'tables'    : sorted(text_extractor.get_table_file_list(document_set, True)),
+        'table'     : text_extractor.load_table_json(document_set, 'source-1.txt-01.txt.tables.json'),
+    }
+
+def test_text_store_migration(tmp_path, monkeypatch):
+    """Folder layout is migrated into text store, all reads return the same data"""
+    monkeypatch.chdir(tmp_path)
+    text_extractor = TextExtractor()
+    extract_and_enrich(text_extractor, 'set1', tmp_path)
+    assert not text_extractor.uses_text_store('set1')
+    folder_snapshot = get_snapshot(text_extractor, 'set1')
+    assert folder_snapshot['pages'] == ['source-0.txt-01', 'source-1.txt-01']
+    assert folder_snapshot['fact_list'] == ['fact 1', 'fact 2']
+
+    assert text_extractor.migrate_to_text_store('set1') == 2
+    assert text_extractor.uses_text_store('set1')
+    assert not os.path.isdir(os.path.join('.document-plain-text', 'set1'))
+    assert get_snapshot(text_extractor, 'set1') == folder_snapshot
+    # store is found by new instance too
+    assert get_snapshot(TextExtractor(), 'set1') == folder_snapshot
+
+    text_extractor.delete_table('set1', 'source-1.txt-01')
+    assert not text_extractor.get_table_file_list('set1', True)
+
+def test_text_store_for_new_document_set(tmp_path, monkeypatch):
+    """New document set is saved into text store if it's enabled"""
+    monkeypatch.chdir(tmp_path)
+    text_extractor = TextExtractor(use_text_store=True)
+    output_log = extract_and_enrich(text_extractor, 'set2', tmp_path)
+    assert output_log == ['Copied plain text document from source-0.txt', 'Copied plain text document from source-1.txt']
+    assert text_extractor.uses_text_store('set2')
+    assert not os.path.isdir(os.path.join('.document-plain-text', 'set2'))
+    assert get_snapshot(text_extractor, 'set2')['input'] == [
+        ('text 0', {'s_source': 'source-0.txt', 'page_number': 1, 'p_source': 'source-0.txt-01.txt'}),
+        ('text 1', {'s_source': 'source-1.txt', 'page_number': 1, 'p_source': 'source-1.txt-01.txt'})
+    ]
+
+def test_iter_input_with_meta(tmp_path, monkeypatch):
+    """Iterator variants filter by source file and keep order (folder and text store)"""
+    monkeypatch.chdir(tmp_path)
+    text_extractor = TextExtractor()
+    extract_and_enrich(text_extractor, 'set3', tmp_path)
+    for _ in range(2):
+        pages = list(text_extractor.iter_input_with_meta('set3', True, ['source-0.txt'], max_workers=2))
+        assert pages == [('<p>text 0</p>', {'s_source': 'source-0.txt', 'page_number': 1, 'p_source': 'source-0.txt-01.txt'})]
+        pages = list(text_extractor.iter_input_with_meta_by_files('set3', ['source-1.txt-01', 'source-0.txt-01']))
+        assert [p[0] for p in pages] == ['text 1', 'text 0']
+        text_extractor.migrate_to_text_store('set3')
+
+def test_iter_in_order():
+    """Results are in order of items"""
+    assert list(iter_in_order(lambda x: x * 2, list(range(50)), 4)) == [x * 2 for x in range(50)]
+    assert list(iter_in_order(lambda x: x * 2, [1, 2], 1)) == [2, 4]
+
+def test_iter_in_background():
+    """Items are produced in other thread, errors are raised in reader"""
+    assert list(iter_in_background(iter(range(50)), 4)) == list(range(50))
+    def failing_items():
+        yield 1
+        raise ValueError('broken archive')
+    with pytest.raises(ValueError):
+        list(iter_in_background(failing_items(), 4))
+    # reader can stop early
+    assert next(iter_in_background(iter(range(50)), 2)) == 0
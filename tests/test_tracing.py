@@ -0,0 +1,85 @@
+"""
+    Tests of stage tracing
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import json
+from dataclasses import dataclass
+
+import pytest
+
+from core.tracing import Tracer, JsonLinesSpanExporter, iter_span_tree, add_llm_usage, to_otlp_json
+
+@dataclass
+class StandInCallback:
+    """Token usage fields of openai callback"""
+    total_tokens      : int
+    prompt_tokens     : int
+    completion_tokens : int
+    total_cost        : float
+
+def test_nested_spans_exported_as_json_lines(tmp_path):
+    """Nested spans are children of the root, trace is written when root is finished"""
+    tracer = Tracer([JsonLinesSpanExporter(str(tmp_path))])
+
+    with tracer.span('query', document_set='set1') as root:
+        with tracer.span('similarity_search') as search_span:
+            with tracer.span('embed_query', query_chars=5):
+                pass
+            search_span.set_attribute('chunks', 3)
+        for _ in range(2):
+            with tracer.span('llm.refine_combine') as llm_span:
+                add_llm_usage(llm_span, StandInCallback(100, 80, 20, 0.01))
+                add_llm_usage(llm_span, StandInCallback(10, 8, 2, 0.001))
+        assert not list(tmp_path.iterdir())
+    assert tracer.get_current_span() is None
+
+    assert [(depth, span.name) for depth, span in iter_span_tree(root)] == [
+        (0, 'query'), (1, 'similarity_search'), (2, 'embed_query'), (1, 'llm.refine_combine'), (1, 'llm.refine_combine')
+    ]
+    assert root.children[1].attributes['tokens'] == 110
+    assert root.children[1].attributes['cost'] == pytest.approx(0.011)
+
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1 and files[0].name.startswith('spans-')
+    records = [json.loads(line) for line in files[0].read_text(encoding='utf-8').splitlines()]
+    assert [r['name'] for r in records] == ['query', 'similarity_search', 'embed_query', 'llm.refine_combine', 'llm.refine_combine']
+    assert len({r['trace_id'] for r in records}) == 1
+    assert records[0]['parent_id'] is None
+    assert records[2]['parent_id'] == records[1]['span_id']
+    assert records[1]['attributes'] == {'chunks': 3}
+    assert records[0]['duration'] >= records[1]['duration']
+
+def test_error_recorded_and_raised(tmp_path):
+    """Error of stage is saved in span and raised"""
+    tracer = Tracer([JsonLinesSpanExporter(str(tmp_path))])
+
+    with pytest.raises(ValueError):
+        with tracer.span('file_indexing'):
+            with tracer.span('build_index'):
+                raise ValueError('no vectors')
+
+    records = [json.loads(line) for line in next(tmp_path.iterdir()).read_text(encoding='utf-8').splitlines()]
+    assert all('no vectors' in r['error'] for r in records)
+
+def test_otlp_json():
+    """Spans are converted into OTLP/HTTP JSON request"""
+    tracer = Tracer([])
+    with tracer.span('query', chunks=3, score=0.5, add_llm_score=False, index_name='index1') as root:
+        with tracer.span('index_search'):
+            pass
+
+    request = to_otlp_json([span for _, span in iter_span_tree(root)])
+    spans = request['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert [s['name'] for s in spans] == ['query', 'index_search']
+    assert 'parentSpanId' not in spans[0]
+    assert spans[1]['parentSpanId'] == spans[0]['spanId']
+    assert len(spans[0]['traceId']) == 32 and len(spans[0]['spanId']) == 16
+    assert int(spans[0]['endTimeUnixNano']) >= int(spans[0]['startTimeUnixNano'])
+    assert spans[0]['attributes'] == [
+        {'key': 'chunks', 'value': {'intValue': '3'}},
+        {'key': 'score', 'value': {'doubleValue': 0.5}},
+        {'key': 'add_llm_score', 'value': {'boolValue': False}},
+        {'key': 'index_name', 'value': {'stringValue': 'index1'}}
+    ]
@@ -0,0 +1,122 @@
+"""
+    Tests of bulk url download (local http server)
+"""
+
+# pylint: disable=C0301,C0103,C0304
+
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from core.source_storage import SourceStorage
+from core.url_ingestion import UrlIngestion, UrlIngestionParams, UrlIngestionStatus, get_file_name_from_url, get_url_ingestion_message
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Small site: pages with ETag, flaky page, sitemaps"""
+
+    active_count = 0
+    max_active_count = 0
+    flaky_count = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args): # pylint: disable=W0622
+        pass
+
+    def send_body(self, body : bytes, content_type : str = 'text/html', headers : dict = None):
+        """Send 200 response"""
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self): # pylint: disable=C0116
+        host = f'http://{self.headers["Host"]}'
+        if self.path == '/sitemap.xml':
+            self.send_body(f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"><sitemap><loc>{host}/pages.xml</loc></sitemap></sitemapindex>'.encode(), 'application/xml')
+            return
+        if self.path == '/pages.xml':
+            locations = ''.join(f'<url><loc>{host}/page/{index}</loc></url>' for index in range(8))
+            self.send_body(f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locations}<url><loc>{host}/flaky</loc></url></urlset>'.encode(), 'application/xml')
+            return
+        if self.path == '/flaky':
+            with SiteHandler.lock:
+                SiteHandler.flaky_count += 1
+                flaky_count = SiteHandler.flaky_count
+            if flaky_count == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            self.send_body(b'<p>flaky</p>')
+            return
+        if self.path.startswith('/page/'):
+            etag = f'"{self.path}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            with SiteHandler.lock:
+                SiteHandler.active_count += 1
+                SiteHandler.max_active_count = max(SiteHandler.max_active_count, SiteHandler.active_count)
+            time.sleep(0.05)
+            with SiteHandler.lock:
+                SiteHandler.active_count -= 1
+            self.send_body(f'<p>{self.path}</p>'.encode() * 10000, headers={'ETag': etag})
+            return
+        self.send_response(404)
+        self.end_headers()
+
+@pytest.fixture(name='site_url')
+def fixture_site_url():
+    """Run local http server"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SiteHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+def test_ingest_sitemap(tmp_path, monkeypatch, site_url):
+    """Sitemap urls are downloaded with retries and per-host limit, second run uses ETag"""
+    monkeypatch.chdir(tmp_path)
+    source_storage = SourceStorage(False)
+    url_ingestion = UrlIngestion(source_storage, UrlIngestionParams(max_per_host=2, retry_delay=0.01))
+
+    url_list = url_ingestion.get_sitemap_urls(f'{site_url}/sitemap.xml')
+    assert len(url_list) == 9
+
+    result_list = url_ingestion.ingest('set1', url_list + [f'{site_url}/missing'])
+    assert [r.status for r in result_list] == [UrlIngestionStatus.SAVED] * 9 + [UrlIngestionStatus.ERROR]
+    assert result_list[-1].error == 'HTTP 404'
+    assert SiteHandler.flaky_count == 2
+    assert SiteHandler.max_active_count <= 2
+    assert len(source_storage.get_all_files('set1')) == 9
+    page_file_name = [file_name for file_name in source_storage.get_all_files('set1') if file_name.endswith('page-0.html')][0]
+    with open(page_file_name, 'rb') as f:
+        assert len(f.read()) > 100000
+
+    result_list = url_ingestion.ingest('set1', url_list[:8])
+    assert [r.status for r in result_list] == [UrlIngestionStatus.NOT_MODIFIED] * 8
+    assert result_list[0].digest == source_storage.get_file_digest('set1', result_list[0].file_name)
+
+def test_single_url_message(tmp_path, monkeypatch, site_url):
+    """Single url upload reports loaded, not modified and error"""
+    monkeypatch.chdir(tmp_path)
+    url_ingestion = UrlIngestion(SourceStorage(False), UrlIngestionParams(retry_delay=0.01))
+    file_name = get_file_name_from_url(f'{site_url}/page/1')
+
+    messages = [get_url_ingestion_message(url_ingestion.ingest('set1', [url])[0]) for url in [f'{site_url}/page/1', f'{site_url}/page/1', f'{site_url}/missing']]
+    assert messages == [
+        f'Content loaded into {file_name} file.',
+        f'Content of {file_name} file is not modified.',
+        f'ERROR: {site_url}/missing. HTTP 404'
+    ]
+
+def test_file_name_from_url():
+    """Known file types keep extension, other urls are html"""
+    assert get_file_name_from_url('https://site.com/docs/a?b=c') == 'site.com-docs-a-b=c.html'
+    assert get_file_name_from_url('https://site.com/docs/a.pdf') == 'site.com-docs-a.pdf'
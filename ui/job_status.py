@@ -0,0 +1,41 @@
+"""
+    Status of background job for streamlit pages
+"""
+# pylint: disable=C0301,C0103
+
+import time
+from typing import Optional
+
+import streamlit as st
+
+from core.job_manager import JobManager, JobItem, JobStatus
+
+JOB_REFRESH_SECONDS = 1
+
+def show_job_status(job_manager : JobManager, document_set : str, job_type : str) -> Optional[JobItem]:
+    """Show last job of type for document set, page is refreshed while job is active"""
+
+    job = job_manager.get_last_job(document_set, job_type)
+    if not job:
+        return None
+
+    status_container = st.container(border=True)
+    col1, col2 = status_container.columns([9, 1])
+    status_str = JobStatus(job.status).value.capitalize()
+    if job.cancel_requested and job.is_active:
+        status_str += ' (cancelling)'
+    col1.markdown(f'**Last job:** {status_str}. {job.progress if job.is_active else ""}')
+    if job.is_active and not job.cancel_requested:
+        if col2.button("Cancel", key=f'cancel_job_{job.job_id}'):
+            job_manager.cancel(job.job_id)
+            st.rerun()
+    if job.error:
+        status_container.error(job.error)
+    if job.result:
+        status_container.expander(label="Log").markdown('<br/>'.join(job.result), unsafe_allow_html= True)
+
+    if job.is_active:
+        time.sleep(JOB_REFRESH_SECONDS)
+        st.rerun()
+
+    return job